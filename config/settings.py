@@ -4,6 +4,8 @@ FastOTP Django Settings
 import os
 from pathlib import Path
 
+from .database import database_config
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 # Detect Vercel environment
@@ -28,12 +30,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'fastotp.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'fastotp.sharding.TenantMiddleware',  # no-op with a single database
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -45,7 +49,8 @@ LOGIN_REDIRECT_URL = 'dashboard'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'fastotp.metrics.InstrumentedDjangoTemplates',
+        'NAME': 'django',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -59,17 +64,62 @@ TEMPLATES = [
     },
 ]
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+# ─── Hot Partials (fastotp.hot_partials) ─────
+# 'jinja2' renders the polled HTMX partials with the Jinja2 copies in jinja2/ (needs Jinja2);
+# everything else stays on Django templates. `manage.py check` verifies both render the same HTML.
+HOT_PARTIALS_ENGINE = os.environ.get('HOT_PARTIALS_ENGINE', 'django')
+JINJA2_BYTECODE_CACHE_DIR = os.environ.get('JINJA2_BYTECODE_CACHE_DIR', '')  # default: <tmp>/fastotp-jinja2
+if HOT_PARTIALS_ENGINE == 'jinja2':
+    TEMPLATES.append({
+        'BACKEND': 'fastotp.jinja.InstrumentedJinja2',
+        'NAME': 'jinja2',
+        'DIRS': [BASE_DIR / 'jinja2'],
+        'APP_DIRS': False,
+        'OPTIONS': {'environment': 'fastotp.jinja.environment'},
+    })
+
+# ─── Database ────────────────────────────────
+# DATABASE_URL unset → local SQLite. See config/database.py for DB_POOL_MODE.
+DB_POOL_MODE = os.environ.get('DB_POOL_MODE', 'pgbouncer' if VERCEL_ENV else 'persistent')
+_db_profile = {
+    'pool_mode': DB_POOL_MODE,
+    'conn_max_age': int(os.environ.get('DB_CONN_MAX_AGE', '60')),
+    'pool_size': int(os.environ.get('DB_POOL_SIZE', '4')),
 }
+if os.environ.get('DATABASE_URL'):
+    DATABASES = {'default': database_config(os.environ['DATABASE_URL'], **_db_profile)}
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+        }
+    }
+
+# Read replica for read-heavy views (logs, dashboard aggregates); see fastotp/db_routers.py.
+if os.environ.get('DATABASE_REPLICA_URL'):
+    DATABASES['replica'] = database_config(os.environ['DATABASE_REPLICA_URL'], **_db_profile)
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+
+# ─── Sharding (fastotp.sharding) ─────────────
+# Extra databases for the per-tenant tables (OTPLog, Transaction, CreditBalance), as alias=url pairs:
+#   DATABASE_SHARD_URLS=shard1=sqlite:///shard1.sqlite3,shard2=postgres://…
+# Tenants hash over default + these. Before changing the list on a live system run
+# `manage.py rebalance_shards --pin <new list>`, then `manage.py rebalance_shards` after the deploy.
+for _alias, _url in (pair.split('=', 1) for pair in os.environ.get('DATABASE_SHARD_URLS', '').split(',') if pair):
+    DATABASES[_alias.strip()] = database_config(_url.strip(), **_db_profile)
+DATABASE_SHARDS = [alias for alias in DATABASES if alias != 'replica']
+SHARD_PLACEMENT_TTL = int(os.environ.get('SHARD_PLACEMENT_TTL', '5'))  # seconds a worker may route by a stale placement
+DATABASE_ROUTERS = ['fastotp.sharding.ShardRouter', 'fastotp.db_routers.PrimaryReplicaRouter']
 
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
 STATIC_ROOT = BASE_DIR / 'staticfiles'
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    # Fingerprinted + gzip/brotli; WhiteNoise serves hashed names with a 10-year immutable Cache-Control.
+    'staticfiles': {'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage'},
+}
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
@@ -84,9 +134,120 @@ USE_TZ = True
 FASTOTP_API_KEY = os.environ.get('FASTOTP_API_KEY', '')
 FASTOTP_API_URL = 'https://api.fastotp.co/v1'
 
+# ─── OTP Delivery ────────────────────────────
+# Background worker after commit. Serverless functions may freeze once the response
+# is sent, so Vercel delivers inline on commit unless told otherwise.
+OTP_DELIVERY_ASYNC = os.environ.get('OTP_DELIVERY_ASYNC', '0' if VERCEL_ENV else '1') == '1'
+OTP_DELIVERY_WORKERS = 4
+
+# ─── Send Deduplication (fastotp.dedup) ──────
+# Per worker, from in-process caches (no OTPLog query).
+OTP_RESEND_COOLDOWN = 30     # seconds a repeat send to the same key/identifier/channel returns the same otp_id
+IDEMPOTENCY_KEY_TTL = 86400  # seconds an Idempotency-Key replays its first response
+
+# ─── OTP Codes ───────────────────────────────
+# 'stored': random code, hash kept on the user row. 'totp': RFC 6238 code derived from
+# the number and time step (fastotp.totp) — nothing stored per code.
+OTP_MODE = os.environ.get('OTP_MODE', 'stored')
+TOTP_SECRET = os.environ.get('TOTP_SECRET', '')  # derives per-identifier secrets; defaults to SECRET_KEY
+TOTP_STEP = 30               # seconds per code for authenticator-style flows
+TOTP_SIGNUP_STEP = 300       # signup codes: valid for the rest of this step plus TOTP_DRIFT_STEPS more
+TOTP_DRIFT_STEPS = 1         # steps of clock drift accepted either side
+TOTP_MAX_ATTEMPTS = 5        # wrong codes per identifier per validity window (per worker)
+
+# ─── API Sandbox (fastotp.sandbox) ───────────
+# Test keys never touch the database or credits: every code is SANDBOX_OTP_CODE and the
+# magic numbers +15005550001-6 force error/delivery outcomes.
+SANDBOX_OTP_CODE = '123456'
+SANDBOX_FAILURE_RATE = float(os.environ.get('SANDBOX_FAILURE_RATE', '0'))  # share of sends answered 503
+SANDBOX_DELAY_MS = int(os.environ.get('SANDBOX_DELAY_MS', '0'))            # real delay added to each send
+SANDBOX_LOG_SIZE = 200        # recent calls kept per test key (per worker)
+OTP_MAX_VERIFY_ATTEMPTS = 5   # wrong codes per API OTP
+
+# ─── Webhooks (fastotp.webhooks) ─────────────
+# A background dispatcher thread per worker. On Vercel (no threads after the
+# response) events wait in the outbox for Vercel Cron to call /api/cron/webhooks
+# with CRON_SECRET; `python manage.py dispatch_webhooks` also drains it.
+WEBHOOK_DISPATCH_ASYNC = os.environ.get('WEBHOOK_DISPATCH_ASYNC', '0' if VERCEL_ENV else '1') == '1'
+CRON_SECRET = os.environ.get('CRON_SECRET', '')  # /api/cron/webhooks is 404 when unset
+WEBHOOK_ALLOW_PRIVATE = DEBUG      # allow loopback/private endpoint URLs (local receivers only)
+WEBHOOK_BATCH_SIZE = 100           # events per POST to one endpoint
+WEBHOOK_ENDPOINT_CONCURRENCY = 2   # requests in flight per endpoint
+WEBHOOK_TIMEOUT = 10               # seconds per request
+WEBHOOK_MAX_ATTEMPTS = 8           # 10s, 20s, 40s ... capped at WEBHOOK_RETRY_MAX, then failed
+WEBHOOK_RETRY_MAX = 3600
+
 # ─── Payment Gateways ────────────────────────
 PAYSTACK_SECRET_KEY = os.environ.get('PAYSTACK_SECRET_KEY', '')
 FLUTTERWAVE_SECRET_KEY = os.environ.get('FLUTTERWAVE_SECRET_KEY', '')
+PAYSTACK_BASE_URL = os.environ.get('PAYSTACK_BASE_URL', 'https://api.paystack.co')
+FLUTTERWAVE_BASE_URL = os.environ.get('FLUTTERWAVE_BASE_URL', 'https://api.flutterwave.com/v3')
+PAYMENT_GATEWAY_TIMEOUT = 10          # seconds, per call
+PAYMENT_GATEWAY_MAX_CONNECTIONS = 20  # keep-alive pool size per gateway
+PAYMENT_VERIFY_CACHE_TTL = 30         # seconds a verify result is reused per reference
+
+# ─── Billing ─────────────────────────────────
+BILLING_SNAPSHOT_TTL = 15  # seconds a per-user billing snapshot is reused in-process
+CATALOGUE_TTL = 600        # upper bound on CreditPackage staleness in other workers
+
+# ─── API Keys ────────────────────────────────
+API_KEY_HASH_SECRET = os.environ.get('API_KEY_HASH_SECRET', '')  # HMAC key for stored API key hashes; defaults to SECRET_KEY. Rotating it invalidates all keys.
+API_KEY_CACHE_TTL = 60            # seconds a verified key is trusted in-process (revocation lag in other workers)
+API_KEY_NEGATIVE_CACHE_TTL = 300  # seconds an unknown/revoked key is rejected without a query
+
+# ─── API Key Usage ───────────────────────────
+USAGE_FLUSH_INTERVAL = 10     # seconds between batched usage writes per process
+USAGE_FLUSH_MAX_EVENTS = 500  # flush early once this many calls are buffered
+
+# ─── Latency Analytics ───────────────────────
+LATENCY_SKETCH_ACCURACY = 0.01  # relative error of reported percentiles
+LATENCY_FLUSH_INTERVAL = 30     # seconds between sketch merges per process
+LATENCY_QUERY_CACHE_TTL = 60    # seconds a percentile query result is reused
+
+# ─── FX Rates ────────────────────────────────
+FX_RATE_SOURCE = 'fastotp.fx.FileRateSource'
+FX_RATES_FILE = os.environ.get('FX_RATES_FILE', str(BASE_DIR / 'fx_rates.json'))
+FX_CACHE_TTL = 300  # seconds
+FX_MAX_AGE = 48 * 3600  # seconds; older rates still charge, with a warning, but are not displayed
+FX_FALLBACK_RATES = {'USD': '1', 'NGN': '1600'}  # coverage page only, never charged
+
+# ─── Metrics (/metrics, Prometheus format) ──
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'True') == 'True'
+METRICS_SAMPLE_RATE = float(os.environ.get('METRICS_SAMPLE_RATE', '0.1'))  # share of requests with DB/template/upstream detail
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')  # scrapers send "Authorization: Bearer <token>"; /metrics is 404 when unset
+
+# ─── Passwords & Login ───────────────────────
+# Preferred hasher (scrypt | argon2 | pbkdf2); the others stay listed so existing
+# hashes verify and are upgraded on next login. argon2 needs `argon2-cffi`.
+PASSWORD_HASHER = os.environ.get('PASSWORD_HASHER', 'scrypt')
+_PASSWORD_HASHERS = {
+    'scrypt': 'fastotp.hashers.TunedScryptPasswordHasher',
+    'argon2': 'fastotp.hashers.TunedArgon2PasswordHasher',
+    'pbkdf2': 'fastotp.hashers.TunedPBKDF2PasswordHasher',
+}
+PASSWORD_HASHERS = [_PASSWORD_HASHERS[PASSWORD_HASHER]] + [
+    path for name, path in _PASSWORD_HASHERS.items() if name != PASSWORD_HASHER
+]
+# Cost knobs (defaults are Django's): PASSWORD_SCRYPT_WORK_FACTOR / _BLOCK_SIZE / _PARALLELISM,
+# PASSWORD_ARGON2_TIME_COST / _MEMORY_COST / _PARALLELISM, PASSWORD_PBKDF2_ITERATIONS.
+
+LOGIN_THROTTLE_WINDOW = 300          # seconds
+LOGIN_MAX_ATTEMPTS_PER_IP = 30       # attempts per window, checked before hashing
+LOGIN_MAX_ATTEMPTS_PER_ACCOUNT = 5   # failed attempts per email per window
+LOGIN_UNKNOWN_EMAIL_TTL = 60         # seconds an email without an account skips the lookup
+
+# ─── Fraud Detection (fastotp.fraud) ─────────
+FRAUD_DETECTION = os.environ.get('FRAUD_DETECTION', 'True') == 'True'
+FRAUD_WINDOW = 600  # seconds of send history each limit covers
+# Sends per window before blocking (flagged from 70%); per worker process. 'prefix' is per API key;
+# 'ip' only counts keyless (signup) sends.
+FRAUD_LIMITS = {'api_key': 2000, 'ip': 20, 'prefix': 5000, 'number_range': 8, 'unlisted_prefix': 20}
+
+# ─── Client IPs ──────────────────────────────
+# Proxies whose X-Forwarded-For entries are believed (net.get_client_ip); the
+# client is the rightmost hop outside these. Add your load balancer's range when
+# running behind one (the Vercel runtime already puts the client in REMOTE_ADDR).
+TRUSTED_PROXIES = os.environ.get('TRUSTED_PROXIES', '127.0.0.0/8,::1/128').split(',')
 
 # ─── Session ─────────────────────────────────
 SESSION_ENGINE = 'django.contrib.sessions.backends.db'
@@ -94,5 +255,23 @@ SESSION_COOKIE_AGE = 86400 * 30  # 30 days
 SESSION_COOKIE_SECURE = not DEBUG
 CSRF_COOKIE_SECURE = not DEBUG
 
+# ─── Maintenance (python manage.py sweep) ────
+SWEEP_BATCH_SIZE = 500
+SWEEP_PAUSE = 0.05                    # seconds between batches
+SWEEP_INTERVAL = int(os.environ.get('SWEEP_INTERVAL', '0'))  # >0: each worker also sweeps in-process this often (s)
+SIGNUP_ABANDON_AFTER_HOURS = 48       # unverified signups older than this are deleted
+LOGIN_SESSION_RETENTION_DAYS = 30     # matches SESSION_COOKIE_AGE
+WEBHOOK_EVENT_RETENTION_DAYS = 7      # delivered/failed webhook outbox rows
+
+# ─── Enrichment (fastotp.enrichment) ─────────
+# Offline GeoIP database (.mmdb, e.g. GeoLite2-City or DB-IP Lite); unset → no locations.
+GEOIP_DATABASE = os.environ.get('GEOIP_DATABASE', '')
+ENRICHMENT_ASYNC = os.environ.get('ENRICHMENT_ASYNC', '0' if VERCEL_ENV else '1') == '1'  # 0: enrich logins inline
+ENRICHMENT_CACHE_SIZE = 10_000  # parsed user agents / resolved IPs kept per worker (LRU)
+
+# ─── Admin (fastotp.admin) ───────────────────
+ADMIN_COUNT_LIMIT = 10_000        # exact changelist counts stop here; larger unfiltered tables show an estimate
+ADMIN_ACTION_BATCH_SIZE = 1000    # rows per transaction for bulk admin actions
+
 # ─── Email (configure for production) ────────
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
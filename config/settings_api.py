@@ -0,0 +1,40 @@
+"""
+FastOTP slim settings for API-only lambdas.
+
+Serves the JSON/HTMX endpoints (OTP send/verify, polling, /metrics) with a
+minimal app and middleware stack so cold starts skip the admin, WhiteNoise
+(static files are routed straight to Vercel's CDN) and the messages framework.
+
+DJANGO_SETTINGS_MODULE=config.settings_api
+"""
+from .settings import *  # noqa: F401,F403
+
+INSTALLED_APPS = [
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',
+    'django.contrib.staticfiles',
+    'fastotp',
+]
+
+MIDDLEWARE = [
+    'fastotp.metrics.MetricsMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'fastotp.sharding.TenantMiddleware',  # the polling endpoints read the signed-in tenant's shard
+]
+
+ROOT_URLCONF = 'config.urls_api'
+
+# The site's engines ('django', plus 'jinja2' when HOT_PARTIALS_ENGINE=jinja2),
+# minus the context processors of apps this stack leaves out.
+TEMPLATES = [
+    {**engine, 'OPTIONS': {**engine['OPTIONS'], 'context_processors': [
+        'django.template.context_processors.request',
+        'django.contrib.auth.context_processors.auth',
+    ]}} if engine['NAME'] == 'django' else engine
+    for engine in TEMPLATES  # noqa: F405
+]
@@ -0,0 +1,7 @@
+from django.urls import path, include
+
+# Same route table as the site (so {% url %} in shared partials still
+# resolves) without mounting the admin.
+urlpatterns = [
+    path('', include('fastotp.urls')),
+]
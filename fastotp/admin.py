@@ -0,0 +1,380 @@
+"""
+FastOTP Admin
+=============
+Admin for tables that grow to millions of rows (``OTPLog``, ``Transaction``)
+and the ones they point at. Every changelist page costs a fixed number of
+queries, whatever the table size:
+
+    counts       ``EstimatedCountPaginator``: the planner's row estimate for an
+                 unfiltered list, an exact count capped at ``ADMIN_COUNT_LIMIT``
+                 for a filtered one; no second "N total" count, no facet counts
+    foreign keys ``raw_id_fields`` / ``autocomplete_fields``, never a <select>
+                 of every user or key; ``list_select_related`` for the columns
+    dates        ``KeysetDateQuerySet``: the date drill-down finds each
+                 year/month/day with one index seek on ``created_at`` instead of
+                 a DISTINCT over the table
+
+Bulk actions are set-based UPDATEs applied in PK batches through
+``maintenance.sweep_in_batches``, so "select all" over a large filter never
+loads the rows or holds one long transaction. ``delete_selected`` is removed
+from the large tables for the same reason.
+
+With several ``DATABASE_SHARDS`` the sharded tables (``ShardedAdmin``) list
+one shard at a time, picked with a "shard" filter that shows each shard's
+estimated size; change and delete pages find a row's shard by asking all of
+them at once (``sharding.fan_out``).
+"""
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin.views.main import ChangeList
+from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import QuerySet
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from .apikeys import forget_key
+from .billing import invalidate_billing
+from .dedup import forget_otp
+from .maintenance import sweep_in_batches
+from .models import APIKey, CreditBalance, CreditPackage, OTPLog, Transaction, User
+from .services import change_otp_status, refund_otp_credits
+from .sharding import current_shard, fan_out, on_shard, owned_rows, ring, tenant
+
+ADMIN_COUNT_LIMIT = getattr(settings, 'ADMIN_COUNT_LIMIT', 10_000)
+ADMIN_ACTION_BATCH_SIZE = getattr(settings, 'ADMIN_ACTION_BATCH_SIZE', 1000)
+
+
+# ─────────────────────────────────────────────
+#  Counts
+# ─────────────────────────────────────────────
+
+def estimated_row_count(model, using: str = 'default'):
+    """
+    Approximate row count of ``model``'s table without scanning it: PostgreSQL's
+    ``pg_class.reltuples`` (kept by ANALYZE/autovacuum), SQLite's largest rowid.
+    ``None`` when no estimate is available.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                           [connection.ops.quote_name(table)])
+        elif connection.vendor == 'sqlite':
+            cursor.execute(f'SELECT MAX(rowid) FROM {connection.ops.quote_name(table)}')
+        else:
+            return None
+        row = cursor.fetchone()
+    if not row or row[0] is None or row[0] < 0:  # reltuples is -1 before the first ANALYZE
+        return None
+    return int(row[0])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    ``count`` is the planner estimate for an unfiltered queryset over
+    ``ADMIN_COUNT_LIMIT`` rows, and otherwise an exact count that stops at
+    ``ADMIN_COUNT_LIMIT`` (the changelist then shows that many).
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > ADMIN_COUNT_LIMIT:
+                return estimate
+        return queryset.order_by()[:ADMIN_COUNT_LIMIT].count()
+
+
+# ─────────────────────────────────────────────
+#  Date drill-down
+# ─────────────────────────────────────────────
+
+def _bucket_start(value, kind: str):
+    if isinstance(value, datetime):
+        value = timezone.localtime(value) if timezone.is_aware(value) else value
+    return datetime(value.year, value.month if kind != 'year' else 1, value.day if kind == 'day' else 1)
+
+
+def _next_bucket(start: datetime, kind: str) -> datetime:
+    if kind == 'year':
+        return start.replace(year=start.year + 1)
+    if kind == 'month':
+        return start.replace(year=start.year + start.month // 12, month=start.month % 12 + 1)
+    return start + timedelta(days=1)
+
+
+class KeysetDateQuerySet(QuerySet):
+    """
+    ``dates()``/``datetimes()`` (used by the admin ``date_hierarchy``) that walk
+    the index: each bucket is ``ORDER BY field LIMIT 1`` from the start of the
+    next one, so a page costs one seek per year/month/day shown.
+    """
+
+    def _keyset_buckets(self, field_name: str, kind: str, aware: bool) -> list:
+        values = self.order_by(field_name).values_list(field_name, flat=True)
+        buckets, lower = [], None
+        while (value := (values.filter(**{f'{field_name}__gte': lower}) if lower else values).first()) is not None:
+            start = _bucket_start(value, kind)
+            buckets.append(timezone.make_aware(start) if aware else start.date())
+            lower = _next_bucket(start, kind)
+            if aware:
+                lower = timezone.make_aware(lower)
+            elif not isinstance(value, datetime):
+                lower = lower.date()
+        return buckets
+
+    def dates(self, field_name, kind, order='ASC'):
+        if kind not in ('year', 'month', 'day'):
+            return super().dates(field_name, kind, order)
+        return self._keyset_buckets(field_name, kind, aware=False)[::-1 if order == 'DESC' else 1]
+
+    def datetimes(self, field_name, kind, order='ASC', tzinfo=None):
+        if kind not in ('year', 'month', 'day') or tzinfo is not None:
+            return super().datetimes(field_name, kind, order, tzinfo)
+        return self._keyset_buckets(field_name, kind, aware=settings.USE_TZ)[::-1 if order == 'DESC' else 1]
+
+
+# ─────────────────────────────────────────────
+#  Base admin
+# ─────────────────────────────────────────────
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
+    list_per_page = 50
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        return KeysetDateQuerySet(model=queryset.model, query=queryset.query, using=queryset._db)
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)  # collects and lists every selected row first
+        return actions
+
+    def apply_in_batches(self, request, queryset, apply, done: str):
+        """Run ``apply(batch) -> rows`` over ``queryset`` in PK batches and report ``done`` with the total."""
+        rows = sweep_in_batches(queryset, apply, batch_size=ADMIN_ACTION_BATCH_SIZE, pause=0)
+        self.message_user(request, done.format(rows=rows),
+                          messages.SUCCESS if rows else messages.WARNING)
+
+
+# ─────────────────────────────────────────────
+#  Shards
+# ─────────────────────────────────────────────
+
+SHARD_PARAM = 'shard'
+
+
+class ShardListFilter(admin.SimpleListFilter):
+    """Which shard the changelist reads; defaults to the first. No "All": pages do not merge across databases."""
+    title = 'shard'
+    parameter_name = SHARD_PARAM
+
+    def lookups(self, request, model_admin):
+        counts = fan_out(lambda alias: estimated_row_count(model_admin.model, alias))
+        return [(alias, alias if count is None else f'{alias} (~{count:,})') for alias, count in counts.items()]
+
+    def choices(self, changelist):
+        current = self.value() or ring.aliases[0]
+        for lookup, title in self.lookup_choices:
+            yield {
+                'selected': current == lookup,
+                'query_string': changelist.get_query_string({self.parameter_name: lookup}),
+                'display': title,
+            }
+
+    def queryset(self, request, queryset):
+        return queryset  # ShardedAdmin.get_queryset already reads the shard
+
+
+class ShardedChangeList(ChangeList):
+    def url_for_result(self, result):
+        return f'{super().url_for_result(result)}?{SHARD_PARAM}={result._state.db}'
+
+
+def _rendered(response):
+    if hasattr(response, 'render') and not response.is_rendered:
+        response.render()
+    return response
+
+
+class ShardedAdmin(LargeTableAdmin):
+    """
+    ``LargeTableAdmin`` for a table split across ``DATABASE_SHARDS``. Each page
+    runs inside ``on_shard()`` for the shard in ``?shard=``, the one holding the
+    object, or the posted user's. Foreign keys are prefetched from ``default``
+    rather than joined: the shards hold no users, keys or packages.
+    """
+
+    def _routing(self, request, object_id=None):
+        alias = request.GET.get(SHARD_PARAM)
+        if alias not in ring.aliases and object_id is not None:
+            alias = self._find_shard(object_id)
+        if alias in ring.aliases:
+            return on_shard(alias)
+        try:
+            return tenant(request.POST['user'])
+        except (KeyError, ValueError):
+            return on_shard(ring.aliases[0])
+
+    def _find_shard(self, object_id):
+        if len(ring.aliases) == 1:
+            return ring.aliases[0]
+        try:
+            pk = self.model._meta.pk.to_python(object_id)
+        except (ValidationError, ValueError):
+            return None
+        found = fan_out(lambda alias: self.model._base_manager.using(alias).filter(pk=pk).exists())
+        return next((alias for alias, exists in found.items() if exists), None)
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        alias = current_shard()
+        if len(ring.aliases) == 1 or alias is None:
+            return queryset
+        return owned_rows(queryset.using(alias), alias).prefetch_related(*self.list_select_related)
+
+    def get_list_select_related(self, request):
+        return () if len(ring.aliases) > 1 else self.list_select_related
+
+    def get_list_filter(self, request):
+        list_filter = super().get_list_filter(request)
+        return (ShardListFilter, *list_filter) if len(ring.aliases) > 1 else list_filter
+
+    def get_changelist(self, request, **kwargs):
+        return ShardedChangeList if len(ring.aliases) > 1 else super().get_changelist(request, **kwargs)
+
+    def changelist_view(self, request, extra_context=None):
+        with self._routing(request):
+            return _rendered(super().changelist_view(request, extra_context))
+
+    def changeform_view(self, request, object_id=None, form_url='', extra_context=None):
+        with self._routing(request, object_id):
+            return _rendered(super().changeform_view(request, object_id, form_url, extra_context))
+
+    def delete_view(self, request, object_id, extra_context=None):
+        with self._routing(request, object_id):
+            return _rendered(super().delete_view(request, object_id, extra_context))
+
+    def history_view(self, request, object_id, extra_context=None):
+        with self._routing(request, object_id):
+            return _rendered(super().history_view(request, object_id, extra_context))
+
+
+# ─────────────────────────────────────────────
+#  Model admins
+# ─────────────────────────────────────────────
+
+@admin.register(User)
+class UserAdmin(BaseUserAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
+    list_display = ('email', 'username', 'company_name', 'is_verified', 'is_active', 'created_at')
+    list_filter = ('is_verified', 'is_active', 'is_staff')
+    search_fields = ('=username', '=email')  # exact matches only, no LIKE scan
+    ordering = ('-created_at',)
+    fieldsets = BaseUserAdmin.fieldsets + (
+        ('FastOTP', {'fields': ('company_name', 'phone_number', 'whatsapp_number', 'is_verified')}),
+    )
+
+
+@admin.register(APIKey)
+class APIKeyAdmin(LargeTableAdmin):
+    list_display = ('name', 'prefix', 'user', 'environment', 'status', 'total_requests', 'last_used_at',
+                    'created_at')
+    list_filter = ('environment', 'status')
+    list_select_related = ('user',)
+    autocomplete_fields = ('user',)
+    fields = ('user', 'name', 'environment', 'status', 'prefix', 'total_requests', 'last_used_at')
+    readonly_fields = ('prefix', 'total_requests', 'last_used_at')
+    actions = ('revoke_keys',)
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if obj.status == 'revoked':
+            forget_key(obj.key_hash)
+
+    @admin.action(description='Revoke selected API keys')
+    def revoke_keys(self, request, queryset):
+        def revoke(batch):
+            key_hashes = list(batch.values_list('key_hash', flat=True))
+            rows = batch.update(status='revoked')
+            for key_hash in key_hashes:
+                forget_key(key_hash)
+            return rows
+        self.apply_in_batches(request, queryset.filter(status='active'), revoke, 'Revoked {rows} API keys.')
+
+
+@admin.register(OTPLog)
+class OTPLogAdmin(ShardedAdmin):
+    list_display = ('created_at', 'identifier', 'channel', 'status', 'user', 'api_key', 'country_name',
+                    'cost_credits', 'latency_ms', 'risk_score')
+    list_filter = ('status', 'channel')
+    list_select_related = ('user', 'api_key')
+    raw_id_fields = ('user', 'api_key')
+    date_hierarchy = 'created_at'
+    exclude = ('otp_hash',)
+    readonly_fields = ('created_at',)
+    actions = ('expire_otps', 'refund_otps')
+
+    @admin.action(description='Expire selected open OTPs')
+    def expire_otps(self, request, queryset):
+        def expire(batch):
+            rows = change_otp_status(batch, 'expired')
+            for row in rows:
+                forget_otp(row['id'])
+            return len(rows)
+        self.apply_in_batches(request, queryset.filter(status__in=OTPLog.OPEN_STATUSES), expire,
+                              'Expired {rows} OTPs.')
+
+    @admin.action(description='Refund credits for selected OTPs')
+    def refund_otps(self, request, queryset):
+        self.apply_in_batches(request, queryset.filter(cost_credits__gt=0), refund_otp_credits,
+                              'Refunded {rows} OTP sends.')
+
+
+@admin.register(Transaction)
+class TransactionAdmin(ShardedAdmin):
+    list_display = ('created_at', 'user', 'transaction_type', 'status', 'amount_usd', 'credits', 'gateway',
+                    'gateway_ref', 'package')
+    list_filter = ('transaction_type', 'status')
+    list_select_related = ('user', 'package')
+    raw_id_fields = ('user',)
+    date_hierarchy = 'created_at'
+    readonly_fields = ('created_at', 'status', 'amount_usd', 'credits')  # changed only by services/actions
+    actions = ('fail_pending_topups',)
+
+    @admin.action(description='Mark selected pending top-ups as failed')
+    def fail_pending_topups(self, request, queryset):
+        def fail(batch):
+            user_ids = set(batch.values_list('user_id', flat=True))
+            rows = batch.update(status='failed')
+            for user_id in user_ids:
+                invalidate_billing(user_id)
+            return rows
+        self.apply_in_batches(request, queryset.filter(status='pending', transaction_type='topup'), fail,
+                              'Marked {rows} top-ups as failed.')
+
+
+@admin.register(CreditBalance)
+class CreditBalanceAdmin(ShardedAdmin):
+    list_display = ('user', 'balance', 'total_topped_up', 'total_consumed', 'updated_at')
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
+    # Figures move only by F() updates in services; a form save would overwrite concurrent debits.
+    readonly_fields = ('balance', 'total_topped_up', 'total_consumed')
+
+
+@admin.register(CreditPackage)
+class CreditPackageAdmin(admin.ModelAdmin):
+    list_display = ('name', 'tier', 'credits', 'price_usd', 'price_per_otp', 'is_popular', 'is_active')
+    list_filter = ('tier', 'is_active')
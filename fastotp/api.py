@@ -0,0 +1,152 @@
+"""
+FastOTP REST API
+================
+JSON endpoints authenticated with ``Authorization: Bearer <API key>``:
+
+    POST /api/v1/send          {"identifier", "channel", "expires_in"}
+    POST /api/v1/verify        {"otp_id", "code"}
+    GET  /api/v1/sandbox/log   recent sandbox calls (test keys only)
+
+Live keys send real OTPs through ``services.send_api_otp``. Test keys are
+served entirely by ``fastotp.sandbox``: no queries, no credits, no delivery.
+Sends pass through ``fastotp.dedup`` first (resend cooldown and the optional
+``Idempotency-Key`` header). Every authenticated call counts towards the key's
+usage (``fastotp.usage``), whatever its outcome. Errors are ``{"success": false, "error": <code>,
+"message": ...}`` with the status from ``ERRORS``.
+"""
+import json
+import re
+import uuid
+from functools import partial
+from django.http import JsonResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+
+from .apikeys import authenticate_api_key
+from .dedup import IDEMPOTENCY_KEY_MAX_LENGTH, deduplicated_send, forget_otp
+from .models import OTPLog
+from .net import get_client_ip
+from .sandbox import sandbox
+from .services import send_api_otp, verify_api_otp
+from .sharding import TenantMoving, tenant
+from .usage import record_usage
+
+ERRORS = {
+    'invalid_request': (400, 'Malformed request body.'),
+    'invalid_identifier': (400, 'Identifier must be an E.164 number (or an email for the email channel).'),
+    'unauthorized': (401, 'Missing, unknown or revoked API key.'),
+    'insufficient_credits': (402, 'Not enough credits to send this OTP.'),
+    'blocked': (403, 'Send refused by fraud detection.'),
+    'sandbox_only': (403, 'Only test keys have a sandbox.'),
+    'not_found': (404, 'No deliverable OTP with this id.'),
+    'already_verified': (409, 'This OTP has already been verified.'),
+    'request_in_progress': (409, 'An identical send is still in progress; retry shortly.'),
+    'expired': (410, 'This OTP has expired.'),
+    'invalid_code': (422, 'Incorrect code.'),
+    'idempotency_conflict': (422, 'This Idempotency-Key was already used for a different request.'),
+    'too_many_attempts': (429, 'Too many incorrect codes for this OTP.'),
+    'upstream_unavailable': (503, 'Delivery is temporarily unavailable; retry later.'),
+    'account_moving': (503, 'This account is being moved between databases; retry in a few seconds.'),
+}
+
+CHANNELS = {value for value, _ in OTPLog.CHANNEL}
+EXPIRES_IN_RANGE = (60, 3600)
+_E164 = re.compile(r'\+[1-9]\d{6,14}')
+_EMAIL = re.compile(r'[^@\s]+@[^@\s]+\.[^@\s]+')
+
+
+def api_response(body: dict) -> JsonResponse:
+    if body.get('success'):
+        return JsonResponse(body)
+    status, message = ERRORS.get(body['error'], (400, ''))
+    return JsonResponse({**body, 'message': message}, status=status)
+
+
+def api_error(code: str, **extra) -> JsonResponse:
+    return api_response({'success': False, 'error': code, **extra})
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class APIView(View):
+    """
+    Authenticates the bearer key into ``request.api_key``, records the call
+    against it, parses JSON bodies into ``request.data`` and routes the key
+    owner's rows to their shard.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        auth = request.headers.get('Authorization', '')
+        api_key = authenticate_api_key(auth[7:] if auth.startswith('Bearer ') else '')
+        if api_key is None:
+            return api_error('unauthorized')
+        record_usage(api_key.id)
+        request.api_key = api_key
+        request.data = {}
+        if request.method == 'POST':
+            try:
+                request.data = json.loads(request.body or b'{}')
+            except ValueError:
+                return api_error('invalid_request')
+            if not isinstance(request.data, dict):
+                return api_error('invalid_request')
+        try:
+            with tenant(api_key.user_id):
+                return super().dispatch(request, *args, **kwargs)
+        except TenantMoving:
+            return api_error('account_moving')
+
+    @property
+    def in_sandbox(self) -> bool:
+        return self.request.api_key.environment == 'test'
+
+
+class SendOTPView(APIView):
+    def post(self, request):
+        identifier = request.data.get('identifier')
+        channel = request.data.get('channel', 'whatsapp')
+        expires_in = request.data.get('expires_in', 300)
+        if (channel not in CHANNELS or not isinstance(expires_in, int)
+                or not EXPIRES_IN_RANGE[0] <= expires_in <= EXPIRES_IN_RANGE[1]):
+            return api_error('invalid_request')
+        pattern = _EMAIL if channel == 'email' else _E164
+        if not isinstance(identifier, str) or len(identifier) > 100 or not pattern.fullmatch(identifier):
+            return api_error('invalid_identifier')
+
+        idempotency_key = request.headers.get('Idempotency-Key', '')
+        if len(idempotency_key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+            return api_error('invalid_request')
+
+        api_key = request.api_key
+        if self.in_sandbox:
+            send = partial(sandbox.send, api_key.id, identifier, channel, expires_in)
+        else:
+            send = partial(send_api_otp, api_key, identifier, channel, expires_in,
+                           ip_address=get_client_ip(request))
+        return api_response(deduplicated_send(api_key.id, identifier, channel, expires_in, send,
+                                              idempotency_key=idempotency_key))
+
+
+class VerifyOTPView(APIView):
+    def post(self, request):
+        otp_id, code = request.data.get('otp_id'), request.data.get('code')
+        if not isinstance(otp_id, str) or not isinstance(code, str):
+            return api_error('invalid_request')
+        if self.in_sandbox:
+            body = sandbox.verify(request.api_key.id, otp_id, code)
+        else:
+            try:
+                uuid.UUID(otp_id)
+            except ValueError:
+                return api_error('not_found')
+            body = verify_api_otp(request.api_key, otp_id, code)
+        if body['success']:
+            forget_otp(otp_id)
+        return api_response(body)
+
+
+class SandboxLogView(APIView):
+    def get(self, request):
+        if not self.in_sandbox:
+            return api_error('sandbox_only')
+        return JsonResponse({'success': True, 'sandbox': True, 'entries': sandbox.log(request.api_key.id)})
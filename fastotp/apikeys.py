@@ -0,0 +1,85 @@
+"""
+FastOTP API Key Authentication
+==============================
+API keys are never stored in plaintext. A key ``fotk_live_<token>`` is kept as:
+
+    lookup    first ``LOOKUP_LENGTH`` characters, indexed (not secret)
+    key_hash  HMAC-SHA256 of the full key under ``API_KEY_HASH_SECRET``
+
+Authenticating is one indexed lookup plus a constant-time digest compare.
+Results are cached in-process by digest — valid keys for
+``API_KEY_CACHE_TTL`` seconds, unknown/revoked ones for
+``API_KEY_NEGATIVE_CACHE_TTL`` — so repeated bad keys never reach the database.
+
+Changing ``API_KEY_HASH_SECRET`` invalidates every issued key.
+"""
+import hashlib
+import hmac
+import secrets
+from dataclasses import dataclass
+from django.conf import settings
+
+from .cache import TTLCache
+
+KEY_PREFIX = 'fotk_'
+LOOKUP_LENGTH = 22  # "fotk_live_" + 12 random characters (72 bits)
+
+API_KEY_CACHE_TTL = getattr(settings, 'API_KEY_CACHE_TTL', 60)
+API_KEY_NEGATIVE_CACHE_TTL = getattr(settings, 'API_KEY_NEGATIVE_CACHE_TTL', 300)
+
+_valid = TTLCache(maxsize=10_000, ttl=API_KEY_CACHE_TTL)
+_invalid = TTLCache(maxsize=50_000, ttl=API_KEY_NEGATIVE_CACHE_TTL)
+
+
+@dataclass(frozen=True)
+class AuthenticatedKey:
+    id: object
+    user_id: object
+    environment: str
+
+
+def _hash_secret() -> bytes:
+    return (getattr(settings, 'API_KEY_HASH_SECRET', '') or settings.SECRET_KEY).encode()
+
+
+def generate_key(environment: str) -> str:
+    return f"{KEY_PREFIX}{environment}_{secrets.token_urlsafe(32)}"
+
+
+def lookup_for(raw_key: str) -> str:
+    return raw_key[:LOOKUP_LENGTH]
+
+
+def hash_key(raw_key: str) -> str:
+    return hmac.new(_hash_secret(), raw_key.encode(), hashlib.sha256).hexdigest()
+
+
+def authenticate_api_key(raw_key: str):
+    """Return an ``AuthenticatedKey`` for an active key, else ``None``."""
+    if not raw_key or not raw_key.startswith(KEY_PREFIX) or len(raw_key) <= LOOKUP_LENGTH:
+        return None
+    digest = hash_key(raw_key)
+    cached = _valid.get(digest)
+    if cached is not None:
+        return cached
+    if digest in _invalid:
+        return None
+
+    from .models import APIKey
+    candidates = (APIKey.objects.filter(lookup=lookup_for(raw_key))
+                  .values_list('id', 'user_id', 'environment', 'status', 'key_hash'))
+    for key_id, user_id, environment, status, key_hash in candidates:
+        if hmac.compare_digest(key_hash, digest):
+            if status != 'active':
+                break
+            authenticated = AuthenticatedKey(id=key_id, user_id=user_id, environment=environment)
+            _valid.set(digest, authenticated)
+            return authenticated
+    _invalid.set(digest, True)
+    return None
+
+
+def forget_key(key_hash: str):
+    """Drop a key from this process's caches (revocation); other workers follow within the TTL."""
+    _valid.pop(key_hash)
+    _invalid.pop(key_hash)
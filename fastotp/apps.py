@@ -5,3 +5,6 @@ class FastotpConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'fastotp'
     verbose_name = 'FastOTP'
+
+    def ready(self):
+        from . import hot_partials, signals  # noqa: F401
@@ -0,0 +1,146 @@
+"""
+FastOTP Login Pipeline
+======================
+Password login that stays cheap under credential-stuffing traffic:
+
+1. Per-IP and per-account attempt limits are checked before any hashing.
+2. Emails with no account are remembered briefly and answered without a query
+   or a hash. The response is held for about as long as a real password check
+   takes (a sleep, not CPU), so timing does not reveal which emails exist.
+3. Only then does ``authenticate`` run the real hash, and the configured
+   hasher upgrades old hashes on success.
+
+Counters live in-process, so limits apply per worker.
+"""
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import ClassVar
+from django.conf import settings
+from django.contrib.auth import authenticate
+
+from .cache import TTLCache
+
+LOGIN_THROTTLE_WINDOW = getattr(settings, 'LOGIN_THROTTLE_WINDOW', 300)
+LOGIN_MAX_ATTEMPTS_PER_IP = getattr(settings, 'LOGIN_MAX_ATTEMPTS_PER_IP', 30)
+LOGIN_MAX_ATTEMPTS_PER_ACCOUNT = getattr(settings, 'LOGIN_MAX_ATTEMPTS_PER_ACCOUNT', 5)
+LOGIN_UNKNOWN_EMAIL_TTL = getattr(settings, 'LOGIN_UNKNOWN_EMAIL_TTL', 60)
+
+
+class AttemptLimiter:
+    """
+    Fixed-window attempt counter per key.
+
+    Usage:
+        limiter = AttemptLimiter(limit=5, window=300)
+        if limiter.blocked(key): ...
+        limiter.hit(key)
+    """
+
+    def __init__(self, limit: int, window: float, maxsize: int = 100_000):
+        self.limit = limit
+        self.window = window
+        self._windows = TTLCache(maxsize=maxsize, ttl=window)
+        self._lock = threading.Lock()
+
+    def hit(self, key) -> int:
+        now = time.monotonic()
+        with self._lock:
+            started, count = self._windows.get(key, (now, 0))
+            count += 1
+            self._windows.set(key, (started, count), ttl=max(started + self.window - now, 0.001))
+        return count
+
+    def blocked(self, key) -> bool:
+        entry = self._windows.get(key)
+        return entry is not None and entry[1] >= self.limit
+
+    def reset(self, key):
+        self._windows.pop(key)
+
+    def clear(self):
+        self._windows.clear()
+
+
+ip_limiter = AttemptLimiter(LOGIN_MAX_ATTEMPTS_PER_IP, LOGIN_THROTTLE_WINDOW)
+account_limiter = AttemptLimiter(LOGIN_MAX_ATTEMPTS_PER_ACCOUNT, LOGIN_THROTTLE_WINDOW)
+
+
+# ─────────────────────────────────────────────
+#  Unknown Emails
+# ─────────────────────────────────────────────
+
+_unknown_emails = TTLCache(maxsize=100_000, ttl=LOGIN_UNKNOWN_EMAIL_TTL)
+
+
+class _CheckDuration:
+    """Moving average of real password-check time, used to pace unknown-email replies."""
+
+    def __init__(self):
+        self.seconds = None
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self.seconds = seconds if self.seconds is None else 0.8 * self.seconds + 0.2 * seconds
+
+    def estimate(self) -> float:
+        if self.seconds is None:
+            # Calibrate once per process with a single real hash.
+            from django.contrib.auth.hashers import make_password
+            start = time.perf_counter()
+            make_password('calibration')
+            self.observe(time.perf_counter() - start)
+        return self.seconds
+
+
+check_duration = _CheckDuration()
+
+
+def forget_unknown_email(email: str):
+    """Call when an account is created so this process stops treating the email as unknown."""
+    _unknown_emails.pop(email)
+
+
+def _pace_unknown(started: float):
+    remaining = check_duration.estimate() * random.uniform(0.9, 1.1) - (time.perf_counter() - started)
+    if remaining > 0:
+        time.sleep(remaining)
+
+
+# ─────────────────────────────────────────────
+#  Pipeline
+# ─────────────────────────────────────────────
+
+@dataclass(frozen=True)
+class LoginResult:
+    OK: ClassVar[str] = 'ok'
+    INVALID: ClassVar[str] = 'invalid'
+    THROTTLED: ClassVar[str] = 'throttled'
+
+    outcome: str
+    user: object = None
+
+
+def attempt_login(request, email: str, password: str, ip: str) -> LoginResult:
+    started = time.perf_counter()
+    if ip_limiter.blocked(ip) or account_limiter.blocked(email):
+        return LoginResult(LoginResult.THROTTLED)
+    ip_limiter.hit(ip)
+
+    from .models import User
+    if email in _unknown_emails or not User.objects.filter(username=email).exists():
+        _unknown_emails.set(email, True)
+        account_limiter.hit(email)  # same lockout as real accounts, or 429s would reveal them
+        _pace_unknown(started)
+        return LoginResult(LoginResult.INVALID)
+
+    check_started = time.perf_counter()
+    user = authenticate(request, username=email, password=password)
+    check_duration.observe(time.perf_counter() - check_started)
+    if user is None:
+        account_limiter.hit(email)
+        return LoginResult(LoginResult.INVALID)
+    account_limiter.reset(email)
+    return LoginResult(LoginResult.OK, user)
@@ -0,0 +1,1169 @@
+"""
+FastOTP Benchmarks
+==================
+Scenario registry and measurement helpers for ``python manage.py benchmark``.
+
+Every scenario runs against a throwaway test database (never the configured
+one) and returns plain dicts, so results can be written as JSON and diffed
+between releases.
+"""
+import gc
+import statistics
+import time
+from contextlib import contextmanager
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+
+SCENARIOS = {}
+
+_PLAIN_STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+def scenario(name: str):
+    """Register ``func(size, iterations) -> dict`` as a named benchmark scenario."""
+    def register(func):
+        SCENARIOS[name] = func
+        return func
+    return register
+
+
+@contextmanager
+def isolated_database():
+    """Create a disposable test database for the duration of a run."""
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        with override_settings(STORAGES=_PLAIN_STORAGES, ALLOWED_HOSTS=['*']):
+            yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def percentile(samples: list, pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not samples:
+        return 0.0
+    rank = max(0, min(len(samples) - 1, int(round(pct / 100 * len(samples) + 0.5)) - 1))
+    return samples[rank]
+
+
+def summarize(samples_ms: list) -> dict:
+    samples = sorted(samples_ms)
+    total_s = sum(samples) / 1000
+    return {
+        'iterations': len(samples),
+        'throughput_per_s': round(len(samples) / total_s, 1) if total_s else None,
+        'mean_ms': round(statistics.fmean(samples), 4) if samples else 0.0,
+        'p50_ms': round(percentile(samples, 50), 4),
+        'p95_ms': round(percentile(samples, 95), 4),
+        'p99_ms': round(percentile(samples, 99), 4),
+        'max_ms': round(samples[-1], 4) if samples else 0.0,
+    }
+
+
+def count_queries(func, *args, **kwargs) -> int:
+    with CaptureQueriesContext(connection) as ctx:
+        func(*args, **kwargs)
+    return len(ctx.captured_queries)
+
+
+def measure(func, iterations: int = 100, warmup: int = 5, setup=None) -> dict:
+    """
+    Time ``func`` ``iterations`` times and report latency percentiles plus the
+    query count of a single call. ``setup`` runs before each call, untimed.
+    """
+    for _ in range(warmup):
+        if setup:
+            setup()
+        func()
+    if setup:
+        setup()
+    queries = count_queries(func)
+    samples = []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(iterations):
+            if setup:
+                setup()
+            start = time.perf_counter()
+            func()
+            samples.append((time.perf_counter() - start) * 1000)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return {**summarize(samples), 'queries': queries}
+
+
+def bulk_insert(model, rows, batch_size: int = 5000):
+    """``bulk_create`` an iterable of unsaved instances in bounded-memory chunks."""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            model.objects.bulk_create(batch, batch_size=batch_size)
+            batch.clear()
+    if batch:
+        model.objects.bulk_create(batch, batch_size=batch_size)
+
+
+def make_user(email: str = 'bench@fastotp.test', **extra):
+    from .models import User
+    return User.objects.create_user(username=email, email=email, password='bench-pass-123',
+                                    whatsapp_number='+2348000000000', **extra)
+
+
+# ─────────────────────────────────────────────
+#  Scenarios
+# ─────────────────────────────────────────────
+
+@scenario('billing')
+def bench_billing(size: int = 10_000, iterations: int = 50) -> dict:
+    """Billing page and balance poll with ``size`` transactions in the user's history."""
+    from decimal import Decimal
+    from django.test import Client
+    from .billing import invalidate_billing
+    from .models import CreditBalance, Transaction
+
+    user = make_user()
+    CreditBalance.objects.create(user=user, balance=Decimal('1000'))
+    bulk_insert(Transaction, (
+        Transaction(user=user, transaction_type='consumption', credits=Decimal('0.0045'),
+                    status='completed', description='OTP send')
+        for _ in range(size)
+    ))
+    client = Client()
+    client.force_login(user)
+
+    def cold():
+        invalidate_billing(user.pk)
+
+    return {
+        'transactions': size,
+        'billing_page_cold': measure(lambda: client.get('/billing/'), iterations, setup=cold),
+        'billing_page_warm': measure(lambda: client.get('/billing/'), iterations),
+        'balance_poll_warm': measure(lambda: client.get('/billing/balance/poll/'), iterations),
+    }
+
+
+@scenario('page_weight')
+def bench_page_weight(size: int = 0, iterations: int = 0) -> dict:
+    """Bytes shipped per page: HTML, self-hosted assets (raw/gzip) and remaining external requests."""
+    import gzip
+    import re
+    from django.conf import settings
+    from django.contrib.staticfiles import finders
+    from django.test import Client
+
+    tag_re = re.compile(r'<(?:script|link)\b[^>]*>')
+    ref_re = re.compile(r'(?:src|href)="([^"]+)"')
+    anonymous, authed = Client(), Client()
+    authed.force_login(make_user())
+    pages = {
+        'home': (anonymous, '/'),
+        'coverage': (anonymous, '/coverage/'),
+        'login': (anonymous, '/login/'),
+        'billing': (authed, '/billing/'),
+    }
+
+    results = {}
+    for name, (client, url) in pages.items():
+        html = client.get(url).content
+        local_raw = local_gzip = 0
+        external = []
+        for tag in tag_re.findall(html.decode()):
+            ref = ref_re.search(tag)
+            if not ref or 'preconnect' in tag:
+                continue
+            ref = ref.group(1)
+            if ref.startswith(settings.STATIC_URL):
+                path = finders.find(ref[len(settings.STATIC_URL):])
+                if path:
+                    with open(path, 'rb') as fh:
+                        data = fh.read()
+                    local_raw += len(data)
+                    local_gzip += len(gzip.compress(data))
+            elif ref.startswith('http'):
+                external.append(ref)
+        results[name] = {
+            'html_bytes': len(html),
+            'html_gzip_bytes': len(gzip.compress(html)),
+            'local_asset_bytes': local_raw,
+            'local_asset_gzip_bytes': local_gzip,
+            'external_requests': len(external),
+            'external': external,
+        }
+    return results
+
+
+@scenario('signup_otp')
+def bench_signup_otp(size: int = 0, iterations: int = 20) -> dict:
+    """Signup step 1 (account creation), SendSignupOTPView and VerifySignupOTPView, one fresh signup per call."""
+    from datetime import timedelta
+    from itertools import count
+    from unittest import mock
+    from django.test import Client
+    from django.utils import timezone
+    from . import services
+    from .models import User
+    from .services import hash_otp
+
+    seq = count()
+    state = {}
+
+    def new_client():
+        # Each signup from its own address and number block, so fraud limits never block a timed send.
+        n = next(seq)
+        state['client'], state['n'] = Client(REMOTE_ADDR=f'10.{n >> 16 & 255}.{n >> 8 & 255}.{n & 255}'), n
+
+    def step1():
+        n = state['n']
+        state['client'].post('/signup/', {
+            'email': f'signup{n}@fastotp.test', 'password': 'bench-pass-123',
+            'password2': 'bench-pass-123', 'first_name': 'Bench', 'last_name': 'User',
+            'company_name': 'FastOTP', 'whatsapp_number': f'+23480{n * 7919 % 10 ** 5:05d}{n % 1000:03d}',
+        })
+
+    def new_signup():
+        new_client()
+        step1()
+
+    def send():
+        state['client'].post('/signup/send-otp/')
+
+    def sent_signup():
+        new_signup()
+        send()
+        user = User.objects.get(email=f"signup{state['n']}@fastotp.test")
+        user.verification_otp = hash_otp('123456', user.whatsapp_number)
+        user.otp_expires_at = timezone.now() + timedelta(minutes=10)
+        user.save(update_fields=['verification_otp', 'otp_expires_at'])
+
+    def verify():
+        state['client'].post('/signup/verify-otp/', {f'd{i}': str(i) for i in range(1, 7)})
+
+    # No delivery: the stub's worker threads would contend for the bench database.
+    with mock.patch.object(services, 'dispatch_otp_delivery', lambda *a, **k: None):
+        return {
+            'signup_step1': measure(step1, iterations, warmup=2, setup=new_client),
+            'send_signup_otp': measure(send, iterations, warmup=2, setup=new_signup),
+            'verify_signup_otp': measure(verify, iterations, warmup=2, setup=sent_signup),
+        }
+
+
+@scenario('dashboard')
+def bench_dashboard(size: int = None, iterations: int = 20) -> dict:
+    """DashboardView and OTP log pages with ``size`` OTPLog rows (default: 1k and 100k; try 1000000)."""
+    import random
+    from django.test import Client
+    from .models import OTPLog
+
+    user = make_user()
+    client = Client()
+    client.force_login(user)
+    rng = random.Random(42)
+    statuses = ['delivered', 'delivered', 'delivered', 'verified', 'failed', 'pending']
+
+    results, loaded = {}, 0
+    for target in ([size] if size else [1_000, 100_000]):
+        bulk_insert(OTPLog, (
+            OTPLog(user=user, identifier=f'+2348{rng.randint(10**7, 10**8 - 1)}',
+                   channel=rng.choice(['whatsapp', 'sms', 'email']), status=rng.choice(statuses),
+                   latency_ms=rng.randint(150, 1200))
+            for _ in range(target - loaded)
+        ))
+        loaded = target
+        results[f'{target}_rows'] = {
+            'dashboard': measure(lambda: client.get('/dashboard/'), iterations),
+            'otp_logs': measure(lambda: client.get('/dashboard/logs/'), iterations),
+        }
+    return results
+
+
+@scenario('polling')
+def bench_polling(size: int = 50, iterations: int = 20) -> dict:
+    """HTMX polling endpoints hit concurrently by ``size`` logged-in sessions."""
+    from concurrent.futures import ThreadPoolExecutor
+    from django.db import connections
+    from django.test import Client
+    from .models import CreditBalance, OTPLog
+
+    clients = []
+    for n in range(size):
+        user = make_user(f'poll{n}@fastotp.test')
+        CreditBalance.objects.create(user=user, balance=100)
+        OTPLog.objects.bulk_create(OTPLog(user=user, identifier='+234800000000', status='delivered')
+                                   for _ in range(20))
+        client = Client()
+        client.force_login(user)
+        clients.append(client)
+
+    def session(client, url):
+        samples = []
+        try:
+            for _ in range(iterations):
+                start = time.perf_counter()
+                client.get(url)
+                samples.append((time.perf_counter() - start) * 1000)
+        finally:
+            connections.close_all()
+        return samples
+
+    results = {'sessions': size}
+    for name, url in (('otp_logs_poll', '/dashboard/logs/poll/'),
+                      ('credit_balance_poll', '/billing/balance/poll/')):
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=size) as pool:
+            samples = [s for batch in pool.map(lambda c: session(c, url), clients) for s in batch]
+        wall = time.perf_counter() - start
+        results[name] = {**summarize(samples), 'throughput_per_s': round(len(samples) / wall, 1),
+                         'queries': count_queries(clients[0].get, url)}
+    return results
+
+
+@scenario('otp_primitives')
+def bench_otp_primitives(size: int = 0, iterations: int = 2000) -> dict:
+    """``hash_otp`` and the credit/debit balance functions in isolation."""
+    from decimal import Decimal
+    from .models import CreditBalance, OTPLog, Transaction
+    from .services import credit_user_account, debit_user_account, hash_otp
+
+    user = make_user()
+    CreditBalance.objects.create(user=user, balance=Decimal(iterations * 10))
+    log = OTPLog.objects.create(user=user, identifier='+2348000000000')
+    state = {}
+
+    def pending_topup():
+        state['txn'] = Transaction.objects.create(user=user, transaction_type='topup',
+                                                  amount_usd=Decimal('5.00'), credits=Decimal('500'))
+
+    return {
+        'hash_otp': measure(lambda: hash_otp('123456', '+2348000000000'), iterations * 10),
+        'debit_user_account': measure(lambda: debit_user_account(user, Decimal('0.0045'), log), iterations),
+        'credit_user_account': measure(lambda: credit_user_account(user, Decimal('500'), state['txn']),
+                                       iterations, setup=pending_topup),
+    }
+
+
+@scenario('api_key_usage')
+def bench_api_key_usage(size: int = 50, iterations: int = 5000) -> dict:
+    """Per-call ``APIKey`` row update versus the buffered usage counter, over ``size`` keys."""
+    from django.db.models import F
+    from django.utils import timezone
+    from .models import APIKey
+    from .usage import UsageBuffer
+
+    user = make_user()
+    keys = [APIKey.objects.create(user=user, name=f'Key {n}').pk for n in range(size)]
+    seq = iter(range(10**9))
+    buffer = UsageBuffer(interval=3600, max_events=10**9)  # flushed explicitly below
+
+    def row_update():
+        APIKey.objects.filter(pk=keys[next(seq) % size]).update(
+            total_requests=F('total_requests') + 1, last_used_at=timezone.now())
+
+    def buffered():
+        buffer.record(keys[next(seq) % size])
+
+    def fill():
+        for n in range(iterations):
+            buffer.record(keys[n % size])
+
+    return {
+        'keys': size,
+        'row_update_per_call': measure(row_update, iterations),
+        'buffered_record': measure(buffered, iterations),
+        'flush': measure(buffer.flush, 20, warmup=1, setup=fill),
+    }
+
+
+@scenario('login_attack')
+def bench_login_attack(size: int = 20, iterations: int = 300) -> dict:
+    """
+    CPU cost of password login under credential-stuffing traffic: ``iterations``
+    attempts (70% unknown emails and 25% wrong passwords from 5 IPs, 5% real
+    logins) against ``size`` accounts, plain ``authenticate`` vs the login pipeline.
+    """
+    import random
+    from django.conf import settings
+    from django.contrib.auth import authenticate
+    from django.contrib.auth.hashers import get_hasher
+    from . import auth
+
+    rng = random.Random(7)
+    emails = [make_user(f'victim{n}@fastotp.test').email for n in range(size)]
+    traffic = []
+    for n in range(iterations):
+        roll = rng.random()
+        if roll < 0.70:
+            traffic.append((f'leaked{n}@example.com', 'hunter2', f'203.0.113.{n % 5}', False))
+        elif roll < 0.95:
+            traffic.append((rng.choice(emails), 'password1', f'203.0.113.{n % 5}', False))
+        else:
+            traffic.append((rng.choice(emails), 'bench-pass-123', f'198.51.100.{n % 250}', True))
+
+    def run(attempt) -> dict:
+        auth.ip_limiter.clear()
+        auth.account_limiter.clear()
+        auth._unknown_emails.clear()
+        outcomes, legit_ok = {}, 0
+        cpu, wall = time.process_time(), time.perf_counter()
+        for email, password, ip, legit in traffic:
+            outcome = attempt(email, password, ip)
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+            legit_ok += legit and outcome == 'ok'
+        cpu, wall = time.process_time() - cpu, time.perf_counter() - wall
+        return {
+            'cpu_ms_per_attempt': round(cpu * 1000 / len(traffic), 3),
+            'cpu_s_total': round(cpu, 3),
+            'wall_s_total': round(wall, 3),
+            'outcomes': outcomes,
+            'legitimate_logins_ok': f'{legit_ok}/{sum(t[3] for t in traffic)}',
+        }
+
+    def plain(email, password, ip):
+        return 'ok' if authenticate(None, username=email, password=password) else 'invalid'
+
+    def pipeline(email, password, ip):
+        return auth.attempt_login(None, email, password, ip).outcome
+
+    hasher = get_hasher()
+    start = time.process_time()
+    for _ in range(5):
+        hasher.encode('bench-pass-123', hasher.salt())
+    return {
+        'hasher': settings.PASSWORD_HASHER,
+        'hash_cpu_ms': round((time.process_time() - start) * 200, 2),
+        'plain_authenticate': run(plain),
+        'login_pipeline': run(pipeline),
+    }
+
+
+@scenario('sweep')
+def bench_sweep(size: int = 20_000, iterations: int = 0) -> dict:
+    """Rows/s of each maintenance sweep task over ``size`` stale rows per task."""
+    from datetime import timedelta
+    from django.contrib.sessions.models import Session
+    from django.utils import timezone
+    from .datagen import explicit_timestamps
+    from .maintenance import run_sweep
+    from .models import LoginSession, OTPLog, User
+
+    old = timezone.now() - timedelta(days=60)
+    owner = make_user()
+    bulk_insert(OTPLog, (OTPLog(user=owner, identifier='+2348000000000', status='sent', expires_at=old)
+                         for _ in range(size)))
+    bulk_insert(Session, (Session(session_key=f'bench{n:035d}', session_data='', expire_date=old)
+                          for n in range(size)))
+    bulk_insert(LoginSession, (LoginSession(user=owner, session_key='x') for _ in range(size)))
+    LoginSession.objects.update(last_active=old)  # auto_now ignores the value on insert
+    with explicit_timestamps(User):
+        bulk_insert(User, (User(username=f'abandoned{n}@fastotp.test', email=f'abandoned{n}@fastotp.test',
+                                is_active=False, verification_otp='x' * 6, otp_expires_at=old, created_at=old)
+                           for n in range(size // 10)))
+
+    return {r.task: {'rows': r.rows, 'seconds': round(r.seconds, 3), 'rows_per_s': round(r.rows_per_second)}
+            for r in run_sweep(pause=0)}
+
+
+@scenario('latency')
+def bench_latency(size: int = 100_000, iterations: int = 20) -> dict:
+    """p50/p95/p99 by country over 30 days: merged daily/hourly sketches vs sorting raw OTPLog latencies."""
+    import os
+    import random
+    from datetime import timedelta
+    from django.core.management import call_command
+    from django.utils import timezone
+    from .datagen import explicit_timestamps, generate_otp_logs
+    from .latency import _query_cache, latency_percentiles
+    from .models import OTPLog
+
+    user = make_user()
+    with explicit_timestamps(OTPLog):
+        bulk_insert(OTPLog, generate_otp_logs(random.Random(3), [user.pk], size))
+    call_command('build_latency_sketches', stdout=open(os.devnull, 'w'))
+    month_ago = timezone.now() - timedelta(days=30)
+
+    def raw():
+        by_country = {}
+        for country, latency in (OTPLog.objects.filter(user=user, latency_ms__isnull=False)
+                                 .values_list('country_code', 'latency_ms').iterator()):
+            by_country.setdefault(country, []).append(latency)
+        return {c: [percentile(sorted(v), p) for p in (50, 95, 99)] for c, v in by_country.items()}
+
+    return {
+        'otp_logs': size,
+        'raw_sort': measure(raw, iterations, warmup=1),
+        'sketch_merge': measure(lambda: latency_percentiles(str(user.pk), 'country', start=month_ago),
+                                iterations, warmup=1, setup=_query_cache.clear),
+    }
+
+
+@scenario('fraud')
+def bench_fraud(size: int = 50_000, iterations: int = 0) -> dict:
+    """
+    Replays ``size`` normal sends over two simulated hours with three pumping
+    attacks mixed in (sequential numbers from rotating IPs, an unlisted premium
+    prefix, one-IP burst) through ``FraudDetector``. Reports per-send scoring
+    cost, what was blocked/flagged per trace, and sketch overcount vs exact counts.
+    """
+    import random
+    import tracemalloc
+    from collections import defaultdict, deque
+    from .datagen import COUNTRY_WEIGHTS
+    from .fraud import FRAUD_LIMITS, FRAUD_WINDOW, FraudDetector
+    from .services import COVERAGE_DATA
+
+    rng = random.Random(11)
+    duration = 7200
+    dials = [c['dial'] for c in COVERAGE_DATA]
+    weights = [COUNTRY_WEIGHTS.get(c['code'], 1) for c in COVERAGE_DATA]
+    keys = [f'key{n}' for n in range(200)]
+    key_weights = [1 / (n + 1) for n in range(len(keys))]
+
+    trace = []
+    for _ in range(size):
+        channel = 'email' if rng.random() < 0.08 else 'sms'
+        identifier = (f'user{rng.getrandbits(32)}@example.com' if channel == 'email'
+                      else f'{rng.choices(dials, weights)[0]}{rng.randrange(10**8, 10**9)}')
+        trace.append((rng.uniform(0, duration), 'normal', identifier, channel,
+                      rng.choices(keys, key_weights)[0], f'10.{rng.randrange(256)}.{rng.randrange(256)}.1'))
+    base = 2348031000000
+    for n in range(450):  # one send every 2 s to consecutive numbers, new IP each time
+        trace.append((1800 + 2 * n, 'sequential_numbers', f'+{base + n}', 'sms', keys[3],
+                      f'172.16.{n // 256}.{n % 256}'))
+    for n in range(600):  # premium-rate prefix we do not cover, random numbers
+        trace.append((3600 + n, 'unlisted_prefix', f'+88216{rng.randrange(10**6, 10**7)}', 'sms', keys[40],
+                      f'192.0.2.{n % 200}'))
+    for n in range(300):  # signup sends (no API key) from one IP, random numbers in covered countries
+        trace.append((5400 + n, 'ip_burst', f'{rng.choices(dials, weights)[0]}{rng.randrange(10**8, 10**9)}',
+                      'sms', None, '198.51.100.9'))
+    trace.sort()
+
+    tracemalloc.start()
+    detector = FraudDetector()
+    sketch_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    exact = {dimension: defaultdict(deque) for dimension in FRAUD_LIMITS}
+    overcount = {dimension: 0 for dimension in FRAUD_LIMITS}
+    results = defaultdict(lambda: {'sends': 0, 'blocked': 0, 'flagged': 0, 'first_block_at_send': None})
+    samples_us = []
+    for at, label, identifier, channel, key, ip in trace:
+        start = time.perf_counter_ns()
+        risk = detector.assess(identifier, channel, api_key_id=key, ip=ip, now=at)
+        samples_us.append((time.perf_counter_ns() - start) / 1000)
+
+        entry = results[label]
+        entry['sends'] += 1
+        entry['blocked'] += risk.blocked
+        entry['flagged'] += risk.action == risk.FLAG
+        if risk.blocked and entry['first_block_at_send'] is None:
+            entry['first_block_at_send'] = entry['sends']
+
+        for dimension, sketch_key in detector._keys(identifier, channel, key, ip)[0]:
+            window = exact[dimension][sketch_key]
+            window.append(at)
+            while window[0] <= at - FRAUD_WINDOW:
+                window.popleft()
+            estimate = detector._counters[dimension].estimate(sketch_key, at)
+            overcount[dimension] = max(overcount[dimension], estimate - len(window))
+
+    samples_us.sort()
+    return {
+        'sends': len(trace),
+        'assess_us': {f'p{p}': round(percentile(samples_us, p), 2) for p in (50, 95, 99)},
+        'assess_per_s': round(len(samples_us) / (sum(samples_us) / 1e6)),
+        'sketch_memory_kb': round(sketch_bytes / 1024),
+        # The sliding window drops a whole slot at a time, so this also includes
+        # events up to one slot older than an exact window would keep.
+        'max_overcount_vs_exact': overcount,
+        'traces': dict(results),
+    }
+
+
+@scenario('webhooks')
+def bench_webhooks(size: int = 2000, iterations: int = 200) -> dict:
+    """
+    Outbox cost on the status-change path, then ``size`` status changes for a
+    user with two local receivers (one answering 503 30% of the time) drained
+    with batching and with one event per request.
+    """
+    from unittest import mock
+    from django.utils import timezone
+    from . import webhooks
+    from .models import OTPLog, WebhookEndpoint, WebhookEvent
+    from .services import change_otp_status
+
+    quiet, with_hooks = make_user('quiet@fastotp.test'), make_user('hooks@fastotp.test')
+
+    def make_logs(user, n):
+        bulk_insert(OTPLog, (OTPLog(user=user, identifier=f'+23480{i:08d}', status='pending',
+                                    expires_at=timezone.now()) for i in range(n)))
+        return list(OTPLog.objects.filter(user=user, status='pending').values_list('pk', flat=True))
+
+    def status_change(pks):
+        it = iter(pks)
+        return lambda: change_otp_status(OTPLog.objects.filter(pk=next(it), status='pending'), 'sent')
+
+    results = {}
+    with webhooks.LocalReceiver() as healthy, webhooks.LocalReceiver(fail_rate=0.3) as flaky, \
+            mock.patch.object(webhooks, 'schedule_dispatch', lambda: None), \
+            mock.patch.object(webhooks, 'WEBHOOK_ALLOW_PRIVATE', True):
+        for receiver in (healthy, flaky):
+            endpoint = WebhookEndpoint.objects.create(user=with_hooks, url=receiver.url)
+            receiver.secret = endpoint.secret
+        webhooks.forget_endpoints(with_hooks.pk)
+
+        results['status_change_no_endpoints'] = measure(status_change(make_logs(quiet, iterations + 10)),
+                                                        iterations)
+        results['status_change_two_endpoints'] = measure(status_change(make_logs(with_hooks, iterations + 10)),
+                                                         iterations)
+
+        pks = make_logs(with_hooks, size)
+        for i in range(0, len(pks), 100):
+            change_otp_status(OTPLog.objects.filter(pk__in=pks[i:i + 100]), 'sent')
+
+        for label, batch_size in (('batched', webhooks.WEBHOOK_BATCH_SIZE), ('one_per_request', 1)):
+            WebhookEvent.objects.update(status='pending', attempts=0, next_attempt_at=timezone.now())
+            healthy.events.clear()
+            dispatcher = webhooks.WebhookDispatcher(batch_size=batch_size)
+            due = WebhookEvent.objects.count()
+            start = time.perf_counter()
+            result = dispatcher.drain()
+            seconds = time.perf_counter() - start
+            dispatcher.close()
+            results[label] = {
+                'events': due, 'seconds': round(seconds, 3), 'events_per_s': round(due / seconds),
+                'requests': result.requests, 'delivered': result.delivered, 'retrying': result.retrying,
+                'healthy_receiver_events': len(healthy.events),
+            }
+        results['signature_rejections'] = healthy.rejected + flaky.rejected
+    return results
+
+
+@scenario('totp')
+def bench_totp(size: int = 0, iterations: int = 20_000) -> dict:
+    """Verifications per second: stored hashed OTP (row read + hash) vs stateless TOTP (pure computation)."""
+    from datetime import timedelta
+    from itertools import count
+    from django.utils import timezone
+    from . import totp
+    from .models import User
+    from .services import TOTP_SIGNUP_STEP, hash_otp
+
+    user = make_user(verification_otp=hash_otp('123456', '+2348000000000'),
+                     otp_expires_at=timezone.now() + timedelta(hours=1))
+
+    def stored_verify():
+        row = User.objects.only('whatsapp_number', 'verification_otp', 'otp_expires_at').get(pk=user.pk)
+        return timezone.now() <= row.otp_expires_at and hash_otp('123456', row.whatsapp_number) == row.verification_otp
+
+    numbers = count()
+    codes = {}
+
+    def next_identifier():
+        identifier = f'+23480{next(numbers):08d}'
+        codes[identifier] = totp.issue_code(identifier, 'signup', step=TOTP_SIGNUP_STEP)
+        return identifier
+
+    pending = []
+
+    def setup():
+        pending.append(next_identifier())
+
+    totp.replay_guard.clear()
+    totp.attempt_limiter.clear()
+    results = {
+        'stored_verify': measure(stored_verify, iterations),
+        'totp_issue': measure(lambda: totp.issue_code('+2348000000000', 'signup', step=TOTP_SIGNUP_STEP),
+                              iterations),
+        'totp_verify_ok': measure(lambda: totp.check_code(pending[-1], codes[pending[-1]], 'signup',
+                                                          step=TOTP_SIGNUP_STEP), iterations, setup=setup),
+        'totp_verify_wrong': measure(lambda: totp.check_code(pending[-1], '000000', 'signup',
+                                                             step=TOTP_SIGNUP_STEP), iterations, setup=setup),
+        'totp_replay_rejected': measure(lambda: totp.check_code(pending[0], codes[pending[0]], 'signup',
+                                                                step=TOTP_SIGNUP_STEP), iterations),
+    }
+    return {name: {'calls_per_s': r['throughput_per_s'], 'p50_ms': r['p50_ms'], 'p99_ms': r['p99_ms'],
+                   'queries': r['queries']}
+            for name, r in results.items()}
+
+
+@scenario('sandbox')
+def bench_sandbox(size: int = 0, iterations: int = 20_000) -> dict:
+    """
+    Test-key traffic: the sandbox engine alone, then ``/api/v1/send`` and
+    ``/api/v1/verify`` end to end for a test key versus a live key.
+    """
+    import json
+    from unittest import mock
+    from django.test import Client
+    from . import services
+    from .fraud import RiskAssessment
+    from .models import APIKey, CreditBalance
+    from .sandbox import SandboxEngine
+
+    engine = SandboxEngine()
+    sent = []
+
+    def engine_send():
+        sent.append(engine.send('bench', '+2348031234567', 'sms')['otp_id'])
+
+    verify_ids = iter(sent)
+
+    def engine_verify():
+        engine.verify('bench', next(verify_ids), '123456')
+
+    results = {'engine_send': measure(engine_send, iterations),
+               'engine_verify': measure(engine_verify, iterations, warmup=0)}
+
+    user = make_user()
+    CreditBalance.objects.create(user=user, balance=10 ** 6)
+    client = Client()
+    http_iterations = max(iterations // 20, 50)
+    numbers = iter(range(10 ** 9))
+    for env in ('test', 'live'):
+        key = APIKey.objects.create(user=user, environment=env)
+        auth = {'HTTP_AUTHORIZATION': f'Bearer {key.raw_key}'}
+        ids = []
+
+        def send():
+            body = json.dumps({'identifier': f'+23480{next(numbers) % 10 ** 8:08d}', 'channel': 'sms'})
+            response = client.post('/api/v1/send', body, content_type='application/json', **auth)
+            ids.append(response.json()['otp_id'])
+
+        pending = iter(ids)
+
+        def verify():
+            client.post('/api/v1/verify', json.dumps({'otp_id': next(pending), 'code': '123456'}),
+                        content_type='application/json', **auth)
+
+        # Live sends: fraud limits off, a known code and no delivery, so only our own path is timed.
+        with mock.patch.object(services, 'assess_send', lambda *a, **k: RiskAssessment(RiskAssessment.ALLOW)), \
+                mock.patch.object(services, 'new_otp_code', lambda length=6: '123456'), \
+                mock.patch.object(services, 'dispatch_otp_delivery', lambda *a, **k: None):
+            results[f'{env}_api_send'] = measure(send, http_iterations)
+        results[f'{env}_api_verify'] = measure(verify, http_iterations, warmup=0)
+    return {name: {'calls_per_s': r['throughput_per_s'], 'p50_ms': r['p50_ms'], 'p99_ms': r['p99_ms'],
+                   'queries': r['queries']}
+            for name, r in results.items()}
+
+
+@scenario('resend')
+def bench_resend(size: int = 50, iterations: int = 500) -> dict:
+    """
+    A resend storm on a live key: ``size`` users each hitting send
+    ``iterations // size`` times in a row. Fresh sends vs answers from the
+    resend cooldown, and the rows/debits the storm costs.
+    """
+    import json
+    from unittest import mock
+    from django.test import Client
+    from . import services
+    from .dedup import idempotency_guard, resend_guard
+    from .fraud import RiskAssessment
+    from .models import APIKey, CreditBalance, OTPLog
+
+    user = make_user()
+    CreditBalance.objects.create(user=user, balance=10 ** 6)
+    key = APIKey.objects.create(user=user, environment='live')
+    client = Client()
+    auth = {'HTTP_AUTHORIZATION': f'Bearer {key.raw_key}'}
+    resend_guard.clear()
+    idempotency_guard.clear()
+    numbers = iter(range(10 ** 9))
+    current = {}
+
+    def send(identifier, **headers):
+        return client.post('/api/v1/send', json.dumps({'identifier': identifier, 'channel': 'sms'}),
+                           content_type='application/json', **auth, **headers)
+
+    def fresh():
+        current['identifier'] = f'+23480{next(numbers):08d}'
+        send(current['identifier'])
+
+    mashes = max(iterations // size, 2)
+    with mock.patch.object(services, 'assess_send', lambda *a, **k: RiskAssessment(RiskAssessment.ALLOW)), \
+            mock.patch.object(services, 'dispatch_otp_delivery', lambda *a, **k: None):
+        results = {
+            'fresh_send': measure(fresh, size),
+            'deduplicated_send': measure(lambda: send(current['identifier']), iterations),
+            'idempotent_replay': measure(lambda: send(current['identifier'], HTTP_IDEMPOTENCY_KEY='bench'),
+                                         iterations),
+        }
+        rows_before = OTPLog.objects.count()
+        for _ in range(size):
+            identifier = f'+23481{next(numbers):08d}'
+            for _ in range(mashes):
+                send(identifier)
+    storm = {'send_calls': size * mashes, 'otp_rows': OTPLog.objects.count() - rows_before}
+    return {**{name: {'calls_per_s': r['throughput_per_s'], 'p50_ms': r['p50_ms'], 'queries': r['queries']}
+               for name, r in results.items()},
+            'storm': storm}
+
+
+@scenario('hot_partials')
+def bench_hot_partials(size: int = 20, iterations: int = 2000) -> dict:
+    """
+    Renders/s of each hot HTMX partial under Django templates vs Jinja2 (logs
+    partial with ``size`` rows), and Jinja2 compile time cold vs from its
+    bytecode cache.
+    """
+    try:
+        import jinja2  # noqa: F401
+    except ImportError:
+        return {'skipped': 'Jinja2 is not installed'}
+    import shutil
+    import tempfile
+    from django.conf import settings
+    from django.template.loader import render_to_string
+    from django.test import RequestFactory
+    from jinja2 import FileSystemBytecodeCache
+    from . import hot_partials, jinja
+
+    jinja_engine = {'BACKEND': 'fastotp.jinja.InstrumentedJinja2', 'NAME': hot_partials.JINJA2_ENGINE,
+                    'DIRS': [settings.BASE_DIR / 'jinja2'], 'APP_DIRS': False,
+                    'OPTIONS': {'environment': 'fastotp.jinja.environment'}}
+    templates = [engine for engine in settings.TEMPLATES if engine.get('NAME') != hot_partials.JINJA2_ENGINE]
+    request = RequestFactory().get('/')
+    samples = dict(reversed(hot_partials.parity_samples()))  # one context per partial: the fullest
+    logs = samples['fastotp/partials/otp_log_rows.html']['logs']
+    samples['fastotp/partials/otp_log_rows.html'] = {'logs': (logs * (size // len(logs) + 1))[:size]}
+
+    results = {}
+    with override_settings(TEMPLATES=templates + [jinja_engine]):
+        results['parity_mismatches'] = len(hot_partials.check_parity())
+        for template_name, context in samples.items():
+            label = template_name.rsplit('/', 1)[-1].removesuffix('.html')
+            for engine in ('django', hot_partials.JINJA2_ENGINE):
+                r = measure(lambda: render_to_string(template_name, context, request, using=engine), iterations)
+                results[f'{label}_{engine}'] = {'renders_per_s': r['throughput_per_s'], 'p50_ms': r['p50_ms']}
+
+        cache_dir = tempfile.mkdtemp(prefix='fastotp-jinja2-bench-')
+        try:
+            def compile_all(bytecode_cache):
+                env = jinja.environment(loader=jinja2.FileSystemLoader(settings.BASE_DIR / 'jinja2'),
+                                        bytecode_cache=bytecode_cache, autoescape=True)
+                start = time.perf_counter()
+                for template_name in hot_partials.HOT_PARTIALS:
+                    env.get_template(template_name)
+                return round((time.perf_counter() - start) * 1000, 3)
+
+            results['compile_ms'] = {'no_cache': compile_all(None),
+                                     'bytecode_cache_cold': compile_all(FileSystemBytecodeCache(cache_dir)),
+                                     'bytecode_cache_warm': compile_all(FileSystemBytecodeCache(cache_dir))}
+        finally:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+    return results
+
+
+@scenario('admin')
+def bench_admin(size: int = 100_000, iterations: int = 20) -> dict:
+    """
+    Queries and latency of each admin changelist (plain, filtered, each
+    date drill-down level) with ``size // 10`` and then ``size`` OTP logs and
+    transactions; the query counts must not grow with the table. Also estimated
+    vs exact counts, keyset vs DISTINCT date buckets, and the bulk actions.
+    """
+    from datetime import timedelta
+    from decimal import Decimal
+    from django.test import Client
+    from django.utils import timezone
+    from .admin import KeysetDateQuerySet, estimated_row_count
+    from .datagen import explicit_timestamps
+    from .models import APIKey, CreditBalance, OTPLog, Transaction
+
+    admin_user = make_user('admin@fastotp.test', is_staff=True, is_superuser=True)
+    owner = make_user()
+    CreditBalance.objects.create(user=owner)
+    key = APIKey.objects.create(user=owner, environment='live')
+    client = Client()
+    client.force_login(admin_user)
+    now = timezone.now()
+    span = timedelta(days=3 * 365)
+
+    def seed(rows):  # both passes cover the whole span, so each page shows the same date buckets
+        with explicit_timestamps(OTPLog, Transaction):
+            bulk_insert(OTPLog, (OTPLog(user=owner, api_key=key, identifier=f'+23480{n:08d}',
+                                        status='sent' if n % 3 else 'delivered', cost_credits=Decimal('0.0045'),
+                                        expires_at=now, created_at=now - span * n / size)
+                                 for n in rows))
+            bulk_insert(Transaction, (Transaction(user=owner, transaction_type='consumption', status='completed',
+                                                  credits=Decimal('0.0045'), created_at=now - span * n / size)
+                                      for n in rows))
+
+    year, month = timezone.localtime(now).year, timezone.localtime(now).month
+    pages = {
+        'otplog': '/admin/fastotp/otplog/',
+        'otplog_filtered': '/admin/fastotp/otplog/?status__exact=sent&channel__exact=whatsapp',
+        'otplog_year': f'/admin/fastotp/otplog/?created_at__year={year}',
+        'otplog_month': f'/admin/fastotp/otplog/?created_at__year={year}&created_at__month={month}',
+        'transaction': '/admin/fastotp/transaction/',
+        'apikey': '/admin/fastotp/apikey/',
+        'user': '/admin/fastotp/user/',
+    }
+
+    def page_queries() -> dict:
+        return {name: count_queries(client.get, url) for name, url in pages.items()}
+
+    seed(range(0, size, 10))
+    small = page_queries()
+    seed(n for n in range(size) if n % 10)
+    large = page_queries()
+    results = {'queries': {name: {'rows_10pct': small[name], 'rows_100pct': large[name]} for name in pages},
+               'bounded': all(large[name] <= small[name] for name in pages)}
+    results['pages'] = {name: {'p50_ms': r['p50_ms'], 'p95_ms': r['p95_ms']}
+                        for name, url in pages.items()
+                        for r in [measure(lambda: client.get(url), iterations, warmup=2)]}
+
+    logs = KeysetDateQuerySet(OTPLog)
+    results['count_ms'] = {
+        'exact': measure(lambda: OTPLog.objects.count(), iterations)['p50_ms'],
+        'estimated': measure(lambda: estimated_row_count(OTPLog), iterations)['p50_ms'],
+    }
+    results['month_buckets_ms'] = {
+        'distinct': measure(lambda: list(OTPLog.objects.datetimes('created_at', 'month')), iterations)['p50_ms'],
+        'keyset': measure(lambda: logs.datetimes('created_at', 'month'), iterations)['p50_ms'],
+    }
+
+    any_pk = OTPLog.objects.values_list('pk', flat=True).first()
+
+    def run_action(action: str) -> dict:
+        start = time.perf_counter()
+        with CaptureQueriesContext(connection) as ctx:
+            client.post('/admin/fastotp/otplog/', {'action': action, 'select_across': '1', 'index': '0',
+                                                    '_selected_action': [str(any_pk)]})
+        return {'seconds': round(time.perf_counter() - start, 3), 'queries': len(ctx.captured_queries)}
+
+    open_rows = OTPLog.objects.filter(status__in=OTPLog.OPEN_STATUSES).count()
+    results['actions'] = {
+        'expire_otps': {'rows': open_rows, **run_action('expire_otps')},
+        'refund_otps': {'rows': size, **run_action('refund_otps')},
+    }
+    results['actions']['refund_otps']['balance'] = str(CreditBalance.objects.get(user=owner).balance)
+    return results
+
+
+@scenario('enrichment')
+def bench_enrichment(size: int = 50_000, iterations: int = 20_000) -> dict:
+    """
+    Lookups/s against a synthetic ``size``-network GeoIP database, and user
+    agent parses/s, each uncached vs through the LRU (repeated agents and IPs,
+    as in real traffic); plus one login session's enrichment.
+    """
+    import os
+    import random
+    import tempfile
+    from unittest import mock
+    from . import enrichment
+    from .datagen import generate_geoip_networks, write_mmdb
+    from .geoip import GeoIPDatabase
+    from .models import LoginSession
+
+    user_agents = [
+        'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+        'Chrome/126.0.0.0 Safari/537.36',
+        'Mozilla/5.0 (Linux; Android 14; SM-S918B) AppleWebKit/537.36 (KHTML, like Gecko) '
+        'SamsungBrowser/25.0 Chrome/121.0.0.0 Mobile Safari/537.36',
+        'Mozilla/5.0 (iPhone; CPU iPhone OS 17_5 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) '
+        'Version/17.5 Mobile/15E148 Safari/604.1',
+        'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) '
+        'Version/17.4.1 Safari/605.1.15',
+        'Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:127.0) Gecko/20100101 Firefox/127.0',
+        'Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)',
+    ]
+
+    def rate(r: dict) -> dict:
+        return {'per_s': r['throughput_per_s'], 'p50_ms': r['p50_ms']}
+
+    rng = random.Random(42)
+    networks = generate_geoip_networks(rng, size)
+    addresses = [str(network.network_address + rng.randint(1, 254)) for network, _ in networks]
+    hot = rng.choices(addresses, k=1000)  # returning users: few distinct addresses
+    fd, path = tempfile.mkstemp(suffix='.mmdb')
+    os.close(fd)
+    try:
+        write_mmdb(path, networks)
+        start = time.perf_counter()
+        database = GeoIPDatabase(path)
+        open_ms = (time.perf_counter() - start) * 1000
+        ips, agents = iter(range(10 ** 9)), iter(range(10 ** 9))
+        with mock.patch.object(enrichment, 'GEOIP_DATABASE', path):
+            enrichment.clear_caches()
+            results = {
+                'database': {'networks': size, 'bytes': os.path.getsize(path), 'open_ms': round(open_ms, 3)},
+                'geoip_uncached': rate(measure(lambda: database.lookup(addresses[next(ips) % size]), iterations)),
+                'geoip_cached': rate(measure(lambda: enrichment.locate(hot[next(ips) % len(hot)]), iterations)),
+                'user_agent_uncached': rate(measure(
+                    lambda: enrichment._parse_user_agent(user_agents[next(agents) % len(user_agents)]), iterations)),
+                'user_agent_cached': rate(measure(
+                    lambda: enrichment.parse_user_agent(user_agents[next(agents) % len(user_agents)]), iterations)),
+            }
+            session = LoginSession.objects.create(user=make_user(), session_key='bench', ip_address=hot[0],
+                                                  user_agent=user_agents[1])
+            login = measure(
+                lambda: enrichment.enrich_login_session(session.pk, session.ip_address, session.user_agent),
+                min(iterations, 500))
+            session.refresh_from_db()
+            results['login_session'] = {**rate(login), 'queries': login['queries'],
+                                        'device_type': session.device_type, 'location': session.location}
+            enrichment.clear_caches()
+        database.close()
+    finally:
+        os.remove(path)
+    return results
+
+
+@contextmanager
+def shard_databases(count: int):
+    """
+    ``count`` migrated SQLite shards (``shard1``, ...) in a temporary directory,
+    on the hash ring with ``default`` for the duration of a run.
+    """
+    import os
+    import shutil
+    import tempfile
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.db import DEFAULT_DB_ALIAS, connections
+    from . import sharding
+
+    directory = tempfile.mkdtemp(prefix='fastotp-shards-')
+    aliases = [f'shard{n}' for n in range(1, count + 1)]
+    old_ring = sharding.ring
+    try:
+        for alias in aliases:
+            config = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': os.path.join(directory, f'{alias}.sqlite3'),
+                      'CONN_MAX_AGE': 60}  # fan-out threads keep their connections, as in production
+            settings.DATABASES[alias] = config
+            connections.settings[alias] = connections.configure_settings({DEFAULT_DB_ALIAS: {}, alias: config})[alias]
+            call_command('migrate', database=alias, verbosity=0)
+        sharding.ring = sharding.HashRing([DEFAULT_DB_ALIAS, *aliases])
+        sharding.refresh_placements()
+        yield aliases
+    finally:
+        sharding.ring = old_ring
+        sharding.refresh_placements()
+        for alias in aliases:
+            if alias in connections.settings:
+                connections[alias].close()
+                del connections[alias]  # this thread's wrapper, so a later run connects afresh
+                del connections.settings[alias]
+            settings.DATABASES.pop(alias, None)
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+@scenario('sharding')
+def bench_sharding(size: int = 100_000, iterations: int = 20) -> dict:
+    """
+    Tenant sharding over ``default`` + 3 SQLite shards: routing cost per query,
+    ring balance and the share of tenants a 5th shard re-homes (vs modulo
+    hashing), a per-shard report run by ``fan_out`` vs one shard after another
+    (plain SQLite, and with a simulated 5 ms round trip per query),
+    and moving a tenant holding ``size // 4`` rows.
+    """
+    import random
+    import uuid
+    from collections import Counter
+    from datetime import timedelta
+    from decimal import Decimal
+    from django.db import connections, router
+    from django.db.models import Count, Sum
+    from django.utils import timezone
+    from . import sharding
+    from .datagen import explicit_timestamps
+    from .models import CreditBalance, OTPLog, Transaction
+
+    def spread(owners: Counter, total: int) -> dict:
+        return {alias: round(owners[alias] / total, 4) for alias in sorted(owners)}
+
+    rng = random.Random(42)
+    tenants = [uuid.UUID(int=rng.getrandbits(128)) for _ in range(100_000)]
+    four = sharding.HashRing(['default', 'shard1', 'shard2', 'shard3'])
+    five = sharding.HashRing(['default', 'shard1', 'shard2', 'shard3', 'shard4'])
+    results = {
+        'ring': {
+            'tenants': len(tenants),
+            'share': spread(Counter(four.node(user_id) for user_id in tenants), len(tenants)),
+            'moved_by_5th_shard': round(sum(four.node(u) != five.node(u) for u in tenants) / len(tenants), 4),
+            'moved_by_5th_shard_modulo': round(sum(u.int % 4 != u.int % 5 for u in tenants) / len(tenants), 4),
+        },
+    }
+
+    with shard_databases(3) as aliases:
+        users = [make_user(f'tenant{n}@fastotp.test') for n in range(40)]
+        by_shard = Counter(sharding.shard_for(user.pk) for user in users)
+        now = timezone.now()
+        per_user = max(size // len(users), 1)
+        for user in users:
+            with sharding.tenant_atomic(user.pk):
+                CreditBalance.objects.create(user=user, balance=Decimal('100'))
+                bulk_insert(OTPLog, (OTPLog(user=user, identifier=f'+23480{n:08d}', expires_at=now,
+                                            status='sent' if n % 3 else 'delivered', cost_credits=Decimal('0.0045'))
+                                     for n in range(per_user)))
+
+        log = OTPLog(user=users[0])
+        ids = iter(tenants * 10)
+        results['routing_us'] = {
+            'shard_for': round(measure(lambda: sharding.shard_for(next(ids)), 20_000)['mean_ms'] * 1000, 2),
+            'db_for_write': round(measure(lambda: router.db_for_write(OTPLog, instance=log), 20_000)['mean_ms']
+                                  * 1000, 2),
+        }
+
+        def status_report(round_trip: float):
+            def network(execute, *args):  # a database server round trip, which SQLite does not have
+                time.sleep(round_trip)
+                return execute(*args)
+
+            def report(alias):
+                with connections[alias].execute_wrapper(network):
+                    return list(sharding.owned_rows(OTPLog.objects.all(), alias).values('status')
+                                .annotate(rows=Count('pk'), credits=Sum('cost_credits')))
+            return report
+
+        def sequential(report):
+            for alias in sharding.ring.aliases:
+                with sharding.on_shard(alias):
+                    report(alias)
+
+        results['fan_out'] = {'tenants_per_shard': dict(sorted(by_shard.items())), 'rows': per_user * len(users)}
+        for label, round_trip in (('sqlite', 0), ('rtt_5ms', 0.005)):
+            report = status_report(round_trip)
+            results['fan_out'][label] = {
+                'sequential_ms': measure(lambda: sequential(report), iterations, warmup=1)['p50_ms'],
+                'parallel_ms': measure(lambda: sharding.fan_out(report), iterations, warmup=1)['p50_ms'],
+            }
+
+        mover = make_user('mover@fastotp.test')
+        source = sharding.shard_for(mover.pk)
+        target = next(alias for alias in aliases if alias != source)
+        history = size // 4
+        with sharding.tenant_atomic(mover.pk), explicit_timestamps(OTPLog, Transaction):
+            CreditBalance.objects.create(user=mover, balance=Decimal('100'))
+            bulk_insert(OTPLog, (OTPLog(user=mover, identifier=f'+23481{n:08d}', expires_at=now,
+                                        status='verified' if n % 4 else 'expired',
+                                        created_at=now - timedelta(days=90) * n / history)
+                                 for n in range(history)))
+            bulk_insert(Transaction, (Transaction(user=mover, transaction_type='consumption', status='completed',
+                                                  credits=Decimal('0.0045'),
+                                                  created_at=now - timedelta(days=90) * n / history)
+                                      for n in range(0, history, 5)))
+        start = time.perf_counter()
+        moved = sharding.move_tenant(mover.pk, target, settle=0)
+        seconds = time.perf_counter() - start
+        with sharding.tenant(mover.pk):
+            placed = OTPLog.objects.filter(user=mover).count()
+        results['move'] = {
+            'rows': moved.rows,
+            'seconds': round(seconds, 3),
+            'rows_per_s': round(moved.rows / seconds) if seconds else None,
+            'synced_at_cut_over': moved.synced,
+            'frozen_ms': round(moved.frozen_seconds * 1000, 1),
+            'rows_on_target': placed,
+            'left_on_source': OTPLog.objects.using(source).filter(user_id=mover.pk).count(),
+        }
+    return results
@@ -0,0 +1,116 @@
+"""
+FastOTP Billing Read Model
+==========================
+Per-user billing snapshot shared by ``BillingView`` and the HTMX balance poll,
+plus the process-wide ``CreditPackage`` catalogue.
+
+A snapshot is built with two read-only queries (balance row + last
+transactions) and cached in-process for ``BILLING_SNAPSHOT_TTL`` seconds. Every
+code path that changes a balance or a transaction calls ``invalidate_billing``
+so the owning process never serves a stale figure after its own write.
+"""
+from dataclasses import dataclass
+from decimal import Decimal
+from django.conf import settings
+
+from .cache import TTLCache
+from .sharding import tenant
+
+BILLING_SNAPSHOT_TTL = getattr(settings, 'BILLING_SNAPSHOT_TTL', 15)
+RECENT_TRANSACTIONS = 20
+
+_snapshots = TTLCache(maxsize=4096, ttl=BILLING_SNAPSHOT_TTL)
+
+
+@dataclass(frozen=True)
+class BalanceSnapshot:
+    balance: Decimal = Decimal('0')
+    total_topped_up: Decimal = Decimal('0')
+    total_consumed: Decimal = Decimal('0')
+
+
+@dataclass(frozen=True)
+class BillingSnapshot:
+    balance: BalanceSnapshot
+    transactions: tuple
+
+
+def get_billing_snapshot(user) -> BillingSnapshot:
+    """Return the cached billing snapshot for ``user``; never writes."""
+    snapshot = _snapshots.get(user.pk)
+    if snapshot is None:
+        from .models import CreditBalance, Transaction
+        with tenant(user.pk):
+            row = (CreditBalance.objects.filter(user_id=user.pk)
+                   .values('balance', 'total_topped_up', 'total_consumed').first())
+            snapshot = BillingSnapshot(
+                balance=BalanceSnapshot(**row) if row else BalanceSnapshot(),
+                transactions=tuple(Transaction.objects.filter(user_id=user.pk)[:RECENT_TRANSACTIONS]),
+            )
+        _snapshots.set(user.pk, snapshot)
+    return snapshot
+
+
+def invalidate_billing(user_id):
+    _snapshots.pop(user_id)
+
+
+# ─────────────────────────────────────────────
+#  Package Catalogue
+# ─────────────────────────────────────────────
+
+CATALOGUE_TTL = getattr(settings, 'CATALOGUE_TTL', 600)
+
+_catalogue = TTLCache(maxsize=1, ttl=CATALOGUE_TTL)
+
+
+@dataclass(frozen=True)
+class PackageEntry:
+    """Read-only view of an active ``CreditPackage`` for listing and checkout."""
+    id: int
+    name: str
+    tier: str
+    credits: int
+    price_usd: Decimal
+    price_per_otp: Decimal
+    is_popular: bool
+    description: str
+    features: tuple
+
+
+@dataclass(frozen=True)
+class PackageCatalogue:
+    packages: tuple
+    by_id: dict
+
+    def get(self, package_id):
+        try:
+            return self.by_id.get(int(package_id))
+        except (TypeError, ValueError):
+            return None
+
+
+def get_catalogue() -> PackageCatalogue:
+    """
+    Active packages, loaded once per process. ``CreditPackage`` save/delete
+    signals drop the cached copy; the TTL bounds staleness in other workers.
+    """
+    catalogue = _catalogue.get('catalogue')
+    if catalogue is None:
+        from .models import CreditPackage
+        packages = tuple(
+            PackageEntry(
+                id=p.id, name=p.name, tier=p.tier, credits=p.credits,
+                price_usd=p.price_usd, price_per_otp=p.price_per_otp,
+                is_popular=p.is_popular, description=p.description,
+                features=tuple(p.features or ()),
+            )
+            for p in CreditPackage.objects.filter(is_active=True)
+        )
+        catalogue = PackageCatalogue(packages=packages, by_id={p.id: p for p in packages})
+        _catalogue.set('catalogue', catalogue)
+    return catalogue
+
+
+def invalidate_catalogue(**kwargs):
+    _catalogue.clear()
@@ -0,0 +1,288 @@
+"""
+FastOTP Synthetic Data
+======================
+Deterministic, bounded-memory generators for realistic demo and load-test
+datasets. Every generator takes a ``random.Random`` so a seed reproduces the
+exact same rows, and yields unsaved model instances for chunked ``bulk_create``.
+"""
+import ipaddress
+import json
+import random
+import struct
+import time
+import uuid
+from collections import defaultdict
+from itertools import accumulate
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from django.contrib.auth.hashers import make_password
+from django.db import router, transaction
+from django.utils import timezone
+
+from .services import COVERAGE_DATA
+
+# Relative OTP traffic per country code; unlisted countries get weight 1.
+COUNTRY_WEIGHTS = {'NG': 30, 'KE': 14, 'ZA': 12, 'GH': 9, 'EG': 8, 'TZ': 4, 'UG': 4, 'ET': 3, 'RW': 2, 'SN': 2}
+CHANNEL_WEIGHTS = {'whatsapp': 60, 'sms': 30, 'email': 8, 'voice': 2}
+STATUS_WEIGHTS = {'delivered': 62, 'verified': 22, 'failed': 6, 'sent': 4, 'pending': 3, 'expired': 3}
+# (median ms, log-normal sigma) of delivery latency per channel.
+LATENCY_PROFILE = {'whatsapp': (380, 0.45), 'sms': (620, 0.55), 'email': (1400, 0.6), 'voice': (2600, 0.4)}
+
+_COUNTRIES = COVERAGE_DATA
+_COUNTRY_CUM = list(accumulate(COUNTRY_WEIGHTS.get(c['code'], 1) for c in COVERAGE_DATA))
+_COST = {c['code']: Decimal(str(c['cost'])) for c in COVERAGE_DATA}
+
+
+def seeded_uuid(rng: random.Random) -> uuid.UUID:
+    return uuid.UUID(int=rng.getrandbits(128), version=4)
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """
+    Let bulk_create keep the generated ``created_at`` instead of auto_now_add's
+    now(). Patches the model field process-wide — management commands only.
+    """
+    fields = [m._meta.get_field('created_at') for m in models]
+    saved = [f.auto_now_add for f in fields]
+    for f in fields:
+        f.auto_now_add = False
+    try:
+        yield
+    finally:
+        for f, value in zip(fields, saved):
+            f.auto_now_add = value
+
+
+def _insert(model, alias: str, batch: list) -> int:
+    with transaction.atomic(using=alias):
+        model.objects.using(alias).bulk_create(batch, batch_size=len(batch))
+    return len(batch)
+
+
+def bulk_load(model, rows, chunk_size: int = 10_000) -> int:
+    """
+    Insert ``rows`` in chunks, one transaction per chunk, each row on the
+    database the router picks for it (its tenant's shard for sharded models).
+    Returns rows written.
+    """
+    written, batches = 0, defaultdict(list)
+    for row in rows:
+        alias = router.db_for_write(model, instance=row)
+        batch = batches[alias]
+        batch.append(row)
+        if len(batch) >= chunk_size:
+            written += _insert(model, alias, batch)
+            batches[alias] = []
+    for alias, batch in batches.items():
+        if batch:
+            written += _insert(model, alias, batch)
+    return written
+
+
+# ─────────────────────────────────────────────
+#  Generators
+# ─────────────────────────────────────────────
+
+def generate_users(rng: random.Random, count: int, prefix: str = 'load'):
+    from .models import User
+    password = make_password('fastotp-demo-pass')  # hashed once, shared by every row
+    now = timezone.now()
+    for n in range(count):
+        country = rng.choices(_COUNTRIES, cum_weights=_COUNTRY_CUM)[0]
+        yield User(
+            id=seeded_uuid(rng),
+            username=f'{prefix}{n}@fastotp.test',
+            email=f'{prefix}{n}@fastotp.test',
+            password=password,
+            first_name='Load', last_name=f'User{n}',
+            whatsapp_number=f"{country['dial']}{rng.randint(10**8, 10**9 - 1)}",
+            company_name=f'Tenant {n}',
+            is_verified=True,
+            avatar_initials='LU',
+            date_joined=now,
+            created_at=now - timedelta(days=rng.randint(0, 365)),
+        )
+
+
+def generate_balances(rng: random.Random, user_ids: list):
+    from .models import CreditBalance
+    for user_id in user_ids:
+        topped_up = Decimal(rng.choice([5, 40, 350]))
+        yield CreditBalance(user_id=user_id, balance=Decimal(rng.randint(0, 5000)),
+                            total_topped_up=topped_up, total_consumed=Decimal(rng.randint(0, 50000)))
+
+
+def generate_api_keys(rng: random.Random, user_ids: list, per_user: int = 2):
+    from .models import APIKey
+    now = timezone.now()
+    for user_id in user_ids:
+        for i in range(per_user):
+            env = 'live' if i == 0 else 'test'
+            api_key = APIKey(id=seeded_uuid(rng), user_id=user_id, name=f'{env.title()} key',
+                             environment=env, created_at=now - timedelta(days=rng.randint(0, 180)))
+            api_key.set_key(f"fotk_{env}_{rng.getrandbits(192):048x}")
+            yield api_key
+
+
+def generate_transactions(rng: random.Random, user_ids: list, per_user: int = 5, days: int = 90):
+    from .models import Transaction
+    now = timezone.now()
+    for user_id in user_ids:
+        for _ in range(per_user):
+            topup = rng.random() < 0.3
+            credits = Decimal(rng.choice([500, 5000, 50000])) if topup else Decimal('0.0045')
+            yield Transaction(
+                id=seeded_uuid(rng), user_id=user_id,
+                transaction_type='topup' if topup else 'consumption',
+                amount_usd=(credits / 100).quantize(Decimal('0.01')) if topup else Decimal('0'),
+                credits=credits, status='completed',
+                gateway=rng.choice(['paystack', 'flutterwave']) if topup else '',
+                description=f'{int(credits)} credits' if topup else 'OTP send',
+                created_at=now - timedelta(seconds=rng.randint(0, days * 86400)),
+            )
+
+
+def generate_otp_logs(rng: random.Random, user_ids: list, count: int, key_ids: dict = None,
+                      days: int = 30):
+    """
+    ``count`` OTPLog rows spread over ``days``. Traffic per tenant is skewed
+    (a few tenants send most OTPs), countries/channels/statuses follow the
+    weight tables above and latency is log-normal per channel.
+    """
+    from .models import OTPLog
+    key_ids = key_ids or {}
+    now = timezone.now()
+    tenant_weights = [1 / (rank + 1) for rank in range(len(user_ids))]
+    channels, channel_cum = list(CHANNEL_WEIGHTS), list(accumulate(CHANNEL_WEIGHTS.values()))
+    statuses, status_cum = list(STATUS_WEIGHTS), list(accumulate(STATUS_WEIGHTS.values()))
+    span = days * 86400
+    five_minutes = timedelta(minutes=5)
+
+    tenants = rng.choices(user_ids, tenant_weights, k=min(count, 100_000))
+    for n in range(count):
+        user_id = tenants[n % len(tenants)]
+        country = rng.choices(_COUNTRIES, cum_weights=_COUNTRY_CUM)[0]
+        channel = rng.choices(channels, cum_weights=channel_cum)[0]
+        status = rng.choices(statuses, cum_weights=status_cum)[0]
+        median, sigma = LATENCY_PROFILE[channel]
+        created = now - timedelta(seconds=rng.randint(0, span))
+        delivered = status in ('delivered', 'verified')
+        latency = int(rng.lognormvariate(0, sigma) * median) if delivered else None
+        identifier = (f'user{rng.randint(1, 10**7)}@example.com' if channel == 'email'
+                      else f"{country['dial']}{rng.randint(10**8, 10**9 - 1)}")
+        yield OTPLog(
+            id=seeded_uuid(rng), user_id=user_id, api_key_id=key_ids.get(user_id),
+            identifier=identifier, channel=channel,
+            country_code=country['code'], country_name=country['country'],
+            status=status, latency_ms=latency,
+            cost_credits=_COST[country['code']],
+            sent_at=created,
+            verified_at=created + timedelta(seconds=rng.randint(5, 90)) if status == 'verified' else None,
+            expires_at=created + five_minutes,
+            created_at=created,
+        )
+
+
+# ─────────────────────────────────────────────
+#  GeoIP
+# ─────────────────────────────────────────────
+
+CITIES = {'NG': 'Lagos', 'KE': 'Nairobi', 'ZA': 'Johannesburg', 'GH': 'Accra', 'EG': 'Cairo'}
+
+
+def generate_geoip_networks(rng: random.Random, count: int) -> list:
+    """``count`` distinct IPv4 /24s with GeoLite2-City-shaped records, weighted like OTP traffic."""
+    prefixes = set()
+    while len(prefixes) < count:
+        prefixes.add(rng.randint(1 << 16, (224 << 16) - 1))  # 1.0.0.0/24 … 223.255.255.0/24
+    networks = []
+    for prefix in sorted(prefixes):
+        country = rng.choices(_COUNTRIES, cum_weights=_COUNTRY_CUM)[0]
+        record = {'country': {'iso_code': country['code'], 'names': {'en': country['country']}}}
+        if country['code'] in CITIES and rng.random() < 0.7:
+            record['city'] = {'names': {'en': CITIES[country['code']]}}
+        networks.append((ipaddress.IPv4Network((prefix << 8, 24)), record))
+    return networks
+
+
+def _mmdb_control(kind: int, size: int) -> bytes:
+    if size < 29:
+        size_bits, extra = size, b''
+    elif size < 285:
+        size_bits, extra = 29, bytes([size - 29])
+    elif size < 65821:
+        size_bits, extra = 30, (size - 285).to_bytes(2, 'big')
+    else:
+        size_bits, extra = 31, (size - 65821).to_bytes(3, 'big')
+    if kind <= 7:
+        return bytes([(kind << 5) | size_bits]) + extra
+    return bytes([size_bits, kind - 7]) + extra  # extended type
+
+
+def _mmdb_encode(value) -> bytes:
+    if isinstance(value, bool):
+        return _mmdb_control(14, int(value))
+    if isinstance(value, str):
+        data = value.encode()
+        return _mmdb_control(2, len(data)) + data
+    if isinstance(value, dict):
+        return _mmdb_control(7, len(value)) + b''.join(_mmdb_encode(k) + _mmdb_encode(v) for k, v in value.items())
+    if isinstance(value, list):
+        return _mmdb_control(11, len(value)) + b''.join(_mmdb_encode(v) for v in value)
+    if isinstance(value, float):
+        return _mmdb_control(3, 8) + struct.pack('>d', value)
+    data = value.to_bytes((value.bit_length() + 7) // 8, 'big')
+    return _mmdb_control(6 if value < 1 << 32 else 9, len(data)) + data
+
+
+def write_mmdb(path, networks, record_size: int = 28, database_type: str = 'FastOTP-Synthetic-City'):
+    """
+    Write ``(network, record)`` pairs as a MaxMind DB file readable by
+    ``fastotp.geoip`` (and MaxMind's own readers): an IPv6 tree with IPv4
+    networks under ``::/96``. Networks must not overlap.
+    """
+    nodes = [[None, None]]
+    records, data = {}, bytearray()
+    for network, record in networks:
+        key = json.dumps(record, sort_keys=True)
+        if key not in records:
+            records[key] = len(data)
+            data += _mmdb_encode(record)
+        value = int(network.network_address)
+        prefix = network.prefixlen + (96 if network.version == 4 else 0)
+        node = 0
+        for depth in range(prefix - 1):
+            bit = (value >> (127 - depth)) & 1
+            if not isinstance(nodes[node][bit], int):
+                nodes.append([None, None])
+                nodes[node][bit] = len(nodes) - 1
+            node = nodes[node][bit]
+        nodes[node][(value >> (128 - prefix)) & 1] = ('data', records[key])
+
+    node_count = len(nodes)
+
+    def resolve(child) -> int:
+        if child is None:
+            return node_count
+        return child if isinstance(child, int) else node_count + 16 + child[1]
+
+    tree = bytearray()
+    for left, right in nodes:
+        left, right = resolve(left), resolve(right)
+        if record_size == 24:
+            tree += left.to_bytes(3, 'big') + right.to_bytes(3, 'big')
+        elif record_size == 28:
+            tree += (left & 0xffffff).to_bytes(3, 'big') + bytes([(left >> 24) << 4 | right >> 24])
+            tree += (right & 0xffffff).to_bytes(3, 'big')
+        else:
+            tree += left.to_bytes(4, 'big') + right.to_bytes(4, 'big')
+    metadata = {
+        'node_count': node_count, 'record_size': record_size, 'ip_version': 6,
+        'database_type': database_type, 'languages': ['en'],
+        'binary_format_major_version': 2, 'binary_format_minor_version': 0,
+        'build_epoch': int(time.time()), 'description': {'en': 'Synthetic FastOTP GeoIP data'},
+    }
+    with open(path, 'wb') as fh:
+        fh.write(tree + bytes(16) + data + b'\xab\xcd\xefMaxMind.com' + _mmdb_encode(metadata))
@@ -0,0 +1,74 @@
+"""
+FastOTP Database Routing
+========================
+All writes, and all reads by default, go to ``default`` (the primary). Read-only,
+lag-tolerant code paths opt in to the ``replica`` alias:
+
+    with replica_reads():
+        stats = OTPLog.objects.filter(user=user).aggregate(...)
+
+or, for a whole view, ``ReplicaReadMixin``. Reads inside an atomic block on the
+primary always stay on the primary, so balance debits and payment flows see
+their own writes. Without a ``replica`` alias configured everything is primary.
+"""
+import contextvars
+from contextlib import contextmanager
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA_ALIAS = 'replica'
+
+_use_replica = contextvars.ContextVar('fastotp_use_replica', default=False)
+
+
+@contextmanager
+def replica_reads():
+    """Route reads in this block to the replica (when one is configured)."""
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+@contextmanager
+def primary_reads():
+    """Force reads in this block back to the primary, e.g. inside a replica-routed view."""
+    token = _use_replica.set(False)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if (_use_replica.get()
+                and REPLICA_ALIAS in settings.DATABASES
+                and not connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return REPLICA_ALIAS
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != REPLICA_ALIAS
+
+
+class ReplicaReadMixin:
+    """
+    Serve a read-only view's GET queries from the replica. Session and user
+    loading happen in ``dispatch`` before ``get`` and stay on the primary; the
+    response is rendered inside the block so lazy querysets follow it.
+    """
+
+    def get(self, request, *args, **kwargs):
+        with replica_reads():
+            response = super().get(request, *args, **kwargs)
+            if hasattr(response, 'render') and not response.is_rendered:
+                response.render()
+        return response
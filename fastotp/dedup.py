@@ -0,0 +1,154 @@
+"""
+FastOTP Send Deduplication
+==========================
+Stops repeated OTP sends before they cost a row, a debit and a provider
+message.
+
+    resend cooldown  a send to the same (API key, identifier, channel) within
+                     ``OTP_RESEND_COOLDOWN`` seconds of the last one returns that
+                     OTP's ``otp_id`` (``"deduplicated": true`` and
+                     ``retry_after``) instead of sending again, until it is
+                     verified or its delivery fails
+    idempotency key  a send with an ``Idempotency-Key`` header replays the first
+                     response for that key (per API key) for
+                     ``IDEMPOTENCY_KEY_TTL`` seconds; reusing the key for a
+                     different request is an error
+
+A second identical request arriving while the first is still being sent gets
+``request_in_progress`` rather than a second OTP. Everything is answered from
+in-process caches, never an ``OTPLog`` query, so like the login throttle it
+applies per worker.
+"""
+import math
+import threading
+import time
+from dataclasses import dataclass
+from typing import ClassVar
+from django.conf import settings
+
+from .cache import TTLCache
+
+OTP_RESEND_COOLDOWN = getattr(settings, 'OTP_RESEND_COOLDOWN', 30)
+IDEMPOTENCY_KEY_TTL = getattr(settings, 'IDEMPOTENCY_KEY_TTL', 86400)
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+
+@dataclass(frozen=True)
+class SendClaim:
+    NEW: ClassVar[str] = 'new'
+    DUPLICATE: ClassVar[str] = 'duplicate'
+    IN_FLIGHT: ClassVar[str] = 'in_flight'
+
+    status: str
+    value: object = None
+    retry_after: int = 0
+
+
+class SendGuard:
+    """
+    Remembers the outcome of a send under a key for ``window`` seconds.
+
+    Usage:
+        guard = SendGuard(window=30)
+        claim = guard.begin(key)
+        if claim.status == SendClaim.NEW:
+            try:
+                result = send()
+            finally:
+                guard.finish(key, result)   # None (failed send) just releases the key
+    """
+
+    def __init__(self, window: float, maxsize: int = 100_000):
+        self.window = window
+        self._recent = TTLCache(maxsize=maxsize, ttl=window)
+        self._aliases = TTLCache(maxsize=maxsize, ttl=window)
+        self._forgotten = TTLCache(maxsize=maxsize, ttl=window)  # forgotten before ``finish`` ran
+        self._in_flight = set()
+        self._lock = threading.Lock()
+
+    def begin(self, key) -> SendClaim:
+        with self._lock:
+            entry = self._recent.get(key)
+            if entry is not None:
+                value, sent_at = entry
+                return SendClaim(SendClaim.DUPLICATE, value,
+                                 max(1, math.ceil(self.window - (time.monotonic() - sent_at))))
+            if key in self._in_flight:
+                return SendClaim(SendClaim.IN_FLIGHT)
+            self._in_flight.add(key)
+        return SendClaim(SendClaim.NEW)
+
+    def finish(self, key, value=None, ttl: float = None, alias=None):
+        """Record ``value`` for ``key`` (for at most ``ttl`` seconds), findable by ``alias`` for ``forget``."""
+        ttl = self.window if ttl is None else min(ttl, self.window)
+        with self._lock:
+            self._in_flight.discard(key)
+            if alias is not None and self._forgotten.pop(alias):
+                return
+            if value is not None and ttl > 0:
+                self._recent.set(key, (value, time.monotonic()), ttl=ttl)
+                if alias is not None:
+                    self._aliases.set(alias, key, ttl=ttl)
+
+    def forget(self, alias):
+        """Drop the entry recorded under ``alias`` (e.g. its OTP was verified or failed)."""
+        with self._lock:
+            key = self._aliases.pop(alias)
+            if key is None:
+                self._forgotten.set(alias, True)  # an inline delivery can fail before ``finish``
+            else:
+                self._recent.pop(key)
+
+    def clear(self):
+        self._recent.clear()
+        self._aliases.clear()
+        self._forgotten.clear()
+
+
+resend_guard = SendGuard(OTP_RESEND_COOLDOWN)
+idempotency_guard = SendGuard(IDEMPOTENCY_KEY_TTL)
+
+
+def deduplicated_send(api_key_id, identifier: str, channel: str, expires_in: int, send,
+                      idempotency_key: str = '') -> dict:
+    """
+    Return ``send()``'s API response body, or the body of an equivalent recent
+    send (resend cooldown) or of the same ``idempotency_key`` without calling it.
+    """
+    request = (identifier, channel, expires_in)
+    idempotency = (api_key_id, idempotency_key) if idempotency_key else None
+    if idempotency:
+        claim = idempotency_guard.begin(idempotency)
+        if claim.status == SendClaim.DUPLICATE:
+            original_request, body = claim.value
+            if original_request != request:
+                return {'success': False, 'error': 'idempotency_conflict'}
+            return {**body, 'idempotent_replay': True}
+        if claim.status == SendClaim.IN_FLIGHT:
+            return {'success': False, 'error': 'request_in_progress'}
+
+    body = None
+    resend = (api_key_id, identifier, channel)
+    try:
+        claim = resend_guard.begin(resend)
+        if claim.status == SendClaim.DUPLICATE:
+            body = {**claim.value, 'deduplicated': True, 'retry_after': claim.retry_after}
+        elif claim.status == SendClaim.IN_FLIGHT:
+            body = {'success': False, 'error': 'request_in_progress'}
+        else:
+            sent = None
+            try:
+                body = send()
+                if body['success'] and body.get('status') != 'failed':
+                    sent = body
+            finally:
+                resend_guard.finish(resend, sent, ttl=expires_in, alias=sent and sent['otp_id'])
+    finally:
+        if idempotency:
+            idempotency_guard.finish(idempotency, (request, body) if body and body['success'] else None)
+    return body
+
+
+def forget_otp(otp_id):
+    """Let the next send to this OTP's identifier through (it was verified or not delivered)."""
+    resend_guard.forget(str(otp_id))
@@ -0,0 +1,236 @@
+"""
+FastOTP Enrichment
+==================
+Readable device and location details from the raw ``user_agent`` and
+``ip_address`` stored with logins and OTPs:
+
+    LoginSession.device_type  "Mobile · Chrome 126 on Android 14"
+    LoginSession.location     "Lagos, Nigeria" (city database) or "Nigeria"
+    OTPLog.country_*          from the sender's IP when the identifier has no
+                              dial-code country (email, unlisted prefixes)
+
+User agents are parsed with a short ordered rule table. IPs are resolved
+against the offline GeoIP database at ``GEOIP_DATABASE`` (``fastotp.geoip``,
+memory-mapped, no network). Both keep an LRU of ``ENRICHMENT_CACHE_SIZE``
+results per worker, since logins repeat a few agents and OTP traffic a few
+addresses.
+
+A login session is enriched after the login commits, on a background thread
+(inline with ``ENRICHMENT_ASYNC = False``), so the login response never waits
+on it. OTP rows take their country at insert time instead: the lookup is an
+in-memory read, and doing it later would cost each row a second write.
+Without a GeoIP database locations and IP countries stay blank.
+"""
+import logging
+import re
+import threading
+from dataclasses import dataclass
+from typing import ClassVar
+from django.conf import settings
+from django.db import transaction
+
+from .cache import TTLCache
+from .geoip import GeoIPDatabase, GeoIPError
+
+logger = logging.getLogger(__name__)
+
+GEOIP_DATABASE = getattr(settings, 'GEOIP_DATABASE', '')
+ENRICHMENT_ASYNC = getattr(settings, 'ENRICHMENT_ASYNC', True)
+ENRICHMENT_CACHE_SIZE = getattr(settings, 'ENRICHMENT_CACHE_SIZE', 10_000)
+ENRICHMENT_CACHE_TTL = 86400
+
+
+# ─────────────────────────────────────────────
+#  User agents
+# ─────────────────────────────────────────────
+
+@dataclass(frozen=True)
+class UserAgent:
+    DESKTOP: ClassVar[str] = 'Desktop'
+    MOBILE: ClassVar[str] = 'Mobile'
+    TABLET: ClassVar[str] = 'Tablet'
+    BOT: ClassVar[str] = 'Bot'
+
+    device: str = ''
+    browser: str = ''
+    os: str = ''
+
+    @property
+    def summary(self) -> str:
+        software = ' on '.join(part for part in (self.browser, self.os) if part)
+        return ' · '.join(part for part in (self.device, software) if part)
+
+
+_BOT = re.compile(r'bot\b|crawl|spider|slurp|curl/|wget/|python-|httpx/|okhttp/|go-http|headless', re.I)
+_BOT_NAME = re.compile(r'[\w-]*(?:bot|spider|crawler|slurp)\b', re.I)
+_PRODUCT = re.compile(r'^[\w.-]+')  # "curl" in "curl/8.4.0"
+_TABLET = re.compile(r'iPad|Tablet|Kindle|Silk/|Android(?!.*Mobile)')
+_MOBILE = re.compile(r'Mobi|iPhone|iPod|Windows Phone|Opera Mini')
+
+# First match wins: browsers also claim to be the ones they are built on.
+BROWSERS = [
+    ('Edge', re.compile(r'Edg(?:e|A|iOS)?/(\d+)')),
+    ('Opera', re.compile(r'OPR/(\d+)')),
+    ('Samsung Internet', re.compile(r'SamsungBrowser/(\d+)')),
+    ('Firefox', re.compile(r'(?:Firefox|FxiOS)/(\d+)')),
+    ('Chrome', re.compile(r'(?:Chrome|CriOS)/(\d+)')),
+    ('Safari', re.compile(r'Version/(\d+)[\d.]*(?: Mobile/\w+)? Safari/')),
+]
+OPERATING_SYSTEMS = [
+    ('Windows', re.compile(r'Windows NT')),  # NT 10.0 is both Windows 10 and 11
+    ('iOS', re.compile(r'(?:iPhone|CPU) OS (\d+)')),
+    ('Android', re.compile(r'Android (\d+)')),
+    ('ChromeOS', re.compile(r'CrOS')),
+    ('macOS', re.compile(r'Mac OS X')),
+    ('Linux', re.compile(r'Linux')),
+]
+
+_user_agents = TTLCache(maxsize=ENRICHMENT_CACHE_SIZE, ttl=ENRICHMENT_CACHE_TTL)
+
+
+def _match(rules: list, user_agent: str) -> str:
+    for name, pattern in rules:
+        found = pattern.search(user_agent)
+        if found:
+            version = next((group for group in found.groups() if group), '')
+            return f'{name} {version}' if version else name
+    return ''
+
+
+def _parse_user_agent(user_agent: str) -> UserAgent:
+    if not user_agent:
+        return UserAgent()
+    if _BOT.search(user_agent):
+        name = _BOT_NAME.search(user_agent) or _PRODUCT.search(user_agent)
+        return UserAgent(UserAgent.BOT, name.group() if name else '')
+    if _TABLET.search(user_agent):
+        device = UserAgent.TABLET
+    elif _MOBILE.search(user_agent):
+        device = UserAgent.MOBILE
+    else:
+        device = UserAgent.DESKTOP
+    return UserAgent(device, _match(BROWSERS, user_agent), _match(OPERATING_SYSTEMS, user_agent))
+
+
+def parse_user_agent(user_agent: str) -> UserAgent:
+    user_agent = (user_agent or '')[:500]
+    parsed = _user_agents.get(user_agent)
+    if parsed is None:
+        parsed = _parse_user_agent(user_agent)
+        _user_agents.set(user_agent, parsed)
+    return parsed
+
+
+# ─────────────────────────────────────────────
+#  IP locations
+# ─────────────────────────────────────────────
+
+@dataclass(frozen=True)
+class Location:
+    country_code: str = ''
+    country_name: str = ''
+    city: str = ''
+
+    @property
+    def display(self) -> str:
+        return ', '.join(part for part in (self.city, self.country_name) if part)
+
+
+UNKNOWN_LOCATION = Location()
+
+_locations = TTLCache(maxsize=ENRICHMENT_CACHE_SIZE, ttl=ENRICHMENT_CACHE_TTL)
+_database = None
+_database_lock = threading.Lock()
+
+
+def geoip_database():
+    """The process's ``GeoIPDatabase`` for ``GEOIP_DATABASE``, or ``None`` if unset or unreadable."""
+    global _database
+    if _database is None:
+        with _database_lock:
+            if _database is None:
+                try:
+                    _database = GeoIPDatabase(GEOIP_DATABASE) if GEOIP_DATABASE else False
+                except (OSError, GeoIPError) as e:
+                    logger.warning(f"GeoIP database {GEOIP_DATABASE} unavailable: {e}")
+                    _database = False
+    return _database or None
+
+
+def _location_from(record) -> Location:
+    if not isinstance(record, dict):
+        return UNKNOWN_LOCATION
+    country = record.get('country') or record.get('registered_country') or {}
+    return Location(
+        country_code=country.get('iso_code', ''),
+        country_name=country.get('names', {}).get('en', ''),
+        city=(record.get('city') or {}).get('names', {}).get('en', ''),
+    )
+
+
+def locate(ip) -> Location:
+    if not ip:
+        return UNKNOWN_LOCATION
+    location = _locations.get(ip)
+    if location is None:
+        database = geoip_database()
+        try:
+            location = _location_from(database.lookup(ip)) if database else UNKNOWN_LOCATION
+        except (ValueError, GeoIPError):
+            location = UNKNOWN_LOCATION
+        _locations.set(ip, location)
+    return location
+
+
+def clear_caches():
+    """Forget cached results and reopen ``GEOIP_DATABASE`` on next use (e.g. after updating the file)."""
+    global _database
+    with _database_lock:
+        _database = None  # lookups still running keep their reference; the map closes when released
+    _user_agents.clear()
+    _locations.clear()
+
+
+# ─────────────────────────────────────────────
+#  Login sessions
+# ─────────────────────────────────────────────
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        from concurrent.futures import ThreadPoolExecutor
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='enrichment')
+    return _pool
+
+
+def enrich_login_session(session_id, ip_address, user_agent: str):
+    from .models import LoginSession
+    LoginSession.objects.filter(pk=session_id).update(
+        device_type=parse_user_agent(user_agent).summary[:50],
+        location=locate(ip_address).display[:100],
+    )
+
+
+def _enrich_in_background(*args):
+    from django.db import connections
+    try:
+        enrich_login_session(*args)
+    except Exception:
+        logger.exception("Login session enrichment failed")
+    finally:
+        connections.close_all()  # this worker thread's connections only
+
+
+def queue_login_enrichment(session):
+    """Fill ``session.device_type`` / ``location`` once the surrounding transaction commits."""
+    args = (session.pk, session.ip_address, session.user_agent)
+    if ENRICHMENT_ASYNC:
+        transaction.on_commit(lambda: _get_pool().submit(_enrich_in_background, *args))
+    else:
+        transaction.on_commit(lambda: enrich_login_session(*args))
@@ -0,0 +1,247 @@
+"""
+FastOTP Send-path Fraud Detection
+=================================
+Streaming SMS-pumping detector consulted before every OTP send.
+
+Each send is counted over the last ``FRAUD_WINDOW`` seconds per dimension:
+
+    api_key          sends per API key
+    ip               sends per client IP, for sends without an API key (signup);
+                     an API call's IP is the customer's backend, shared by
+                     all of its users, so keyed sends count under api_key
+    prefix           sends per API key to each dial code (``COVERAGE_DATA``);
+                     signup OTPs, which have no key, share one budget
+    number_range     sends per block of numbers (all but the last
+                     ``FRAUD_RANGE_DIGITS`` digits), i.e. sequential numbers
+    unlisted_prefix  sends per API key (or IP) to dial codes we do not cover
+
+Counts live in sliding-window count-min sketches (fixed memory whatever the
+traffic, never undercounting). The risk score is the highest count/limit
+ratio across ``FRAUD_LIMITS``; dial codes outside our coverage score at least
+``FRAUD_UNLISTED_PREFIX_SCORE``. A send is flagged at ``FRAUD_FLAG_SCORE`` and
+blocked above ``FRAUD_BLOCK_SCORE``. Blocked attempts still count, so a
+pumping burst stays blocked until it stops.
+
+State is in-process, so limits apply per worker, like the login throttle.
+"""
+import threading
+import time
+from array import array
+from dataclasses import dataclass
+from typing import ClassVar
+from django.conf import settings
+
+FRAUD_DETECTION = getattr(settings, 'FRAUD_DETECTION', True)
+FRAUD_WINDOW = getattr(settings, 'FRAUD_WINDOW', 600)
+FRAUD_WINDOW_SLOTS = getattr(settings, 'FRAUD_WINDOW_SLOTS', 6)
+FRAUD_SKETCH_WIDTH = getattr(settings, 'FRAUD_SKETCH_WIDTH', 8192)
+FRAUD_SKETCH_DEPTH = getattr(settings, 'FRAUD_SKETCH_DEPTH', 4)
+FRAUD_RANGE_DIGITS = getattr(settings, 'FRAUD_RANGE_DIGITS', 3)
+FRAUD_LIMITS = {  # sends per FRAUD_WINDOW
+    'api_key': 2000,
+    'ip': 20,
+    'prefix': 5000,
+    'number_range': 8,
+    'unlisted_prefix': 20,
+    **getattr(settings, 'FRAUD_LIMITS', {}),
+}
+FRAUD_FLAG_SCORE = getattr(settings, 'FRAUD_FLAG_SCORE', 0.7)
+FRAUD_BLOCK_SCORE = getattr(settings, 'FRAUD_BLOCK_SCORE', 1.0)
+FRAUD_UNLISTED_PREFIX_SCORE = getattr(settings, 'FRAUD_UNLISTED_PREFIX_SCORE', 0.8)
+
+
+class CountMinSketch:
+    """
+    ``depth`` rows of ``width`` counters; a key's count is the minimum of its
+    counters, which can overestimate (by about e·N/width in total) but never
+    underestimate. Increments use conservative update to keep the error low.
+    """
+
+    __slots__ = ('width', 'depth', 'rows')
+
+    def __init__(self, width: int = FRAUD_SKETCH_WIDTH, depth: int = FRAUD_SKETCH_DEPTH):
+        self.width = width
+        self.depth = depth
+        self.rows = [array('I', bytes(4 * width)) for _ in range(depth)]
+
+    def indexes(self, key) -> list:
+        # Double hashing (Kirsch–Mitzenmacher): one hash per row from two base hashes.
+        h1 = hash(key)
+        h2 = hash((key, 0x9E3779B9)) | 1
+        return [(h1 + i * h2) % self.width for i in range(self.depth)]
+
+    def estimate(self, indexes) -> int:
+        return min(row[i] for row, i in zip(self.rows, indexes))
+
+    def clear(self):
+        for row in self.rows:
+            row[:] = array('I', bytes(4 * self.width))
+
+
+class SlidingWindowCounter:
+    """
+    Count-min counts over the last ``window`` seconds, kept as ``slots``
+    rotating sub-window sketches plus their running total. The oldest slot is
+    subtracted from the total as it expires, so a count is one read per row.
+
+    Usage:
+        counter = SlidingWindowCounter(window=600)
+        count = counter.add('203.0.113.7')   # count including this one
+    """
+
+    def __init__(self, window: float = FRAUD_WINDOW, slots: int = FRAUD_WINDOW_SLOTS,
+                 width: int = FRAUD_SKETCH_WIDTH, depth: int = FRAUD_SKETCH_DEPTH):
+        self.slot_seconds = window / slots
+        self._slots = [CountMinSketch(width, depth) for _ in range(slots)]
+        self._total = CountMinSketch(width, depth)
+        self._current = 0
+        self._slot_started = None
+
+    def _advance(self, now: float = None):
+        now = time.monotonic() if now is None else now
+        if self._slot_started is None:
+            self._slot_started = now
+            return
+        elapsed = int((now - self._slot_started) // self.slot_seconds)
+        if elapsed <= 0:
+            return
+        self._slot_started += elapsed * self.slot_seconds
+        if elapsed >= len(self._slots):
+            for sketch in self._slots:
+                sketch.clear()
+            self._total.clear()
+            return
+        for _ in range(elapsed):
+            self._current = (self._current + 1) % len(self._slots)
+            expired = self._slots[self._current]
+            for total_row, expired_row in zip(self._total.rows, expired.rows):
+                total_row[:] = array('I', map(int.__sub__, total_row, expired_row))
+            expired.clear()
+
+    def add(self, key, now: float = None) -> int:
+        """Count one event for ``key`` and return its windowed count."""
+        self._advance(now)
+        indexes = self._total.indexes(key)
+        slot = self._slots[self._current]
+        # Conservative update: raise only the current slot's counters that are
+        # at its minimum, and mirror the same increments into the total.
+        floor = slot.estimate(indexes)
+        for slot_row, total_row, i in zip(slot.rows, self._total.rows, indexes):
+            if slot_row[i] == floor:
+                slot_row[i] += 1
+                total_row[i] += 1
+        return self._total.estimate(indexes)
+
+    def estimate(self, key, now: float = None) -> int:
+        self._advance(now)
+        return self._total.estimate(self._total.indexes(key))
+
+
+# ─────────────────────────────────────────────
+#  Risk Scoring
+# ─────────────────────────────────────────────
+
+@dataclass(frozen=True)
+class RiskAssessment:
+    ALLOW: ClassVar[str] = 'allow'
+    FLAG: ClassVar[str] = 'flag'
+    BLOCK: ClassVar[str] = 'block'
+
+    action: str
+    score: float = 0.0
+    reasons: tuple = ()
+
+    @property
+    def blocked(self) -> bool:
+        return self.action == self.BLOCK
+
+    @property
+    def score_percent(self) -> int:
+        """Score as stored on ``OTPLog.risk_score`` (0–100, capped)."""
+        return min(100, round(self.score * 100))
+
+
+_dial_codes = None
+
+
+def dial_prefix(digits: str):
+    """``(dial_code, listed)`` for an E.164 number's digits; unlisted codes fall back to 3 digits."""
+    global _dial_codes
+    if _dial_codes is None:
+        from .services import COVERAGE_DATA
+        _dial_codes = sorted({c['dial'].lstrip('+') for c in COVERAGE_DATA}, key=len, reverse=True)
+    for code in _dial_codes:
+        if digits.startswith(code):
+            return code, True
+    return digits[:3], False
+
+
+class FraudDetector:
+    """
+    Usage:
+        detector = FraudDetector()
+        risk = detector.assess('+2348031234567', 'sms', api_key_id=key.id, ip=ip)
+        if risk.blocked: ...
+    """
+
+    def __init__(self, limits: dict = None, window: float = FRAUD_WINDOW, slots: int = FRAUD_WINDOW_SLOTS,
+                 width: int = FRAUD_SKETCH_WIDTH, depth: int = FRAUD_SKETCH_DEPTH,
+                 flag_score: float = FRAUD_FLAG_SCORE, block_score: float = FRAUD_BLOCK_SCORE):
+        self.limits = limits or FRAUD_LIMITS
+        self.flag_score = flag_score
+        self.block_score = block_score
+        self._counters = {dimension: SlidingWindowCounter(window, slots, width, depth)
+                          for dimension in self.limits}
+        self._lock = threading.Lock()
+
+    def _keys(self, identifier: str, channel: str, api_key_id, ip) -> tuple:
+        keys = []
+        if api_key_id:
+            keys.append(('api_key', str(api_key_id)))
+        elif ip:
+            keys.append(('ip', ip))
+        listed = True
+        if channel != 'email':
+            digits = ''.join(filter(str.isdigit, identifier))
+            prefix, listed = dial_prefix(digits)
+            keys.append(('prefix', (str(api_key_id or ''), prefix)))  # one customer's burst never blocks another's
+            if not listed:
+                keys.append(('unlisted_prefix', str(api_key_id or ip)))
+            if len(digits) > FRAUD_RANGE_DIGITS + len(prefix):
+                keys.append(('number_range', digits[:-FRAUD_RANGE_DIGITS]))
+        return keys, listed
+
+    def assess(self, identifier: str, channel: str, api_key_id=None, ip: str = None,
+               now: float = None) -> RiskAssessment:
+        """Count this send attempt and score it."""
+        keys, listed = self._keys(identifier, channel, api_key_id, ip)
+        now = time.monotonic() if now is None else now
+        score, ratios = (0.0 if listed else FRAUD_UNLISTED_PREFIX_SCORE), []
+        with self._lock:
+            for dimension, key in keys:
+                counter = self._counters.get(dimension)
+                if counter is not None:
+                    ratios.append((dimension, counter.add(key, now) / self.limits[dimension]))
+        reasons = []
+        for dimension, ratio in ratios:
+            score = max(score, ratio)
+            if ratio >= self.flag_score or (dimension == 'unlisted_prefix' and not listed):
+                reasons.append(dimension)
+        if score > self.block_score:
+            action = RiskAssessment.BLOCK
+        elif score >= self.flag_score:
+            action = RiskAssessment.FLAG
+        else:
+            action = RiskAssessment.ALLOW
+        return RiskAssessment(action, score, tuple(reasons))
+
+
+fraud_detector = FraudDetector()
+_ALLOWED = RiskAssessment(RiskAssessment.ALLOW)
+
+
+def assess_send(identifier: str, channel: str, api_key_id=None, ip: str = None) -> RiskAssessment:
+    """Score an OTP send before it is queued; always allows when ``FRAUD_DETECTION`` is off."""
+    if not FRAUD_DETECTION:
+        return _ALLOWED
+    return fraud_detector.assess(identifier, channel, api_key_id, ip)
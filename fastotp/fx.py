@@ -0,0 +1,218 @@
+"""
+FastOTP FX Rates
+================
+Currency conversion for payment initiation and the coverage/pricing pages.
+
+Rates live in the ``FXRate`` table and are read through a short-TTL in-process
+snapshot, so converting an amount never costs more than one query per TTL and
+never a network call. Rates are refreshed out-of-band with
+``python manage.py refresh_fx_rates`` from a pluggable ``RateSource``.
+
+A rate fetched more than ``FX_MAX_AGE`` seconds ago is stale. Payments still
+charge the last stored rate, with a warning, and refuse to start when a
+currency has never been stored. The coverage page ignores stale rates and
+shows ``FX_FALLBACK_RATES`` or its static prices instead.
+"""
+import json
+import logging
+from datetime import timedelta
+from decimal import Decimal, ROUND_HALF_UP
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+FX_CACHE_TTL = getattr(settings, 'FX_CACHE_TTL', 300)
+FX_MAX_AGE = getattr(settings, 'FX_MAX_AGE', 48 * 3600)
+
+# Display only: coverage prices for currencies without a fresh stored rate. Never charged.
+FALLBACK_RATES = {
+    code: Decimal(str(rate))
+    for code, rate in getattr(settings, 'FX_FALLBACK_RATES', {'USD': '1', 'NGN': '1600'}).items()
+}
+
+# Currencies whose gateway amounts are not expressed in 1/100 units.
+ZERO_DECIMAL_CURRENCIES = {'UGX', 'RWF', 'XOF', 'XAF', 'TZS'}
+
+# How a price is written in each currency, '{}' being the amount; others get "<amount> <code>".
+PRICE_FORMATS = {
+    'NGN': '₦{}', 'USD': '${}', 'KES': 'KSh {}', 'ZAR': 'R {}', 'GHS': 'GH₵ {}', 'EGP': 'E£ {}',
+    'ETB': 'Br {}', 'TZS': 'TSh {}', 'ZMW': 'ZK {}', 'RWF': 'RF {}', 'MZN': 'MT {}', 'AOA': 'Kz {}',
+    'BWP': 'P {}', 'NAD': 'N$ {}', 'MWK': 'MK {}', 'SLE': 'Le {}',
+    'XOF': '{} CFA', 'XAF': '{} FCFA',
+}
+
+_rates_cache = TTLCache(maxsize=1, ttl=FX_CACHE_TTL)
+
+
+class FXRateUnavailable(Exception):
+    """Raised when a payment needs a currency that has no stored rate."""
+
+
+# ─────────────────────────────────────────────
+#  Rate Lookup
+# ─────────────────────────────────────────────
+
+def _stored_rates() -> dict:
+    """{currency_code: (Decimal rate per USD, fetched_at)}, loaded from the DB at most once per TTL."""
+    rows = _rates_cache.get('rates')
+    if rows is None:
+        from .models import FXRate
+        rows = {code: (rate, fetched_at)
+                for code, rate, fetched_at in FXRate.objects.values_list('currency_code', 'rate', 'fetched_at')}
+        _rates_cache.set('rates', rows)
+    return rows
+
+
+def _is_stale(fetched_at) -> bool:
+    return fetched_at < timezone.now() - timedelta(seconds=FX_MAX_AGE)
+
+
+def get_rates() -> dict:
+    """
+    Return {currency_code: Decimal rate per USD} for rates fetched within
+    ``FX_MAX_AGE``. For display; payments go through ``get_rate``.
+    """
+    rates, stale = {}, []
+    for code, (rate, fetched_at) in _stored_rates().items():
+        if _is_stale(fetched_at):
+            stale.append(code)
+        else:
+            rates[code] = rate
+    if stale:
+        logger.warning(f"Ignoring FX rates older than {FX_MAX_AGE}s for {', '.join(stale)}; "
+                       f"run refresh_fx_rates")
+    return rates
+
+
+def get_rate(currency: str) -> Decimal:
+    """
+    The rate a payment in ``currency`` is charged at: the last stored rate,
+    however old. Never the display-only ``FALLBACK_RATES``.
+    """
+    currency = currency.upper()
+    if currency == 'USD':
+        return Decimal('1')
+    stored = _stored_rates().get(currency)
+    if stored is None:
+        raise FXRateUnavailable(f'No stored FX rate for {currency}; run refresh_fx_rates')
+    rate, fetched_at = stored
+    if _is_stale(fetched_at):
+        logger.warning(f"Charging the {currency} rate fetched at {fetched_at:%Y-%m-%d %H:%M}, "
+                       f"older than {FX_MAX_AGE}s; run refresh_fx_rates")
+    return rate
+
+
+def invalidate_rates():
+    _rates_cache.clear()
+
+
+# ─────────────────────────────────────────────
+#  Conversion Helpers
+# ─────────────────────────────────────────────
+
+def usd_to_local(amount_usd, currency: str) -> Decimal:
+    """Convert a USD amount to ``currency`` exactly (no float round-trips)."""
+    return Decimal(str(amount_usd)) * get_rate(currency)
+
+
+def to_minor_units(amount, currency: str) -> int:
+    """Amount in the gateway's smallest unit (kobo, pesewas, cents), rounded half-up."""
+    exponent = 0 if currency.upper() in ZERO_DECIMAL_CURRENCIES else 2
+    return int((Decimal(str(amount)) * (10 ** exponent)).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+
+def round_significant(amount: Decimal, digits: int = 2) -> Decimal:
+    """Round to ``digits`` significant figures — per-OTP prices like 7.2 or 0.013."""
+    if not amount:
+        return Decimal('0')
+    return amount.quantize(Decimal(1).scaleb(amount.adjusted() - digits + 1), rounding=ROUND_HALF_UP)
+
+
+def format_price(amount, currency: str) -> str:
+    """``amount`` as written in ``currency``: ``format_price(Decimal('7.2'), 'NGN') == '₦7.2'``."""
+    shown = format(Decimal(str(amount)).normalize(), 'f')
+    return PRICE_FORMATS.get(currency.upper(), '{} ' + currency.upper()).format(shown)
+
+
+def localize_coverage(rows: list) -> list:
+    """
+    Return copies of COVERAGE_DATA rows with ``local_cost`` derived from the
+    current rates, or ``FALLBACK_RATES`` when a currency has no fresh rate.
+    Rows with neither keep their static value.
+    """
+    rates = {**FALLBACK_RATES, **get_rates()}
+    localized = []
+    for row in rows:
+        rate = rates.get(row['currency_code'])
+        if rate is None:
+            localized.append(row)
+            continue
+        local = round_significant(Decimal(str(row['cost'])) * rate)
+        if local >= 10:
+            local = local.quantize(Decimal('1'), rounding=ROUND_HALF_UP)
+        localized.append({
+            **row,
+            'local_cost': local,
+            'local_cost_display': format_price(local, row['currency_code']),
+        })
+    return localized
+
+
+# ─────────────────────────────────────────────
+#  Rate Sources
+# ─────────────────────────────────────────────
+
+class RateSource:
+    """Pluggable origin of FX rates. ``fetch`` returns {currency_code: Decimal}."""
+
+    name = 'base'
+
+    def fetch(self) -> dict:
+        raise NotImplementedError
+
+
+class FileRateSource(RateSource):
+    """
+    Reads rates from a JSON file, either flat ({"NGN": 1600}) or
+    wrapped ({"base": "USD", "rates": {"NGN": 1600}}).
+    """
+
+    name = 'file'
+
+    def __init__(self, path: str = None):
+        self.path = path or getattr(settings, 'FX_RATES_FILE', '')
+
+    def fetch(self) -> dict:
+        with open(self.path, encoding='utf-8') as fh:
+            data = json.load(fh, parse_float=Decimal, parse_int=Decimal)
+        if 'rates' in data:
+            if str(data.get('base', 'USD')).upper() != 'USD':
+                raise ValueError('FX rate file must be USD-based')
+            data = data['rates']
+        return {code.upper(): Decimal(rate) for code, rate in data.items()}
+
+
+def get_rate_source(dotted_path: str = None, **kwargs) -> RateSource:
+    path = dotted_path or getattr(settings, 'FX_RATE_SOURCE', 'fastotp.fx.FileRateSource')
+    return import_string(path)(**kwargs)
+
+
+def refresh_rates(source: RateSource) -> int:
+    """Persist every rate from ``source`` and drop this process's cached snapshot."""
+    from .models import FXRate
+    rates = source.fetch()
+    now = timezone.now()
+    with transaction.atomic():
+        for code, rate in rates.items():
+            FXRate.objects.update_or_create(
+                currency_code=code,
+                defaults={'rate': rate, 'source': source.name, 'fetched_at': now},
+            )
+    invalidate_rates()
+    logger.info(f"Refreshed {len(rates)} FX rates from {source.name}")
+    return len(rates)
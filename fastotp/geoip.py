@@ -0,0 +1,164 @@
+"""
+FastOTP GeoIP Database
+======================
+Reader for MaxMind DB (``.mmdb``) files — GeoLite2/GeoIP2 Country or City,
+DB-IP Lite and other databases in the same format — with no network access
+and no extra dependency.
+
+The file is memory-mapped, so opening it is instant, the OS page cache holds
+the hot part of the search tree, and every worker process on a host shares
+those pages. A lookup walks one tree node per address bit and decodes the
+record it lands on:
+
+    db = GeoIPDatabase('/srv/geoip/GeoLite2-City.mmdb')
+    db.lookup('102.89.32.1')   # {'country': {'iso_code': 'NG', 'names': {'en': 'Nigeria'}}, ...}
+
+Results are not cached here; ``fastotp.enrichment`` keeps an LRU of resolved
+addresses in front of it.
+"""
+import ipaddress
+import mmap
+import struct
+
+METADATA_MARKER = b'\xab\xcd\xefMaxMind.com'
+DATA_SECTION_SEPARATOR = 16  # zero bytes between the search tree and the data section
+
+
+class GeoIPError(Exception):
+    pass
+
+
+class _Decoder:
+    """Decodes the MaxMind DB data format from ``buffer``, pointers relative to ``pointer_base``."""
+
+    def __init__(self, buffer, pointer_base: int = 0):
+        self.buffer = buffer
+        self.pointer_base = pointer_base
+
+    def decode(self, offset: int):
+        """``(value, offset just past it)``."""
+        buffer = self.buffer
+        ctrl = buffer[offset]
+        offset += 1
+        kind = ctrl >> 5
+        if kind == 1:  # pointer: follow it, but carry on after the pointer itself
+            size_bits = (ctrl >> 3) & 0x3
+            if size_bits == 3:
+                target = int.from_bytes(buffer[offset:offset + 4], 'big')
+            else:
+                target = ((ctrl & 0x7) << (8 * (size_bits + 1))) | int.from_bytes(
+                    buffer[offset:offset + size_bits + 1], 'big')
+                target += (0, 2048, 526336)[size_bits]
+            value, _ = self.decode(self.pointer_base + target)
+            return value, offset + size_bits + 1
+        if kind == 0:  # extended type
+            kind = 7 + buffer[offset]
+            offset += 1
+        size = ctrl & 0x1f
+        if size >= 29:
+            extra = size - 28
+            size = (29, 285, 65821)[extra - 1] + int.from_bytes(buffer[offset:offset + extra], 'big')
+            offset += extra
+
+        if kind == 2:  # utf-8 string
+            return buffer[offset:offset + size].decode(), offset + size
+        if kind == 7:  # map
+            result = {}
+            for _ in range(size):
+                key, offset = self.decode(offset)
+                result[key], offset = self.decode(offset)
+            return result, offset
+        if kind in (5, 6, 9, 10):  # uint16/32/64/128
+            return int.from_bytes(buffer[offset:offset + size], 'big'), offset + size
+        if kind == 11:  # array
+            result = []
+            for _ in range(size):
+                value, offset = self.decode(offset)
+                result.append(value)
+            return result, offset
+        if kind == 3:
+            return struct.unpack('>d', buffer[offset:offset + 8])[0], offset + 8
+        if kind == 15:
+            return struct.unpack('>f', buffer[offset:offset + 4])[0], offset + 4
+        if kind == 8:  # int32
+            return int.from_bytes(buffer[offset:offset + size], 'big', signed=size == 4), offset + size
+        if kind == 14:  # boolean: the value is the size
+            return bool(size), offset
+        if kind == 4:
+            return bytes(buffer[offset:offset + size]), offset + size
+        raise GeoIPError(f'Unsupported MaxMind DB data type {kind} at offset {offset - 1}')
+
+
+class GeoIPDatabase:
+    """A memory-mapped ``.mmdb`` file. Thread-safe: lookups only read the map."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as fh:
+            self._map = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        start = self._map.rfind(METADATA_MARKER)
+        if start == -1:
+            self._map.close()
+            raise GeoIPError(f'{path} is not a MaxMind DB file')
+        metadata_start = start + len(METADATA_MARKER)
+        try:
+            self.metadata, _ = _Decoder(self._map, metadata_start).decode(metadata_start)
+            self.node_count = self.metadata['node_count']
+            self.record_size = self.metadata['record_size']
+            self.ip_version = self.metadata['ip_version']
+        except (IndexError, KeyError, TypeError, ValueError, struct.error):
+            self._map.close()
+            raise GeoIPError(f'{path} has unreadable metadata')
+        if self.record_size not in (24, 28, 32):
+            raise GeoIPError(f'Unsupported record size {self.record_size}')
+        self._node_bytes = self.record_size // 4
+        self._tree_size = self.node_count * self._node_bytes
+        self._decoder = _Decoder(self._map, self._tree_size + DATA_SECTION_SEPARATOR)
+        self._ipv4_start = self._find_ipv4_start()
+
+    def _record(self, node: int, bit: int) -> int:
+        offset = node * self._node_bytes
+        buffer = self._map
+        if self.record_size == 24:
+            offset += 3 * bit
+            return int.from_bytes(buffer[offset:offset + 3], 'big')
+        if self.record_size == 32:
+            offset += 4 * bit
+            return int.from_bytes(buffer[offset:offset + 4], 'big')
+        middle = buffer[offset + 3]
+        if bit:
+            return ((middle & 0x0f) << 24) | int.from_bytes(buffer[offset + 4:offset + 7], 'big')
+        return ((middle & 0xf0) << 20) | int.from_bytes(buffer[offset:offset + 3], 'big')
+
+    def _find_ipv4_start(self) -> int:
+        """Node for ``::/96`` in an IPv6 tree, where IPv4 addresses live."""
+        node = 0
+        if self.ip_version == 6:
+            for _ in range(96):
+                if node >= self.node_count:
+                    break
+                node = self._record(node, 0)
+        return node
+
+    def lookup(self, ip: str):
+        """The record for ``ip`` (a dict for GeoIP databases), or ``None`` if it has none."""
+        address = ipaddress.ip_address(ip)
+        if address.version == 6:
+            if self.ip_version == 4:
+                raise GeoIPError('IPv6 address looked up in an IPv4-only database')
+            node, bits = 0, 128
+        else:
+            node, bits = self._ipv4_start, 32
+        packed = int(address)
+        try:
+            for shift in range(bits - 1, -1, -1):
+                if node >= self.node_count:
+                    break
+                node = self._record(node, (packed >> shift) & 1)
+            if node <= self.node_count:  # == node_count: no data for this network
+                return None
+            return self._decoder.decode(self._tree_size + node - self.node_count)[0]
+        except (IndexError, RecursionError, UnicodeDecodeError, struct.error):
+            raise GeoIPError(f'Corrupt search tree or data section near {ip}')
+
+    def close(self):
+        self._map.close()
@@ -0,0 +1,32 @@
+"""
+FastOTP Password Hashers
+========================
+Django's hashers with their cost read from settings, so the work factor can be
+tuned per deployment without code changes. Algorithm names are unchanged:
+existing hashes keep verifying, and a hash made with another algorithm or cost
+is upgraded transparently on the user's next successful login.
+
+``PASSWORD_HASHER`` in settings picks the preferred one (scrypt | argon2 |
+pbkdf2). Argon2 needs the optional ``argon2-cffi`` package.
+"""
+from django.conf import settings
+from django.contrib.auth import hashers
+
+_scrypt = hashers.ScryptPasswordHasher
+_argon2 = hashers.Argon2PasswordHasher
+
+
+class TunedScryptPasswordHasher(hashers.ScryptPasswordHasher):
+    work_factor = getattr(settings, 'PASSWORD_SCRYPT_WORK_FACTOR', _scrypt.work_factor)  # N, power of two
+    block_size = getattr(settings, 'PASSWORD_SCRYPT_BLOCK_SIZE', _scrypt.block_size)     # r
+    parallelism = getattr(settings, 'PASSWORD_SCRYPT_PARALLELISM', _scrypt.parallelism)  # p
+
+
+class TunedArgon2PasswordHasher(hashers.Argon2PasswordHasher):
+    time_cost = getattr(settings, 'PASSWORD_ARGON2_TIME_COST', _argon2.time_cost)
+    memory_cost = getattr(settings, 'PASSWORD_ARGON2_MEMORY_COST', _argon2.memory_cost)  # KiB
+    parallelism = getattr(settings, 'PASSWORD_ARGON2_PARALLELISM', _argon2.parallelism)
+
+
+class TunedPBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    iterations = getattr(settings, 'PASSWORD_PBKDF2_ITERATIONS', hashers.PBKDF2PasswordHasher.iterations)
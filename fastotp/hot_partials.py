@@ -0,0 +1,113 @@
+"""
+FastOTP Hot Partials
+====================
+The HTMX fragments re-rendered on every poll or key action:
+
+    fastotp/partials/otp_log_rows.html     OTP log polling
+    fastotp/partials/credit_balance.html   balance polling
+    fastotp/partials/api_key_row.html      generate / revoke key
+
+With ``HOT_PARTIALS_ENGINE = 'jinja2'`` views render them with the Jinja2
+copies in ``jinja2/`` (``fastotp.jinja``); every other template, and these
+partials when included from full pages, stays on the Django engine.
+
+The two copies must render identical HTML. ``check_parity`` renders both over
+``parity_samples()`` and is registered as a system check, so
+``python manage.py check`` fails on any drift while Jinja2 is enabled.
+"""
+import re
+from django.conf import settings
+from django.core import checks
+from django.http import HttpResponse
+from django.shortcuts import render
+from django.template.loader import render_to_string
+
+HOT_PARTIALS_ENGINE = getattr(settings, 'HOT_PARTIALS_ENGINE', 'django')
+HOT_PARTIALS = (
+    'fastotp/partials/otp_log_rows.html',
+    'fastotp/partials/credit_balance.html',
+    'fastotp/partials/api_key_row.html',
+)
+JINJA2_ENGINE = 'jinja2'  # the ``NAME`` of the Jinja2 entry in ``TEMPLATES``
+
+
+def render_partial(request, template_name: str, context: dict) -> HttpResponse:
+    """``render`` that sends hot partials to the Jinja2 engine when it is enabled."""
+    if HOT_PARTIALS_ENGINE == 'jinja2' and template_name in HOT_PARTIALS:
+        return HttpResponse(render_to_string(template_name, context, request, using=JINJA2_ENGINE))
+    return render(request, template_name, context)
+
+
+# ─────────────────────────────────────────────
+#  Parity
+# ─────────────────────────────────────────────
+
+_CSRF_VALUE = re.compile(r'(name="csrfmiddlewaretoken" value=")[^"]*"')  # masked afresh on every render
+
+
+def parity_samples() -> list:
+    """``(template_name, context)`` pairs covering every branch of the hot partials."""
+    import uuid
+    from datetime import timedelta
+    from decimal import Decimal
+    from types import SimpleNamespace
+    from django.utils import timezone
+    from .models import APIKey, OTPLog
+
+    now = timezone.now()
+    logs = [OTPLog(identifier=f'+23480{i:08d}', channel=channel, status=status, country_name=country,
+                   latency_ms=latency, risk_score=risk, risk_reasons=reasons, created_at=now - timedelta(minutes=i))
+            for i, (channel, status, country, latency, risk, reasons) in enumerate([
+                ('whatsapp', 'delivered', 'Nigeria', 320, None, ''),
+                ('sms', 'verified', 'Kenya', 740, 10, ''),
+                ('voice', 'pending', '', None, 85, 'ip,number_range'),
+                ('email', 'sent', '', 1450, None, ''),
+                ('sms', 'failed', 'Ghana', None, None, ''),
+                ('whatsapp', 'blocked', '', None, 100, 'unlisted_prefix'),
+                ('sms', 'expired', 'Egypt', 0, None, ''),
+            ])]
+    logs.append(OTPLog(identifier='<b>"o\'brien"</b>@x.io & co', channel='email', status='sent',
+                       country_name='<i>', created_at=now))
+
+    def key(**fields):
+        api_key = APIKey(id=uuid.UUID(int=len(fields)), name='Prod <App>', **{'environment': 'live', **fields})
+        api_key.set_key('fotk_live_' + 'x' * 43)
+        return api_key
+
+    usage = {'requests': 42, 'credits': Decimal('0.18900'), 'bars': [0, 25, 100, 0, 50]}
+    active = key(total_requests=1234, last_used_at=now - timedelta(hours=3))
+    active.usage_24h = usage
+    return [
+        ('fastotp/partials/otp_log_rows.html', {'logs': logs}),
+        ('fastotp/partials/otp_log_rows.html', {'logs': []}),
+        ('fastotp/partials/credit_balance.html', {'balance': SimpleNamespace(balance=Decimal('12.3456'))}),
+        ('fastotp/partials/credit_balance.html', {'balance': SimpleNamespace(balance=Decimal('0'))}),
+        ('fastotp/partials/api_key_row.html', {'key': active}),
+        ('fastotp/partials/api_key_row.html', {'key': key(), 'show_full': True}),
+        ('fastotp/partials/api_key_row.html', {'key': key(environment='test', status='revoked')}),
+    ]
+
+
+def check_parity(request=None) -> list:
+    """``(template_name, django_html, jinja2_html)`` for every sample whose renders differ."""
+    from django.test import RequestFactory
+    request = request or RequestFactory().get('/')
+    mismatches = []
+    for template_name, context in parity_samples():
+        django_html, jinja_html = (
+            _CSRF_VALUE.sub(r'\1"', render_to_string(template_name, context, request, using=engine))
+            for engine in ('django', JINJA2_ENGINE)
+        )
+        if django_html != jinja_html:
+            mismatches.append((template_name, django_html, jinja_html))
+    return mismatches
+
+
+@checks.register(checks.Tags.templates)
+def hot_partials_parity(app_configs, **kwargs):
+    if HOT_PARTIALS_ENGINE != 'jinja2':
+        return []
+    return [checks.Error(f'{template_name} renders differently under Jinja2 and Django templates.',
+                         hint='Keep jinja2/ and templates/ copies of the hot partials in sync.',
+                         obj=template_name, id='fastotp.E001')
+            for template_name in dict.fromkeys(name for name, _, _ in check_parity())]
@@ -0,0 +1,322 @@
+"""
+FastOTP Latency Analytics
+=========================
+Delivery-latency percentiles from mergeable DDSketch-style quantile sketches.
+
+A sketch keeps counts in logarithmic buckets (``LATENCY_SKETCH_ACCURACY``
+relative error, ~1% by default), so any quantile of any union of sketches is
+answered from a few hundred integers instead of sorting raw ``OTPLog`` rows.
+
+Sketches are stored in hourly and daily ``LatencySketch`` rows, per scope (a
+user's traffic, or ``''`` for the whole platform) and dimension (all / country
+/ channel / api_key). A range query merges daily rows for whole days and
+hourly rows only for the partial days at either end. Deliveries are added to
+an in-process buffer and merged into the rows every ``LATENCY_FLUSH_INTERVAL``
+seconds by a short-lived background thread, so the delivery path never waits
+on the merge; whatever is left is flushed at process exit.
+"""
+import atexit
+import logging
+import math
+import threading
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+LATENCY_SKETCH_ACCURACY = getattr(settings, 'LATENCY_SKETCH_ACCURACY', 0.01)
+LATENCY_FLUSH_INTERVAL = getattr(settings, 'LATENCY_FLUSH_INTERVAL', 30)
+LATENCY_QUERY_CACHE_TTL = getattr(settings, 'LATENCY_QUERY_CACHE_TTL', 60)
+
+GLOBAL_SCOPE = ''
+DIMENSIONS = ('all', 'country', 'channel', 'api_key')
+
+
+class DDSketch:
+    """
+    Relative-error quantile sketch (Masson et al., VLDB 2019) for positive values.
+
+    Usage:
+        sketch = DDSketch()
+        sketch.add(412)
+        sketch.merge(other)
+        sketch.quantile(0.99)
+    """
+
+    __slots__ = ('gamma', '_log_gamma', 'bins', 'zeros', 'count', 'sum', 'min', 'max')
+
+    def __init__(self, accuracy: float = LATENCY_SKETCH_ACCURACY):
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins = {}
+        self.zeros = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float, count: int = 1):
+        if value <= 0:
+            self.zeros += count
+        else:
+            index = math.ceil(math.log(value) / self._log_gamma)
+            self.bins[index] = self.bins.get(index, 0) + count
+        self.count += count
+        self.sum += value * count
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other: 'DDSketch'):
+        if other.gamma != self.gamma:
+            raise ValueError('Cannot merge sketches with different accuracy')
+        for index, n in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + n
+        self.zeros += other.zeros
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float):
+        """Value at quantile ``q`` within the relative accuracy, or ``None`` when empty."""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > rank:
+                value = 2 * self.gamma ** index / (1 + self.gamma)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else None
+
+    def to_dict(self) -> dict:
+        return {'gamma': self.gamma, 'bins': {str(k): v for k, v in self.bins.items()},
+                'zeros': self.zeros, 'count': self.count, 'sum': self.sum,
+                'min': self.min if self.count else None, 'max': self.max if self.count else None}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'DDSketch':
+        sketch = cls()
+        if data.get('gamma') not in (None, sketch.gamma):
+            sketch.gamma = data['gamma']
+            sketch._log_gamma = math.log(sketch.gamma)
+        sketch.bins = {int(k): v for k, v in data.get('bins', {}).items()}
+        sketch.zeros = data.get('zeros', 0)
+        sketch.count = data.get('count', 0)
+        sketch.sum = data.get('sum', 0.0)
+        sketch.min = data['min'] if data.get('min') is not None else math.inf
+        sketch.max = data['max'] if data.get('max') is not None else -math.inf
+        return sketch
+
+
+def hour_bucket(at):
+    return at.replace(minute=0, second=0, microsecond=0)
+
+
+def day_bucket(at):
+    return at.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def sketch_keys(user_id, country_code: str, channel: str, api_key_id, at) -> list:
+    """Every (scope, resolution, bucket_start, dimension, value) one delivery contributes to."""
+    values = [('all', '')]
+    if country_code:
+        values.append(('country', country_code))
+    if channel:
+        values.append(('channel', channel))
+    user_scope = str(user_id)
+    keys = []
+    for resolution, bucket in (('hour', hour_bucket(at)), ('day', day_bucket(at))):
+        for scope in (GLOBAL_SCOPE, user_scope):
+            keys.extend((scope, resolution, bucket, dimension, value) for dimension, value in values)
+        if api_key_id:
+            keys.append((user_scope, resolution, bucket, 'api_key', str(api_key_id)))
+    return keys
+
+
+# ─────────────────────────────────────────────
+#  Recording
+# ─────────────────────────────────────────────
+
+class LatencyBuffer:
+    """Per-process sketches awaiting a merge into ``LatencySketch`` rows."""
+
+    def __init__(self, interval: float = LATENCY_FLUSH_INTERVAL):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = {}
+        self._last_flush = time.monotonic()
+
+    def record(self, latency_ms, user_id, country_code='', channel='', api_key_id=None, at=None):
+        keys = sketch_keys(user_id, country_code, channel, api_key_id, at or timezone.now())
+        with self._lock:
+            for key in keys:
+                sketch = self._pending.get(key)
+                if sketch is None:
+                    sketch = self._pending[key] = DDSketch()
+                sketch.add(latency_ms)
+            due = time.monotonic() - self._last_flush >= self.interval
+            if due:
+                self._last_flush = time.monotonic()  # one flusher per interval
+        if due:
+            threading.Thread(target=self._flush_in_background, name='latency-flush', daemon=True).start()
+
+    def _flush_in_background(self):
+        from django.db import connections
+        try:
+            self.flush()
+        finally:
+            connections.close_all()  # this thread's connections only
+
+    def add_sketches(self, sketches: dict):
+        """Merge pre-built ``{key: DDSketch}`` (e.g. from a backfill) into the buffer."""
+        with self._lock:
+            for key, sketch in sketches.items():
+                if key in self._pending:
+                    self._pending[key].merge(sketch)
+                else:
+                    self._pending[key] = sketch
+
+    def flush(self) -> int:
+        """Merge buffered sketches into the database. Returns rows written (0 on failure)."""
+        if not self._flush_lock.acquire(blocking=False):
+            return 0
+        try:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                self._last_flush = time.monotonic()
+            if not pending:
+                return 0
+            try:
+                write_sketches(pending)
+            except Exception as e:
+                logger.error(f"Latency sketch flush failed, re-queued {len(pending)} sketches: {e}")
+                self.add_sketches(pending)
+                return 0
+            return len(pending)
+        finally:
+            self._flush_lock.release()
+
+
+def write_sketches(pending: dict):
+    """Merge each pending sketch into its bucket row under a row lock."""
+    from .models import LatencySketch
+    for (scope, resolution, bucket_start, dimension, value), sketch in pending.items():
+        lookup = {'scope': scope, 'resolution': resolution, 'bucket_start': bucket_start,
+                  'dimension': dimension, 'value': value}
+        for attempt in range(2):
+            try:
+                with transaction.atomic():
+                    row = LatencySketch.objects.select_for_update().filter(**lookup).first()
+                    if row is None:
+                        LatencySketch.objects.create(**lookup, count=sketch.count, sketch=sketch.to_dict())
+                    else:
+                        merged = DDSketch.from_dict(row.sketch)
+                        merged.merge(sketch)
+                        row.count, row.sketch = merged.count, merged.to_dict()
+                        row.save(update_fields=['count', 'sketch'])
+                break
+            except IntegrityError:
+                if attempt:  # a concurrent flush created the row twice in a row; give up on this key
+                    raise
+
+
+latency_buffer = LatencyBuffer()
+atexit.register(latency_buffer.flush)
+
+
+def record_latency(latency_ms, user_id, country_code='', channel='', api_key_id=None, at=None):
+    """Add one delivery's latency to the sketches; cheap enough for the delivery path."""
+    if latency_ms is not None:
+        latency_buffer.record(latency_ms, user_id, country_code, channel, api_key_id, at)
+
+
+# ─────────────────────────────────────────────
+#  Queries
+# ─────────────────────────────────────────────
+
+_query_cache = TTLCache(maxsize=2048, ttl=LATENCY_QUERY_CACHE_TTL)
+
+
+def latency_percentiles(scope: str = GLOBAL_SCOPE, dimension: str = 'all', start=None, end=None,
+                        quantiles=(0.5, 0.95, 0.99)) -> dict:
+    """
+    ``{value: {'count', 'p50', 'p95', 'p99', ...}}`` for ``dimension`` within
+    ``scope`` over [start, end), merged from daily/hourly sketches, both ends
+    widened to whole hours. Defaults to the last 7 days. Results are cached for ``LATENCY_QUERY_CACHE_TTL`` seconds.
+    """
+    from django.db.models import Q
+    from .models import LatencySketch
+    if dimension not in DIMENSIONS:
+        raise ValueError(f'Unknown latency dimension: {dimension!r}')
+    end = end or timezone.now()
+    start = hour_bucket(start or end - timedelta(days=7))
+    if end != hour_bucket(end):  # the hour in progress counts, so round up to whole hours
+        end = hour_bucket(end) + timedelta(hours=1)
+    cache_key = (scope, dimension, start, end, tuple(quantiles))
+    cached = _query_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    first_day = day_bucket(start) if start == day_bucket(start) else day_bucket(start) + timedelta(days=1)
+    last_day = day_bucket(end)
+    if first_day < last_day:
+        buckets = (Q(resolution='day', bucket_start__gte=first_day, bucket_start__lt=last_day)
+                   | Q(resolution='hour', bucket_start__gte=start, bucket_start__lt=first_day)
+                   | Q(resolution='hour', bucket_start__gte=last_day, bucket_start__lt=end))
+    else:
+        buckets = Q(resolution='hour', bucket_start__gte=start, bucket_start__lt=end)
+    merged = {}
+    rows = (LatencySketch.objects.filter(buckets, scope=scope, dimension=dimension)
+            .values_list('value', 'sketch'))
+    for value, data in rows.iterator():
+        sketch = DDSketch.from_dict(data)
+        if value in merged:
+            merged[value].merge(sketch)
+        else:
+            merged[value] = sketch
+
+    result = {}
+    for value, sketch in merged.items():
+        entry = {'count': sketch.count, 'mean': round(sketch.mean) if sketch.count else None}
+        for q in quantiles:
+            p = sketch.quantile(q)
+            entry[f'p{round(q * 100):g}'] = round(p) if p is not None else None
+        result[value] = entry
+    _query_cache.set(cache_key, result)
+    return result
+
+
+def compact_count(n: int) -> str:
+    """12_400_000 → '12.4M+', 8_250 → '8.2K+'."""
+    for size, suffix in ((1_000_000_000, 'B'), (1_000_000, 'M'), (1_000, 'K')):
+        if n >= size:
+            return f'{math.floor(n / size * 10) / 10:g}{suffix}+'
+    return str(n)
+
+
+def public_stats() -> dict:
+    """Platform-wide figures for the marketing pages, from the global sketches."""
+    from django.db.models import Sum
+    from .models import LatencySketch
+    stats = _query_cache.get('public_stats')
+    if stats is None:
+        recent = latency_percentiles(GLOBAL_SCOPE, 'all').get('', {})
+        total = (LatencySketch.objects.filter(scope=GLOBAL_SCOPE, resolution='day', dimension='all')
+                 .aggregate(n=Sum('count'))['n'] or 0)
+        stats = {'delivered': total, 'p50_latency': recent.get('p50'), 'p95_latency': recent.get('p95')}
+        _query_cache.set('public_stats', stats)
+    return stats
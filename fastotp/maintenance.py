@@ -0,0 +1,182 @@
+"""
+FastOTP Maintenance Sweeper
+===========================
+Deletes or closes out the rows the app leaves behind: expired signup OTP
+hashes, signups that never verified, expired ``django_session`` rows, old
+``LoginSession`` rows, ``OTPLog`` rows stuck in ``pending``/``sent`` and
+settled webhook outbox rows.
+
+Every task works in primary-key batches of ``SWEEP_BATCH_SIZE``, one short
+transaction per batch and a ``SWEEP_PAUSE`` sleep between batches, so it never
+holds long locks. Tasks on sharded tables run on every shard at once
+(``sharding.fan_out``). Run it with ``python manage.py sweep`` (cron) or let
+each worker run it every ``SWEEP_INTERVAL`` seconds in a background thread.
+"""
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .sharding import fan_out, is_sharded, owned_rows
+
+logger = logging.getLogger(__name__)
+
+SWEEP_BATCH_SIZE = getattr(settings, 'SWEEP_BATCH_SIZE', 500)
+SWEEP_PAUSE = getattr(settings, 'SWEEP_PAUSE', 0.05)
+SWEEP_INTERVAL = getattr(settings, 'SWEEP_INTERVAL', 0)
+SIGNUP_ABANDON_AFTER = timedelta(hours=getattr(settings, 'SIGNUP_ABANDON_AFTER_HOURS', 48))
+LOGIN_SESSION_RETENTION = timedelta(days=getattr(settings, 'LOGIN_SESSION_RETENTION_DAYS', 30))
+WEBHOOK_EVENT_RETENTION = timedelta(days=getattr(settings, 'WEBHOOK_EVENT_RETENTION_DAYS', 7))
+
+TASKS = {}
+
+
+def task(name: str):
+    """Register ``func(now) -> (queryset, apply)`` as a sweep task."""
+    def register(func):
+        TASKS[name] = func
+        return func
+    return register
+
+
+@dataclass(frozen=True)
+class SweepResult:
+    task: str
+    rows: int
+    seconds: float
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+def sweep_in_batches(queryset, apply, batch_size: int = SWEEP_BATCH_SIZE, pause: float = SWEEP_PAUSE,
+                     deadline: float = None) -> int:
+    """
+    Apply ``apply(batch_queryset) -> rows`` to ``queryset`` one PK batch at a
+    time. Each batch re-applies the task's filter, so rows that changed since
+    they were selected are left alone.
+    """
+    total = 0
+    while deadline is None or time.monotonic() < deadline:
+        pks = list(queryset.order_by().values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            break
+        with transaction.atomic(using=queryset.db):
+            total += apply(queryset.filter(pk__in=pks))
+        if len(pks) < batch_size:
+            break
+        time.sleep(pause)
+    return total
+
+
+def _delete(qs) -> int:
+    return qs.delete()[1].get(qs.model._meta.label, 0)
+
+
+# ─────────────────────────────────────────────
+#  Tasks
+# ─────────────────────────────────────────────
+
+@task('verification_otps')
+def expired_verification_otps(now):
+    from .models import User
+    queryset = User.objects.filter(otp_expires_at__lt=now).exclude(verification_otp='')
+    return queryset, lambda qs: qs.update(verification_otp='', otp_expires_at=None)
+
+
+@task('abandoned_signups')
+def abandoned_signups(now):
+    """Accounts created at signup step 1 that never verified (cascades to their balance/logs)."""
+    from .models import User
+    queryset = User.objects.filter(is_active=False, is_verified=False, last_login__isnull=True,
+                                   created_at__lt=now - SIGNUP_ABANDON_AFTER)
+    return queryset, _delete
+
+
+@task('django_sessions')
+def expired_sessions(now):
+    from django.contrib.sessions.models import Session
+    return Session.objects.filter(expire_date__lt=now), _delete
+
+
+@task('login_sessions')
+def stale_login_sessions(now):
+    from .models import LoginSession
+    return LoginSession.objects.filter(last_active__lt=now - LOGIN_SESSION_RETENTION), _delete
+
+
+@task('otp_logs')
+def expired_otp_logs(now):
+    """Open OTPs past ``expires_at`` become ``expired`` (with webhooks); the rows are kept for history."""
+    from .models import OTPLog
+    from .services import change_otp_status
+    queryset = OTPLog.objects.filter(status__in=OTPLog.OPEN_STATUSES, expires_at__lt=now)
+    return queryset, lambda qs: len(change_otp_status(qs, 'expired'))
+
+
+@task('webhook_events')
+def settled_webhook_events(now):
+    """Delivered or failed outbox rows older than ``WEBHOOK_EVENT_RETENTION_DAYS``."""
+    from .models import WebhookEvent
+    queryset = WebhookEvent.objects.filter(status__in=['delivered', 'failed'],
+                                           created_at__lt=now - WEBHOOK_EVENT_RETENTION)
+    return queryset, _delete
+
+
+def run_sweep(tasks=None, batch_size: int = SWEEP_BATCH_SIZE, pause: float = SWEEP_PAUSE,
+              max_seconds: float = None) -> list:
+    """Run the named tasks (default: all) and return a ``SweepResult`` per task."""
+    deadline = time.monotonic() + max_seconds if max_seconds else None
+    now = timezone.now()
+    results = []
+    for name in tasks or TASKS:
+        queryset, apply = TASKS[name](now)
+        start = time.perf_counter()
+        if is_sharded(queryset.model):
+            rows = sum(fan_out(lambda alias: sweep_in_batches(
+                owned_rows(queryset.using(alias), alias), apply, batch_size, pause, deadline)).values())
+        else:
+            rows = sweep_in_batches(queryset, apply, batch_size, pause, deadline)
+        results.append(SweepResult(name, rows, time.perf_counter() - start))
+    return results
+
+
+# ─────────────────────────────────────────────
+#  In-process Schedule
+# ─────────────────────────────────────────────
+
+_schedule_lock = threading.Lock()
+_next_run = time.monotonic() + SWEEP_INTERVAL
+
+
+def _sweep_in_background():
+    try:
+        for result in run_sweep(max_seconds=max(SWEEP_INTERVAL / 10, 5)):
+            if result.rows:
+                logger.info(f"Sweep {result.task}: {result.rows} rows "
+                            f"({result.rows_per_second:.0f} rows/s)")
+    except Exception:
+        logger.exception("Scheduled sweep failed")
+    finally:
+        connections.close_all()  # this thread's connections only
+        _schedule_lock.release()
+
+
+def maybe_schedule_sweep():
+    """
+    Start a background sweep if ``SWEEP_INTERVAL`` seconds have passed in this
+    process and none is running. Called at the end of each request; a no-op
+    when ``SWEEP_INTERVAL`` is 0.
+    """
+    global _next_run
+    if not SWEEP_INTERVAL or time.monotonic() < _next_run:
+        return
+    if not _schedule_lock.acquire(blocking=False):
+        return
+    _next_run = time.monotonic() + SWEEP_INTERVAL
+    threading.Thread(target=_sweep_in_background, name='fastotp-sweep', daemon=True).start()
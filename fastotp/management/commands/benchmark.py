@@ -0,0 +1,43 @@
+import json
+import platform
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from fastotp.bench import SCENARIOS, isolated_database
+
+
+class Command(BaseCommand):
+    help = 'Run FastOTP benchmark scenarios against a throwaway database and emit JSON results.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenarios', nargs='*', help=f'Scenarios to run (default: all). Choices: {", ".join(sorted(SCENARIOS))}')
+        parser.add_argument('--size', type=int, default=None, help='Dataset size passed to each scenario.')
+        parser.add_argument('--iterations', type=int, default=None, help='Timed iterations per measurement.')
+        parser.add_argument('--output', default='', help='Write JSON results to this file instead of stdout.')
+
+    def handle(self, *args, **options):
+        names = options['scenarios'] or sorted(SCENARIOS)
+        unknown = set(names) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f'Unknown scenario(s): {", ".join(sorted(unknown))}')
+
+        kwargs = {k: options[k] for k in ('size', 'iterations') if options[k] is not None}
+        report = {
+            'generated_at': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'results': {},
+        }
+        for name in names:
+            self.stderr.write(f'Running {name}…')
+            with isolated_database():
+                report['results'][name] = SCENARIOS[name](**kwargs)
+
+        output = json.dumps(report, indent=2, default=str)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as fh:
+                fh.write(output + '\n')
+            self.stderr.write(self.style.SUCCESS(f'Wrote {options["output"]}'))
+        else:
+            self.stdout.write(output)
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from fastotp.webhooks import WEBHOOK_POLL_INTERVAL, webhook_dispatcher
+
+
+class Command(BaseCommand):
+    help = 'Deliver due webhook events from the outbox (run from cron with --once, or as a long-running worker).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Drain what is due now, then exit.')
+        parser.add_argument('--interval', type=float, default=WEBHOOK_POLL_INTERVAL,
+                            help='Seconds between polls when running continuously.')
+
+    def handle(self, *args, **opts):
+        try:
+            while True:
+                result = webhook_dispatcher.drain()
+                if result.claimed or opts['once']:
+                    self.stdout.write(f'{result.claimed:,} events in {result.requests:,} requests: '
+                                      f'{result.delivered:,} delivered, {result.retrying:,} retrying, '
+                                      f'{result.failed:,} failed')
+                if opts['once']:
+                    return
+                time.sleep(opts['interval'])
+        finally:
+            webhook_dispatcher.close()
@@ -0,0 +1,62 @@
+import random
+import time
+from django.core.management.base import BaseCommand
+
+from fastotp.datagen import (
+    bulk_load, explicit_timestamps, generate_api_keys, generate_balances,
+    generate_otp_logs, generate_transactions, generate_users,
+)
+from fastotp.models import APIKey, CreditBalance, OTPLog, Transaction, User
+
+
+class Command(BaseCommand):
+    help = ('Generate a deterministic synthetic dataset (users, API keys, balances, '
+            'transactions, OTP logs) with chunked bulk inserts.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1_000)
+        parser.add_argument('--otp-logs', type=int, default=100_000)
+        parser.add_argument('--keys-per-user', type=int, default=2)
+        parser.add_argument('--transactions-per-user', type=int, default=5)
+        parser.add_argument('--days', type=int, default=30, help='Spread OTP logs over this many days.')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--chunk-size', type=int, default=10_000)
+        parser.add_argument('--prefix', default='load', help='Username prefix (keep unique per run).')
+
+    def _load(self, label, model, rows, chunk_size):
+        start = time.perf_counter()
+        written = bulk_load(model, rows, chunk_size)
+        elapsed = time.perf_counter() - start
+        rate = written / elapsed if elapsed else 0
+        self.stdout.write(f'{label:<14} {written:>12,} rows  {elapsed:8.1f}s  {rate:>10,.0f} rows/s')
+
+    def handle(self, *args, **opts):
+        rng = random.Random(opts['seed'])
+        chunk = opts['chunk_size']
+
+        user_ids = []
+
+        def users():
+            for user in generate_users(rng, opts['users'], opts['prefix']):
+                user_ids.append(user.id)
+                yield user
+
+        with explicit_timestamps(User, APIKey, Transaction, OTPLog):
+            self._load('users', User, users(), chunk)
+            self._load('balances', CreditBalance, generate_balances(rng, user_ids), chunk)
+
+            live_keys = {}
+
+            def keys():
+                for key in generate_api_keys(rng, user_ids, opts['keys_per_user']):
+                    if key.environment == 'live':
+                        live_keys[key.user_id] = key.id
+                    yield key
+
+            self._load('api_keys', APIKey, keys(), chunk)
+            self._load('transactions', Transaction,
+                       generate_transactions(rng, user_ids, opts['transactions_per_user']), chunk)
+            self._load('otp_logs', OTPLog,
+                       generate_otp_logs(rng, user_ids, opts['otp_logs'], live_keys, opts['days']), chunk)
+
+        self.stdout.write(self.style.SUCCESS('Done.'))
@@ -0,0 +1,91 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter: import the WSGI entry point, then serve one request.
+_PROBE = r'''
+import io, json, os, sys, time, importlib
+t0 = time.perf_counter()
+os.environ['DJANGO_SETTINGS_MODULE'] = sys.argv[1]
+module = importlib.import_module(sys.argv[2])
+t1 = time.perf_counter()
+status = []
+environ = {
+    'REQUEST_METHOD': 'GET', 'PATH_INFO': sys.argv[3], 'QUERY_STRING': '',
+    'SERVER_NAME': 'localhost', 'SERVER_PORT': '443', 'HTTP_HOST': 'localhost',
+    'SERVER_PROTOCOL': 'HTTP/1.1', 'wsgi.version': (1, 0), 'wsgi.url_scheme': 'https',
+    'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr,
+    'wsgi.multithread': False, 'wsgi.multiprocess': False, 'wsgi.run_once': True,
+}
+b''.join(module.application(environ, lambda s, h, exc_info=None: status.append(s)))
+t2 = time.perf_counter()
+print(json.dumps({'import_ms': (t1 - t0) * 1000, 'first_request_ms': (t2 - t1) * 1000, 'status': status[0]}))
+'''
+
+
+class Command(BaseCommand):
+    help = ('Measure serverless cold start: import-time breakdown and time-to-first-response '
+            'of the WSGI entry point in fresh interpreters. Fails when over --budget-ms.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--settings-module', default=os.environ.get('DJANGO_SETTINGS_MODULE', settings.SETTINGS_MODULE))
+        parser.add_argument('--wsgi-module', default='vercel_wsgi')
+        parser.add_argument('--path', default='/', help='Path of the first request.')
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--top', type=int, default=15, help='Slowest modules to list.')
+        parser.add_argument('--budget-ms', type=float, default=None,
+                            help='Fail if median time-to-first-response exceeds this.')
+
+    def _probe(self, opts, importtime=False):
+        cmd = [sys.executable] + (['-X', 'importtime'] if importtime else []) + [
+            '-c', _PROBE, opts['settings_module'], opts['wsgi_module'], opts['path']]
+        start = time.perf_counter()
+        proc = subprocess.run(cmd, capture_output=True, text=True, cwd=settings.BASE_DIR)
+        wall_ms = (time.perf_counter() - start) * 1000
+        if proc.returncode != 0:
+            raise CommandError(f'Startup probe failed:\n{proc.stderr[-2000:]}')
+        return {**json.loads(proc.stdout.strip().splitlines()[-1]), 'process_ms': wall_ms}, proc.stderr
+
+    @staticmethod
+    def _import_breakdown(stderr: str, top: int) -> dict:
+        by_package, modules = defaultdict(int), []
+        for line in stderr.splitlines():
+            if not line.startswith('import time:') or 'self [us]' in line:
+                continue
+            self_us, cumulative_us, name = (part.strip() for part in line[len('import time:'):].split('|'))
+            modules.append((int(cumulative_us), name))
+            by_package[name.split('.')[0]] += int(self_us)
+        return {
+            'by_package_ms': {pkg: round(us / 1000, 2) for pkg, us in
+                              sorted(by_package.items(), key=lambda kv: -kv[1])[:top]},
+            'slowest_modules_ms': {name: round(us / 1000, 2) for us, name in sorted(modules, reverse=True)[:top]},
+        }
+
+    def handle(self, *args, **opts):
+        runs = [self._probe(opts)[0] for _ in range(opts['runs'])]
+        _, importtime_log = self._probe(opts, importtime=True)
+
+        def median(key):
+            return round(statistics.median(r[key] for r in runs), 2)
+
+        report = {
+            'settings': opts['settings_module'],
+            'path': opts['path'],
+            'status': runs[0]['status'],
+            'runs': len(runs),
+            'import_ms': median('import_ms'),
+            'first_request_ms': median('first_request_ms'),
+            'time_to_first_response_ms': median('process_ms'),
+            **self._import_breakdown(importtime_log, opts['top']),
+        }
+        self.stdout.write(json.dumps(report, indent=2))
+
+        budget = opts['budget_ms']
+        if budget is not None and report['time_to_first_response_ms'] > budget:
+            raise CommandError(f"Cold start {report['time_to_first_response_ms']}ms exceeds budget {budget}ms")
@@ -0,0 +1,74 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from fastotp.admin import estimated_row_count
+from fastotp.models import CreditBalance, OTPLog, Transaction, User
+from fastotp.sharding import (SHARD_MOVE_BATCH_SIZE, ShardMoveError, fan_out, misplaced_tenants, move_tenants,
+                              pin_tenants, placements, ring)
+
+
+class Command(BaseCommand):
+    help = ('Move tenants between DATABASE_SHARDS online. With no options, moves every tenant pinned off '
+            'its ring shard (after --pin and a deploy) or left mid-move.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--status', action='store_true', help='Show estimated rows and placements per shard.')
+        parser.add_argument('--pin', default=None, metavar='ALIASES',
+                            help='Before deploying a new DATABASE_SHARDS (comma-separated aliases): pin every '
+                                 'tenant it would re-home to its current shard.')
+        parser.add_argument('--tenant', default=None, help='Move one tenant (user id or email) ...')
+        parser.add_argument('--to', default=None, metavar='ALIAS', help='... to this shard.')
+        parser.add_argument('--group-size', type=int, default=50, help='Tenants moved per freeze window.')
+        parser.add_argument('--batch-size', type=int, default=SHARD_MOVE_BATCH_SIZE)
+        parser.add_argument('--settle', type=float, default=None,
+                            help='Seconds for a placement change to reach every worker '
+                                 '(default: SHARD_PLACEMENT_TTL + SHARD_MOVE_GRACE).')
+
+    def handle(self, *args, **opts):
+        if opts['status']:
+            return self.status()
+        if opts['pin']:
+            pinned = pin_tenants([alias.strip() for alias in opts['pin'].split(',') if alias.strip()],
+                                 opts['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Pinned {pinned:,} tenants to their current shard.'))
+            return
+
+        if opts['tenant'] or opts['to']:
+            if not (opts['tenant'] and opts['to']):
+                raise CommandError('--tenant and --to go together.')
+            lookup = {'email__iexact': opts['tenant']} if '@' in opts['tenant'] else {'pk': opts['tenant']}
+            try:
+                user_id = User.objects.values_list('pk', flat=True).get(**lookup)
+            except (User.DoesNotExist, ValidationError):
+                raise CommandError(f"No user {opts['tenant']}.")
+            moves = [{user_id: opts['to']}]
+        else:
+            pending = list(misplaced_tenants().items())
+            size = max(opts['group_size'], 1)
+            moves = [dict(pending[i:i + size]) for i in range(0, len(pending), size)]
+
+        moved = rows = 0
+        for group in moves:
+            try:
+                results = move_tenants(group, opts['batch_size'], opts['settle'])
+            except ShardMoveError as exc:
+                raise CommandError(str(exc))
+            for r in results:
+                if r.moved:
+                    self.stdout.write(f'{r.user_id}  {r.source} -> {r.target}  {r.rows:>10,} rows  '
+                                      f'{r.synced:>6,} synced  {r.frozen_seconds:6.2f}s frozen')
+                    moved += 1
+                    rows += r.rows
+        self.stdout.write(self.style.SUCCESS(f'Moved {moved:,} tenants ({rows:,} rows).'))
+
+    def status(self):
+        counts = fan_out(lambda alias: [estimated_row_count(model, alias)
+                                        for model in (OTPLog, Transaction, CreditBalance)])
+        pinned = {}
+        for placement in placements().values():
+            pinned[placement.shard] = pinned.get(placement.shard, 0) + 1
+        self.stdout.write(f"{'shard':<12} {'otp logs':>12} {'transactions':>13} {'balances':>10} {'pinned':>8}")
+        for alias in ring.aliases:
+            logs, transactions, balances = ('?' if n is None else f'~{n:,}' for n in counts[alias])
+            self.stdout.write(f'{alias:<12} {logs:>12} {transactions:>13} {balances:>10} {pinned.get(alias, 0):>8,}')
+        self.stdout.write(f'{len(misplaced_tenants()):,} tenants waiting to move.')
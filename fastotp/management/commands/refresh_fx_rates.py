@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from fastotp.fx import get_rate_source, refresh_rates
+
+
+class Command(BaseCommand):
+    help = 'Refresh stored FX rates (units per USD) from the configured rate source.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', default=None,
+                            help='Dotted path to a RateSource class (default: settings.FX_RATE_SOURCE).')
+        parser.add_argument('--file', default=None,
+                            help='JSON rates file for fastotp.fx.FileRateSource.')
+
+    def handle(self, *args, **options):
+        kwargs = {'path': options['file']} if options['file'] else {}
+        try:
+            source = get_rate_source(options['source'], **kwargs)
+            count = refresh_rates(source)
+        except (OSError, ValueError, NotImplementedError) as exc:
+            raise CommandError(f'FX refresh failed: {exc}')
+        self.stdout.write(self.style.SUCCESS(f'Updated {count} FX rates from {source.name}.'))
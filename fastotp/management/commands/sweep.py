@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from fastotp.maintenance import SWEEP_BATCH_SIZE, SWEEP_PAUSE, TASKS, run_sweep
+
+
+class Command(BaseCommand):
+    help = ('Delete or expire stale rows (signup OTPs, abandoned signups, sessions, '
+            'login sessions, open OTP logs, webhook events) in small throttled batches.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('tasks', nargs='*', help=f"Tasks to run (default: all): {', '.join(TASKS)}")
+        parser.add_argument('--batch-size', type=int, default=SWEEP_BATCH_SIZE)
+        parser.add_argument('--pause', type=float, default=SWEEP_PAUSE, help='Seconds to sleep between batches.')
+        parser.add_argument('--max-seconds', type=float, default=None, help='Stop starting new batches after this long.')
+
+    def handle(self, *args, **opts):
+        unknown = set(opts['tasks']) - set(TASKS)
+        if unknown:
+            raise CommandError(f"Unknown task(s): {', '.join(sorted(unknown))}. Choose from: {', '.join(TASKS)}")
+
+        results = run_sweep(opts['tasks'], opts['batch_size'], opts['pause'], opts['max_seconds'])
+        for r in results:
+            self.stdout.write(f'{r.task:<18} {r.rows:>10,} rows  {r.seconds:8.2f}s  {r.rows_per_second:>10,.0f} rows/s')
+        total = sum(r.rows for r in results)
+        self.stdout.write(self.style.SUCCESS(f'Swept {total:,} rows.'))
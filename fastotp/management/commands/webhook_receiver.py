@@ -0,0 +1,32 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from fastotp.webhooks import LocalReceiver
+
+
+class Command(BaseCommand):
+    help = 'Run a local webhook receiver that checks signatures and prints each event batch.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--port', type=int, default=8787)
+        parser.add_argument('--secret', default='', help="The endpoint's whsec_ secret; unsigned/invalid requests get 401.")
+        parser.add_argument('--fail-rate', type=float, default=0.0, help='Share of requests answered 503, to exercise retries.')
+
+    def handle(self, *args, **opts):
+        def show(batch):
+            for event in batch:
+                self.stdout.write(f"{event['type']:<14} {event['id']}  {json.dumps(event['data'])}")
+
+        receiver = LocalReceiver(opts['secret'], opts['port'], opts['fail_rate'], on_batch=show).start()
+        self.stdout.write(f'Listening on {receiver.url} (Ctrl+C to stop). Set DEBUG=True to register http:// URLs.')
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            receiver.stop()
+            self.stdout.write(f'{receiver.requests} requests, {len(receiver.events)} events, '
+                              f'{receiver.rejected} rejected signatures')
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.15 on 2026-10-19 02:26
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fastotp', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FXRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency_code', models.CharField(max_length=3, unique=True)),
+                ('rate', models.DecimalField(decimal_places=6, max_digits=18)),
+                ('source', models.CharField(blank=True, max_length=50)),
+                ('fetched_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['currency_code'],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.15 on 2026-10-19 02:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fastotp', '0003_transaction_user_created_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='APIKeyUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('requests', models.PositiveIntegerField(default=0)),
+                ('credits', models.DecimalField(decimal_places=4, default=0, max_digits=12)),
+                ('api_key', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hourly_usage', to='fastotp.apikey')),
+            ],
+            options={
+                'ordering': ['-hour'],
+                'constraints': [models.UniqueConstraint(fields=('api_key', 'hour'), name='apikey_usage_hour_uniq')],
+            },
+        ),
+    ]
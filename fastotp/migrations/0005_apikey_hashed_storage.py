@@ -0,0 +1,47 @@
+# Generated by Django 5.1.15 on 2026-10-19 02:45
+
+import hashlib
+import hmac
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def hash_existing_keys(apps, schema_editor):
+    # Mirrors fastotp.apikeys.hash_key / lookup_for at the time of writing.
+    APIKey = apps.get_model('fastotp', 'APIKey')
+    secret = (getattr(settings, 'API_KEY_HASH_SECRET', '') or settings.SECRET_KEY).encode()
+    keys = APIKey.objects.using(schema_editor.connection.alias)
+    for api_key in keys.filter(key_hash='').only('id', 'key').iterator():
+        raw = api_key.key
+        keys.filter(pk=api_key.pk).update(
+            lookup=raw[:22],
+            key_hash=hmac.new(secret, raw.encode(), hashlib.sha256).hexdigest(),
+            prefix=raw[:12] + '...',
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fastotp', '0004_apikeyusage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='apikey',
+            name='key_hash',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='apikey',
+            name='lookup',
+            field=models.CharField(blank=True, db_index=True, max_length=24),
+        ),
+        migrations.AlterField(
+            model_name='apikey',
+            name='prefix',
+            field=models.CharField(blank=True, max_length=16),
+        ),
+        migrations.RunPython(hash_existing_keys, migrations.RunPython.noop),
+    ]
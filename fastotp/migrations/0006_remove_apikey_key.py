@@ -0,0 +1,27 @@
+# Generated by Django 5.1.15 on 2026-10-19 02:45
+
+from django.db import migrations
+
+
+def require_hashed_keys(apps, schema_editor):
+    # 0005 and 0006 usually ship together: refuse to drop a plaintext secret 0005 did not hash.
+    APIKey = apps.get_model('fastotp', 'APIKey')
+    unhashed = APIKey.objects.using(schema_editor.connection.alias).filter(key_hash='').count()
+    if unhashed:
+        raise RuntimeError(f'{unhashed} API keys have no key_hash; re-run 0005 before dropping the plaintext column')
+
+
+class Migration(migrations.Migration):
+    """Drops the plaintext secrets once 0005 has hashed them. Not reversible in practice."""
+
+    dependencies = [
+        ('fastotp', '0005_apikey_hashed_storage'),
+    ]
+
+    operations = [
+        migrations.RunPython(require_hashed_keys, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='apikey',
+            name='key',
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.15 on 2026-10-19 02:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fastotp', '0006_remove_apikey_key'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='loginsession',
+            index=models.Index(fields=['last_active'], name='loginsession_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='otplog',
+            index=models.Index(condition=models.Q(('status__in', ['pending', 'sent'])), fields=['expires_at'], name='otplog_open_expiry_idx'),
+        ),
+    ]
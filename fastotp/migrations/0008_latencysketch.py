@@ -0,0 +1,30 @@
+# Generated by Django 5.1.15 on 2026-10-19 03:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fastotp', '0007_sweeper_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LatencySketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(blank=True, max_length=36)),
+                ('resolution', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], default='hour', max_length=4)),
+                ('bucket_start', models.DateTimeField()),
+                ('dimension', models.CharField(max_length=10)),
+                ('value', models.CharField(blank=True, max_length=64)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('sketch', models.JSONField(default=dict)),
+            ],
+            options={
+                'ordering': ['-bucket_start'],
+                'constraints': [models.UniqueConstraint(fields=('scope', 'dimension', 'resolution', 'bucket_start', 'value'), name='latency_sketch_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.15 on 2026-10-19 03:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fastotp', '0008_latencysketch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='otplog',
+            name='risk_reasons',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='otplog',
+            name='risk_score',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='otplog',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('sent', 'Sent'), ('delivered', 'Delivered'), ('verified', 'Verified'), ('failed', 'Failed'), ('expired', 'Expired'), ('blocked', 'Blocked')], default='pending', max_length=15),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.15 on 2026-10-19 03:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fastotp', '0010_webhooks'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='otplog',
+            index=models.Index(fields=['-created_at', '-id'], name='otplog_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['-created_at', '-id'], name='txn_created_idx'),
+        ),
+    ]
@@ -1,9 +1,11 @@
 import uuid
-import secrets
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
 
+from .apikeys import generate_key, hash_key, lookup_for
+from .webhooks import generate_webhook_secret
+
 
 class User(AbstractUser):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -35,8 +37,9 @@ class APIKey(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='api_keys')
     name = models.CharField(max_length=100, default='Default Key')
-    key = models.CharField(max_length=64, unique=True)
-    prefix = models.CharField(max_length=8, blank=True)
+    lookup = models.CharField(max_length=24, db_index=True, blank=True)  # see fastotp.apikeys
+    key_hash = models.CharField(max_length=64, blank=True)
+    prefix = models.CharField(max_length=16, blank=True)  # display only
     environment = models.CharField(max_length=10, choices=KEY_ENV, default='test')
     status = models.CharField(max_length=10, choices=KEY_STATUS, default='active')
     last_used_at = models.DateTimeField(null=True, blank=True)
@@ -47,17 +50,39 @@ class APIKey(models.Model):
         ordering = ['-created_at']
 
     def save(self, *args, **kwargs):
-        if not self.key:
-            self.key = f"fotk_{self.environment}_{secrets.token_urlsafe(32)}"
-            self.prefix = self.key[:12] + '...'
+        if not self.key_hash:
+            self.set_key(generate_key(self.environment))
         super().save(*args, **kwargs)
 
+    def set_key(self, raw_key: str):
+        """Store ``raw_key`` hashed; the plaintext stays on ``raw_key`` for this instance only."""
+        self.raw_key = raw_key
+        self.lookup = lookup_for(raw_key)
+        self.key_hash = hash_key(raw_key)
+        self.prefix = raw_key[:12] + '...'
+
     def __str__(self):
         return f"{self.name} ({self.prefix})"
 
 
+class APIKeyUsage(models.Model):
+    """Hourly request/credit rollup per key, written in batches by ``fastotp.usage``."""
+    api_key = models.ForeignKey(APIKey, on_delete=models.CASCADE, related_name='hourly_usage')
+    hour = models.DateTimeField()
+    requests = models.PositiveIntegerField(default=0)
+    credits = models.DecimalField(max_digits=12, decimal_places=4, default=0)
+
+    class Meta:
+        ordering = ['-hour']
+        constraints = [models.UniqueConstraint(fields=['api_key', 'hour'], name='apikey_usage_hour_uniq')]
+
+    def __str__(self):
+        return f"{self.api_key_id} @ {self.hour:%Y-%m-%d %H:00} — {self.requests} requests"
+
+
 class CreditBalance(models.Model):
-    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='credit_balance')
+    # Sharded tables (fastotp.sharding) may sit on a database without the users they point at.
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='credit_balance', db_constraint=False)
     balance = models.DecimalField(max_digits=12, decimal_places=4, default=0)
     total_topped_up = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     total_consumed = models.DecimalField(max_digits=12, decimal_places=4, default=0)
@@ -92,20 +117,25 @@ class Transaction(models.Model):
     TX_STATUS = [('pending', 'Pending'), ('completed', 'Completed'), ('failed', 'Failed')]
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='transactions')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='transactions', db_constraint=False)
     transaction_type = models.CharField(max_length=15, choices=TX_TYPE)
     amount_usd = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     credits = models.DecimalField(max_digits=12, decimal_places=4, default=0)
     status = models.CharField(max_length=10, choices=TX_STATUS, default='pending')
     gateway = models.CharField(max_length=50, blank=True)  # paystack / flutterwave
     gateway_ref = models.CharField(max_length=100, blank=True)
-    package = models.ForeignKey(CreditPackage, null=True, blank=True, on_delete=models.SET_NULL)
+    package = models.ForeignKey(CreditPackage, null=True, blank=True, on_delete=models.SET_NULL, db_constraint=False)
     description = models.CharField(max_length=255, blank=True)
     metadata = models.JSONField(default=dict)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='txn_user_created_idx'),
+            # Admin changelist order and date drill-down (fastotp.admin).
+            models.Index(fields=['-created_at', '-id'], name='txn_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.transaction_type} — {self.credits} credits — {self.status}"
@@ -120,11 +150,13 @@ class OTPLog(models.Model):
         ('verified', 'Verified'),
         ('failed', 'Failed'),
         ('expired', 'Expired'),
+        ('blocked', 'Blocked'),  # refused by the fraud detector, never sent
     ]
+    OPEN_STATUSES = ('pending', 'sent')  # awaiting delivery/verification; expire past expires_at
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='otp_logs')
-    api_key = models.ForeignKey(APIKey, null=True, blank=True, on_delete=models.SET_NULL)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='otp_logs', db_constraint=False)
+    api_key = models.ForeignKey(APIKey, null=True, blank=True, on_delete=models.SET_NULL, db_constraint=False)
     identifier = models.CharField(max_length=100)  # phone/email
     channel = models.CharField(max_length=15, choices=CHANNEL, default='whatsapp')
     country_code = models.CharField(max_length=5, blank=True)
@@ -135,6 +167,8 @@ class OTPLog(models.Model):
     cost_credits = models.DecimalField(max_digits=8, decimal_places=4, default=0)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     user_agent = models.CharField(max_length=500, blank=True)
+    risk_score = models.PositiveSmallIntegerField(null=True, blank=True)  # 0–100, see fastotp.fraud
+    risk_reasons = models.CharField(max_length=100, blank=True)          # comma-separated dimensions
     sent_at = models.DateTimeField(null=True, blank=True)
     verified_at = models.DateTimeField(null=True, blank=True)
     expires_at = models.DateTimeField(null=True, blank=True)
@@ -142,10 +176,22 @@ class OTPLog(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Small partial index: only open rows, which the sweeper closes out.
+            models.Index(fields=['expires_at'], name='otplog_open_expiry_idx',
+                         condition=models.Q(status__in=['pending', 'sent'])),
+            # Admin changelist order and date drill-down (fastotp.admin).
+            models.Index(fields=['-created_at', '-id'], name='otplog_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.identifier} — {self.channel} — {self.status}"
 
+    @property
+    def is_flagged(self) -> bool:
+        from .fraud import FRAUD_FLAG_SCORE
+        return self.status != 'blocked' and (self.risk_score or 0) >= FRAUD_FLAG_SCORE * 100
+
 
 class LoginSession(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='login_sessions')
@@ -160,6 +206,106 @@ class LoginSession(models.Model):
 
     class Meta:
         ordering = ['-last_active']
+        indexes = [models.Index(fields=['last_active'], name='loginsession_active_idx')]
 
     def __str__(self):
         return f"{self.user.email} — {self.ip_address}"
+
+
+class FXRate(models.Model):
+    """Units of ``currency_code`` per 1 USD, refreshed out-of-band by ``refresh_fx_rates``."""
+    currency_code = models.CharField(max_length=3, unique=True)
+    rate = models.DecimalField(max_digits=18, decimal_places=6)
+    source = models.CharField(max_length=50, blank=True)
+    fetched_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['currency_code']
+
+    def __str__(self):
+        return f"1 USD = {self.rate} {self.currency_code}"
+
+
+class LatencySketch(models.Model):
+    """Hourly/daily delivery-latency sketch (``fastotp.latency.DDSketch``) for one scope/dimension value."""
+    RESOLUTION = [('hour', 'Hour'), ('day', 'Day')]
+
+    scope = models.CharField(max_length=36, blank=True)  # user id, or '' for the whole platform
+    resolution = models.CharField(max_length=4, choices=RESOLUTION, default='hour')
+    bucket_start = models.DateTimeField()
+    dimension = models.CharField(max_length=10)  # all / country / channel / api_key
+    value = models.CharField(max_length=64, blank=True)
+    count = models.PositiveIntegerField(default=0)
+    sketch = models.JSONField(default=dict)
+
+    class Meta:
+        ordering = ['-bucket_start']
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'dimension', 'resolution', 'bucket_start', 'value'],
+                                    name='latency_sketch_uniq'),
+        ]
+
+    def __str__(self):
+        return (f"{self.scope or 'global'} {self.dimension}={self.value} "
+                f"@ {self.resolution} {self.bucket_start:%Y-%m-%d %H:00} ({self.count})")
+
+
+class WebhookEndpoint(models.Model):
+    """Customer URL that receives signed OTP status events (see ``fastotp.webhooks``)."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='webhook_endpoints')
+    url = models.URLField(max_length=500)
+    secret = models.CharField(max_length=64, blank=True)  # HMAC signing secret, shared with the customer
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def save(self, *args, **kwargs):
+        if not self.secret:
+            self.secret = generate_webhook_secret()
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.url} ({self.user_id})"
+
+
+class WebhookEvent(models.Model):
+    """Outbox row: one event for one endpoint, written in the transaction that caused it."""
+    STATUS = [('pending', 'Pending'), ('delivered', 'Delivered'), ('failed', 'Failed')]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    endpoint = models.ForeignKey(WebhookEndpoint, on_delete=models.CASCADE, related_name='events')
+    event_type = models.CharField(max_length=40)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.CharField(max_length=200, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    delivered_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # The dispatcher only ever scans due pending rows.
+            models.Index(fields=['next_attempt_at'], name='webhook_event_due_idx',
+                         condition=models.Q(status='pending')),
+        ]
+
+    def __str__(self):
+        return f"{self.event_type} → {self.endpoint_id} — {self.status}"
+
+
+class TenantPlacement(models.Model):
+    """A tenant placed off its hash-ring shard, or mid-move between two (``fastotp.sharding``)."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='placement')
+    shard = models.CharField(max_length=64)
+    copy_shard = models.CharField(max_length=64, blank=True)  # holds a copy of the rows while moving
+    frozen = models.BooleanField(default=False)               # writes refused during the cut-over
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user_id} → {self.shard}"
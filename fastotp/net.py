@@ -0,0 +1,40 @@
+"""
+FastOTP Client Addresses
+========================
+Who is on the other end of a request, for the login throttle and the fraud
+limits. Kept apart from ``fastotp.views`` so the API lambda can use it
+without loading the site's views.
+"""
+import ipaddress
+from django.conf import settings
+
+TRUSTED_PROXIES = [ipaddress.ip_network(net.strip(), strict=False)
+                   for net in getattr(settings, 'TRUSTED_PROXIES', ['127.0.0.0/8', '::1/128']) if net.strip()]
+
+
+def _is_trusted_proxy(hop: str) -> bool:
+    try:
+        address = ipaddress.ip_address(hop)
+    except ValueError:
+        return False
+    return any(address in net for net in TRUSTED_PROXIES)
+
+
+def get_client_ip(request):
+    """
+    The address of the first hop outside ``TRUSTED_PROXIES``, read right to left
+    from ``REMOTE_ADDR`` through ``X-Forwarded-For``. Entries a client wrote
+    itself sit left of that hop and are ignored, so the throttles and fraud
+    limits keyed on the result cannot be dodged with a forged header.
+    """
+    remote_addr = request.META.get('REMOTE_ADDR')
+    if not remote_addr or not _is_trusted_proxy(remote_addr):
+        return remote_addr
+    forwarded = [hop.strip() for hop in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if hop.strip()]
+    for hop in reversed(forwarded):
+        if not _is_trusted_proxy(hop):
+            try:
+                return str(ipaddress.ip_address(hop))
+            except ValueError:
+                return None  # garbage where the client's address should be
+    return forwarded[0] if forwarded else remote_addr
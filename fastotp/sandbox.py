@@ -0,0 +1,195 @@
+"""
+FastOTP Sandbox
+===============
+In-memory send/verify engine for ``test`` API keys, so integration and load
+tests never reach the database, the delivery workers or ``CreditBalance``.
+
+Every sandbox code is ``SANDBOX_OTP_CODE`` (``123456`` by default) and is
+returned in the send response. The ``otp_id`` is self-describing — expiry,
+outcome and an HMAC binding it to the API key — so any worker can verify it
+without shared state. Calls are appended to a per-key ring buffer of
+``SANDBOX_LOG_SIZE`` entries instead of ``OTPLog``.
+
+Magic numbers force an outcome (``SANDBOX_MAGIC_NUMBERS`` adds more):
+
+    +15005550001  rejected: invalid identifier
+    +15005550002  accepted, delivery fails (the code never verifies)
+    +15005550003  blocked by fraud detection
+    +15005550004  insufficient credits
+    +15005550005  delivered slowly (``SANDBOX_SLOW_LATENCY_MS``)
+    +15005550006  upstream unavailable (retry later)
+
+Any other identifier is delivered. ``SANDBOX_FAILURE_RATE`` turns that share
+of ordinary sends into ``upstream_unavailable`` and ``SANDBOX_DELAY_MS`` adds
+a real wait to each send, to exercise client timeouts and retries.
+
+Used codes and wrong-guess counts are per worker, like the login throttle.
+"""
+import hashlib
+import hmac
+import os
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+
+from .auth import AttemptLimiter
+from .cache import TTLCache
+
+SANDBOX_OTP_CODE = getattr(settings, 'SANDBOX_OTP_CODE', '123456')
+SANDBOX_LATENCY_MS = getattr(settings, 'SANDBOX_LATENCY_MS', (180, 900))  # reported delivery latency range
+SANDBOX_SLOW_LATENCY_MS = getattr(settings, 'SANDBOX_SLOW_LATENCY_MS', 8000)
+SANDBOX_DELAY_MS = getattr(settings, 'SANDBOX_DELAY_MS', 0)
+SANDBOX_FAILURE_RATE = getattr(settings, 'SANDBOX_FAILURE_RATE', 0.0)
+SANDBOX_LOG_SIZE = getattr(settings, 'SANDBOX_LOG_SIZE', 200)
+SANDBOX_MAX_KEYS = getattr(settings, 'SANDBOX_MAX_KEYS', 10_000)
+OTP_MAX_VERIFY_ATTEMPTS = getattr(settings, 'OTP_MAX_VERIFY_ATTEMPTS', 5)
+
+DELIVERED = 'delivered'
+DELIVERY_FAILED = 'delivery_failed'
+SLOW = 'slow'
+SEND_ERRORS = ('invalid_identifier', 'blocked', 'insufficient_credits', 'upstream_unavailable')
+
+SANDBOX_MAGIC_NUMBERS = {
+    '+15005550001': 'invalid_identifier',
+    '+15005550002': DELIVERY_FAILED,
+    '+15005550003': 'blocked',
+    '+15005550004': 'insufficient_credits',
+    '+15005550005': SLOW,
+    '+15005550006': 'upstream_unavailable',
+    **getattr(settings, 'SANDBOX_MAGIC_NUMBERS', {}),
+}
+
+ID_PREFIX = 'sbx_'
+_EXPIRY_LEN, _NONCE_LEN, _SIG_LEN = 8, 8, 16  # hex characters of an otp_id after the prefix
+
+
+def _iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, tz=dt_timezone.utc).isoformat()
+
+
+class SandboxEngine:
+    """
+    Usage:
+        engine = SandboxEngine()
+        sent = engine.send(key.id, '+2348031234567', 'sms')
+        engine.verify(key.id, sent['otp_id'], sent['otp'])
+
+    ``send`` and ``verify`` return API response bodies (``success`` plus
+    either the result fields or an ``error`` code).
+    """
+
+    def __init__(self, code: str = SANDBOX_OTP_CODE, magic_numbers: dict = None,
+                 failure_rate: float = SANDBOX_FAILURE_RATE, delay_ms: float = SANDBOX_DELAY_MS,
+                 log_size: int = SANDBOX_LOG_SIZE):
+        self.code = code
+        self.magic_numbers = SANDBOX_MAGIC_NUMBERS if magic_numbers is None else magic_numbers
+        self.failure_rate = failure_rate
+        self.delay_ms = delay_ms
+        self.log_size = log_size
+        self._key = hashlib.sha256(b'fastotp.sandbox:' + settings.SECRET_KEY.encode()).digest()
+        self._logs = TTLCache(maxsize=SANDBOX_MAX_KEYS, ttl=86400)
+        self._logs_lock = threading.Lock()
+        self._used = TTLCache(maxsize=100_000, ttl=3600)
+        self._used_lock = threading.Lock()
+        self._attempts = AttemptLimiter(OTP_MAX_VERIFY_ATTEMPTS, 3600)
+
+    # ── otp_id: <expiry><nonce><outcome flag><signature>, all hex but the flag
+
+    def _sign(self, api_key_id, body: str) -> str:
+        return hmac.new(self._key, f'{api_key_id}:{body}'.encode(), hashlib.sha256).hexdigest()[:_SIG_LEN]
+
+    def _make_id(self, api_key_id, expires_at: int, failed: bool) -> str:
+        body = f"{expires_at:0{_EXPIRY_LEN}x}{os.urandom(_NONCE_LEN // 2).hex()}{'f' if failed else 'd'}"
+        return f'{ID_PREFIX}{body}{self._sign(api_key_id, body)}'
+
+    def _parse_id(self, api_key_id, otp_id: str):
+        """``(expires_at, failed)`` for an id issued to ``api_key_id``, else ``None``."""
+        body_len = _EXPIRY_LEN + _NONCE_LEN + 1
+        if not otp_id.startswith(ID_PREFIX) or len(otp_id) != len(ID_PREFIX) + body_len + _SIG_LEN:
+            return None
+        body, signature = otp_id[len(ID_PREFIX):-_SIG_LEN], otp_id[-_SIG_LEN:]
+        if not hmac.compare_digest(self._sign(api_key_id, body), signature):
+            return None
+        return int(body[:_EXPIRY_LEN], 16), body[-1] == 'f'
+
+    # ── Ring-buffer log
+
+    def _log(self, api_key_id, action: str, otp_id: str, identifier: str, result: str):
+        with self._logs_lock:
+            entries = self._logs.get(api_key_id)
+            if entries is None:
+                entries = deque(maxlen=self.log_size)
+                self._logs.set(api_key_id, entries)
+            entries.append((time.time(), action, otp_id, identifier, result))
+
+    def log(self, api_key_id) -> list:
+        """This worker's recent sandbox calls for ``api_key_id``, newest first."""
+        with self._logs_lock:
+            entries = list(self._logs.get(api_key_id) or ())
+        return [{'at': _iso(at), 'action': action, 'otp_id': otp_id, 'identifier': identifier, 'result': result}
+                for at, action, otp_id, identifier, result in reversed(entries)]
+
+    # ── Send / verify
+
+    def outcome_for(self, identifier: str) -> str:
+        outcome = self.magic_numbers.get(identifier, DELIVERED)
+        if outcome == DELIVERED and self.failure_rate and random.random() < self.failure_rate:
+            return 'upstream_unavailable'
+        return outcome
+
+    def send(self, api_key_id, identifier: str, channel: str = 'whatsapp', expires_in: int = 300) -> dict:
+        outcome = self.outcome_for(identifier)
+        if self.delay_ms:
+            time.sleep(self.delay_ms / 1000)
+        if outcome in SEND_ERRORS:
+            self._log(api_key_id, 'send', '', identifier, outcome)
+            return {'success': False, 'error': outcome, 'sandbox': True}
+
+        expires_at = int(time.time()) + expires_in
+        otp_id = self._make_id(api_key_id, expires_at, outcome == DELIVERY_FAILED)
+        if outcome == SLOW:
+            latency_ms = SANDBOX_SLOW_LATENCY_MS
+        else:
+            low, high = SANDBOX_LATENCY_MS
+            latency_ms = low + int(otp_id[-_SIG_LEN:], 16) % (high - low + 1)
+        status = 'failed' if outcome == DELIVERY_FAILED else 'sent'
+        self._log(api_key_id, 'send', otp_id, identifier, status)
+        return {'success': True, 'otp_id': otp_id, 'status': status, 'channel': channel,
+                'expires_at': _iso(expires_at), 'latency_ms': latency_ms, 'otp': self.code, 'sandbox': True}
+
+    def verify(self, api_key_id, otp_id: str, code: str) -> dict:
+        result = self._check(api_key_id, otp_id, code)
+        self._log(api_key_id, 'verify', otp_id, '', result)
+        if result != 'verified':
+            return {'success': False, 'error': result, 'sandbox': True}
+        return {'success': True, 'otp_id': otp_id, 'status': 'verified', 'sandbox': True}
+
+    def _check(self, api_key_id, otp_id: str, code: str) -> str:
+        parsed = self._parse_id(api_key_id, otp_id)
+        if parsed is None or parsed[1]:
+            return 'not_found'
+        if otp_id in self._used:
+            return 'already_verified'
+        if time.time() > parsed[0]:
+            return 'expired'
+        if self._attempts.blocked(otp_id):
+            return 'too_many_attempts'
+        if not hmac.compare_digest(str(code), self.code):
+            self._attempts.hit(otp_id)
+            return 'invalid_code'
+        with self._used_lock:
+            if otp_id in self._used:
+                return 'already_verified'
+            self._used.set(otp_id, True, ttl=max(parsed[0] - time.time(), 1))
+        return 'verified'
+
+    def clear(self):
+        self._logs.clear()
+        self._used.clear()
+        self._attempts.clear()
+
+
+sandbox = SandboxEngine()
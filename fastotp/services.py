@@ -4,13 +4,36 @@ FastOTP Service Layer
 Placeholder implementations for FastOTP Python client and Payment Gateway logic.
 Replace the stub methods with actual SDK/API calls.
 """
+import contextvars
 import hashlib
+import hmac
 import random
+import secrets
 import string
 import logging
+import threading
+import weakref
+from collections import defaultdict
 from datetime import timedelta
+from functools import partial
+from decimal import Decimal, ROUND_HALF_UP
 from django.utils import timezone
 from django.conf import settings
+from django.db import transaction as db_transaction
+from django.db.models import Case, DecimalField, F, Value, When
+
+from .auth import AttemptLimiter
+from .billing import invalidate_billing
+from .cache import TTLCache
+from .dedup import forget_otp
+from .enrichment import locate
+from .fraud import assess_send, dial_prefix
+from .latency import record_latency
+from .metrics import track_upstream
+from .sharding import tenant_atomic
+from .totp import check_code, code_expires_at, issue_code
+from .usage import record_usage
+from .webhooks import OTP_EVENT_FIELDS, enqueue_otp_events
 
 logger = logging.getLogger(__name__)
 
@@ -65,8 +88,9 @@ class FastOTPClient:
         # data = response.json()
 
         # ── STUB ──────────────────────────────────
-        logger.info(f"[STUB] Sending OTP to {identifier} via {channel}")
-        otp = ''.join(random.choices(string.digits, k=length))
+        with track_upstream('FastOTPClient'):
+            logger.info(f"[STUB] Sending OTP to {identifier} via {channel}")
+            otp = new_otp_code(length)
         return {
             'success': True,
             'otp_id': 'stub_' + identifier[:8],
@@ -76,6 +100,31 @@ class FastOTPClient:
             'error': None,
         }
 
+    def send_code(self, identifier: str, code: str, channel: str = 'whatsapp',
+                  expires_in: int = 300, sender_id: str = '') -> dict:
+        """
+        Deliver a code generated (and stored hashed) by FastOTP itself, using the
+        channel's OTP message template. Unlike ``send_otp`` the provider never
+        picks the code, so what the user receives is what ``verify_*`` checks.
+
+        Returns:
+            dict: {'success': bool, 'message_id': str, 'latency_ms': int, 'error': str | None}
+        """
+        # TODO: Replace with real HTTP call using requests / httpx
+        # requests.post(f"{self.BASE_URL}/messages", headers=self.session_headers, json={
+        #     'to': identifier, 'channel': channel, 'template': 'otp',
+        #     'variables': {'code': code, 'expires_in': expires_in}, 'sender_id': sender_id})
+
+        # ── STUB ──────────────────────────────────
+        with track_upstream('FastOTPClient'):
+            logger.info(f"[STUB] Sending {len(code)}-digit code to {identifier} via {channel}")
+        return {
+            'success': True,
+            'message_id': 'stub_' + identifier[:8],
+            'latency_ms': random.randint(180, 900),
+            'error': None,
+        }
+
     def verify_otp(self, identifier: str, otp: str, otp_id: str = '') -> dict:
         """
         Verify a previously sent OTP.
@@ -84,7 +133,8 @@ class FastOTPClient:
             dict: {'success': bool, 'message': str}
         """
         # TODO: Replace with real verification call
-        logger.info(f"[STUB] Verifying OTP for {identifier}")
+        with track_upstream('FastOTPClient'):
+            logger.info(f"[STUB] Verifying OTP for {identifier}")
         return {'success': True, 'message': 'OTP verified successfully.'}
 
     def get_delivery_status(self, otp_id: str) -> dict:
@@ -98,23 +148,170 @@ class FastOTPClient:
         return COVERAGE_DATA
 
 
+# ─────────────────────────────────────────────
+#  Payment Gateway — Shared HTTP Transport
+# ─────────────────────────────────────────────
+
+class GatewayError(Exception):
+    """Raised when a payment gateway call fails or returns an error payload."""
+
+
+class _PooledGateway:
+    """
+    Base for payment gateways that talk HTTPS to a provider.
+
+    One instance is shared per process (see ``paystack_gateway`` /
+    ``flutterwave_gateway`` below) so keep-alive connections are reused across
+    requests instead of paying a TLS handshake on the user's critical path.
+    With no secret key configured the gateway runs in stub mode. Transport
+    failures (timeouts, refused connections) surface as ``GatewayError`` like
+    provider errors do. Only settled verification results are cached.
+
+    pip install httpx
+    """
+
+    SECRET_KEY = ''
+    BASE_URL = ''
+    TIMEOUT = getattr(settings, 'PAYMENT_GATEWAY_TIMEOUT', 10)
+    MAX_CONNECTIONS = getattr(settings, 'PAYMENT_GATEWAY_MAX_CONNECTIONS', 20)
+    KEEPALIVE_EXPIRY = 30
+    VERIFY_CACHE_TTL = getattr(settings, 'PAYMENT_VERIFY_CACHE_TTL', 30)
+    TERMINAL_STATUSES = frozenset()  # verification statuses that can no longer change
+
+    def __init__(self, secret_key: str = None, base_url: str = None, timeout: float = None):
+        self.secret_key = self.SECRET_KEY if secret_key is None else secret_key
+        self.base_url = (base_url or self.BASE_URL).rstrip('/')
+        self.timeout = timeout or self.TIMEOUT
+        self.verify_cache = TTLCache(maxsize=2048, ttl=self.VERIFY_CACHE_TTL)
+        self._client = None
+        self._async_clients = weakref.WeakKeyDictionary()  # event loop -> AsyncClient
+        self._lock = threading.Lock()
+
+    @property
+    def is_stub(self) -> bool:
+        return not self.secret_key
+
+    def _client_kwargs(self) -> dict:
+        import httpx
+        return {
+            'base_url': self.base_url,
+            'headers': {
+                'Authorization': f'Bearer {self.secret_key}',
+                'Content-Type': 'application/json',
+            },
+            'timeout': self.timeout,
+            'limits': httpx.Limits(
+                max_connections=self.MAX_CONNECTIONS,
+                max_keepalive_connections=self.MAX_CONNECTIONS,
+                keepalive_expiry=self.KEEPALIVE_EXPIRY,
+            ),
+        }
+
+    @property
+    def client(self):
+        """Lazily created, process-wide ``httpx.Client`` with a keep-alive pool."""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import httpx
+                    self._client = httpx.Client(**self._client_kwargs())
+        return self._client
+
+    @property
+    def async_client(self):
+        """``httpx.AsyncClient`` bound to the running event loop; dropped with the loop."""
+        import asyncio
+        import httpx
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._async_clients.get(loop)
+            if client is None:
+                for closed in [other for other in self._async_clients if other.is_closed()]:
+                    del self._async_clients[closed]
+                client = self._async_clients[loop] = httpx.AsyncClient(**self._client_kwargs())
+        return client
+
+    def _transport_error(self, exc) -> GatewayError:
+        return GatewayError(f'{self.__class__.__name__}: {exc.__class__.__name__} {exc}'.strip())
+
+    def _cache_verification(self, key: str, result: dict) -> dict:
+        if result.get('status') in self.TERMINAL_STATUSES:
+            self.verify_cache.set(key, result)
+        return result
+
+    def _unwrap(self, response) -> dict:
+        try:
+            payload = response.json()
+        except ValueError:
+            raise GatewayError(f'{self.__class__.__name__}: non-JSON response ({response.status_code})')
+        if response.status_code >= 400:
+            raise GatewayError(f"{self.__class__.__name__}: {payload.get('message', response.status_code)}")
+        return payload.get('data') or {}
+
+    def _request(self, method: str, path: str, timeout: float = None, **kwargs) -> dict:
+        import httpx
+        try:
+            with track_upstream(self.__class__.__name__):
+                response = self.client.request(method, path, timeout=timeout or self.timeout, **kwargs)
+        except httpx.HTTPError as e:
+            raise self._transport_error(e) from e
+        return self._unwrap(response)
+
+    async def _arequest(self, method: str, path: str, timeout: float = None, **kwargs) -> dict:
+        import httpx
+        try:
+            with track_upstream(self.__class__.__name__):
+                response = await self.async_client.request(method, path, timeout=timeout or self.timeout,
+                                                           **kwargs)
+        except httpx.HTTPError as e:
+            raise self._transport_error(e) from e
+        return self._unwrap(response)
+
+    def close(self):
+        """Close pooled connections (tests / process shutdown)."""
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+        with self._lock:
+            self._async_clients.clear()
+        self.verify_cache.clear()
+
+
 # ─────────────────────────────────────────────
 #  Payment Gateway — Paystack
 # ─────────────────────────────────────────────
 
-class PaystackGateway:
+class PaystackGateway(_PooledGateway):
     """
     Paystack payment integration.
 
-    pip install paystackapi
-    Set PAYSTACK_SECRET_KEY in Django settings.
+    Set PAYSTACK_SECRET_KEY in Django settings (and PAYSTACK_BASE_URL to point
+    at a local stub server in tests).
     """
 
     SECRET_KEY = getattr(settings, 'PAYSTACK_SECRET_KEY', '')
-    BASE_URL = 'https://api.paystack.co'
+    BASE_URL = getattr(settings, 'PAYSTACK_BASE_URL', 'https://api.paystack.co')
+    TERMINAL_STATUSES = frozenset({'success', 'failed', 'abandoned', 'reversed'})
+
+    def _init_payload(self, email, amount_kobo, metadata, callback_url) -> dict:
+        return {
+            'email': email,
+            'amount': amount_kobo,
+            'metadata': metadata or {},
+            'callback_url': callback_url,
+        }
+
+    def _stub_init(self, email: str, amount_kobo: int) -> dict:
+        logger.info(f"[STUB] Paystack init for {email}, amount={amount_kobo}")
+        return {
+            'authorization_url': 'https://checkout.paystack.com/stub_access_code',
+            'access_code': 'stub_access_code',
+            'reference': 'stub_ref_' + email[:6],
+        }
 
     def initialize_transaction(self, email: str, amount_kobo: int,
-                                metadata: dict = None, callback_url: str = '') -> dict:
+                                metadata: dict = None, callback_url: str = '',
+                                timeout: float = None) -> dict:
         """
         Initialise a Paystack transaction.
 
@@ -123,56 +320,87 @@ class PaystackGateway:
             amount_kobo: Amount in kobo (NGN * 100) or pesewas (GHS * 100).
             metadata: Extra data (user_id, package_id, credits).
             callback_url: URL to redirect after payment.
+            timeout: Per-call timeout in seconds (defaults to PAYMENT_GATEWAY_TIMEOUT).
 
         Returns:
             dict: {'authorization_url': str, 'access_code': str, 'reference': str}
         """
-        # TODO:
-        # from paystackapi.transaction import Transaction
-        # response = Transaction.initialize(email=email, amount=amount_kobo,
-        #                                   metadata=metadata, callback_url=callback_url)
-        # return response['data']
-
-        logger.info(f"[STUB] Paystack init for {email}, amount={amount_kobo}")
-        return {
-            'authorization_url': 'https://checkout.paystack.com/stub_access_code',
-            'access_code': 'stub_access_code',
-            'reference': 'stub_ref_' + email[:6],
-        }
-
-    def verify_transaction(self, reference: str) -> dict:
+        if self.is_stub:
+            return self._stub_init(email, amount_kobo)
+        return self._request('POST', '/transaction/initialize', timeout=timeout,
+                             json=self._init_payload(email, amount_kobo, metadata, callback_url))
+
+    async def ainitialize_transaction(self, email: str, amount_kobo: int,
+                                      metadata: dict = None, callback_url: str = '',
+                                      timeout: float = None) -> dict:
+        """Async variant of ``initialize_transaction``."""
+        if self.is_stub:
+            return self._stub_init(email, amount_kobo)
+        return await self._arequest('POST', '/transaction/initialize', timeout=timeout,
+                                    json=self._init_payload(email, amount_kobo, metadata, callback_url))
+
+    def verify_transaction(self, reference: str, timeout: float = None) -> dict:
         """
         Verify a Paystack payment by reference.
 
+        Settled results are cached briefly per reference, so a double-submitted
+        callback does not hit Paystack twice; pending ones are asked again.
+
         Returns:
             dict: {'status': 'success'|'failed', 'amount': int, 'metadata': dict}
         """
-        # TODO:
-        # from paystackapi.transaction import Transaction
-        # response = Transaction.verify(reference)
-        # return response['data']
-
-        logger.info(f"[STUB] Verifying Paystack txn: {reference}")
-        return {'status': 'success', 'amount': 100000, 'metadata': {}}
+        cached = self.verify_cache.get(reference)
+        if cached is not None:
+            return cached
+        if self.is_stub:
+            logger.info(f"[STUB] Verifying Paystack txn: {reference}")
+            result = {'status': 'success', 'amount': 100000, 'metadata': {}}
+        else:
+            result = self._request('GET', f'/transaction/verify/{reference}', timeout=timeout)
+        return self._cache_verification(reference, result)
+
+    async def averify_transaction(self, reference: str, timeout: float = None) -> dict:
+        """Async variant of ``verify_transaction`` (shares the same cache)."""
+        cached = self.verify_cache.get(reference)
+        if cached is not None:
+            return cached
+        if self.is_stub:
+            logger.info(f"[STUB] Verifying Paystack txn: {reference}")
+            result = {'status': 'success', 'amount': 100000, 'metadata': {}}
+        else:
+            result = await self._arequest('GET', f'/transaction/verify/{reference}', timeout=timeout)
+        return self._cache_verification(reference, result)
 
 
 # ─────────────────────────────────────────────
 #  Payment Gateway — Flutterwave
 # ─────────────────────────────────────────────
 
-class FlutterwaveGateway:
+class FlutterwaveGateway(_PooledGateway):
     """
     Flutterwave payment integration.
 
-    pip install flutterwave3
-    Set FLUTTERWAVE_SECRET_KEY in Django settings.
+    Set FLUTTERWAVE_SECRET_KEY in Django settings (and FLUTTERWAVE_BASE_URL to
+    point at a local stub server in tests).
     """
 
     SECRET_KEY = getattr(settings, 'FLUTTERWAVE_SECRET_KEY', '')
-    BASE_URL = 'https://api.flutterwave.com/v3'
+    BASE_URL = getattr(settings, 'FLUTTERWAVE_BASE_URL', 'https://api.flutterwave.com/v3')
+    TERMINAL_STATUSES = frozenset({'successful', 'failed', 'cancelled'})
+
+    def _payment_payload(self, tx_ref, amount, currency, customer, redirect_url, meta) -> dict:
+        return {
+            'tx_ref': tx_ref,
+            'amount': str(amount),
+            'currency': currency,
+            'customer': customer,
+            'redirect_url': redirect_url,
+            'meta': meta or {},
+        }
 
-    def initialize_payment(self, tx_ref: str, amount: float, currency: str,
-                            customer: dict, redirect_url: str, meta: dict = None) -> dict:
+    def initialize_payment(self, tx_ref: str, amount, currency: str,
+                            customer: dict, redirect_url: str, meta: dict = None,
+                            timeout: float = None) -> dict:
         """
         Create a Flutterwave payment link.
 
@@ -183,94 +411,420 @@ class FlutterwaveGateway:
             customer: {'email': str, 'name': str, 'phone_number': str}
             redirect_url: URL to redirect after payment.
             meta: Extra metadata dict.
+            timeout: Per-call timeout in seconds (defaults to PAYMENT_GATEWAY_TIMEOUT).
 
         Returns:
             dict: {'link': str}  — payment checkout URL
         """
-        # TODO:
-        # import rave_python
-        # rave = rave_python.Rave(self.SECRET_KEY, production=True)
-        # payload = {"txRef": tx_ref, "amount": amount, "currency": currency, ...}
-        # response = rave.Card.charge(payload)
+        if self.is_stub:
+            logger.info(f"[STUB] Flutterwave payment link for {customer.get('email')}")
+            return {'link': f'https://checkout.flutterwave.com/v3/hosted/pay/stub_{tx_ref}'}
+        return self._request('POST', '/payments', timeout=timeout,
+                             json=self._payment_payload(tx_ref, amount, currency, customer, redirect_url, meta))
+
+    async def ainitialize_payment(self, tx_ref: str, amount, currency: str,
+                                  customer: dict, redirect_url: str, meta: dict = None,
+                                  timeout: float = None) -> dict:
+        """Async variant of ``initialize_payment``."""
+        if self.is_stub:
+            logger.info(f"[STUB] Flutterwave payment link for {customer.get('email')}")
+            return {'link': f'https://checkout.flutterwave.com/v3/hosted/pay/stub_{tx_ref}'}
+        return await self._arequest('POST', '/payments', timeout=timeout,
+                                    json=self._payment_payload(tx_ref, amount, currency, customer, redirect_url, meta))
+
+    def verify_payment(self, transaction_id: str, timeout: float = None) -> dict:
+        """Verify a Flutterwave payment (settled results cached briefly per transaction id)."""
+        cached = self.verify_cache.get(transaction_id)
+        if cached is not None:
+            return cached
+        if self.is_stub:
+            logger.info(f"[STUB] Verifying Flutterwave txn: {transaction_id}")
+            result = {'status': 'successful', 'amount': 10, 'currency': 'USD'}
+        else:
+            result = self._request('GET', f'/transactions/{transaction_id}/verify', timeout=timeout)
+        return self._cache_verification(transaction_id, result)
+
+    async def averify_payment(self, transaction_id: str, timeout: float = None) -> dict:
+        """Async variant of ``verify_payment`` (shares the same cache)."""
+        cached = self.verify_cache.get(transaction_id)
+        if cached is not None:
+            return cached
+        if self.is_stub:
+            logger.info(f"[STUB] Verifying Flutterwave txn: {transaction_id}")
+            result = {'status': 'successful', 'amount': 10, 'currency': 'USD'}
+        else:
+            result = await self._arequest('GET', f'/transactions/{transaction_id}/verify', timeout=timeout)
+        return self._cache_verification(transaction_id, result)
+
+
+# Process-wide gateway clients — import these instead of instantiating per request.
+# Built on first access so lambdas that never take payments never construct them.
+_GATEWAYS = {'paystack_gateway': PaystackGateway, 'flutterwave_gateway': FlutterwaveGateway}
+
+
+def __getattr__(name):
+    if name in _GATEWAYS:
+        gateway = globals()[name] = _GATEWAYS[name]()
+        return gateway
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# ─────────────────────────────────────────────
+#  Background OTP Delivery
+# ─────────────────────────────────────────────
+
+OTP_DELIVERY_ASYNC = getattr(settings, 'OTP_DELIVERY_ASYNC', True)
+OTP_DELIVERY_WORKERS = getattr(settings, 'OTP_DELIVERY_WORKERS', 4)
 
-        logger.info(f"[STUB] Flutterwave payment link for {customer.get('email')}")
-        return {'link': f'https://checkout.flutterwave.com/v3/hosted/pay/stub_{tx_ref}'}
+_delivery_pool = None
+_delivery_pool_lock = threading.Lock()
 
-    def verify_payment(self, transaction_id: str) -> dict:
-        """Verify a Flutterwave payment."""
-        # TODO: GET /transactions/{transaction_id}/verify
-        logger.info(f"[STUB] Verifying Flutterwave txn: {transaction_id}")
-        return {'status': 'successful', 'amount': 10, 'currency': 'USD'}
+
+def _get_delivery_pool():
+    global _delivery_pool
+    if _delivery_pool is None:
+        from concurrent.futures import ThreadPoolExecutor
+        with _delivery_pool_lock:
+            if _delivery_pool is None:
+                _delivery_pool = ThreadPoolExecutor(max_workers=OTP_DELIVERY_WORKERS,
+                                                    thread_name_prefix='otp-delivery')
+    return _delivery_pool
+
+
+def deliver_otp(otp_log_id, identifier: str, code: str, channel: str = 'whatsapp', expires_in: int = 300):
+    """Send ``code`` through the delivery API and record the outcome on a ``pending`` OTPLog."""
+    from .models import OTPLog
+    try:
+        result = FastOTPClient().send_code(identifier, code, channel=channel, expires_in=expires_in)
+    except Exception as e:
+        logger.error(f"OTP delivery to {identifier} via {channel} failed: {e}")
+        result = {'success': False, 'latency_ms': None}
+    rows = change_otp_status(
+        OTPLog.objects.filter(pk=otp_log_id, status='pending'),
+        'sent' if result['success'] else 'failed',
+        latency_ms=result.get('latency_ms'),
+        sent_at=timezone.now(),
+    )
+    if rows and result['success']:
+        row = rows[0]
+        record_latency(row['latency_ms'], row['user_id'], row['country_code'], row['channel'], row['api_key_id'])
+    elif not result['success']:
+        forget_otp(otp_log_id)  # let the customer's retry send a new OTP
+
+
+def _deliver_in_background(*args, **kwargs):
+    from django.db import connections
+    try:
+        deliver_otp(*args, **kwargs)
+    except Exception:
+        logger.exception("Background OTP delivery crashed")
+    finally:
+        connections.close_all()  # this worker thread's connections only
+
+
+def dispatch_otp_delivery(otp_log_id, identifier: str, code: str, channel: str = 'whatsapp',
+                          expires_in: int = 300):
+    """
+    Queue delivery for after the surrounding transaction commits, so the
+    request returns without waiting on the upstream API. With
+    ``OTP_DELIVERY_ASYNC = False`` delivery runs inline on commit instead.
+    The worker runs in a copy of the caller's context, so it writes the
+    outcome to the same tenant's shard. ``code`` is the plaintext of the hash
+    stored for this OTP; it only lives in the queued call.
+    """
+    args = (otp_log_id, identifier, code, channel, expires_in)
+    if OTP_DELIVERY_ASYNC:
+        context = contextvars.copy_context()
+        db_transaction.on_commit(lambda: _get_delivery_pool().submit(context.run, _deliver_in_background, *args))
+    else:
+        db_transaction.on_commit(lambda: deliver_otp(*args))
 
 
 # ─────────────────────────────────────────────
 #  OTP Business Logic
 # ─────────────────────────────────────────────
 
+def change_otp_status(queryset, status: str, **fields) -> list:
+    """
+    Move the OTPLog rows in ``queryset`` to ``status`` (plus ``fields``) and
+    queue their webhook events in the same transaction. Returns the changed
+    rows as dicts of ``OTP_EVENT_FIELDS`` with the new values applied.
+    Runs on the tenant or shard in context (``fastotp.sharding``).
+    """
+    with tenant_atomic():
+        rows = list(queryset.select_for_update().values(*OTP_EVENT_FIELDS))
+        if not rows:
+            return rows
+        queryset.model.objects.filter(pk__in=[row['id'] for row in rows]).update(status=status, **fields)
+        for row in rows:
+            row['status'] = status
+            row.update((k, v) for k, v in fields.items() if k in row)
+        enqueue_otp_events(rows)
+    return rows
+
+
+OTP_MODE = getattr(settings, 'OTP_MODE', 'stored')  # 'stored' (hashed per OTP) | 'totp' (derived, stateless)
+TOTP_SIGNUP_STEP = getattr(settings, 'TOTP_SIGNUP_STEP', 300)
+
+
+def new_otp_code(length: int = 6) -> str:
+    """A uniformly random numeric code from the OS CSPRNG."""
+    return ''.join(secrets.choice(string.digits) for _ in range(length))
+
+
 def hash_otp(otp: str, identifier: str) -> str:
     """Hash an OTP before storing — never store plain OTPs."""
     salt = getattr(settings, 'SECRET_KEY', '')[:16]
     return hashlib.sha256(f"{salt}:{identifier}:{otp}".encode()).hexdigest()
 
 
-def generate_registration_otp(user) -> str:
-    """Generate and attach an OTP for WhatsApp signup verification."""
+def generate_registration_otp(user, ip_address: str = None):
+    """
+    Attach a fresh signup OTP to ``user`` and queue its WhatsApp delivery.
+    Returns ``(otp, otp_log)``; the log stays ``pending`` until the delivery
+    worker records the outcome. When the fraud detector blocks the send the
+    log is ``blocked``, nothing is queued and ``otp`` is ``None``.
+
+    With ``OTP_MODE = 'totp'`` the code is derived from the number and the
+    time step (``fastotp.totp``), so the user row is not written.
+    """
     from .models import OTPLog
-    otp = ''.join(random.choices(string.digits, k=6))
-    user.verification_otp = hash_otp(otp, user.whatsapp_number)
-    user.otp_expires_at = timezone.now() + timedelta(minutes=10)
-    user.save(update_fields=['verification_otp', 'otp_expires_at'])
-
-    OTPLog.objects.create(
-        user=user,
-        identifier=user.whatsapp_number,
-        channel='whatsapp',
-        otp_hash=hash_otp(otp, user.whatsapp_number),
-        status='sent',
-        expires_at=user.otp_expires_at,
-    )
-    return otp  # Return only to show in UI for demo; remove in production
+    risk = assess_send(user.whatsapp_number, 'whatsapp', ip=ip_address)
+    location = locate(ip_address)
+    risk_fields = {'risk_score': risk.score_percent, 'risk_reasons': ','.join(risk.reasons),
+                   'ip_address': ip_address, 'country_code': location.country_code,
+                   'country_name': location.country_name[:60]}
+    if risk.blocked:
+        logger.warning(f"Blocked signup OTP to {user.whatsapp_number}: {risk.reasons}")
+        otp_log = OTPLog.objects.create(user=user, identifier=user.whatsapp_number, channel='whatsapp',
+                                        status='blocked', **risk_fields)
+        return None, otp_log
+
+    with tenant_atomic(user.pk):
+        if OTP_MODE == 'totp':
+            otp = issue_code(user.whatsapp_number, 'signup', step=TOTP_SIGNUP_STEP)
+            otp_hash, expires_at = '', code_expires_at(step=TOTP_SIGNUP_STEP)
+        else:
+            otp = new_otp_code()
+            otp_hash, expires_at = hash_otp(otp, user.whatsapp_number), timezone.now() + timedelta(minutes=10)
+            user.verification_otp, user.otp_expires_at = otp_hash, expires_at
+            user.save(update_fields=['verification_otp', 'otp_expires_at'])
+        otp_log = OTPLog.objects.create(
+            user=user,
+            identifier=user.whatsapp_number,
+            channel='whatsapp',
+            otp_hash=otp_hash,
+            status='pending',
+            expires_at=expires_at,
+            **risk_fields,
+        )
+        expires_in = max(int((expires_at - timezone.now()).total_seconds()), 1)
+        dispatch_otp_delivery(otp_log.id, user.whatsapp_number, otp, 'whatsapp', expires_in=expires_in)
+    return otp, otp_log  # otp is returned only to show in UI for demo; remove in production
 
 
 def verify_registration_otp(user, submitted_otp: str) -> bool:
     """Verify the registration OTP submitted by the user."""
-    if timezone.now() > user.otp_expires_at:
-        return False
-    expected = hash_otp(submitted_otp, user.whatsapp_number)
-    if expected == user.verification_otp:
-        user.is_verified = True
+    from .models import OTPLog
+    if OTP_MODE == 'totp':
+        if not check_code(user.whatsapp_number, submitted_otp, 'signup', step=TOTP_SIGNUP_STEP):
+            return False
+        open_logs = OTPLog.objects.filter(user=user, otp_hash='', status__in=OTPLog.OPEN_STATUSES)
+    else:
+        if user.otp_expires_at is None or timezone.now() > user.otp_expires_at:
+            return False  # no code issued (blocked send) or swept by maintenance
+        expected = hash_otp(submitted_otp, user.whatsapp_number)
+        if expected != user.verification_otp:
+            return False
         user.verification_otp = ''
+        open_logs = OTPLog.objects.filter(user=user, otp_hash=expected, status__in=OTPLog.OPEN_STATUSES)
+    user.is_verified = True
+    with tenant_atomic(user.pk):
         user.save(update_fields=['is_verified', 'verification_otp'])
-        return True
-    return False
+        change_otp_status(open_logs, 'verified', verified_at=timezone.now())
+    return True
 
 
-def credit_user_account(user, credits: float, transaction) -> bool:
-    """Credit a user's account after successful payment."""
-    from .models import CreditBalance
-    balance, _ = CreditBalance.objects.get_or_create(user=user)
-    balance.balance += credits
-    balance.total_topped_up += transaction.amount_usd
-    balance.save()
+# ─────────────────────────────────────────────
+#  API Sends (live keys)
+# ─────────────────────────────────────────────
+
+EMAIL_OTP_COST = getattr(settings, 'EMAIL_OTP_COST', 0.001)
+OTP_MAX_VERIFY_ATTEMPTS = getattr(settings, 'OTP_MAX_VERIFY_ATTEMPTS', 5)
+
+api_verify_limiter = AttemptLimiter(OTP_MAX_VERIFY_ATTEMPTS, 3600)
+_coverage_by_dial = None
+
+
+def otp_price(identifier: str, channel: str) -> tuple:
+    """``(country_code, country_name, credits)`` for one OTP; unlisted dial codes pay the highest rate."""
+    global _coverage_by_dial
+    if channel == 'email':
+        return '', '', EMAIL_OTP_COST
+    if _coverage_by_dial is None:
+        _coverage_by_dial = {c['dial'].lstrip('+'): c for c in COVERAGE_DATA}
+    prefix, listed = dial_prefix(''.join(filter(str.isdigit, identifier)))
+    if not listed:
+        return '', '', max(c['cost'] for c in COVERAGE_DATA)
+    country = _coverage_by_dial[prefix]
+    return country['code'], country['country'], country['cost']
+
+
+def send_api_otp(api_key, identifier: str, channel: str = 'whatsapp', expires_in: int = 300,
+                 ip_address: str = None) -> dict:
+    """
+    Send an OTP for a live API key: fraud check, debit, ``OTPLog`` row and
+    queued delivery. Returns the API response body. API OTPs always have a
+    row (for billing and logs), so the code hash is kept on it whatever
+    ``OTP_MODE`` is.
+    """
+    from .models import OTPLog
+    risk = assess_send(identifier, channel, api_key.id, ip_address)
+    country_code, country_name, credits = otp_price(identifier, channel)
+    if not country_code:  # no dial-code country (email, unlisted prefix): fall back to the caller's IP
+        location = locate(ip_address)
+        country_code, country_name = location.country_code, location.country_name[:60]
+    fields = {'user_id': api_key.user_id, 'api_key_id': api_key.id, 'identifier': identifier,
+              'channel': channel, 'country_code': country_code, 'country_name': country_name,
+              'ip_address': ip_address, 'risk_score': risk.score_percent,
+              'risk_reasons': ','.join(risk.reasons)}
+    if risk.blocked:
+        logger.warning(f"Blocked API OTP to {identifier} for key {api_key.id}: {risk.reasons}")
+        OTPLog.objects.create(status='blocked', **fields)
+        return {'success': False, 'error': 'blocked'}
+
+    otp = new_otp_code()
+    expires_at = timezone.now() + timedelta(seconds=expires_in)
+    otp_log = OTPLog(otp_hash=hash_otp(otp, identifier), status='pending', expires_at=expires_at, **fields)
+    with tenant_atomic(api_key.user_id):
+        if not debit_user_account(api_key.user_id, credits, otp_log):
+            return {'success': False, 'error': 'insufficient_credits'}
+        dispatch_otp_delivery(otp_log.id, identifier, otp, channel, expires_in=expires_in)
+    return {'success': True, 'otp_id': str(otp_log.id), 'status': 'pending', 'channel': channel,
+            'expires_at': expires_at.isoformat(), 'latency_ms': None}
+
+
+def verify_api_otp(api_key, otp_id, code: str) -> dict:
+    """Check ``code`` against an OTP sent with ``api_key``; at most ``OTP_MAX_VERIFY_ATTEMPTS`` wrong guesses."""
+    from .models import OTPLog
+    if api_verify_limiter.blocked(otp_id):
+        return {'success': False, 'error': 'too_many_attempts'}
+    log = (OTPLog.objects.filter(pk=otp_id, api_key_id=api_key.id)
+           .values('identifier', 'otp_hash', 'status', 'expires_at').first())
+    if log is None or log['status'] in ('failed', 'blocked'):
+        return {'success': False, 'error': 'not_found'}
+    if log['status'] == 'verified':
+        return {'success': False, 'error': 'already_verified'}
+    now = timezone.now()
+    if log['status'] == 'expired' or now > log['expires_at']:
+        return {'success': False, 'error': 'expired'}
+    if not hmac.compare_digest(hash_otp(code, log['identifier']), log['otp_hash']):
+        api_verify_limiter.hit(otp_id)
+        return {'success': False, 'error': 'invalid_code'}
+    rows = change_otp_status(OTPLog.objects.filter(pk=otp_id, status__in=OTPLog.OPEN_STATUSES),
+                             'verified', verified_at=now)
+    if not rows:  # a concurrent request verified it first
+        return {'success': False, 'error': 'already_verified'}
+    return {'success': True, 'otp_id': str(otp_id), 'status': 'verified'}
+
+
+# ─────────────────────────────────────────────
+#  Credit Arithmetic
+# ─────────────────────────────────────────────
+
+CREDIT_QUANTUM = Decimal('0.0001')  # matches CreditBalance.balance decimal_places
+
+
+def to_credits(value) -> Decimal:
+    """Coerce a credit amount to an exact 4dp Decimal (floats go through str, never binary)."""
+    if not isinstance(value, Decimal):
+        value = Decimal(str(value))
+    return value.quantize(CREDIT_QUANTUM, rounding=ROUND_HALF_UP)
+
+
+def credit_user_account(user, credits, transaction) -> bool:
+    """
+    Credit a user's account after successful payment.
+
+    Idempotent per transaction: a repeated gateway callback finds the
+    transaction already completed and credits nothing.
+    """
+    from .models import CreditBalance, Transaction
+    credits = to_credits(credits)
+    with tenant_atomic(user.pk):
+        claimed = (Transaction.objects.filter(pk=transaction.pk)
+                   .exclude(status='completed').update(status='completed'))
+        if not claimed:
+            return False
+        CreditBalance.objects.get_or_create(user=user)
+        CreditBalance.objects.filter(user=user).update(
+            balance=F('balance') + credits,
+            total_topped_up=F('total_topped_up') + transaction.amount_usd,
+            updated_at=timezone.now(),
+        )
+        db_transaction.on_commit(lambda: invalidate_billing(user.pk))
     transaction.status = 'completed'
-    transaction.save()
     return True
 
 
-def debit_user_account(user, credits: float, otp_log) -> bool:
-    """Debit credits when an OTP is sent."""
+def debit_user_account(user, credits, otp_log) -> bool:
+    """
+    Debit credits when an OTP is sent and save ``otp_log`` with its cost.
+    Fails without writing if the balance is short. ``user`` may be a User or its pk.
+    """
     from .models import CreditBalance
-    balance, _ = CreditBalance.objects.get_or_create(user=user)
-    if balance.balance < credits:
-        return False
-    balance.balance -= credits
-    balance.total_consumed += credits
-    balance.save()
-    otp_log.cost_credits = credits
-    otp_log.save()
+    credits = to_credits(credits)
+    with tenant_atomic(getattr(user, 'pk', user)):
+        debited = CreditBalance.objects.filter(user=user, balance__gte=credits).update(
+            balance=F('balance') - credits,
+            total_consumed=F('total_consumed') + credits,
+            updated_at=timezone.now(),
+        )
+        if not debited:
+            return False
+        otp_log.cost_credits = credits
+        otp_log.save()
+        db_transaction.on_commit(lambda: invalidate_billing(otp_log.user_id))
+        if otp_log.api_key_id:
+            db_transaction.on_commit(lambda: record_usage(otp_log.api_key_id, credits, requests=0))
     return True
 
 
+def refund_otp_credits(queryset) -> int:
+    """
+    Give back the credits charged for the OTPLog rows in ``queryset``: one
+    balance UPDATE for all owners, one ``refund`` Transaction per owner, and
+    ``cost_credits`` zeroed so a row is never refunded twice. Returns the
+    number of rows refunded. Runs on the shard in context, like ``change_otp_status``.
+    """
+    from .models import CreditBalance, OTPLog, Transaction
+    with tenant_atomic():
+        rows = list(queryset.filter(cost_credits__gt=0).select_for_update()
+                    .values_list('pk', 'user_id', 'cost_credits'))
+        if not rows:
+            return 0
+        totals, sends = defaultdict(Decimal), defaultdict(int)
+        for _, user_id, credits in rows:
+            totals[user_id] += credits
+            sends[user_id] += 1
+        OTPLog.objects.filter(pk__in=[pk for pk, _, _ in rows]).update(cost_credits=0)
+        refund = Case(*(When(user_id=user_id, then=Value(credits)) for user_id, credits in totals.items()),
+                      output_field=DecimalField(max_digits=12, decimal_places=4))
+        CreditBalance.objects.filter(user_id__in=list(totals)).update(
+            balance=F('balance') + refund,
+            total_consumed=F('total_consumed') - refund,
+            updated_at=timezone.now(),
+        )
+        Transaction.objects.bulk_create([
+            Transaction(user_id=user_id, transaction_type='refund', credits=credits, status='completed',
+                        description=f"Refund for {sends[user_id]} OTP send{'s' if sends[user_id] != 1 else ''}")
+            for user_id, credits in totals.items()
+        ])
+        for user_id in totals:
+            db_transaction.on_commit(partial(invalidate_billing, user_id))
+    return len(rows)
+
+
 # ─────────────────────────────────────────────
 #  Static Coverage Data
 # ─────────────────────────────────────────────
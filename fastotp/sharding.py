@@ -0,0 +1,574 @@
+"""
+FastOTP Tenant Sharding
+=======================
+Spreads the per-tenant tables (``OTPLog``, ``Transaction``, ``CreditBalance``)
+over the database aliases in ``DATABASE_SHARDS``; every other table stays on
+``default``. A tenant (user) lives on the alias its ``User.id`` lands on in a
+consistent hash ring (``SHARD_VIRTUAL_NODES`` points per alias), unless a
+``TenantPlacement`` row pins it elsewhere. Adding an alias to the ring only
+re-homes about 1/N of the tenants, and those are moved by
+``python manage.py rebalance_shards`` while the app keeps serving.
+
+``ShardRouter`` sends each sharded query to its tenant's shard, taken from:
+
+    the instance          saves, ``user.otp_logs``, ``user.credit_balance``
+    ``tenant(user_id)``   set per request by ``TenantMiddleware`` / the API views
+    ``on_shard(alias)``   per-shard jobs: sweeper, reports, admin changelists
+
+A sharded query with none of these raises ``UnroutedQuery`` rather than
+guessing. Writes that touch a tenant's rows and ``default`` together (a debit
+with its OTP row and webhook outbox) run in ``tenant_atomic``. Cross-shard
+reads go through ``fan_out``, which runs a function on every shard at once.
+
+With a single alias (the default) the router and middleware step aside and
+nothing here costs a query.
+"""
+import bisect
+import contextvars
+import hashlib
+import logging
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass
+from datetime import timedelta
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, transaction
+from django.db.models import Q
+from django.http import HttpResponse
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+DATABASE_SHARDS = getattr(settings, 'DATABASE_SHARDS', [DEFAULT_DB_ALIAS])
+SHARD_VIRTUAL_NODES = getattr(settings, 'SHARD_VIRTUAL_NODES', 256)
+SHARD_PLACEMENT_TTL = getattr(settings, 'SHARD_PLACEMENT_TTL', 5)
+SHARD_FAN_OUT_WORKERS = getattr(settings, 'SHARD_FAN_OUT_WORKERS', 8)
+SHARD_MOVE_BATCH_SIZE = getattr(settings, 'SHARD_MOVE_BATCH_SIZE', 2000)
+SHARD_MOVE_GRACE = 2  # seconds on top of SHARD_PLACEMENT_TTL for requests already in flight
+SHARD_MOVE_SYNC_WINDOW = timedelta(hours=1)  # longest OTP lifetime: older settled rows no longer change
+
+SHARDED_MODELS = ('fastotp.OTPLog', 'fastotp.Transaction', 'fastotp.CreditBalance')
+
+
+class UnroutedQuery(Exception):
+    """A sharded model was queried outside ``tenant()`` / ``on_shard()`` with no instance to route by."""
+
+
+class TenantMoving(Exception):
+    """A write to a tenant frozen for the cut-over of a move; retry in a few seconds."""
+
+
+class ShardMoveError(Exception):
+    pass
+
+
+def as_uuid(value) -> uuid.UUID:
+    return value if isinstance(value, uuid.UUID) else uuid.UUID(str(value))
+
+
+# ─────────────────────────────────────────────
+#  Hash ring
+# ─────────────────────────────────────────────
+
+def _hash(key: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'big')
+
+
+class HashRing:
+    """Consistent hash ring over shard aliases, ``virtual_nodes`` points per alias."""
+
+    def __init__(self, aliases, virtual_nodes: int = SHARD_VIRTUAL_NODES):
+        self.aliases = tuple(aliases)
+        points = sorted((_hash(f'{alias}#{i}'.encode()), alias)
+                        for alias in self.aliases for i in range(virtual_nodes))
+        self._points = [point for point, _ in points]
+        self._owners = [alias for _, alias in points]
+
+    def node(self, user_id) -> str:
+        if len(self.aliases) == 1:
+            return self.aliases[0]
+        index = bisect.bisect(self._points, _hash(as_uuid(user_id).bytes))
+        return self._owners[index % len(self._owners)]
+
+
+ring = HashRing(DATABASE_SHARDS)
+
+
+def is_sharded(model) -> bool:
+    return len(ring.aliases) > 1 and model._meta.label in SHARDED_MODELS
+
+
+# ─────────────────────────────────────────────
+#  Placements
+# ─────────────────────────────────────────────
+
+@dataclass(frozen=True)
+class Placement:
+    shard: str
+    copy_shard: str = ''  # second shard holding a copy of the tenant's rows while it moves
+    frozen: bool = False  # writes refused during a move's cut-over
+
+
+_placements = {}
+_guests = {}  # alias -> tenants whose rows there are only a move's copy
+_placements_loaded_at = None
+_placements_lock = threading.Lock()
+
+
+def refresh_placements():
+    global _placements, _guests, _placements_loaded_at
+    from .models import TenantPlacement
+    with _placements_lock:
+        placements, guests = {}, defaultdict(set)
+        rows = TenantPlacement.objects.using(DEFAULT_DB_ALIAS).values_list('user_id', 'shard', 'copy_shard', 'frozen')
+        for user_id, shard, copy_shard, frozen in rows:
+            placements[user_id] = Placement(shard, copy_shard, frozen)
+            if copy_shard:
+                guests[copy_shard].add(user_id)
+        _placements, _guests = placements, {alias: frozenset(ids) for alias, ids in guests.items()}
+        _placements_loaded_at = time.monotonic()
+
+
+def placements() -> dict:
+    """
+    ``{user_id: Placement}`` for tenants off their ring shard or mid-move. The
+    table is small and re-read at most every ``SHARD_PLACEMENT_TTL`` seconds
+    per worker, which bounds how long a worker can route by a stale placement.
+    """
+    if len(ring.aliases) > 1 and (_placements_loaded_at is None
+                                  or time.monotonic() - _placements_loaded_at > SHARD_PLACEMENT_TTL):
+        refresh_placements()
+    return _placements
+
+
+def shard_for(user_id) -> str:
+    """The alias holding ``user_id``'s rows."""
+    user_id = as_uuid(user_id)
+    placement = placements().get(user_id)
+    return placement.shard if placement else ring.node(user_id)
+
+
+def guest_tenants(alias: str) -> frozenset:
+    placements()
+    return _guests.get(alias, frozenset())
+
+
+def owned_rows(queryset, alias: str):
+    """``queryset`` without the copies of tenants being moved onto or off ``alias``."""
+    guests = guest_tenants(alias)
+    return queryset.exclude(user_id__in=guests) if guests else queryset
+
+
+# ─────────────────────────────────────────────
+#  Routing
+# ─────────────────────────────────────────────
+
+_route = contextvars.ContextVar('fastotp_shard_route', default=None)  # (user_id, None) or (None, alias)
+
+
+@contextmanager
+def tenant(user_id):
+    """Route sharded queries in this block to ``user_id``'s shard."""
+    token = _route.set((as_uuid(user_id), None))
+    try:
+        yield
+    finally:
+        _route.reset(token)
+
+
+@contextmanager
+def on_shard(alias: str):
+    """Route sharded queries in this block to ``alias``, whoever owns the rows."""
+    token = _route.set((None, alias))
+    try:
+        yield
+    finally:
+        _route.reset(token)
+
+
+def current_shard():
+    """Alias the current ``tenant()`` / ``on_shard()`` block routes to, or ``None`` outside one."""
+    route = _route.get()
+    if route is None:
+        return None
+    user_id, alias = route
+    return alias or shard_for(user_id)
+
+
+@contextmanager
+def tenant_atomic(user_id=None):
+    """
+    ``transaction.atomic()`` for a tenant's rows (``user_id``, or the tenant or
+    shard in context) and the ``default`` rows written with them. When the
+    tenant lives off ``default`` this is one block per database, the shard's
+    inside ``default``'s: the shard commits first and ``default`` (webhook
+    outbox, ``on_commit`` hooks) right after, not as one atomic commit.
+    """
+    with ExitStack() as stack:
+        if user_id is not None:
+            stack.enter_context(tenant(user_id))
+        stack.enter_context(transaction.atomic())
+        alias = current_shard()
+        if alias and alias != DEFAULT_DB_ALIAS:
+            stack.enter_context(transaction.atomic(using=alias))
+        yield
+
+
+def _hinted_tenant(instance):
+    if instance is None:
+        return None
+    if instance._meta.label == settings.AUTH_USER_MODEL:
+        return instance.pk
+    return getattr(instance, 'user_id', None)
+
+
+class ShardRouter:
+    """
+    Routes ``SHARDED_MODELS`` to their tenant's shard; ``None`` (next router)
+    for everything else and for tenants on ``default``, so replica reads still
+    apply there. Runs before ``PrimaryReplicaRouter``. Every alias gets the
+    full schema, so ``migrate --database <shard>`` needs no special casing.
+    """
+
+    def _db(self, model, hints, write: bool):
+        if not is_sharded(model):
+            return None
+        user_id, alias = _hinted_tenant(hints.get('instance')), None
+        if user_id is None:
+            user_id, alias = _route.get() or (None, None)
+        if user_id is not None:
+            placement = placements().get(user_id)
+            if write and placement and placement.frozen:
+                raise TenantMoving(f"Tenant {user_id} is being moved to {placement.copy_shard}; retry shortly")
+            alias = placement.shard if placement else ring.node(user_id)
+        if alias is None:
+            raise UnroutedQuery(f"{model._meta.label} query outside tenant()/on_shard() with "
+                                f"{len(ring.aliases)} shards configured")
+        return None if alias == DEFAULT_DB_ALIAS else alias
+
+    def db_for_read(self, model, **hints):
+        return self._db(model, hints, write=False)
+
+    def db_for_write(self, model, **hints):
+        return self._db(model, hints, write=True)
+
+
+class TenantMiddleware:
+    """
+    Route each request's sharded queries to the signed-in user's shard (or the
+    signing-up user's, from ``pending_user_id``), and answer writes to a tenant
+    frozen mid-move with a 503 the client can retry. Removed from the stack
+    when only one shard is configured.
+    """
+
+    def __init__(self, get_response):
+        if len(ring.aliases) == 1:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        user = request.user
+        user_id = user.pk if user.is_authenticated else request.session.get('pending_user_id')
+        if not user_id:
+            return self.get_response(request)
+        with tenant(user_id):
+            return self.get_response(request)
+
+    def process_exception(self, request, exception):
+        if isinstance(exception, TenantMoving):
+            response = HttpResponse('Your account is briefly read-only while it is moved. Retry in a few seconds.',
+                                    status=503, content_type='text/plain')
+            response['Retry-After'] = str(SHARD_PLACEMENT_TTL + SHARD_MOVE_GRACE)
+            return response
+        return None
+
+
+# ─────────────────────────────────────────────
+#  Fan-out
+# ─────────────────────────────────────────────
+
+_pool = None
+_pool_lock = threading.Lock()
+_in_fan_out = threading.local()
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        from concurrent.futures import ThreadPoolExecutor
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=SHARD_FAN_OUT_WORKERS, thread_name_prefix='shard-fan-out')
+    return _pool
+
+
+def _run_on_shard(func, alias):
+    _in_fan_out.active = True
+    try:
+        with on_shard(alias):
+            return func(alias)
+    finally:
+        _in_fan_out.active = False
+        close_old_connections()  # keeps persistent (CONN_MAX_AGE) connections for the next fan-out
+
+
+def fan_out(func, aliases=None) -> dict:
+    """
+    ``{alias: func(alias)}`` for every shard (or ``aliases``), run at once on
+    pool threads, each inside ``on_shard(alias)`` on its own connection. With
+    one shard, or from inside another fan-out, it runs inline.
+    """
+    aliases = tuple(aliases or ring.aliases)
+    if len(aliases) == 1 or getattr(_in_fan_out, 'active', False):
+        results = {}
+        for alias in aliases:
+            with on_shard(alias):
+                results[alias] = func(alias)
+        return results
+    futures = {alias: _get_pool().submit(_run_on_shard, func, alias) for alias in aliases}
+    return {alias: future.result() for alias, future in futures.items()}
+
+
+def delete_tenant_rows(user_id, batch_size: int = SHARD_MOVE_BATCH_SIZE):
+    """
+    Delete a removed user's rows from every shard but ``default`` (whose rows
+    go with the user's own cascade): Django cascades only within one database.
+    """
+    from .models import CreditBalance, OTPLog, Transaction
+
+    def delete(alias):
+        for model in (OTPLog, Transaction, CreditBalance):
+            _delete_rows(model, user_id, alias, batch_size)
+
+    fan_out(delete, [alias for alias in ring.aliases if alias != DEFAULT_DB_ALIAS])
+
+
+def clear_api_key_rows(api_key_id, user_id):
+    """
+    ``SET NULL`` a deleted API key on its owner's ``OTPLog`` rows off
+    ``default`` (and on a move's copy): the delete's own ``on_delete`` only
+    reaches the database the key lives on.
+    """
+    from .models import OTPLog
+    placement = placements().get(as_uuid(user_id))
+    aliases = {shard_for(user_id), placement.copy_shard if placement else ''} - {'', DEFAULT_DB_ALIAS}
+    if aliases:
+        fan_out(lambda alias: OTPLog._base_manager.using(alias).filter(user_id=user_id, api_key_id=api_key_id)
+                .update(api_key=None), aliases)
+
+
+def first_on_any_shard(queryset):
+    """The first row of ``queryset`` on whichever shard has one, e.g. a transaction by gateway reference."""
+    found = fan_out(lambda alias: owned_rows(queryset.using(alias), alias).first())
+    return next((row for row in found.values() if row is not None), None)
+
+
+# ─────────────────────────────────────────────
+#  Moving tenants
+# ─────────────────────────────────────────────
+
+@dataclass(frozen=True)
+class MoveResult:
+    user_id: uuid.UUID
+    source: str
+    target: str
+    rows: int = 0            # copied in the online pass
+    synced: int = 0          # re-copied at cut-over
+    frozen_seconds: float = 0.0
+
+    @property
+    def moved(self) -> bool:
+        return self.source != self.target
+
+
+def _place(user_id, **fields):
+    from .models import TenantPlacement
+    TenantPlacement.objects.using(DEFAULT_DB_ALIAS).update_or_create(user_id=user_id, defaults=fields)
+
+
+def _copy_rows(model, user_id, source: str, target: str, batch_size: int, since=None, pks=()) -> int:
+    """Upsert ``user_id``'s rows (those created after ``since`` or in ``pks``, if given) from source to target."""
+    rows = model._base_manager.using(source).filter(user_id=user_id).order_by('pk')
+    if since is not None:
+        rows = rows.filter(Q(created_at__gte=since) | Q(pk__in=list(pks)))
+    fields = [f.name for f in model._meta.concrete_fields if not f.primary_key]
+    copied, last = 0, None
+    while batch := list((rows.filter(pk__gt=last) if last else rows)[:batch_size]):
+        with transaction.atomic(using=target):
+            model._base_manager.using(target).bulk_create(batch, update_conflicts=True, unique_fields=['id'],
+                                                          update_fields=fields)
+        copied += len(batch)
+        last = batch[-1].pk
+    return copied
+
+
+def _copy_balance(user_id, source: str, target: str) -> int:
+    """Balances have per-database integer PKs, so they are matched on ``user_id``, never copied by PK."""
+    from .models import CreditBalance
+    row = (CreditBalance._base_manager.using(source).filter(user_id=user_id)
+           .values('balance', 'total_topped_up', 'total_consumed').first())
+    if row is None:
+        return 0
+    CreditBalance._base_manager.using(target).update_or_create(user_id=user_id, defaults=row)
+    return 1
+
+
+def _delete_rows(model, user_id, alias: str, batch_size: int):
+    rows = model._base_manager.using(alias).filter(user_id=user_id)
+    while pks := list(rows.values_list('pk', flat=True)[:batch_size]):
+        model._base_manager.using(alias).filter(pk__in=pks).delete()
+
+
+def _fingerprint(user_id, alias: str) -> tuple:
+    from .models import CreditBalance, OTPLog, Transaction
+    return (
+        OTPLog._base_manager.using(alias).filter(user_id=user_id).count(),
+        Transaction._base_manager.using(alias).filter(user_id=user_id).count(),
+        CreditBalance._base_manager.using(alias).filter(user_id=user_id)
+        .values_list('balance', 'total_topped_up', 'total_consumed').first(),
+    )
+
+
+def move_tenants(moves: dict, batch_size: int = SHARD_MOVE_BATCH_SIZE, settle: float = None) -> list:
+    """
+    Move each tenant in ``{user_id: target_alias}`` to its target while the app
+    keeps serving it. The group shares each wait:
+
+        1. mark the target copy as a guest (fan-out readers skip it), copy
+           every row online in ``batch_size`` upserts
+        2. freeze: writes for these tenants raise ``TenantMoving`` (503, retry)
+        3. re-copy what could have changed since step 1 (rows newer than
+           ``SHARD_MOVE_SYNC_WINDOW``, open OTPs, pending top-ups, the
+           balance), compare row counts and balances, point the placement at
+           the target and unfreeze
+        4. delete the source rows once every worker routes to the target
+
+    ``settle`` is how long a placement change takes to reach every worker
+    (``SHARD_PLACEMENT_TTL`` + ``SHARD_MOVE_GRACE``). A move interrupted at any
+    step resumes when run again. Patches ``created_at`` process-wide while it
+    copies (``datagen.explicit_timestamps``), so run it from a management
+    command. Returns a ``MoveResult`` per tenant; tenants whose copy did not
+    match are left on their source and raise ``ShardMoveError`` at the end.
+    """
+    from .datagen import explicit_timestamps
+    from .models import CreditBalance, OTPLog, TenantPlacement, Transaction
+    moves = {as_uuid(user_id): target for user_id, target in moves.items()}
+    unknown = set(moves.values()) - set(ring.aliases)
+    if unknown:
+        raise ShardMoveError(f"Unknown shard(s) {', '.join(sorted(unknown))}; choose from {', '.join(ring.aliases)}")
+    settle = SHARD_PLACEMENT_TTL + SHARD_MOVE_GRACE if settle is None else settle
+    refresh_placements()
+
+    sources, copying, cut_over = {}, [], []
+    for user_id, target in moves.items():
+        placement = _placements.get(user_id)
+        sources[user_id] = source = placement.shard if placement else ring.node(user_id)
+        if placement and placement.copy_shard and target not in (placement.shard, placement.copy_shard):
+            raise ShardMoveError(f"Tenant {user_id} is mid-move between {placement.shard} and "
+                                 f"{placement.copy_shard}; finish that move first")
+        if source != target:
+            copying.append(user_id)
+        elif placement and placement.copy_shard:
+            cut_over.append(user_id)  # interrupted after the cut-over: only the source cleanup is left
+            sources[user_id] = placement.copy_shard
+
+    copied, synced, frozen_at, failed = {}, {}, {}, []
+    if copying:
+        for user_id in copying:
+            _place(user_id, shard=sources[user_id], copy_shard=moves[user_id], frozen=False)
+        time.sleep(settle)
+        with explicit_timestamps(OTPLog, Transaction):
+            started = timezone.now()
+            for user_id in copying:
+                source, target = sources[user_id], moves[user_id]
+                for model in (OTPLog, Transaction, CreditBalance):  # leftovers of an interrupted attempt
+                    _delete_rows(model, user_id, target, batch_size)
+                copied[user_id] = sum(_copy_rows(model, user_id, source, target, batch_size)
+                                      for model in (OTPLog, Transaction))
+                logger.info(f"Copied {copied[user_id]:,} rows of tenant {user_id} from {source} to {target}")
+
+            TenantPlacement.objects.using(DEFAULT_DB_ALIAS).filter(user_id__in=copying).update(frozen=True)
+            for user_id in copying:
+                frozen_at[user_id] = time.perf_counter()
+            time.sleep(settle)
+            since = started - SHARD_MOVE_SYNC_WINDOW
+            for user_id in copying:
+                source, target = sources[user_id], moves[user_id]
+                open_otps = (OTPLog._base_manager.using(target).filter(user_id=user_id, status__in=OTPLog.OPEN_STATUSES)
+                             .values_list('pk', flat=True))
+                pending = (Transaction._base_manager.using(target).filter(user_id=user_id, status='pending')
+                           .values_list('pk', flat=True))
+                synced[user_id] = (_copy_rows(OTPLog, user_id, source, target, batch_size, since, open_otps)
+                                   + _copy_rows(Transaction, user_id, source, target, batch_size, since, pending)
+                                   + _copy_balance(user_id, source, target))
+                if _fingerprint(user_id, source) == _fingerprint(user_id, target):
+                    _place(user_id, shard=target, copy_shard=source, frozen=False)
+                    cut_over.append(user_id)
+                else:
+                    _place(user_id, shard=source, copy_shard=target, frozen=False)
+                    failed.append(user_id)
+                    logger.error(f"Tenant {user_id}: copy on {target} does not match {source}; left on {source}")
+                frozen_at[user_id] = time.perf_counter() - frozen_at[user_id]
+
+    if cut_over:
+        time.sleep(settle)
+        for user_id in cut_over:
+            for model in (OTPLog, Transaction, CreditBalance):
+                _delete_rows(model, user_id, sources[user_id], batch_size)
+            if ring.node(user_id) == moves[user_id]:
+                TenantPlacement.objects.using(DEFAULT_DB_ALIAS).filter(user_id=user_id).delete()
+            else:
+                _place(user_id, shard=moves[user_id], copy_shard='', frozen=False)
+    refresh_placements()
+
+    if failed:
+        raise ShardMoveError(f"{len(failed)} tenant(s) did not copy cleanly and stayed put: "
+                             f"{', '.join(map(str, failed))}")
+    return [MoveResult(user_id, sources[user_id], target, copied.get(user_id, 0), synced.get(user_id, 0),
+                       frozen_at.get(user_id, 0.0))
+            for user_id, target in moves.items()]
+
+
+def move_tenant(user_id, target: str, **kwargs) -> MoveResult:
+    return move_tenants({user_id: target}, **kwargs)[0]
+
+
+def pin_tenants(aliases, batch_size: int = SHARD_MOVE_BATCH_SIZE) -> int:
+    """
+    Before changing ``DATABASE_SHARDS`` to ``aliases``: pin every tenant the
+    new ring would re-home to where it is now, so the deploy moves nothing.
+    ``rebalance_shards`` then moves the pinned tenants online. Returns the
+    number pinned.
+    """
+    from .models import TenantPlacement, User
+    future = HashRing(aliases)
+    refresh_placements()
+    pinned, batch = 0, []
+    for user_id in User.objects.using(DEFAULT_DB_ALIAS).values_list('pk', flat=True).iterator(batch_size):
+        current = shard_for(user_id)
+        if user_id not in _placements and future.node(user_id) != current:
+            batch.append(TenantPlacement(user_id=user_id, shard=current))
+        if len(batch) >= batch_size:
+            pinned += len(TenantPlacement.objects.using(DEFAULT_DB_ALIAS).bulk_create(batch, ignore_conflicts=True))
+            batch = []
+    if batch:
+        pinned += len(TenantPlacement.objects.using(DEFAULT_DB_ALIAS).bulk_create(batch, ignore_conflicts=True))
+    refresh_placements()
+    return pinned
+
+
+def misplaced_tenants() -> dict:
+    """``{user_id: target}`` for tenants pinned off their ring shard or left mid-move."""
+    refresh_placements()
+    targets = {}
+    for user_id, placement in _placements.items():
+        home = ring.node(user_id)
+        if placement.copy_shard and home not in (placement.shard, placement.copy_shard):
+            home = placement.shard  # finish the interrupted move (drop its copy) before the next one
+        if placement.shard != home or placement.copy_shard:
+            targets[user_id] = home
+    return targets
@@ -0,0 +1,31 @@
+from django.core.signals import request_finished
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import APIKey, CreditPackage, User
+
+
+@receiver([post_save, post_delete], sender=CreditPackage)
+def credit_package_changed(sender, **kwargs):
+    from .billing import invalidate_catalogue
+    invalidate_catalogue()
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    from .sharding import delete_tenant_rows, ring
+    if len(ring.aliases) > 1:
+        delete_tenant_rows(instance.pk)
+
+
+@receiver(post_delete, sender=APIKey)
+def api_key_deleted(sender, instance, **kwargs):
+    from .sharding import clear_api_key_rows, ring
+    if len(ring.aliases) > 1:
+        clear_api_key_rows(instance.pk, instance.user_id)
+
+
+@receiver(request_finished)
+def schedule_sweep(sender, **kwargs):
+    from .maintenance import maybe_schedule_sweep
+    maybe_schedule_sweep()
@@ -0,0 +1,61 @@
+"""
+Self-hosted asset tags.
+
+``{% asset_url 'vendor/htmx.min.js' %}`` resolves to the fingerprinted static
+URL once ``npm run build`` + ``collectstatic`` have produced the file, and to the
+pinned CDN copy until then, so a tree without built assets still renders.
+"""
+from django import template
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import ManifestFilesMixin, staticfiles_storage
+from django.templatetags.static import static
+
+from ..cache import TTLCache
+
+register = template.Library()
+
+# A build or collectstatic that lands while the process runs shows up within this many seconds.
+ASSET_CHECK_TTL = getattr(settings, 'ASSET_CHECK_TTL', 60)
+
+CDN_FALLBACKS = {
+    'vendor/htmx.min.js': 'https://unpkg.com/htmx.org@1.9.12/dist/htmx.min.js',
+    'vendor/alpine.min.js': 'https://unpkg.com/alpinejs@3.14.8/dist/cdn.min.js',
+    'vendor/lucide.min.js': 'https://unpkg.com/lucide@0.469.0/dist/umd/lucide.min.js',
+}
+
+COMPILED_CSS = 'css/app.css'
+
+
+_built = TTLCache(maxsize=64, ttl=ASSET_CHECK_TTL)
+
+
+def is_built(path: str) -> bool:
+    """Whether ``path`` is servable locally (manifest entry in prod, finder hit in dev), rechecked every TTL."""
+    built = _built.get(path)
+    if built is None:
+        built = _find(path)
+        _built.set(path, built)
+    return built
+
+
+def _find(path: str) -> bool:
+    if isinstance(staticfiles_storage, ManifestFilesMixin):
+        if path not in staticfiles_storage.hashed_files:
+            # collectstatic may have written the manifest after this process loaded it.
+            staticfiles_storage.hashed_files, staticfiles_storage.manifest_hash = staticfiles_storage.load_manifest()
+        return path in staticfiles_storage.hashed_files
+    return finders.find(path) is not None
+
+
+@register.simple_tag
+def asset_url(path: str) -> str:
+    if is_built(path):
+        return static(path)
+    return CDN_FALLBACKS[path]
+
+
+@register.simple_tag
+def compiled_css() -> str:
+    """URL of the purged Tailwind build, or '' when the browser JIT fallback is needed."""
+    return static(COMPILED_CSS) if is_built(COMPILED_CSS) else ''
@@ -0,0 +1,52 @@
+from decimal import Decimal
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from fastotp.models import APIKey, CreditPackage, OTPLog, Transaction, User
+
+from . import PLAIN_STORAGES
+
+
+@override_settings(STORAGES=PLAIN_STORAGES)
+class ChangelistQueryCountTests(TestCase):
+    """Changelist pages cost a fixed number of queries, however many rows and related objects they show."""
+
+    @classmethod
+    def setUpTestData(cls):
+        package = CreditPackage.objects.create(name='Starter', tier='starter', credits=500, price_usd=5,
+                                               price_per_otp=Decimal('0.01'))
+        for i in range(30):  # a distinct user and key per row: any per-row lookup shows up as 30 queries
+            user = User.objects.create_user(username=f'user{i}@x.io', email=f'user{i}@x.io', password='x')
+            key = APIKey.objects.create(user=user, name=f'Key {i}', environment='live')
+            OTPLog.objects.create(user=user, api_key=key, identifier=f'+2348031{i:06d}', status='sent')
+            Transaction.objects.create(user=user, transaction_type='topup', package=package, amount_usd=5)
+        cls.admin = User.objects.create_superuser(username='root@x.io', email='root@x.io', password='x')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def assertChangelistQueries(self, url, num):
+        with self.assertNumQueries(num):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['cl'].result_list), 30)
+
+    def test_otp_log_changelist(self):
+        # session, user, row estimate (or capped count when filtered), page rows, date drill-down
+        year = timezone.now().year
+        for url, num in (('/admin/fastotp/otplog/', 8), ('/admin/fastotp/otplog/?status__exact=sent', 7),
+                         (f'/admin/fastotp/otplog/?created_at__year={year}', 6)):
+            with self.subTest(url=url):
+                self.assertChangelistQueries(url, num)
+
+    def test_transaction_changelist(self):
+        for url, num in (('/admin/fastotp/transaction/', 8),
+                         ('/admin/fastotp/transaction/?status__exact=pending', 7)):
+            with self.subTest(url=url):
+                self.assertChangelistQueries(url, num)
+
+    def test_api_key_changelist(self):
+        for url, num in (('/admin/fastotp/apikey/', 5), ('/admin/fastotp/apikey/?environment__exact=live', 4)):
+            with self.subTest(url=url):
+                self.assertChangelistQueries(url, num)
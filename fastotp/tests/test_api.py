@@ -0,0 +1,145 @@
+import json
+from unittest import mock
+
+from django.test import TestCase
+
+from fastotp import api, apikeys, sandbox
+from fastotp.dedup import idempotency_guard, resend_guard
+from fastotp.models import APIKey, OTPLog, User
+
+
+class APITestCase(TestCase):
+    def setUp(self):
+        resend_guard.clear()
+        idempotency_guard.clear()
+        sandbox.sandbox.clear()
+        self.user = User.objects.create_user(username='dev@x.io', email='dev@x.io', password='pass12345')
+        self.key = APIKey.objects.create(user=self.user, environment='test')
+
+    def call(self, path, body, key=None, **headers):
+        key = key or self.key
+        return self.client.post(path, body if isinstance(body, str) else json.dumps(body),
+                                content_type='application/json', HTTP_AUTHORIZATION=f'Bearer {key.raw_key}',
+                                **headers)
+
+    def send(self, identifier='+2348031234567', key=None, **body):
+        return self.call('/api/v1/send', {'identifier': identifier, 'channel': 'sms', **body}, key)
+
+    def verify(self, otp_id, code=sandbox.SANDBOX_OTP_CODE, key=None):
+        return self.call('/api/v1/verify', {'otp_id': otp_id, 'code': code}, key)
+
+
+class APIAuthTests(APITestCase):
+    def test_missing_malformed_and_unknown_keys_are_unauthorized(self):
+        body = json.dumps({'identifier': '+2348031234567', 'channel': 'sms'})
+        for headers in ({}, {'HTTP_AUTHORIZATION': self.key.raw_key},
+                        {'HTTP_AUTHORIZATION': f'Basic {self.key.raw_key}'},
+                        {'HTTP_AUTHORIZATION': 'Bearer fotk_test_' + 'x' * 43}):
+            with self.subTest(headers=headers):
+                response = self.client.post('/api/v1/send', body, content_type='application/json', **headers)
+                self.assertEqual(response.status_code, 401)
+                self.assertEqual(response.json()['error'], 'unauthorized')
+
+    def test_revoked_key_is_unauthorized(self):
+        self.key.status = 'revoked'
+        self.key.save()
+        apikeys.forget_key(self.key.key_hash)
+        self.assertEqual(self.send().status_code, 401)
+
+
+class APIValidationTests(APITestCase):
+    def assertError(self, response, status, error):
+        self.assertEqual((response.status_code, response.json()['error']), (status, error))
+
+    def test_malformed_bodies(self):
+        self.assertError(self.call('/api/v1/send', '{not json'), 400, 'invalid_request')
+        self.assertError(self.call('/api/v1/send', '[1, 2]'), 400, 'invalid_request')
+        self.assertError(self.call('/api/v1/verify', {'otp_id': 42, 'code': '123456'}), 400, 'invalid_request')
+
+    def test_unknown_channel(self):
+        self.assertError(self.send(channel='pigeon'), 400, 'invalid_request')
+
+    def test_expires_in_range(self):
+        low, high = api.EXPIRES_IN_RANGE
+        for expires_in in (low - 1, high + 1, '300', 300.0, None):
+            with self.subTest(expires_in=expires_in):
+                self.assertError(self.send(expires_in=expires_in), 400, 'invalid_request')
+        for expires_in in (low, high):
+            with self.subTest(expires_in=expires_in):
+                resend_guard.clear()
+                self.assertEqual(self.send(expires_in=expires_in).status_code, 200)
+
+    def test_identifier_must_be_e164(self):
+        for identifier in ('08031234567', '+0123456789', '+12345', '+1234567890123456', '+234 803 123 4567',
+                           'dev@x.io', 42, None):
+            with self.subTest(identifier=identifier):
+                self.assertError(self.send(identifier), 400, 'invalid_identifier')
+
+    def test_email_channel_takes_an_email(self):
+        self.assertError(self.send('+2348031234567', channel='email'), 400, 'invalid_identifier')
+        self.assertEqual(self.send('dev@x.io', channel='email').status_code, 200)
+
+    def test_overlong_idempotency_key(self):
+        response = self.call('/api/v1/send', {'identifier': '+2348031234567', 'channel': 'sms'},
+                             HTTP_IDEMPOTENCY_KEY='k' * 1000)
+        self.assertError(response, 400, 'invalid_request')
+
+
+class SandboxAPITests(APITestCase):
+    def test_send_then_verify_then_replay(self):
+        sent = self.send().json()
+        self.assertTrue(sent['sandbox'])
+        self.assertEqual(sent['otp'], sandbox.SANDBOX_OTP_CODE)
+        self.assertEqual(self.verify(sent['otp_id']).json()['status'], 'verified')
+        replay = self.verify(sent['otp_id'])
+        self.assertEqual((replay.status_code, replay.json()['error']), (409, 'already_verified'))
+        self.assertFalse(OTPLog.objects.exists())
+
+    def test_otp_id_signed_for_another_key_is_not_found(self):
+        other = APIKey.objects.create(user=self.user, environment='test')
+        sent = self.send(key=other).json()
+        response = self.verify(sent['otp_id'])
+        self.assertEqual((response.status_code, response.json()['error']), (404, 'not_found'))
+        tampered = sent['otp_id'][:-1] + ('0' if sent['otp_id'][-1] != '0' else '1')
+        self.assertEqual(self.verify(tampered, key=other).json()['error'], 'not_found')
+
+    def test_wrong_codes_hit_the_attempt_limit(self):
+        otp_id = self.send().json()['otp_id']
+        for _ in range(sandbox.OTP_MAX_VERIFY_ATTEMPTS):
+            self.assertEqual(self.verify(otp_id, '000000').json()['error'], 'invalid_code')
+        response = self.verify(otp_id)
+        self.assertEqual((response.status_code, response.json()['error']), (429, 'too_many_attempts'))
+
+    def test_expired_codes(self):
+        otp_id = self.send(expires_in=60).json()['otp_id']
+        with mock.patch.object(sandbox.time, 'time', return_value=sandbox.time.time() + 61):
+            response = self.verify(otp_id)
+        self.assertEqual((response.status_code, response.json()['error']), (410, 'expired'))
+
+    def test_magic_numbers(self):
+        expected = {
+            '+15005550001': (400, 'invalid_identifier'),
+            '+15005550003': (403, 'blocked'),
+            '+15005550004': (402, 'insufficient_credits'),
+            '+15005550006': (503, 'upstream_unavailable'),
+        }
+        for identifier, (status, error) in expected.items():
+            with self.subTest(identifier=identifier):
+                response = self.send(identifier)
+                self.assertEqual((response.status_code, response.json()['error']), (status, error))
+
+        failed = self.send('+15005550002').json()
+        self.assertEqual(failed['status'], 'failed')
+        self.assertEqual(self.verify(failed['otp_id']).json()['error'], 'not_found')
+
+        slow = self.send('+15005550005').json()
+        self.assertEqual((slow['status'], slow['latency_ms']), ('sent', sandbox.SANDBOX_SLOW_LATENCY_MS))
+        self.assertEqual(self.verify(slow['otp_id']).json()['status'], 'verified')
+
+    def test_log_is_per_key_and_test_keys_only(self):
+        self.send()
+        entries = self.client.get('/api/v1/sandbox/log', HTTP_AUTHORIZATION=f'Bearer {self.key.raw_key}').json()
+        self.assertEqual([entry['action'] for entry in entries['entries']], ['send'])
+        live = APIKey.objects.create(user=self.user, environment='live')
+        response = self.client.get('/api/v1/sandbox/log', HTTP_AUTHORIZATION=f'Bearer {live.raw_key}')
+        self.assertEqual((response.status_code, response.json()['error']), (403, 'sandbox_only'))
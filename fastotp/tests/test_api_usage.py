@@ -0,0 +1,59 @@
+import json
+from decimal import Decimal
+from unittest import mock
+
+from django.test import TestCase
+
+from fastotp import services
+from fastotp.dedup import idempotency_guard, resend_guard
+from fastotp.fraud import RiskAssessment
+from fastotp.models import APIKey, APIKeyUsage, CreditBalance, User
+from fastotp.usage import usage_buffer
+
+
+class APIUsageTests(TestCase):
+    def setUp(self):
+        usage_buffer.flush()
+        resend_guard.clear()
+        idempotency_guard.clear()
+        self.user = User.objects.create_user(username='dev@x.io', email='dev@x.io', password='pass12345')
+
+    def call(self, key, path, body):
+        return self.client.post(path, json.dumps(body), content_type='application/json',
+                                HTTP_AUTHORIZATION=f'Bearer {key.raw_key}')
+
+    def requests_for(self, key) -> int:
+        usage_buffer.flush()
+        return APIKey.objects.get(pk=key.pk).total_requests
+
+    def test_every_authenticated_call_is_counted(self):
+        live = APIKey.objects.create(user=self.user, environment='live')
+        send = {'identifier': '+2348031234567', 'channel': 'sms'}
+        self.assertEqual(self.call(live, '/api/v1/send', send).status_code, 402)  # no credits yet
+        with mock.patch.object(services, 'assess_send', lambda *a, **k: RiskAssessment(RiskAssessment.BLOCK)), \
+                self.assertLogs('fastotp.services', 'WARNING'):
+            self.assertEqual(self.call(live, '/api/v1/send', send).status_code, 403)
+        CreditBalance.objects.create(user=self.user, balance=100)
+        with mock.patch.object(services, 'dispatch_otp_delivery', lambda *a, **k: None), \
+                self.captureOnCommitCallbacks(execute=True):
+            first = self.call(live, '/api/v1/send', send).json()
+        replay = self.call(live, '/api/v1/send', send).json()  # resend cooldown answers
+        self.assertEqual(replay['otp_id'], first['otp_id'])
+        self.call(live, '/api/v1/verify', {'otp_id': first['otp_id'], 'code': '000000'})
+        self.assertEqual(self.requests_for(live), 5)
+        usage = APIKeyUsage.objects.get(api_key=live)
+        self.assertEqual(usage.requests, 5)
+        self.assertGreater(usage.credits, Decimal('0'))  # only the one delivered send is charged
+
+    def test_sandbox_calls_are_counted(self):
+        test = APIKey.objects.create(user=self.user, environment='test')
+        otp_id = self.call(test, '/api/v1/send', {'identifier': '+2348031234567', 'channel': 'sms'}).json()['otp_id']
+        self.call(test, '/api/v1/verify', {'otp_id': otp_id, 'code': '123456'})
+        self.client.get('/api/v1/sandbox/log', HTTP_AUTHORIZATION=f'Bearer {test.raw_key}')
+        self.assertEqual(self.requests_for(test), 3)
+
+    def test_unauthenticated_calls_are_not_counted(self):
+        response = self.client.post('/api/v1/send', '{}', content_type='application/json',
+                                    HTTP_AUTHORIZATION='Bearer fotk_live_unknown')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(usage_buffer.pending(), 0)
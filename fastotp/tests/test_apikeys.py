@@ -0,0 +1,90 @@
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase
+
+from fastotp import apikeys
+from fastotp.apikeys import authenticate_api_key
+from fastotp.models import APIKey, User
+
+
+class APIKeyAuthenticationTests(TestCase):
+    def setUp(self):
+        apikeys._valid.clear()
+        apikeys._invalid.clear()
+        self.user = User.objects.create_user(username='dev@x.io', email='dev@x.io', password='pass12345')
+        self.key = APIKey.objects.create(user=self.user, environment='live')
+
+    def test_correct_key_authenticates(self):
+        authenticated = authenticate_api_key(self.key.raw_key)
+        self.assertEqual((authenticated.id, authenticated.user_id, authenticated.environment),
+                         (self.key.pk, self.user.pk, 'live'))
+        with self.assertNumQueries(0):
+            self.assertEqual(authenticate_api_key(self.key.raw_key), authenticated)
+
+    def test_wrong_secret_with_a_matching_lookup_is_refused(self):
+        forged = self.key.raw_key[:apikeys.LOOKUP_LENGTH] + 'x' * 43
+        self.assertEqual(apikeys.lookup_for(forged), self.key.lookup)
+        self.assertIsNone(authenticate_api_key(forged))
+        with self.assertNumQueries(0):
+            self.assertIsNone(authenticate_api_key(forged))
+
+    def test_malformed_keys_never_reach_the_database(self):
+        with self.assertNumQueries(0):
+            for raw in ('', 'sk_live_abc', self.key.raw_key[:apikeys.LOOKUP_LENGTH]):
+                self.assertIsNone(authenticate_api_key(raw))
+
+    def test_revoked_key_is_refused(self):
+        self.key.status = 'revoked'
+        self.key.save()
+        self.assertIsNone(authenticate_api_key(self.key.raw_key))
+
+    def test_revoking_clears_the_positive_cache(self):
+        self.assertIsNotNone(authenticate_api_key(self.key.raw_key))
+        self.client.force_login(self.user)
+        self.client.post(f'/dashboard/developer/keys/{self.key.pk}/revoke/')
+        self.assertIsNone(authenticate_api_key(self.key.raw_key))
+
+    def test_forgetting_a_key_clears_the_negative_cache(self):
+        self.key.status = 'revoked'
+        self.key.save()
+        self.assertIsNone(authenticate_api_key(self.key.raw_key))
+        APIKey.objects.filter(pk=self.key.pk).update(status='active')
+        self.assertIsNone(authenticate_api_key(self.key.raw_key))  # still negatively cached
+        apikeys.forget_key(self.key.key_hash)
+        self.assertIsNotNone(authenticate_api_key(self.key.raw_key))
+
+
+class HashedStorageMigrationTests(TransactionTestCase):
+    before = [('fastotp', '0004_apikeyusage')]
+    after = [('fastotp', '0006_remove_apikey_key')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes('fastotp'))
+
+    def plaintext_key(self, apps, raw_key: str, username: str):
+        user = apps.get_model('fastotp', 'User').objects.create(username=username, email=username)
+        return apps.get_model('fastotp', 'APIKey').objects.create(user_id=user.pk, key=raw_key, environment='live')
+
+    def test_backfilled_hashes_authenticate(self):
+        apps = self.migrate(self.before)
+        raw_key = apikeys.generate_key('live')
+        legacy = self.plaintext_key(apps, raw_key, 'old@x.io')
+        self.migrate(self.after)
+        apikeys._invalid.clear()
+        authenticated = authenticate_api_key(raw_key)
+        self.assertIsNotNone(authenticated)
+        self.assertEqual(authenticated.id, legacy.pk)
+        self.assertEqual(APIKey.objects.get(pk=legacy.pk).prefix, raw_key[:12] + '...')
+
+    def test_plaintext_is_kept_when_a_key_was_not_hashed(self):
+        apps = self.migrate([('fastotp', '0005_apikey_hashed_storage')])
+        self.plaintext_key(apps, apikeys.generate_key('live'), 'late@x.io')  # written after the backfill ran
+        with self.assertRaisesMessage(RuntimeError, '1 API keys have no key_hash'):
+            self.migrate(self.after)
+        self.migrate(self.before)
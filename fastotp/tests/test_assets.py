@@ -0,0 +1,26 @@
+import shutil
+import tempfile
+from pathlib import Path
+
+from django.test import SimpleTestCase, override_settings
+
+from fastotp.templatetags import fastotp_assets
+
+from . import PLAIN_STORAGES
+
+
+class AssetTagTests(SimpleTestCase):
+    def setUp(self):
+        self.static_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.static_dir)
+        fastotp_assets._built.clear()
+        self.addCleanup(fastotp_assets._built.clear)
+
+    def test_build_is_picked_up_without_a_restart(self):
+        with override_settings(STORAGES=PLAIN_STORAGES, STATICFILES_DIRS=[self.static_dir]):
+            self.assertEqual(fastotp_assets.asset_url('vendor/htmx.min.js'),
+                             fastotp_assets.CDN_FALLBACKS['vendor/htmx.min.js'])
+            (self.static_dir / 'vendor').mkdir()
+            (self.static_dir / 'vendor' / 'htmx.min.js').write_text('/* htmx */')
+            fastotp_assets._built.clear()  # the TTL elapsing
+            self.assertEqual(fastotp_assets.asset_url('vendor/htmx.min.js'), '/static/vendor/htmx.min.js')
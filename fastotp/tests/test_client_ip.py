@@ -0,0 +1,22 @@
+from django.test import RequestFactory, SimpleTestCase
+
+from fastotp.net import get_client_ip
+
+
+class ClientIPTests(SimpleTestCase):
+    def ip(self, remote_addr, forwarded=None):
+        headers = {'HTTP_X_FORWARDED_FOR': forwarded} if forwarded is not None else {}
+        return get_client_ip(RequestFactory().get('/', REMOTE_ADDR=remote_addr, **headers))
+
+    def test_forwarded_header_is_ignored_from_untrusted_peers(self):
+        self.assertEqual(self.ip('203.0.113.7', '198.51.100.1'), '203.0.113.7')
+
+    def test_rightmost_untrusted_hop_behind_a_trusted_proxy(self):
+        self.assertEqual(self.ip('127.0.0.1', '198.51.100.1'), '198.51.100.1')
+        # The client prepended a forged entry; the proxy appended the real one.
+        self.assertEqual(self.ip('127.0.0.1', '1.2.3.4, 198.51.100.1'), '198.51.100.1')
+        self.assertEqual(self.ip('127.0.0.1', '198.51.100.1, 127.0.0.2'), '198.51.100.1')
+
+    def test_malformed_client_hop(self):
+        self.assertIsNone(self.ip('127.0.0.1', 'not-an-ip'))
+        self.assertEqual(self.ip('127.0.0.1'), '127.0.0.1')
@@ -0,0 +1,80 @@
+from unittest import mock
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.test import TransactionTestCase
+
+from fastotp.db_routers import REPLICA_ALIAS, PrimaryReplicaRouter, primary_reads, replica_reads
+from fastotp.models import CreditBalance, OTPLog, User
+
+
+class ReplicaRoutingTestCase(TransactionTestCase):
+    """
+    Runs with a ``replica`` alias declared, outside the per-test transaction
+    (so ``in_atomic_block`` reflects the code under test). Queries still run on
+    ``default``: ``routed`` records where the router *would* have sent each read.
+    """
+
+    def setUp(self):
+        patcher = mock.patch.dict(settings.DATABASES, {REPLICA_ALIAS: settings.DATABASES[DEFAULT_DB_ALIAS]})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.router = PrimaryReplicaRouter()
+        self.routed = []
+        decide = PrimaryReplicaRouter.db_for_read
+
+        def spy(router, model, **hints):
+            self.routed.append((model, decide(router, model, **hints)))
+            return DEFAULT_DB_ALIAS
+
+        read_patcher = mock.patch.object(PrimaryReplicaRouter, 'db_for_read', spy)
+        read_patcher.start()
+        self.addCleanup(read_patcher.stop)
+
+    def aliases_for(self, model) -> set:
+        return {alias for routed_model, alias in self.routed if routed_model is model}
+
+
+class PrimaryReplicaRouterTests(ReplicaRoutingTestCase):
+    def test_reads_use_the_replica_only_when_asked(self):
+        self.assertEqual(PrimaryReplicaRouter.db_for_read(self.router, OTPLog), DEFAULT_DB_ALIAS)
+        self.routed.clear()
+        with replica_reads():
+            list(OTPLog.objects.all())
+            with primary_reads():
+                list(User.objects.all())
+        self.assertEqual(self.aliases_for(OTPLog), {REPLICA_ALIAS})
+        self.assertEqual(self.aliases_for(User), {DEFAULT_DB_ALIAS})
+
+    def test_writes_always_go_to_the_primary(self):
+        with replica_reads():
+            self.assertEqual(self.router.db_for_write(OTPLog), DEFAULT_DB_ALIAS)
+
+    def test_reads_after_a_write_in_a_transaction_stay_on_the_primary(self):
+        user = User.objects.create_user(username='rw@x.io', email='rw@x.io', password='pass12345')
+        CreditBalance.objects.create(user=user, balance=10)
+        self.routed.clear()
+        with replica_reads(), transaction.atomic():
+            CreditBalance.objects.filter(user=user).update(balance=5)
+            balance = CreditBalance.objects.get(user=user).balance
+        self.assertEqual(balance, 5)
+        self.assertEqual(self.aliases_for(CreditBalance), {DEFAULT_DB_ALIAS})
+
+
+class ReplicaViewTests(ReplicaRoutingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='logs@x.io', email='logs@x.io', password='pass12345')
+        OTPLog.objects.create(user=self.user, identifier='+2348030000000', channel='sms', status='sent')
+        self.client.force_login(self.user)
+        self.routed.clear()
+
+    def test_log_poll_reads_from_the_replica(self):
+        response = self.client.get('/dashboard/logs/poll/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.aliases_for(OTPLog), {REPLICA_ALIAS})
+        self.assertEqual(self.aliases_for(User), {DEFAULT_DB_ALIAS})  # session and auth stay on the primary
+
+    def test_log_page_reads_from_the_replica(self):
+        self.client.get('/dashboard/logs/')
+        self.assertEqual(self.aliases_for(OTPLog), {REPLICA_ALIAS})
@@ -0,0 +1,131 @@
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from fastotp import services
+from fastotp.dedup import SendClaim, SendGuard, deduplicated_send, forget_otp, idempotency_guard, resend_guard
+from fastotp.models import OTPLog, User
+
+from . import PLAIN_STORAGES
+
+
+class SendGuardTests(SimpleTestCase):
+    def setUp(self):
+        self.guard = SendGuard(window=30)
+
+    def test_duplicate_inside_the_window_returns_the_recorded_value(self):
+        self.assertEqual(self.guard.begin('k').status, SendClaim.NEW)
+        self.guard.finish('k', 'otp-1', alias='otp-1')
+        claim = self.guard.begin('k')
+        self.assertEqual((claim.status, claim.value), (SendClaim.DUPLICATE, 'otp-1'))
+        self.assertTrue(1 <= claim.retry_after <= 30)
+
+    def test_in_flight_until_finished(self):
+        self.guard.begin('k')
+        self.assertEqual(self.guard.begin('k').status, SendClaim.IN_FLIGHT)
+        self.guard.finish('k')  # failed send: released, nothing recorded
+        self.assertEqual(self.guard.begin('k').status, SendClaim.NEW)
+
+    def test_forget_after_finish_releases_the_key(self):
+        self.guard.begin('k')
+        self.guard.finish('k', 'otp-1', alias='otp-1')
+        self.guard.forget('otp-1')
+        self.assertEqual(self.guard.begin('k').status, SendClaim.NEW)
+
+    def test_forget_before_finish_releases_the_key(self):
+        self.guard.begin('k')
+        self.guard.forget('otp-1')  # inline delivery failed before the send returned
+        self.guard.finish('k', 'otp-1', alias='otp-1')
+        self.assertEqual(self.guard.begin('k').status, SendClaim.NEW)
+
+    def test_record_never_outlives_its_ttl(self):
+        self.guard.begin('k')
+        self.guard.finish('k', 'otp-1', ttl=0)
+        self.assertEqual(self.guard.begin('k').status, SendClaim.NEW)
+
+
+class DeduplicatedSendTests(SimpleTestCase):
+    def setUp(self):
+        resend_guard.clear()
+        idempotency_guard.clear()
+        self.sends = 0
+
+    def send(self):
+        self.sends += 1
+        return {'success': True, 'otp_id': f'otp-{self.sends}', 'status': 'sent'}
+
+    def dedup(self, send=None, identifier='+2348031234567', idempotency_key=''):
+        return deduplicated_send('key-1', identifier, 'sms', 300, send or self.send, idempotency_key=idempotency_key)
+
+    def test_duplicate_inside_the_cooldown_returns_the_same_otp(self):
+        first = self.dedup()
+        second = self.dedup()
+        self.assertEqual(second['otp_id'], first['otp_id'])
+        self.assertTrue(second['deduplicated'])
+        self.assertGreater(second['retry_after'], 0)
+        self.assertEqual(self.sends, 1)
+
+    def test_identical_send_in_flight_is_refused(self):
+        def send_while_in_flight():
+            self.nested = self.dedup()
+            return self.send()
+        self.dedup(send_while_in_flight)
+        self.assertEqual(self.nested, {'success': False, 'error': 'request_in_progress'})
+
+    def test_failed_delivery_is_not_deduplicated(self):
+        self.dedup(lambda: {'success': True, 'otp_id': 'otp-x', 'status': 'failed'})
+        self.assertEqual(self.dedup()['otp_id'], 'otp-1')
+
+    def test_forget_otp_lets_the_next_send_through(self):
+        forget_otp(self.dedup()['otp_id'])
+        self.assertEqual(self.dedup()['otp_id'], 'otp-2')
+
+    def test_idempotency_key_replays_the_first_response(self):
+        first = self.dedup(idempotency_key='order-7')
+        resend_guard.clear()
+        replay = self.dedup(idempotency_key='order-7')
+        self.assertEqual(replay, {**first, 'idempotent_replay': True})
+        self.assertEqual(self.sends, 1)
+
+    def test_idempotency_key_reused_for_another_request_conflicts(self):
+        self.dedup(idempotency_key='order-7')
+        conflict = self.dedup(identifier='+2348039999999', idempotency_key='order-7')
+        self.assertEqual(conflict, {'success': False, 'error': 'idempotency_conflict'})
+        self.assertEqual(self.sends, 1)
+
+    def test_idempotency_key_in_flight_is_refused(self):
+        def send_while_in_flight():
+            self.nested = self.dedup(identifier='+2348039999999', idempotency_key='order-7')
+            return self.send()
+        self.dedup(send_while_in_flight, idempotency_key='order-7')
+        self.assertEqual(self.nested, {'success': False, 'error': 'request_in_progress'})
+
+    def test_failed_send_does_not_claim_the_idempotency_key(self):
+        self.dedup(lambda: {'success': False, 'error': 'upstream_unavailable'}, idempotency_key='order-7')
+        self.assertEqual(self.dedup(idempotency_key='order-7')['otp_id'], 'otp-1')
+
+
+@override_settings(STORAGES=PLAIN_STORAGES)
+@mock.patch.object(services, 'dispatch_otp_delivery', lambda *a, **k: None)
+class SignupResendTests(TestCase):
+    def setUp(self):
+        resend_guard.clear()
+        self.user = User.objects.create_user(username='new@x.io', email='new@x.io', password='pass12345',
+                                             whatsapp_number='+2348031234567', is_active=False)
+        session = self.client.session
+        session['pending_user_id'] = str(self.user.pk)
+        session.save()
+
+    def test_repeated_clicks_get_the_code_already_sent(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first = self.client.post('/signup/send-otp/')
+            second = self.client.post('/signup/send-otp/')
+        self.assertEqual(OTPLog.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(first.context['demo_otp'], second.context['demo_otp'])
+        self.assertEqual(first.context['otp_log'].pk, second.context['otp_log'].pk)
+
+    def test_a_failed_delivery_lets_the_next_click_send(self):
+        first = self.client.post('/signup/send-otp/')
+        forget_otp(first.context['otp_log'].pk)
+        self.client.post('/signup/send-otp/')
+        self.assertEqual(OTPLog.objects.filter(user=self.user).count(), 2)
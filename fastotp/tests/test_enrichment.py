@@ -0,0 +1,147 @@
+import ipaddress
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from fastotp import enrichment
+from fastotp.datagen import write_mmdb
+from fastotp.enrichment import Location, UserAgent, locate, parse_user_agent
+from fastotp.geoip import METADATA_MARKER, GeoIPDatabase, GeoIPError
+
+LAGOS = {'country': {'iso_code': 'NG', 'names': {'en': 'Nigeria'}}, 'city': {'names': {'en': 'Lagos'}}}
+KENYA = {'country': {'iso_code': 'KE', 'names': {'en': 'Kenya'}}}
+ANYCAST = {'registered_country': {'iso_code': 'US', 'names': {'en': 'United States'}}}
+
+
+class UserAgentTests(SimpleTestCase):
+    def test_classification(self):
+        cases = {
+            'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+            'Chrome/126.0.0.0 Safari/537.36 Edg/126.0.0.0': UserAgent('Desktop', 'Edge 126', 'Windows'),
+            'Mozilla/5.0 (Linux; Android 14; SM-S918B) AppleWebKit/537.36 (KHTML, like Gecko) '
+            'SamsungBrowser/25.0 Chrome/121.0.0.0 Mobile Safari/537.36':
+                UserAgent('Mobile', 'Samsung Internet 25', 'Android 14'),
+            'Mozilla/5.0 (iPhone; CPU iPhone OS 17_5 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) '
+            'Version/17.5 Mobile/15E148 Safari/604.1': UserAgent('Mobile', 'Safari 17', 'iOS 17'),
+            'Mozilla/5.0 (iPad; CPU OS 16_6 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) '
+            'CriOS/125.0.6422.80 Mobile/15E148 Safari/604.1': UserAgent('Tablet', 'Chrome 125', 'iOS 16'),
+            'Mozilla/5.0 (Linux; Android 13; SM-X200) AppleWebKit/537.36 (KHTML, like Gecko) '
+            'Chrome/124.0.0.0 Safari/537.36': UserAgent('Tablet', 'Chrome 124', 'Android 13'),
+            'Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:127.0) Gecko/20100101 Firefox/127.0':
+                UserAgent('Desktop', 'Firefox 127', 'Linux'),
+            'Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)': UserAgent('Bot', 'Googlebot'),
+            'curl/8.4.0': UserAgent('Bot', 'curl'),
+            '': UserAgent(),
+        }
+        for user_agent, expected in cases.items():
+            with self.subTest(user_agent=user_agent):
+                self.assertEqual(enrichment._parse_user_agent(user_agent), expected)
+
+    def test_summary(self):
+        parsed = parse_user_agent('Mozilla/5.0 (Linux; Android 14; Pixel 8) AppleWebKit/537.36 '
+                                  '(KHTML, like Gecko) Chrome/126.0.0.0 Mobile Safari/537.36')
+        self.assertEqual(parsed.summary, 'Mobile · Chrome 126 on Android 14')
+        self.assertEqual(parse_user_agent(None).summary, '')
+
+
+class GeoIPTestCase(SimpleTestCase):
+    """A small City-shaped database written with ``fastotp.datagen.write_mmdb``."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, cls.directory)
+        cls.path = os.path.join(cls.directory, 'fixture.mmdb')
+        write_mmdb(cls.path, [
+            (ipaddress.ip_network('102.89.32.0/24'), LAGOS),
+            (ipaddress.ip_network('41.90.0.0/16'), KENYA),
+            (ipaddress.ip_network('1.1.1.0/24'), ANYCAST),
+            (ipaddress.ip_network('2c0f:f7a8::/32'), LAGOS),
+        ])
+
+    def setUp(self):
+        enrichment.clear_caches()
+        self.addCleanup(enrichment.clear_caches)
+
+    def use(self, path):
+        patcher = mock.patch.object(enrichment, 'GEOIP_DATABASE', path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class GeoIPDatabaseTests(GeoIPTestCase):
+    def test_lookup(self):
+        database = GeoIPDatabase(self.path)
+        self.addCleanup(database.close)
+        self.assertEqual(database.lookup('102.89.32.1'), LAGOS)
+        self.assertEqual(database.lookup('41.90.200.7'), KENYA)
+        self.assertEqual(database.lookup('2c0f:f7a8:1::1'), LAGOS)
+        self.assertIsNone(database.lookup('102.89.33.1'))
+        with self.assertRaises(ValueError):
+            database.lookup('not an ip')
+
+    def test_record_sizes(self):
+        for record_size in (24, 28, 32):
+            with self.subTest(record_size=record_size):
+                path = os.path.join(self.directory, f'fixture-{record_size}.mmdb')
+                write_mmdb(path, [(ipaddress.ip_network('41.90.0.0/16'), KENYA)], record_size=record_size)
+                database = GeoIPDatabase(path)
+                self.assertEqual(database.lookup('41.90.0.1'), KENYA)
+                database.close()
+
+    def test_not_a_maxmind_file(self):
+        path = os.path.join(self.directory, 'corrupt.mmdb')
+        for content in (b'\x00' * 4096, b'\x00' * 64 + METADATA_MARKER, b'\x00' * 64 + METADATA_MARKER + b'\xe1\x42ab'):
+            with self.subTest(content=content[-8:]), self.assertRaises(GeoIPError):
+                with open(path, 'wb') as fh:
+                    fh.write(content)
+                GeoIPDatabase(path)
+
+
+class LocateTests(GeoIPTestCase):
+    def test_city_and_country(self):
+        self.use(self.path)
+        self.assertEqual(locate('102.89.32.9'), Location('NG', 'Nigeria', 'Lagos'))
+        self.assertEqual(locate('102.89.32.9').display, 'Lagos, Nigeria')
+        self.assertEqual(locate('41.90.1.1').display, 'Kenya')
+        self.assertEqual(locate('1.1.1.1').country_code, 'US')  # registered country when no country
+
+    def test_unknown_and_malformed_addresses(self):
+        self.use(self.path)
+        for ip in ('8.8.8.8', 'garbage', '', None):
+            with self.subTest(ip=ip):
+                self.assertEqual(locate(ip), enrichment.UNKNOWN_LOCATION)
+
+    def test_missing_file_falls_back_to_an_empty_location(self):
+        self.use(os.path.join(self.directory, 'missing.mmdb'))
+        with self.assertLogs('fastotp.enrichment', 'WARNING'):
+            self.assertEqual(locate('102.89.32.9'), enrichment.UNKNOWN_LOCATION)
+
+    def test_corrupt_file_falls_back_to_an_empty_location(self):
+        path = os.path.join(self.directory, 'truncated.mmdb')
+        with open(self.path, 'rb') as source, open(path, 'wb') as fh:
+            fh.write(source.read()[:64])
+        self.use(path)
+        with self.assertLogs('fastotp.enrichment', 'WARNING'):
+            self.assertEqual(locate('102.89.32.9'), enrichment.UNKNOWN_LOCATION)
+
+    def test_corrupt_tree_falls_back_to_an_empty_location(self):
+        path = os.path.join(self.directory, 'scrambled.mmdb')
+        with open(self.path, 'rb') as source:
+            content = bytearray(source.read())
+        database = GeoIPDatabase(self.path)
+        tree_size = database.node_count * database.record_size // 4
+        database.close()
+        content[:tree_size] = b'\xff' * tree_size  # every record points past the data section
+        with open(path, 'wb') as fh:
+            fh.write(content)
+        self.use(path)
+        self.assertEqual(locate('102.89.32.9'), enrichment.UNKNOWN_LOCATION)
+
+    def test_no_database_configured(self):
+        self.use('')
+        self.assertEqual(locate('102.89.32.9'), enrichment.UNKNOWN_LOCATION)
@@ -0,0 +1,50 @@
+import json
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase
+
+from fastotp import fraud, services
+from fastotp.dedup import idempotency_guard, resend_guard
+from fastotp.fraud import FraudDetector
+from fastotp.models import APIKey, CreditBalance, OTPLog, User
+
+
+class PrefixLimitTests(SimpleTestCase):
+    def test_prefix_budget_is_per_api_key(self):
+        detector = FraudDetector(limits={'prefix': 3})
+        numbers = [f'+2348{n * 7919 % 10 ** 6:06d}123' for n in range(5)]
+        results = [detector.assess(number, 'sms', api_key_id='key-a', now=0) for number in numbers]
+        self.assertTrue(results[-1].blocked)
+        self.assertIn('prefix', results[-1].reasons)
+        self.assertFalse(detector.assess(numbers[0], 'sms', api_key_id='key-b', now=0).blocked)
+
+
+class IPLimitTests(TestCase):
+    def setUp(self):
+        resend_guard.clear()
+        idempotency_guard.clear()
+        self.user = User.objects.create_user(username='ip@x.io', email='ip@x.io', password='pass12345')
+        CreditBalance.objects.create(user=self.user, balance=1000)
+
+    def test_keyless_sends_are_limited_per_ip(self):
+        detector = FraudDetector()
+        numbers = [f'+23480{n * 7919 % 10 ** 5:05d}{n % 1000:03d}' for n in range(25)]
+        results = [detector.assess(number, 'sms', ip='203.0.113.9', now=0) for number in numbers]
+        self.assertTrue(results[-1].blocked)
+        self.assertIn('ip', results[-1].reasons)
+
+    def test_live_key_sends_from_one_backend_ip_are_not_blocked(self):
+        key = APIKey.objects.create(user=self.user, environment='live')
+        with mock.patch.object(fraud, 'fraud_detector', FraudDetector()), \
+                mock.patch.object(fraud, 'FRAUD_DETECTION', True), \
+                mock.patch.object(services, 'dispatch_otp_delivery', lambda *a, **k: None):
+            statuses = [
+                self.client.post('/api/v1/send',
+                                 json.dumps({'identifier': f'+23480{n * 7919 % 10 ** 5:05d}{n % 1000:03d}',
+                                             'channel': 'sms'}),
+                                 content_type='application/json', REMOTE_ADDR='203.0.113.9',
+                                 HTTP_AUTHORIZATION=f'Bearer {key.raw_key}').status_code
+                for n in range(30)
+            ]
+        self.assertEqual(set(statuses), {200})
+        self.assertEqual(OTPLog.objects.filter(api_key=key).count(), 30)
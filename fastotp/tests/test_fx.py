@@ -0,0 +1,46 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.test import TestCase
+from django.utils import timezone
+
+from fastotp import fx
+from fastotp.models import FXRate
+from fastotp.services import COVERAGE_DATA
+
+
+class FXRateTests(TestCase):
+    def setUp(self):
+        fx.invalidate_rates()
+        self.addCleanup(fx.invalidate_rates)
+
+    def test_stale_rates_are_ignored_with_a_warning(self):
+        FXRate.objects.create(currency_code='KES', rate=Decimal('130'))
+        FXRate.objects.create(currency_code='NGN', rate=Decimal('900'),
+                              fetched_at=timezone.now() - timedelta(seconds=fx.FX_MAX_AGE + 60))
+        with self.assertLogs('fastotp.fx', 'WARNING'):
+            rates = fx.get_rates()
+        self.assertEqual(rates, {'KES': Decimal('130')})
+
+    def test_payments_charge_the_last_stored_rate_even_when_stale(self):
+        FXRate.objects.create(currency_code='NGN', rate=Decimal('900'),
+                              fetched_at=timezone.now() - timedelta(seconds=fx.FX_MAX_AGE + 60))
+        with self.assertLogs('fastotp.fx', 'WARNING'):
+            self.assertEqual(fx.get_rate('NGN'), Decimal('900'))
+
+    def test_payments_never_charge_the_fallback_table(self):
+        with self.assertRaises(fx.FXRateUnavailable):
+            fx.get_rate('NGN')
+        self.assertEqual(fx.get_rate('USD'), Decimal('1'))
+
+    def test_static_prices_match_their_currency_format(self):
+        for row in COVERAGE_DATA:
+            self.assertEqual(fx.format_price(row['local_cost'], row['currency_code']), row['local_cost_display'])
+
+    def test_localized_prices_are_formatted_from_the_amount(self):
+        FXRate.objects.create(currency_code='XOF', rate=Decimal('600'))
+        FXRate.objects.create(currency_code='NGN', rate=Decimal('1500'))
+        rows = {row['currency_code']: row for row in fx.localize_coverage(COVERAGE_DATA)}
+        self.assertEqual(rows['XOF']['local_cost_display'], fx.format_price(rows['XOF']['local_cost'], 'XOF'))
+        self.assertTrue(rows['XOF']['local_cost_display'].endswith(' CFA'))
+        self.assertTrue(rows['NGN']['local_cost_display'].startswith('₦'))
@@ -0,0 +1,30 @@
+import importlib
+import os
+import sys
+from unittest import mock
+
+from django.template import engines
+from django.test import SimpleTestCase, override_settings
+
+from fastotp import hot_partials
+
+
+def api_templates(engine: str) -> list:
+    """``config.settings_api.TEMPLATES`` as loaded with ``HOT_PARTIALS_ENGINE=<engine>``."""
+    with mock.patch.dict(os.environ, {'HOT_PARTIALS_ENGINE': engine}), mock.patch.dict(sys.modules):
+        sys.modules.pop('config.settings', None)
+        sys.modules.pop('config.settings_api', None)
+        return importlib.import_module('config.settings_api').TEMPLATES
+
+
+class APISettingsTemplateTests(SimpleTestCase):
+    def test_api_settings_keep_the_django_engine_name(self):
+        with override_settings(TEMPLATES=api_templates('django')):
+            self.assertEqual([engine.name for engine in engines.all()], ['django'])
+
+    def test_both_engines_render_the_same_hot_partials_under_api_settings(self):
+        with override_settings(TEMPLATES=api_templates('jinja2')), \
+                mock.patch.object(hot_partials, 'HOT_PARTIALS_ENGINE', 'jinja2'):
+            self.assertEqual([engine.name for engine in engines.all()], ['django', 'jinja2'])
+            self.assertEqual(hot_partials.check_parity(), [])
+            self.assertEqual(hot_partials.hot_partials_parity(None), [])
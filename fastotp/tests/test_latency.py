@@ -0,0 +1,51 @@
+import threading
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase
+from django.utils import timezone
+
+from fastotp import latency
+from fastotp.latency import DDSketch, LatencyBuffer, latency_percentiles, sketch_keys, write_sketches
+from fastotp.models import User
+
+
+class LatencyBufferTests(TestCase):
+    def test_flush_runs_off_the_recording_thread(self):
+        flushed, done = [], threading.Event()
+
+        def write(pending):
+            flushed.append((threading.current_thread(), len(pending)))
+            done.set()
+
+        buffer = LatencyBuffer(interval=0)
+        with mock.patch.object(latency, 'write_sketches', write), \
+                mock.patch('django.db.connections.close_all'):
+            buffer.record(420, user_id=1, channel='sms')
+            self.assertTrue(done.wait(5))
+        [(thread, rows)] = flushed
+        self.assertIsNot(thread, threading.current_thread())
+        self.assertGreater(rows, 0)
+
+
+class LatencyQueryTests(TestCase):
+    def setUp(self):
+        latency._query_cache.clear()
+        self.addCleanup(latency._query_cache.clear)
+
+    def test_the_hour_in_progress_is_included(self):
+        now = timezone.now()
+        sketch = DDSketch()
+        sketch.add(300)
+        write_sketches({key: sketch for key in sketch_keys(7, '', '', None, now)})
+        result = latency_percentiles('7', 'all', start=now - timedelta(hours=2), end=now)
+        self.assertEqual(result['']['count'], 1)
+
+
+class LatencyStatsViewTests(TestCase):
+    def test_huge_days_is_clamped(self):
+        user = User.objects.create_user(username='lat@x.io', email='lat@x.io', password='pass12345')
+        self.client.force_login(user)
+        response = self.client.get('/dashboard/latency/', {'days': 10 ** 12})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get('/dashboard/latency/', {'end': '0001-01-01'}).status_code, 400)
@@ -0,0 +1,29 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from fastotp.maintenance import run_sweep
+from fastotp.models import User
+from fastotp.services import hash_otp
+
+
+class VerificationSweepTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='late@x.io', email='late@x.io', password='pass12345',
+                                             whatsapp_number='+2348035550199', is_active=False)
+        self.user.verification_otp = hash_otp('123456', self.user.whatsapp_number)
+        self.user.otp_expires_at = timezone.now() - timedelta(minutes=1)
+        self.user.save()
+
+    def test_verify_after_the_sweep_fails_normally(self):
+        [result] = run_sweep(['verification_otps'], pause=0)
+        self.assertEqual(result.rows, 1)
+        self.assertIsNone(User.objects.get(pk=self.user.pk).otp_expires_at)
+
+        session = self.client.session
+        session['pending_user_id'] = str(self.user.pk)
+        session.save()
+        response = self.client.post('/signup/verify-otp/', {f'd{i}': digit for i, digit in enumerate('123456', 1)})
+        self.assertContains(response, 'Invalid or expired OTP')
+        self.assertFalse(User.objects.get(pk=self.user.pk).is_verified)
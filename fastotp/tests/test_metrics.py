@@ -0,0 +1,27 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from fastotp import metrics
+
+
+class MetricsEndpointTests(SimpleTestCase):
+    def test_missing_token_hides_the_endpoint(self):
+        with mock.patch.object(metrics, 'METRICS_TOKEN', ''):
+            self.assertEqual(self.client.get('/metrics').status_code, 404)
+
+    def test_token_is_required_when_configured(self):
+        with mock.patch.object(metrics, 'METRICS_TOKEN', 's3cret'):
+            self.assertEqual(self.client.get('/metrics').status_code, 403)
+            response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer s3cret')
+        self.assertEqual(response.status_code, 200)
+
+
+class HistogramTests(SimpleTestCase):
+    def test_quantiles_stay_within_bucket_error(self):
+        hist = metrics.Histogram(metrics.SECONDS_BUCKETS)
+        for value in (0.0123, 0.25, 3.7):
+            hist.observe(value)
+        for q, value in ((0.3, 0.0123), (0.6, 0.25), (1.0, 3.7)):
+            self.assertLessEqual(hist.quantile(q), value * 2 ** 0.25 + 1e-6)
+            self.assertGreaterEqual(hist.quantile(q), value)
@@ -0,0 +1,46 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from fastotp import latency, services
+from fastotp.models import APIKey, CreditBalance, OTPLog, User
+from fastotp.services import FastOTPClient, generate_registration_otp, send_api_otp, verify_api_otp, \
+    verify_registration_otp
+
+
+class DeliveredCodeTests(TestCase):
+    """The code handed to the transport is the one whose hash is stored."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='new@x.io', email='new@x.io', password='pass12345',
+                                             whatsapp_number='+2348035550101')
+        self.sent = []
+        for patcher in (mock.patch.object(services, 'OTP_DELIVERY_ASYNC', False),
+                        mock.patch.object(FastOTPClient, 'send_code', self.fake_send_code),
+                        mock.patch.object(latency, 'latency_buffer', latency.LatencyBuffer())):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def fake_send_code(self, identifier, code, channel='whatsapp', expires_in=300, sender_id=''):
+        self.sent.append((identifier, code))
+        return {'success': True, 'message_id': 'm1', 'latency_ms': 200, 'error': None}
+
+    def test_signup_code_sent_is_the_code_verified(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            generate_registration_otp(self.user)
+        [(identifier, code)] = self.sent
+        self.assertEqual(identifier, self.user.whatsapp_number)
+        self.assertEqual(OTPLog.objects.get(user=self.user).status, 'sent')
+        self.assertTrue(verify_registration_otp(User.objects.get(pk=self.user.pk), code))
+
+    def test_api_code_sent_is_the_code_verified(self):
+        CreditBalance.objects.create(user=self.user, balance=10)
+        key = APIKey.objects.create(user=self.user, environment='live')
+        with self.captureOnCommitCallbacks(execute=True):
+            body = send_api_otp(key, '+2348035550102', 'sms')
+        [(_, code)] = self.sent
+        self.assertTrue(verify_api_otp(key, body['otp_id'], code)['success'])
+
+    def test_verify_without_an_issued_code_fails(self):
+        self.assertIsNone(self.user.otp_expires_at)
+        self.assertFalse(verify_registration_otp(self.user, '123456'))
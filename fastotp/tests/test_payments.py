@@ -0,0 +1,168 @@
+import asyncio
+import json
+import threading
+import time
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from django.test import TestCase
+
+from fastotp import fx, services
+from fastotp.models import CreditBalance, CreditPackage, FXRate, Transaction, User
+from fastotp.services import FlutterwaveGateway, GatewayError, PaystackGateway
+
+
+class StubPaystack(BaseHTTPRequestHandler):
+    """Paystack-shaped responses keyed by reference: ok, pending, down, slow; ref_abc echoes what was charged."""
+    hits = []
+    charged = {}
+
+    def _reply(self, status: int, body: dict):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        try:
+            self.wfile.write(payload)
+        except BrokenPipeError:  # the client timed out first
+            pass
+
+    def do_POST(self):
+        self.hits.append(self.path)
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        if self.path == '/transaction/initialize':
+            self.charged['ref_abc'] = body.get('amount')
+            self._reply(200, {'status': True, 'data': {'authorization_url': 'https://pay.test/abc',
+                                                       'reference': 'ref_abc'}})
+        else:
+            self._reply(404, {'message': 'not found'})
+
+    def do_GET(self):
+        self.hits.append(self.path)
+        reference = self.path.rsplit('/', 1)[-1]
+        if reference == 'down':
+            self._reply(500, {'message': 'upstream down'})
+        elif reference == 'slow':
+            time.sleep(0.5)
+            self._reply(200, {'data': {'status': 'success'}})
+        elif reference in self.charged:
+            self._reply(200, {'data': {'status': 'success', 'amount': self.charged[reference], 'currency': 'NGN'}})
+        else:
+            self._reply(200, {'data': {'status': 'ongoing' if reference == 'pending' else 'success'}})
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServerTestCase(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StubPaystack)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_address[1]}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        StubPaystack.hits.clear()
+        StubPaystack.charged.clear()
+        self.gateway = PaystackGateway(secret_key='sk_test_stub', base_url=self.base_url, timeout=2)
+        self.addCleanup(self.gateway.close)
+
+
+class PaystackGatewayTests(StubServerTestCase):
+    def test_initialize_against_stub_server(self):
+        result = self.gateway.initialize_transaction('a@b.co', 500_000, callback_url='https://x.test/cb')
+        self.assertEqual(result['reference'], 'ref_abc')
+
+    def test_settled_verification_is_cached(self):
+        self.assertEqual(self.gateway.verify_transaction('ok')['status'], 'success')
+        self.gateway.verify_transaction('ok')
+        self.assertEqual(len(StubPaystack.hits), 1)
+
+    def test_pending_verification_is_asked_again(self):
+        self.gateway.verify_transaction('pending')
+        self.gateway.verify_transaction('pending')
+        self.assertEqual(len(StubPaystack.hits), 2)
+
+    def test_provider_and_transport_errors_raise_gateway_error(self):
+        with self.assertRaises(GatewayError):
+            self.gateway.verify_transaction('down')
+        with self.assertRaises(GatewayError):
+            self.gateway.verify_transaction('slow', timeout=0.1)
+        refused = PaystackGateway(secret_key='sk_test_stub', base_url='http://127.0.0.1:9')
+        with self.assertRaises(GatewayError):
+            refused.verify_transaction('ok')
+
+    def test_async_clients_are_dropped_with_their_loop(self):
+        async def verify():
+            return await self.gateway.averify_transaction('pending')
+
+        asyncio.run(verify())
+        asyncio.run(verify())
+        self.assertEqual(len(self.gateway._async_clients), 1)
+
+
+class PaymentViewTests(StubServerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='pay@x.io', email='pay@x.io', password='pass12345')
+        CreditBalance.objects.create(user=self.user)
+        self.package = CreditPackage.objects.create(name='Starter', tier='starter', credits=500, price_usd=5,
+                                                    price_per_otp=Decimal('0.01'))
+        FXRate.objects.create(currency_code='NGN', rate=Decimal('1500'))
+        fx.invalidate_rates()
+        self.addCleanup(fx.invalidate_rates)
+        self.client.force_login(self.user)
+
+    def test_gateway_failure_fails_the_transaction(self):
+        down = PaystackGateway(secret_key='sk_test_stub', base_url='http://127.0.0.1:9')
+        with mock.patch.object(services, 'paystack_gateway', down), self.assertLogs('fastotp.views', 'ERROR'):
+            response = self.client.post('/billing/pay/', {'package_id': self.package.pk, 'gateway': 'paystack'})
+        self.assertRedirects(response, '/billing/', fetch_redirect_response=False)
+        self.assertEqual(Transaction.objects.get(user=self.user).status, 'failed')
+
+    def test_paystack_payment_without_a_stored_rate_is_refused(self):
+        FXRate.objects.all().delete()
+        fx.invalidate_rates()
+        with mock.patch.object(services, 'paystack_gateway', self.gateway), self.assertLogs('fastotp.views', 'ERROR'):
+            self.client.post('/billing/pay/', {'package_id': self.package.pk, 'gateway': 'paystack'})
+        self.assertEqual(Transaction.objects.get(user=self.user).status, 'failed')
+        self.assertEqual(StubPaystack.hits, [])
+
+    def test_paystack_callback_credits_once(self):
+        with mock.patch.object(services, 'paystack_gateway', self.gateway):
+            self.client.post('/billing/pay/', {'package_id': self.package.pk, 'gateway': 'paystack'})
+            self.client.get('/billing/verify/paystack/?reference=ref_abc')
+            self.client.get('/billing/verify/paystack/?reference=ref_abc')
+        self.assertEqual(CreditBalance.objects.get(user=self.user).balance, 500)
+
+    def test_flutterwave_callback_finds_the_transaction_by_tx_ref(self):
+        with mock.patch.object(services, 'flutterwave_gateway', FlutterwaveGateway(secret_key='')):
+            self.client.post('/billing/pay/', {'package_id': self.package.pk, 'gateway': 'flutterwave'})
+            txn = Transaction.objects.get(user=self.user)
+            self.client.get(f'/billing/verify/flutterwave/?status=successful&tx_ref={txn.pk}&transaction_id=42')
+        self.assertEqual(Transaction.objects.get(pk=txn.pk).status, 'completed')
+        self.assertEqual(CreditBalance.objects.get(user=self.user).balance, 500)
+
+    def test_unknown_paystack_reference_is_not_sent_to_the_gateway(self):
+        with mock.patch.object(services, 'paystack_gateway', self.gateway):
+            self.client.get('/billing/verify/paystack/?reference=forged')
+            self.client.get('/billing/verify/paystack/?reference=')
+        self.assertEqual(StubPaystack.hits, [])
+
+    def test_paystack_amount_mismatch_is_not_credited(self):
+        with mock.patch.object(services, 'paystack_gateway', self.gateway):
+            self.client.post('/billing/pay/', {'package_id': self.package.pk, 'gateway': 'paystack'})
+            StubPaystack.charged['ref_abc'] = 100  # ₦1 paid for the whole package
+            with self.assertLogs('fastotp.views', 'ERROR'):
+                self.client.get('/billing/verify/paystack/?reference=ref_abc')
+        self.assertEqual(Transaction.objects.get(user=self.user).status, 'failed')
+        self.assertEqual(CreditBalance.objects.get(user=self.user).balance, 0)
@@ -0,0 +1,45 @@
+from django.test import TransactionTestCase, override_settings
+
+from config import settings_api
+from fastotp import sharding
+from fastotp.bench import shard_databases
+from fastotp.models import APIKey, OTPLog, User
+
+
+class ShardedTestCase(TransactionTestCase):
+    """``default`` plus one migrated SQLite shard, with a tenant living on the shard."""
+
+    @classmethod
+    def setUpClass(cls):
+        (cls.shard,) = cls.enterClassContext(shard_databases(1))
+        cls.databases = {'default', cls.shard}  # set after the runner built the test databases
+        super().setUpClass()
+
+    def setUp(self):
+        n = 0
+        while True:
+            self.user = User.objects.create_user(username=f't{n}@x.io', email=f't{n}@x.io', password='pass12345')
+            if sharding.shard_for(self.user.pk) == self.shard:
+                break
+            n += 1
+
+    def add_log(self, **fields) -> OTPLog:
+        with sharding.tenant_atomic(self.user.pk):
+            return OTPLog.objects.create(user=self.user, identifier='+2348031234567', status='sent', **fields)
+
+
+class APIKeyDeleteTests(ShardedTestCase):
+    def test_deleting_a_key_clears_it_on_the_owners_shard(self):
+        key = APIKey.objects.create(user=self.user, environment='live')
+        log = self.add_log(api_key=key)
+        key.delete()
+        self.assertIsNone(OTPLog._base_manager.using(self.shard).get(pk=log.pk).api_key_id)
+
+
+@override_settings(MIDDLEWARE=settings_api.MIDDLEWARE)
+class APISettingsTenantTests(ShardedTestCase):
+    def test_log_poll_reads_the_tenants_shard(self):
+        self.add_log()
+        self.client.force_login(self.user)
+        response = self.client.get('/dashboard/logs/poll/')
+        self.assertContains(response, '+2348031234567')
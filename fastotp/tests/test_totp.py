@@ -0,0 +1,97 @@
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase
+
+from fastotp import services, totp
+from fastotp.models import OTPLog, User
+
+RFC_SECRET = b'12345678901234567890'
+
+
+class RFCVectorTests(SimpleTestCase):
+    def test_rfc4226_hotp_values(self):
+        expected = ['755224', '287082', '359152', '969429', '338314',
+                    '254676', '287922', '162583', '399871', '520489']
+        self.assertEqual([totp.hotp(RFC_SECRET, counter, 6) for counter in range(10)], expected)
+
+    def test_rfc6238_sha1_values(self):
+        for at, code in ((59, '94287082'), (1111111109, '07081804'), (1111111111, '14050471'),
+                         (1234567890, '89005924'), (2000000000, '69279037'), (20000000000, '65353130')):
+            with self.subTest(at=at):
+                self.assertEqual(totp.totp(RFC_SECRET, at, step=30, digits=8), code)
+
+
+class CheckCodeTests(SimpleTestCase):
+    at = 1_700_000_000
+
+    def setUp(self):
+        totp.replay_guard.clear()
+        totp.attempt_limiter.clear()
+
+    def code_at(self, at, identifier='+2348031234567'):
+        return totp.issue_code(identifier, at=at)
+
+    def test_codes_within_the_drift_window_verify(self):
+        for offset in (-totp.TOTP_STEP, 0, totp.TOTP_STEP):
+            with self.subTest(offset=offset):
+                totp.replay_guard.clear()
+                self.assertTrue(totp.check_code('+2348031234567', self.code_at(self.at + offset), at=self.at))
+
+    def test_codes_outside_the_drift_window_are_refused(self):
+        for offset in (-2 * totp.TOTP_STEP, 2 * totp.TOTP_STEP):
+            with self.subTest(offset=offset):
+                self.assertFalse(totp.check_code('+2348031234567', self.code_at(self.at + offset), at=self.at))
+
+    def test_a_used_code_is_refused(self):
+        code = self.code_at(self.at)
+        self.assertTrue(totp.check_code('+2348031234567', code, at=self.at))
+        self.assertFalse(totp.check_code('+2348031234567', code, at=self.at))
+
+    def test_an_older_code_is_refused_after_a_newer_one(self):
+        older = self.code_at(self.at - totp.TOTP_STEP)
+        self.assertTrue(totp.check_code('+2348031234567', self.code_at(self.at), at=self.at))
+        self.assertFalse(totp.check_code('+2348031234567', older, at=self.at))
+
+    def test_replay_guard_only_accepts_newer_steps(self):
+        guard = totp.ReplayGuard()
+        self.assertTrue(guard.accept('k', 10))
+        self.assertFalse(guard.accept('k', 10))
+        self.assertFalse(guard.accept('k', 9))
+        self.assertTrue(guard.accept('k', 11))
+
+    def test_wrong_guesses_lock_the_identifier(self):
+        good = self.code_at(self.at)
+        wrong = str((int(good) + 1) % 10 ** totp.TOTP_DIGITS).zfill(totp.TOTP_DIGITS)
+        for _ in range(totp.TOTP_MAX_ATTEMPTS):
+            self.assertFalse(totp.check_code('+2348031234567', wrong, at=self.at))
+        self.assertFalse(totp.check_code('+2348031234567', good, at=self.at))
+        self.assertTrue(totp.check_code('+2348039999999', self.code_at(self.at, '+2348039999999'), at=self.at))
+
+    def test_malformed_codes_never_match(self):
+        secret = totp.derive_secret('+2348031234567')
+        for code in ('', '12345', '1234567', 'abcdef'):
+            self.assertIsNone(totp.match_step(secret, code, self.at))
+
+
+@mock.patch.object(services, 'OTP_MODE', 'totp')
+class TOTPRegistrationTests(TestCase):
+    def setUp(self):
+        totp.replay_guard.clear()
+        totp.attempt_limiter.clear()
+        self.user = User.objects.create_user(username='new@x.io', email='new@x.io', password='pass12345',
+                                             whatsapp_number='+2348031234567')
+        self.log = OTPLog.objects.create(user=self.user, identifier=self.user.whatsapp_number, status='sent')
+
+    def signup_code(self):
+        return totp.issue_code(self.user.whatsapp_number, 'signup', step=services.TOTP_SIGNUP_STEP)
+
+    def test_the_issued_code_verifies_the_user_once(self):
+        code = self.signup_code()
+        self.assertTrue(services.verify_registration_otp(self.user, code))
+        self.assertTrue(User.objects.get(pk=self.user.pk).is_verified)
+        self.assertEqual(OTPLog.objects.get(pk=self.log.pk).status, 'verified')
+        self.assertFalse(services.verify_registration_otp(self.user, code))
+
+    def test_a_code_for_another_purpose_is_refused(self):
+        self.assertFalse(services.verify_registration_otp(self.user, totp.issue_code(self.user.whatsapp_number)))
+        self.assertFalse(User.objects.get(pk=self.user.pk).is_verified)
@@ -0,0 +1,103 @@
+import asyncio
+import socket
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase
+
+from fastotp import webhooks
+from fastotp.models import User, WebhookEndpoint, WebhookEvent
+from fastotp.webhooks import UnsafeWebhookURL, check_webhook_url
+
+
+@mock.patch.object(webhooks, 'WEBHOOK_ALLOW_PRIVATE', False)
+class WebhookURLCheckTests(SimpleTestCase):
+    def test_non_public_addresses_are_refused(self):
+        for url in ('https://127.0.0.1/hook', 'https://169.254.169.254/latest/meta-data/',
+                    'https://10.0.0.7/hook', 'https://[::1]/hook', 'https://[::ffff:127.0.0.1]/hook',
+                    'https://localhost:8443/hook', 'https://metadata.google.internal/',
+                    'https://0.0.0.0/hook', 'https://100.64.0.1/hook'):
+            with self.subTest(url=url), self.assertRaises(UnsafeWebhookURL):
+                check_webhook_url(url)
+
+    def test_public_address_passes(self):
+        check_webhook_url('https://93.184.215.14/hook')
+
+    def test_allow_private_lifts_the_check(self):
+        with mock.patch.object(webhooks, 'WEBHOOK_ALLOW_PRIVATE', True):
+            check_webhook_url('http://127.0.0.1:8787/webhooks')
+
+
+class RecordingBackend:
+    def __init__(self):
+        self.hosts = []
+
+    async def connect_tcp(self, host, port, **kwargs):
+        self.hosts.append(host)
+
+
+class PublicAddressBackendTests(SimpleTestCase):
+    def connect(self, answers, host='hooks.example.com'):
+        inner = RecordingBackend()
+        answers = iter(answers)
+        resolve = mock.Mock(side_effect=lambda *a, **k: [(socket.AF_INET, socket.SOCK_STREAM, 6, '',
+                                                          (next(answers), 443))])
+        with mock.patch.object(socket, 'getaddrinfo', resolve):
+            asyncio.run(webhooks.PublicAddressBackend(inner).connect_tcp(host, 443))
+        return inner.hosts, resolve.call_count
+
+    def test_connects_to_the_address_it_checked(self):
+        # A rebinding resolver answers public first, loopback after.
+        self.assertEqual(self.connect(['93.184.215.14', '127.0.0.1']), (['93.184.215.14'], 1))
+
+    def test_refuses_a_host_that_resolves_inward(self):
+        with self.assertRaises(UnsafeWebhookURL):
+            self.connect(['169.254.169.254'])
+        with self.assertRaises(UnsafeWebhookURL):
+            self.connect(['93.184.215.14'], host='metadata.google.internal')
+
+
+@mock.patch.object(webhooks, 'WEBHOOK_ALLOW_PRIVATE', False)
+class WebhookSSRFTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='hooks@x.io', email='hooks@x.io', password='pass12345')
+
+    def test_registration_refuses_metadata_address(self):
+        self.client.force_login(self.user)
+        response = self.client.post('/dashboard/developer/webhooks/add/',
+                                    {'url': 'https://169.254.169.254/latest/meta-data/'})
+        self.assertContains(response, 'public host')
+        self.assertFalse(WebhookEndpoint.objects.exists())
+
+    def test_send_time_check_blocks_endpoints_that_resolve_inward(self):
+        with webhooks.LocalReceiver() as receiver:
+            endpoint = WebhookEndpoint.objects.create(user=self.user, url=receiver.url)
+            with mock.patch.object(webhooks, 'schedule_dispatch', lambda: None):
+                webhooks.enqueue_test_event(endpoint)
+            dispatcher = webhooks.WebhookDispatcher()
+            self.addCleanup(dispatcher.close)
+            result = dispatcher.dispatch_due()
+        self.assertEqual((result.delivered, result.retrying), (0, 1))
+        self.assertEqual(receiver.events, [])
+        self.assertTrue(WebhookEvent.objects.get().last_error.startswith('Blocked: 127.0.0.1'))
+
+
+class DeferredDispatchTests(TestCase):
+    def test_sync_mode_leaves_events_for_the_outbox_worker(self):
+        user = User.objects.create_user(username='cron@x.io', email='cron@x.io', password='pass12345')
+        endpoint = WebhookEndpoint.objects.create(user=user, url='https://example.com/hook')
+        with mock.patch.object(webhooks, 'WEBHOOK_DISPATCH_ASYNC', False), \
+                mock.patch.object(webhooks.webhook_dispatcher, 'dispatch_due') as dispatch_due, \
+                self.captureOnCommitCallbacks(execute=True):
+            webhooks.enqueue_test_event(endpoint)
+        dispatch_due.assert_not_called()
+        self.assertEqual(WebhookEvent.objects.get().status, 'pending')
+
+    def test_cron_endpoint_needs_the_secret(self):
+        with mock.patch.object(webhooks, 'CRON_SECRET', ''):
+            self.assertEqual(self.client.get('/api/cron/webhooks').status_code, 404)
+        with mock.patch.object(webhooks, 'CRON_SECRET', 'c4on'), \
+                mock.patch.object(webhooks.webhook_dispatcher, 'dispatch_due',
+                                  return_value=webhooks.DispatchResult(claimed=3, requests=1, delivered=3)):
+            self.assertEqual(self.client.get('/api/cron/webhooks').status_code, 403)
+            response = self.client.get('/api/cron/webhooks', HTTP_AUTHORIZATION='Bearer c4on')
+        self.assertEqual(response.json()['delivered'], 3)
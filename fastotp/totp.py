@@ -0,0 +1,154 @@
+"""
+FastOTP Stateless Codes (HOTP / TOTP)
+=====================================
+RFC 4226 / RFC 6238 one-time codes that need no per-code storage.
+
+Each (purpose, identifier) pair gets a secret derived from ``TOTP_SECRET``
+(HMAC-SHA256, never stored), and the code for a time step is
+``HOTP(secret, floor(unix_time / step))``. Verifying recomputes the codes for
+the current step ± ``TOTP_DRIFT_STEPS`` and compares in constant time, so it
+is pure computation.
+
+Two small in-process caches guard it:
+
+* a replay guard remembers the last accepted step per identifier, so a used
+  code (or an older one) is refused while it would otherwise still be valid;
+* wrong guesses are limited to ``TOTP_MAX_ATTEMPTS`` per identifier per
+  validity window.
+
+Both are per worker, like the login throttle.
+
+Rotating ``TOTP_SECRET`` changes every identifier's codes, including secrets
+already enrolled in authenticator apps.
+"""
+import base64
+import hashlib
+import hmac
+import struct
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+from urllib.parse import quote, urlencode
+from django.conf import settings
+
+from .auth import AttemptLimiter
+from .cache import TTLCache
+
+TOTP_STEP = getattr(settings, 'TOTP_STEP', 30)
+TOTP_DIGITS = getattr(settings, 'TOTP_DIGITS', 6)
+TOTP_DRIFT_STEPS = getattr(settings, 'TOTP_DRIFT_STEPS', 1)
+TOTP_MAX_ATTEMPTS = getattr(settings, 'TOTP_MAX_ATTEMPTS', 5)
+TOTP_ISSUER = getattr(settings, 'TOTP_ISSUER', 'FastOTP')
+
+
+def _master_secret() -> bytes:
+    return (getattr(settings, 'TOTP_SECRET', '') or settings.SECRET_KEY).encode()
+
+
+def derive_secret(identifier: str, purpose: str = 'otp') -> bytes:
+    """20-byte HOTP key for ``identifier`` (the RFC 4226 recommended length)."""
+    return hmac.new(_master_secret(), f'{purpose}:{identifier}'.encode(), hashlib.sha256).digest()[:20]
+
+
+def hotp(secret: bytes, counter: int, digits: int = TOTP_DIGITS) -> str:
+    """RFC 4226 HOTP value (HMAC-SHA1, dynamic truncation)."""
+    mac = hmac.new(secret, struct.pack('>Q', counter), hashlib.sha1).digest()
+    offset = mac[-1] & 0x0F
+    value = struct.unpack('>I', mac[offset:offset + 4])[0] & 0x7FFFFFFF
+    return str(value % 10 ** digits).zfill(digits)
+
+
+def time_step(at: float = None, step: int = TOTP_STEP) -> int:
+    return int((time.time() if at is None else at) // step)
+
+
+def totp(secret: bytes, at: float = None, step: int = TOTP_STEP, digits: int = TOTP_DIGITS) -> str:
+    """RFC 6238 TOTP value at unix time ``at`` (default: now)."""
+    return hotp(secret, time_step(at, step), digits)
+
+
+def match_step(secret: bytes, code: str, at: float = None, step: int = TOTP_STEP,
+               drift: int = TOTP_DRIFT_STEPS, digits: int = TOTP_DIGITS):
+    """The time step within ± ``drift`` whose code equals ``code``, else ``None``."""
+    if len(code) != digits or not code.isdigit():
+        return None
+    current = time_step(at, step)
+    matched = None
+    for counter in range(current - drift, current + drift + 1):
+        # Check every candidate so timing does not reveal which step matched.
+        if hmac.compare_digest(hotp(secret, counter, digits), code):
+            matched = counter
+    return matched
+
+
+def code_expires_at(at: float = None, step: int = TOTP_STEP, drift: int = TOTP_DRIFT_STEPS) -> datetime:
+    """When a code issued at ``at`` stops verifying (end of its step + ``drift`` steps)."""
+    end = (time_step(at, step) + drift + 1) * step
+    return datetime.fromtimestamp(end, tz=dt_timezone.utc)
+
+
+# ─────────────────────────────────────────────
+#  Replay Guard
+# ─────────────────────────────────────────────
+
+class ReplayGuard:
+    """
+    Last accepted time step per key. A step is accepted only if it is newer,
+    so each code verifies once and older codes are refused after a newer one.
+    """
+
+    def __init__(self, maxsize: int = 100_000, ttl: float = TOTP_STEP * (2 * TOTP_DRIFT_STEPS + 1)):
+        self._last = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+
+    def accept(self, key, counter: int, ttl: float = None) -> bool:
+        with self._lock:
+            last = self._last.get(key)
+            if last is not None and counter <= last:
+                return False
+            self._last.set(key, counter, ttl=ttl)
+            return True
+
+    def clear(self):
+        self._last.clear()
+
+
+replay_guard = ReplayGuard()
+attempt_limiter = AttemptLimiter(TOTP_MAX_ATTEMPTS, TOTP_STEP * (2 * TOTP_DRIFT_STEPS + 1))
+
+
+# ─────────────────────────────────────────────
+#  Issue / Check
+# ─────────────────────────────────────────────
+
+def issue_code(identifier: str, purpose: str = 'otp', step: int = TOTP_STEP, at: float = None) -> str:
+    """The code to send to ``identifier`` now; nothing is stored."""
+    return totp(derive_secret(identifier, purpose), at, step)
+
+
+def check_code(identifier: str, code: str, purpose: str = 'otp', step: int = TOTP_STEP,
+               drift: int = TOTP_DRIFT_STEPS, at: float = None) -> bool:
+    """Verify ``code`` for ``identifier``: drift window, replay guard and attempt limit, no queries."""
+    key = (purpose, identifier)
+    if attempt_limiter.blocked(key):
+        return False
+    counter = match_step(derive_secret(identifier, purpose), code, at, step, drift)
+    if counter is None:
+        attempt_limiter.hit(key)
+        return False
+    if not replay_guard.accept(key, counter, ttl=step * (2 * drift + 1)):
+        return False
+    attempt_limiter.reset(key)
+    return True
+
+
+def authenticator_secret(identifier: str, purpose: str = 'authenticator') -> str:
+    """Base32 secret for enrolling ``identifier`` in an authenticator app."""
+    return base64.b32encode(derive_secret(identifier, purpose)).decode().rstrip('=')
+
+
+def provisioning_uri(identifier: str, purpose: str = 'authenticator') -> str:
+    """``otpauth://`` URI (QR code payload) for ``authenticator_secret``."""
+    params = urlencode({'secret': authenticator_secret(identifier, purpose), 'issuer': TOTP_ISSUER,
+                        'digits': TOTP_DIGITS, 'period': TOTP_STEP})
+    return f"otpauth://totp/{quote(f'{TOTP_ISSUER}:{identifier}')}?{params}"
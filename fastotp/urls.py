@@ -1,5 +1,7 @@
 from django.urls import path
-from . import views
+from . import api, views
+from .metrics import metrics_view
+from .webhooks import cron_dispatch_view
 
 urlpatterns = [
     # ── Marketing
@@ -13,6 +15,7 @@ urlpatterns = [
     path('signup/verify/', views.SignupStep2View.as_view(), name='signup_step2'),
     path('signup/send-otp/', views.SendSignupOTPView.as_view(), name='send_signup_otp'),
     path('signup/verify-otp/', views.VerifySignupOTPView.as_view(), name='verify_signup_otp'),
+    path('signup/otp-status/<uuid:otp_id>/', views.SignupOTPStatusView.as_view(), name='signup_otp_status'),
     path('login/', views.LoginView.as_view(), name='login'),
     path('logout/', views.LogoutView.as_view(), name='logout'),
 
@@ -22,8 +25,14 @@ urlpatterns = [
     path('dashboard/developer/', views.DeveloperToolsView.as_view(), name='developer'),
     path('dashboard/developer/keys/generate/', views.GenerateAPIKeyView.as_view(), name='generate_key'),
     path('dashboard/developer/keys/<uuid:key_id>/revoke/', views.RevokeAPIKeyView.as_view(), name='revoke_key'),
+    path('dashboard/developer/webhooks/add/', views.CreateWebhookEndpointView.as_view(), name='add_webhook'),
+    path('dashboard/developer/webhooks/<uuid:endpoint_id>/delete/', views.DeleteWebhookEndpointView.as_view(),
+         name='delete_webhook'),
+    path('dashboard/developer/webhooks/<uuid:endpoint_id>/test/', views.TestWebhookEndpointView.as_view(),
+         name='test_webhook'),
     path('dashboard/logs/', views.OTPLogsView.as_view(), name='otp_logs'),
     path('dashboard/logs/poll/', views.OTPLogsPollingView.as_view(), name='otp_logs_poll'),
+    path('dashboard/latency/', views.LatencyStatsView.as_view(), name='latency_stats'),
 
     # ── Billing
     path('billing/', views.BillingView.as_view(), name='billing'),
@@ -31,6 +40,15 @@ urlpatterns = [
     path('billing/pay/', views.InitiatePaymentView.as_view(), name='initiate_payment'),
     path('billing/verify/<str:gateway>/', views.PaymentCallbackView.as_view(), name='payment_callback'),
 
+    # ── API
+    path('api/v1/send', api.SendOTPView.as_view(), name='api_send'),
+    path('api/v1/verify', api.VerifyOTPView.as_view(), name='api_verify'),
+    path('api/v1/sandbox/log', api.SandboxLogView.as_view(), name='api_sandbox_log'),
+
+    # ── Ops
+    path('metrics', metrics_view, name='metrics'),
+    path('api/cron/webhooks', cron_dispatch_view, name='cron_webhooks'),
+
     # ── Dev utils
     path('dev/seed/', views.SeedDemoView.as_view(), name='seed_demo'),
 ]
@@ -0,0 +1,187 @@
+"""
+FastOTP API Key Usage
+=====================
+Buffered accounting for ``APIKey.total_requests`` / ``last_used_at`` and the
+hourly ``APIKeyUsage`` rollup shown on the developer page.
+
+Calls are counted in memory and written in batches: one ``F()``-based UPDATE
+for all touched keys plus one UPDATE per hour bucket, instead of a write to the
+key row on every API call. A flush happens inline once ``USAGE_FLUSH_INTERVAL``
+seconds or ``USAGE_FLUSH_MAX_EVENTS`` events have accumulated, and at process
+exit — so a crash loses at most that much usage per worker.
+"""
+import atexit
+import logging
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, PositiveIntegerField, Value, When
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+USAGE_FLUSH_INTERVAL = getattr(settings, 'USAGE_FLUSH_INTERVAL', 10)
+USAGE_FLUSH_MAX_EVENTS = getattr(settings, 'USAGE_FLUSH_MAX_EVENTS', 500)
+UPDATE_BATCH = 500  # keys per UPDATE statement
+
+
+def hour_bucket(at):
+    return at.replace(minute=0, second=0, microsecond=0)
+
+
+class UsageBuffer:
+    """
+    Thread-safe per-process accumulator.
+
+    Usage:
+        buffer = UsageBuffer()
+        buffer.record(api_key_id, credits=Decimal('0.0045'))
+        buffer.flush()
+    """
+
+    def __init__(self, interval: float = USAGE_FLUSH_INTERVAL, max_events: int = USAGE_FLUSH_MAX_EVENTS):
+        self.interval = interval
+        self.max_events = max_events
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._totals = {}   # key_id -> [requests, last_used_at]
+        self._hourly = {}   # (key_id, hour) -> [requests, credits]
+        self._events = 0
+        self._last_flush = time.monotonic()
+
+    def record(self, api_key_id, credits=Decimal('0'), at=None, requests: int = 1):
+        at = at or timezone.now()
+        with self._lock:
+            total = self._totals.get(api_key_id)
+            if total is None:
+                self._totals[api_key_id] = [requests, at]
+            else:
+                total[0] += requests
+                total[1] = max(total[1], at)
+            bucket = self._hourly.setdefault((api_key_id, hour_bucket(at)), [0, Decimal('0')])
+            bucket[0] += requests
+            bucket[1] += credits
+            self._events += 1
+            due = (self._events >= self.max_events
+                   or time.monotonic() - self._last_flush >= self.interval)
+        if due:
+            self.flush()
+
+    def pending(self) -> int:
+        return self._events
+
+    def flush(self) -> int:
+        """Write buffered usage. Returns the number of events flushed (0 on failure)."""
+        # One flusher at a time; callers that lose the race keep recording.
+        if not self._flush_lock.acquire(blocking=False):
+            return 0
+        try:
+            with self._lock:
+                totals, hourly, events = self._totals, self._hourly, self._events
+                self._reset()
+            if not totals:
+                return 0
+            try:
+                write_usage(totals, hourly)
+            except Exception as e:
+                logger.error(f"API key usage flush failed, re-queued {events} events: {e}")
+                self._requeue(totals, hourly, events)
+                return 0
+            return events
+        finally:
+            self._flush_lock.release()
+
+    def _requeue(self, totals: dict, hourly: dict, events: int):
+        with self._lock:
+            for key_id, (count, last_used) in totals.items():
+                total = self._totals.setdefault(key_id, [0, last_used])
+                total[0] += count
+                total[1] = max(total[1], last_used)
+            for bucket_key, (count, credits) in hourly.items():
+                bucket = self._hourly.setdefault(bucket_key, [0, Decimal('0')])
+                bucket[0] += count
+                bucket[1] += credits
+            self._events += events
+
+
+def write_usage(totals: dict, hourly: dict):
+    """Apply accumulated increments with set-based ``F()`` updates in one transaction."""
+    from .models import APIKey, APIKeyUsage
+    with transaction.atomic():
+        key_ids = list(totals)
+        for start in range(0, len(key_ids), UPDATE_BATCH):
+            chunk = key_ids[start:start + UPDATE_BATCH]
+            requests = Case(*[When(pk=k, then=Value(totals[k][0])) for k in chunk],
+                            output_field=PositiveIntegerField())
+            last_used = Case(*[When(pk=k, then=Value(totals[k][1])) for k in chunk])
+            APIKey.objects.filter(pk__in=chunk).update(
+                total_requests=F('total_requests') + requests,
+                last_used_at=Greatest(Coalesce('last_used_at', last_used), last_used),
+            )
+
+        # Keys revoked and deleted since recording have nothing to roll up into.
+        live = set(APIKey.objects.filter(pk__in=key_ids).values_list('pk', flat=True))
+        by_hour = {}
+        for (key_id, hour), values in hourly.items():
+            if key_id in live:
+                by_hour.setdefault(hour, {})[key_id] = values
+        APIKeyUsage.objects.bulk_create(
+            [APIKeyUsage(api_key_id=k, hour=hour) for hour, keys in by_hour.items() for k in keys],
+            ignore_conflicts=True,
+        )
+        for hour, keys in by_hour.items():
+            requests = Case(*[When(api_key_id=k, then=Value(v[0])) for k, v in keys.items()],
+                            output_field=PositiveIntegerField())
+            credits = Case(*[When(api_key_id=k, then=Value(v[1])) for k, v in keys.items()],
+                           output_field=DecimalField(max_digits=12, decimal_places=4))
+            APIKeyUsage.objects.filter(hour=hour, api_key_id__in=list(keys)).update(
+                requests=F('requests') + requests,
+                credits=F('credits') + credits,
+            )
+
+
+usage_buffer = UsageBuffer()
+atexit.register(usage_buffer.flush)
+
+
+def record_usage(api_key_id, credits=Decimal('0'), at=None, requests: int = 1):
+    """
+    Count one API call against ``api_key_id``; cheap enough for the request path.
+    ``fastotp.api`` counts every authenticated call; the debit adds the credits
+    of a send afterwards with ``requests=0``.
+    """
+    if api_key_id:
+        usage_buffer.record(api_key_id, credits, at, requests)
+
+
+# ─────────────────────────────────────────────
+#  Developer Page
+# ─────────────────────────────────────────────
+
+def hourly_usage(key_ids, hours: int = 24) -> dict:
+    """
+    Per-key usage over the last ``hours`` hours from the flushed rollup:
+    ``{key_id: {'requests', 'credits', 'series'}}`` where ``series`` holds one
+    request count per hour, oldest first.
+    """
+    from .models import APIKeyUsage
+    current = hour_bucket(timezone.now())
+    first = current - timedelta(hours=hours - 1)
+    usage = {k: {'requests': 0, 'credits': Decimal('0'), 'series': [0] * hours} for k in key_ids}
+    rows = (APIKeyUsage.objects.filter(api_key_id__in=list(usage), hour__gte=first)
+            .values_list('api_key_id', 'hour', 'requests', 'credits'))
+    for key_id, hour, requests, credits in rows:
+        entry = usage[key_id]
+        index = int((hour - first).total_seconds() // 3600)
+        if 0 <= index < hours:
+            entry['series'][index] += requests
+        entry['requests'] += requests
+        entry['credits'] += credits
+    return usage
@@ -1,24 +1,45 @@
 import json
+import logging
 import uuid
 import random
-from datetime import timedelta
+from datetime import datetime, timedelta
+from decimal import Decimal
 from django.shortcuts import render, redirect, get_object_or_404
 from django.views import View
 from django.views.generic import TemplateView, ListView
-from django.contrib.auth import login, logout, authenticate, update_session_auth_hash
+from django.contrib.auth import login, logout, update_session_auth_hash
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib import messages
-from django.http import HttpResponse, JsonResponse
+from django.http import Http404, HttpResponse, JsonResponse
 from django.utils import timezone
-from django.db.models import Sum, Count, Avg
-from django.db import transaction
-
-from .models import User, APIKey, CreditBalance, CreditPackage, Transaction, OTPLog, LoginSession
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.validators import URLValidator
+from django.db.models import Sum, Count
+from django.db import IntegrityError, transaction
+
+from .models import (
+    User, APIKey, CreditBalance, CreditPackage, Transaction, OTPLog, LoginSession, WebhookEndpoint,
+)
 from .services import (
-    FastOTPClient, PaystackGateway, FlutterwaveGateway,
     generate_registration_otp, verify_registration_otp,
-    credit_user_account, COVERAGE_DATA
+    credit_user_account, COVERAGE_DATA, GatewayError,
 )
+from .billing import get_billing_snapshot, invalidate_billing, get_catalogue
+from .db_routers import ReplicaReadMixin, replica_reads
+from .usage import hourly_usage
+from .apikeys import forget_key
+from .auth import LoginResult, attempt_login, forget_unknown_email
+from .latency import DIMENSIONS as LATENCY_DIMENSIONS, compact_count, latency_percentiles, public_stats
+from .dedup import SendClaim, resend_guard
+from .enrichment import queue_login_enrichment
+from .hot_partials import render_partial
+from .net import get_client_ip
+from .sandbox import SANDBOX_OTP_CODE
+from .sharding import first_on_any_shard, tenant_atomic
+from .webhooks import UnsafeWebhookURL, check_webhook_url, enqueue_test_event, forget_endpoints
+
+logger = logging.getLogger(__name__)
 
 
 # ─────────────────────────────────────────────
@@ -31,10 +52,12 @@ class HomeView(TemplateView):
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
         ctx['coverage_count'] = len(COVERAGE_DATA)
+        live = public_stats()
         ctx['stats'] = {
-            'otps_sent': '12.4M+',
+            # Launch figures until the latency sketches have data.
+            'otps_sent': compact_count(live['delivered']) if live['delivered'] else '12.4M+',
             'countries': '24+',
-            'avg_latency': '380ms',
+            'p50_latency': f"{live['p50_latency']}ms" if live['p50_latency'] else '380ms',
             'uptime': '99.99%',
         }
         return ctx
@@ -44,8 +67,9 @@ class CoverageView(TemplateView):
     template_name = 'fastotp/coverage.html'
 
     def get_context_data(self, **kwargs):
+        from .fx import localize_coverage
         ctx = super().get_context_data(**kwargs)
-        ctx['countries'] = COVERAGE_DATA
+        ctx['countries'] = localize_coverage(COVERAGE_DATA)
         return ctx
 
 
@@ -80,10 +104,13 @@ class SignupStep1View(View):
         company = data.get('company_name', '').strip()
         whatsapp = data.get('whatsapp_number', '').strip()
 
+        # An unfinished signup from this same session (e.g. "Wrong number? Go back")
+        # is replaced rather than blocking its own email address.
+        pending_id = request.session.get('pending_user_id')
         errors = {}
         if not email:
             errors['email'] = 'Email is required.'
-        elif User.objects.filter(email=email).exists():
+        elif User.objects.filter(email=email).exclude(id=pending_id).exists():
             errors['email'] = 'This email is already registered.'
         if len(password) < 8:
             errors['password'] = 'Password must be at least 8 characters.'
@@ -95,12 +122,27 @@ class SignupStep1View(View):
         if errors:
             return render(request, self.template_name, {'errors': errors, 'form': data})
 
-        # Temporarily store in session
-        request.session['signup_data'] = {
-            'email': email, 'password': password,
-            'first_name': first_name, 'last_name': last_name,
-            'company_name': company, 'whatsapp_number': whatsapp,
-        }
+        # Create the (inactive) account now so the slow password hash runs once,
+        # here, and never on the OTP send path. It is activated by OTP verification.
+        try:
+            with transaction.atomic():
+                if pending_id:
+                    User.objects.filter(id=pending_id, is_active=False).delete()
+                user = User.objects.create_user(
+                    username=email, email=email, password=password,
+                    first_name=first_name, last_name=last_name,
+                    company_name=company, whatsapp_number=whatsapp,
+                    is_active=False,
+                )
+                with tenant_atomic(user.pk):
+                    CreditBalance.objects.create(user=user, balance=5)  # Free trial credits
+            forget_unknown_email(email)
+        except IntegrityError:
+            errors['email'] = 'This email is already registered.'
+            return render(request, self.template_name, {'errors': errors, 'form': data})
+
+        request.session['signup_data'] = {'email': email, 'whatsapp_number': whatsapp}
+        request.session['pending_user_id'] = str(user.id)
         return redirect('signup_step2')
 
 
@@ -126,43 +168,66 @@ class SignupStep2View(View):
 
 
 class SendSignupOTPView(View):
-    """HTMX: Send OTP to WhatsApp and return OTP input fragment."""
+    """HTMX: Queue the WhatsApp OTP and return the OTP input fragment immediately."""
 
     def post(self, request):
-        signup_data = request.session.get('signup_data', {})
-        whatsapp = signup_data.get('whatsapp_number', '')
-        if not whatsapp:
+        user_id = request.session.get('pending_user_id')
+        user = None
+        if user_id:
+            user = User.objects.filter(id=user_id, is_active=False).only('id', 'whatsapp_number').first()
+        if user is None:
             return HttpResponse('<p class="text-red-400">Session expired. Please restart.</p>')
 
-        # Create temp user or retrieve pending
-        user, created = User.objects.get_or_create(
-            email=signup_data['email'],
-            defaults={
-                'username': signup_data['email'],
-                'first_name': signup_data['first_name'],
-                'last_name': signup_data['last_name'],
-                'company_name': signup_data['company_name'],
-                'whatsapp_number': whatsapp,
-                'is_active': False,
-            }
-        )
-        if created:
-            user.set_password(signup_data['password'])
-            user.save()
-            CreditBalance.objects.create(user=user, balance=5)  # Free trial credits
-
-        otp = generate_registration_otp(user)
-        request.session['pending_user_id'] = str(user.id)
+        # Repeated clicks within OTP_RESEND_COOLDOWN get the code already on its way.
+        resend_key = ('signup', user.pk)
+        claim = resend_guard.begin(resend_key)
+        if claim.status == SendClaim.DUPLICATE:
+            otp, otp_log = claim.value
+        elif claim.status == SendClaim.IN_FLIGHT:
+            return render(request, 'fastotp/partials/otp_error.html', {
+                'message': 'Your code is on its way. Please wait a moment.',
+            })
+        else:
+            sent = None
+            try:
+                otp, otp_log = generate_registration_otp(user, get_client_ip(request))
+                if otp_log.status != 'blocked':
+                    sent = (otp, otp_log)
+            finally:
+                resend_guard.finish(resend_key, sent, alias=sent and str(sent[1].id))
+        if otp_log.status == 'blocked':
+            return render(request, 'fastotp/partials/otp_error.html', {
+                'message': "We can't send a code to this number right now. Please try again later.",
+            })
 
-        # Return the OTP input fragment (HTMX swap)
-        expires_at = (timezone.now() + timedelta(minutes=10)).isoformat()
+        # Return the OTP input fragment (HTMX swap); delivery status polls in below it
         return render(request, 'fastotp/partials/otp_input.html', {
-            'whatsapp': whatsapp,
+            'whatsapp': user.whatsapp_number,
             'demo_otp': otp,  # For demo only — remove in production
-            'expires_seconds': 600,
+            'expires_seconds': max(int((otp_log.expires_at - timezone.now()).total_seconds()), 0),
+            'otp_log': otp_log,
         })
 
 
+class SignupOTPStatusView(View):
+    """HTMX polling endpoint: delivery status of the signup OTP, until it settles."""
+
+    def get(self, request, otp_id):
+        user_id = request.session.get('pending_user_id')
+        otp_log = None
+        if user_id:
+            otp_log = (OTPLog.objects.filter(id=otp_id, user_id=user_id)
+                       .only('id', 'status', 'latency_ms', 'expires_at').first())
+        if otp_log is None:
+            return HttpResponse(status=286)  # stop polling
+        expired = timezone.now() > otp_log.expires_at
+        response = render(request, 'fastotp/partials/otp_delivery_status.html',
+                          {'otp_log': otp_log, 'expired': expired})
+        if otp_log.status != 'pending' or expired:
+            response.status_code = 286
+        return response
+
+
 class VerifySignupOTPView(View):
     """HTMX: Verify the submitted OTP."""
 
@@ -201,17 +266,24 @@ class LoginView(View):
     def post(self, request):
         email = request.POST.get('email', '').strip().lower()
         password = request.POST.get('password', '')
-        user = authenticate(request, username=email, password=password)
+        result = attempt_login(request, email, password, get_client_ip(request))
+        if result.outcome == LoginResult.THROTTLED:
+            return render(request, self.template_name, {
+                'error': 'Too many login attempts. Please wait a few minutes and try again.',
+                'email': email,
+            }, status=429)
+        user = result.user
         if user:
             login(request, user)
             # Track session
-            LoginSession.objects.create(
+            session = LoginSession.objects.create(
                 user=user,
                 session_key=request.session.session_key or '',
                 ip_address=get_client_ip(request),
                 user_agent=request.META.get('HTTP_USER_AGENT', '')[:500],
                 is_current=True,
             )
+            queue_login_enrichment(session)  # device_type / location, after the response
             return redirect('dashboard')
         return render(request, self.template_name, {
             'error': 'Invalid email or password.',
@@ -237,22 +309,61 @@ class DashboardView(LoginRequiredMixin, TemplateView):
         ctx = super().get_context_data(**kwargs)
         user = self.request.user
         balance, _ = CreditBalance.objects.get_or_create(user=user)
-        recent_logs = OTPLog.objects.filter(user=user).order_by('-created_at')[:10]
         today = timezone.now().date()
-        stats = OTPLog.objects.filter(user=user).aggregate(
-            total=Count('id'),
-            delivered=Count('id', filter=models.Q(status='delivered')),
-            avg_latency=Avg('latency_ms'),
-        )
+        with replica_reads():
+            recent_logs = list(OTPLog.objects.filter(user=user).order_by('-created_at')[:10])
+            stats = OTPLog.objects.filter(user=user).aggregate(
+                total=Count('id'),
+                delivered=Count('id', filter=models.Q(status='delivered')),
+            )
+            active_keys = APIKey.objects.filter(user=user, status='active').count()
+            latency = latency_percentiles(str(user.pk), 'all', start=timezone.now() - timedelta(days=30))
         ctx.update({
             'balance': balance,
             'recent_logs': recent_logs,
             'stats': stats,
-            'active_keys': APIKey.objects.filter(user=user, status='active').count(),
+            'latency': latency.get('', {}),
+            'active_keys': active_keys,
         })
         return ctx
 
 
+LATENCY_MAX_DAYS = 366
+
+
+class LatencyStatsView(LoginRequiredMixin, View):
+    """
+    JSON: the user's delivery-latency percentiles by ``dimension`` over the last
+    ``days`` (1 to ``LATENCY_MAX_DAYS``) or [start, end).
+    """
+    login_url = 'login'
+
+    def get(self, request):
+        dimension = request.GET.get('dimension', 'all')
+        if dimension not in LATENCY_DIMENSIONS:
+            return JsonResponse({'error': f"dimension must be one of {', '.join(LATENCY_DIMENSIONS)}"}, status=400)
+        try:
+            end = datetime.fromisoformat(request.GET['end']) if 'end' in request.GET else timezone.now()
+            days = min(max(int(request.GET.get('days', 7)), 1), LATENCY_MAX_DAYS)
+            start = (datetime.fromisoformat(request.GET['start']) if 'start' in request.GET
+                     else end - timedelta(days=days))
+        except (ValueError, OverflowError):
+            return JsonResponse({'error': 'start/end must be ISO 8601 and days an integer'}, status=400)
+        if timezone.is_naive(start):
+            start = timezone.make_aware(start)
+        if timezone.is_naive(end):
+            end = timezone.make_aware(end)
+        end = min(end, timezone.now())  # nothing is recorded in the future
+        with replica_reads():
+            percentiles = latency_percentiles(str(request.user.pk), dimension, start, end)
+        return JsonResponse({
+            'dimension': dimension,
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'percentiles': percentiles,
+        })
+
+
 class AccountView(LoginRequiredMixin, View):
     login_url = 'login'
     template_name = 'fastotp/account.html'
@@ -308,7 +419,18 @@ class DeveloperToolsView(LoginRequiredMixin, TemplateView):
 
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
-        ctx['api_keys'] = APIKey.objects.filter(user=self.request.user)
+        api_keys = list(APIKey.objects.filter(user=self.request.user))
+        usage = hourly_usage([key.id for key in api_keys])
+        for key in api_keys:
+            key.usage_24h = usage[key.id]
+            peak = max(key.usage_24h['series']) or 1
+            key.usage_24h['bars'] = [round(n * 100 / peak) for n in key.usage_24h['series']]
+        ctx['api_keys'] = api_keys
+        ctx['webhook_endpoints'] = WebhookEndpoint.objects.filter(user=self.request.user, is_active=True).annotate(
+            pending_events=Count('events', filter=models.Q(events__status='pending')),
+            failed_events=Count('events', filter=models.Q(events__status='failed')),
+        )
+        ctx['sandbox_code'] = SANDBOX_OTP_CODE
         return ctx
 
 
@@ -320,7 +442,7 @@ class GenerateAPIKeyView(LoginRequiredMixin, View):
         env = request.POST.get('environment', 'test')
         key_obj = APIKey.objects.create(user=request.user, name=name, environment=env)
         if 'HX-Request' in request.headers:
-            return render(request, 'fastotp/partials/api_key_row.html', {
+            return render_partial(request, 'fastotp/partials/api_key_row.html', {
                 'key': key_obj,
                 'show_full': True,
             })
@@ -334,12 +456,55 @@ class RevokeAPIKeyView(LoginRequiredMixin, View):
         key_obj = get_object_or_404(APIKey, id=key_id, user=request.user)
         key_obj.status = 'revoked'
         key_obj.save()
+        forget_key(key_obj.key_hash)
         if 'HX-Request' in request.headers:
-            return render(request, 'fastotp/partials/api_key_row.html', {'key': key_obj})
+            return render_partial(request, 'fastotp/partials/api_key_row.html', {'key': key_obj})
         return redirect('developer')
 
 
-class OTPLogsView(LoginRequiredMixin, TemplateView):
+class CreateWebhookEndpointView(LoginRequiredMixin, View):
+    login_url = 'login'
+
+    def post(self, request):
+        url = request.POST.get('url', '').strip()
+        try:
+            URLValidator(schemes=['https'] if not settings.DEBUG else ['http', 'https'])(url)
+        except ValidationError:
+            return HttpResponse('<p class="text-sm text-red-500 px-6 py-3">Enter a valid https:// URL.</p>')
+        try:
+            check_webhook_url(url)
+        except UnsafeWebhookURL:
+            return HttpResponse('<p class="text-sm text-red-500 px-6 py-3">'
+                                'Webhook URLs must point at a public host.</p>')
+        endpoint = WebhookEndpoint.objects.create(user=request.user, url=url)
+        forget_endpoints(request.user.pk)
+        if 'HX-Request' in request.headers:
+            return render(request, 'fastotp/partials/webhook_endpoint_row.html', {'endpoint': endpoint})
+        return redirect('developer')
+
+
+class DeleteWebhookEndpointView(LoginRequiredMixin, View):
+    login_url = 'login'
+
+    def post(self, request, endpoint_id):
+        endpoint = get_object_or_404(WebhookEndpoint, id=endpoint_id, user=request.user)
+        endpoint.delete()
+        forget_endpoints(request.user.pk)
+        if 'HX-Request' in request.headers:
+            return HttpResponse('')
+        return redirect('developer')
+
+
+class TestWebhookEndpointView(LoginRequiredMixin, View):
+    login_url = 'login'
+
+    def post(self, request, endpoint_id):
+        endpoint = get_object_or_404(WebhookEndpoint, id=endpoint_id, user=request.user, is_active=True)
+        enqueue_test_event(endpoint)
+        return HttpResponse('<span class="text-xs text-emerald-600">✓ Test event queued</span>')
+
+
+class OTPLogsView(LoginRequiredMixin, ReplicaReadMixin, TemplateView):
     login_url = 'login'
     template_name = 'fastotp/otp_logs.html'
 
@@ -354,8 +519,9 @@ class OTPLogsPollingView(LoginRequiredMixin, View):
     login_url = 'login'
 
     def get(self, request):
-        logs = OTPLog.objects.filter(user=request.user).order_by('-created_at')[:20]
-        return render(request, 'fastotp/partials/otp_log_rows.html', {'logs': logs})
+        with replica_reads():
+            logs = list(OTPLog.objects.filter(user=request.user).order_by('-created_at')[:20])
+        return render_partial(request, 'fastotp/partials/otp_log_rows.html', {'logs': logs})
 
 
 # ─────────────────────────────────────────────
@@ -368,14 +534,11 @@ class BillingView(LoginRequiredMixin, TemplateView):
 
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
-        user = self.request.user
-        balance, _ = CreditBalance.objects.get_or_create(user=user)
-        packages = CreditPackage.objects.filter(is_active=True)
-        transactions = Transaction.objects.filter(user=user)[:20]
+        snapshot = get_billing_snapshot(self.request.user)
         ctx.update({
-            'balance': balance,
-            'packages': packages,
-            'transactions': transactions,
+            'balance': snapshot.balance,
+            'packages': get_catalogue().packages,
+            'transactions': snapshot.transactions,
         })
         return ctx
 
@@ -384,8 +547,8 @@ class CreditBalancePollingView(LoginRequiredMixin, View):
     """HTMX polling for live balance updates."""
 
     def get(self, request):
-        balance, _ = CreditBalance.objects.get_or_create(user=request.user)
-        return render(request, 'fastotp/partials/credit_balance.html', {'balance': balance})
+        balance = get_billing_snapshot(request.user).balance
+        return render_partial(request, 'fastotp/partials/credit_balance.html', {'balance': balance})
 
 
 class InitiatePaymentView(LoginRequiredMixin, View):
@@ -393,9 +556,13 @@ class InitiatePaymentView(LoginRequiredMixin, View):
     login_url = 'login'
 
     def post(self, request):
+        from .fx import FXRateUnavailable, usd_to_local, to_minor_units
+        from .services import paystack_gateway, flutterwave_gateway
         package_id = request.POST.get('package_id')
         gateway = request.POST.get('gateway', 'paystack')
-        package = get_object_or_404(CreditPackage, id=package_id, is_active=True)
+        package = get_catalogue().get(package_id)
+        if package is None:
+            raise Http404('Package not found.')
         user = request.user
 
         # Create a pending transaction
@@ -406,33 +573,45 @@ class InitiatePaymentView(LoginRequiredMixin, View):
             credits=package.credits,
             status='pending',
             gateway=gateway,
-            package=package,
+            package_id=package.id,
             description=f'{package.name} — {package.credits} credits',
         )
 
-        payment_url = '#'
-        if gateway == 'paystack':
-            gw = PaystackGateway()
-            result = gw.initialize_transaction(
-                email=user.email,
-                amount_kobo=int(float(package.price_usd) * 100 * 1600),  # approx NGN
-                metadata={'user_id': str(user.id), 'package_id': str(package.id), 'txn_id': str(txn.id)},
-                callback_url=request.build_absolute_uri('/billing/verify/paystack/'),
-            )
-            payment_url = result.get('authorization_url', '#')
-            txn.gateway_ref = result.get('reference', '')
-        else:
-            gw = FlutterwaveGateway()
-            result = gw.initialize_payment(
-                tx_ref=str(txn.id),
-                amount=float(package.price_usd),
-                currency='USD',
-                customer={'email': user.email, 'name': user.get_full_name()},
-                redirect_url=request.build_absolute_uri('/billing/verify/flutterwave/'),
-            )
-            payment_url = result.get('link', '#')
+        payment_url, error = '#', None
+        try:
+            if gateway == 'paystack':
+                amount_kobo = to_minor_units(usd_to_local(package.price_usd, 'NGN'), 'NGN')
+                result = paystack_gateway.initialize_transaction(
+                    email=user.email,
+                    amount_kobo=amount_kobo,
+                    metadata={'user_id': str(user.id), 'package_id': str(package.id), 'txn_id': str(txn.id)},
+                    callback_url=request.build_absolute_uri('/billing/verify/paystack/'),
+                )
+                payment_url = result.get('authorization_url', '#')
+                txn.gateway_ref = result.get('reference', '')
+                txn.metadata['charge'] = {'amount': amount_kobo, 'currency': 'NGN'}  # checked on the callback
+            else:
+                result = flutterwave_gateway.initialize_payment(
+                    tx_ref=str(txn.id),
+                    amount=package.price_usd,
+                    currency='USD',
+                    customer={'email': user.email, 'name': user.get_full_name()},
+                    redirect_url=request.build_absolute_uri('/billing/verify/flutterwave/'),
+                )
+                payment_url = result.get('link', '#')
+                txn.gateway_ref = str(txn.id)  # the tx_ref Flutterwave sends back to the callback
+                txn.metadata['charge'] = {'amount': str(package.price_usd), 'currency': 'USD'}
+        except GatewayError as e:
+            logger.error(f"Payment initialisation via {gateway} failed for transaction {txn.id}: {e}")
+            txn.status = 'failed'
+            error = 'The payment provider is not responding. Please try again in a moment.'
+        except FXRateUnavailable as e:
+            logger.error(f"Payment initialisation via {gateway} refused for transaction {txn.id}: {e}")
+            txn.status = 'failed'
+            error = 'Card payments in this currency are unavailable right now. Please try again later.'
 
         txn.save()
+        invalidate_billing(user.pk)
 
         if 'HX-Request' in request.headers:
             return render(request, 'fastotp/partials/payment_modal.html', {
@@ -440,7 +619,11 @@ class InitiatePaymentView(LoginRequiredMixin, View):
                 'txn': txn,
                 'payment_url': payment_url,
                 'gateway': gateway,
+                'error': error,
             })
+        if error:
+            messages.error(request, error)
+            return redirect('billing')
         return redirect(payment_url)
 
 
@@ -448,30 +631,78 @@ class PaymentCallbackView(View):
     """Handle payment gateway callbacks."""
 
     def get(self, request, gateway):
-        if gateway == 'paystack':
-            ref = request.GET.get('reference', '')
-            gw = PaystackGateway()
-            result = gw.verify_transaction(ref)
-            if result.get('status') == 'success':
-                try:
-                    txn = Transaction.objects.get(gateway_ref=ref)
-                    credit_user_account(txn.user, float(txn.credits), txn)
-                    messages.success(request, f'✅ {int(txn.credits)} credits added to your account!')
-                except Transaction.DoesNotExist:
-                    messages.error(request, 'Transaction not found.')
-        elif gateway == 'flutterwave':
-            txn_id = request.GET.get('transaction_id', '')
-            status = request.GET.get('status', '')
-            if status == 'successful':
-                try:
-                    txn = Transaction.objects.get(gateway_ref=txn_id)
-                    credit_user_account(txn.user, float(txn.credits), txn)
-                    messages.success(request, f'✅ {int(txn.credits)} credits added!')
-                except Transaction.DoesNotExist:
-                    pass
-
+        from .services import paystack_gateway, flutterwave_gateway
+        try:
+            if gateway == 'paystack':
+                self.paystack(request, paystack_gateway)
+            elif gateway == 'flutterwave':
+                self.flutterwave(request, flutterwave_gateway)
+        except GatewayError as e:
+            # The payment may still have gone through: leave the transaction pending for a retried callback.
+            logger.error(f"Payment verification via {gateway} failed: {e}")
+            messages.error(request, 'We could not confirm your payment yet. Please refresh in a moment.')
         return redirect('billing')
 
+    def paystack(self, request, gateway):
+        ref = request.GET.get('reference', '')
+        txn = first_on_any_shard(Transaction.objects.filter(gateway='paystack', gateway_ref=ref)) if ref else None
+        if txn is None:
+            messages.error(request, 'Transaction not found.')
+            return
+        result = gateway.verify_transaction(ref)
+        if result.get('status') == 'success':
+            if not self.paid_in_full(txn, gateway, result.get('amount'), result.get('currency', 'NGN')):
+                self.fail(txn)
+                messages.error(request, 'The amount paid does not match this purchase.')
+            elif credit_user_account(txn.user, txn.credits, txn):
+                messages.success(request, f'✅ {int(txn.credits)} credits added to your account!')
+        elif result.get('status') in gateway.TERMINAL_STATUSES:
+            self.fail(txn)
+            messages.error(request, 'The payment was not completed.')
+
+    def flutterwave(self, request, gateway):
+        tx_ref = request.GET.get('tx_ref', '')
+        txn = first_on_any_shard(Transaction.objects.filter(gateway='flutterwave', gateway_ref=tx_ref)) if tx_ref else None
+        if txn is None:
+            messages.error(request, 'Transaction not found.')
+            return
+        if request.GET.get('status', '') != 'successful':
+            self.fail(txn)
+            messages.error(request, 'The payment was not completed.')
+            return
+        # Never trust the redirect's status param alone — confirm with Flutterwave, for this tx_ref.
+        result = gateway.verify_payment(request.GET.get('transaction_id', ''))
+        if result.get('status') == 'successful' and result.get('tx_ref', tx_ref) == tx_ref:
+            if not self.paid_in_full(txn, gateway, result.get('amount'), result.get('currency')):
+                self.fail(txn)
+                messages.error(request, 'The amount paid does not match this purchase.')
+            elif credit_user_account(txn.user, txn.credits, txn):
+                messages.success(request, f'✅ {int(txn.credits)} credits added!')
+        elif result.get('status') in gateway.TERMINAL_STATUSES:
+            self.fail(txn)
+            messages.error(request, 'The payment was not completed.')
+
+    @staticmethod
+    def paid_in_full(txn, gateway, amount, currency) -> bool:
+        """The verified charge is the one this transaction asked for (stub gateways charge nothing)."""
+        if gateway.is_stub:
+            return True
+        charge = txn.metadata.get('charge')
+        try:
+            paid = charge is not None and currency == charge['currency'] and (
+                Decimal(str(amount)) == Decimal(str(charge['amount'])))
+        except (ArithmeticError, ValueError):
+            paid = False
+        if not paid:
+            logger.error(f"Transaction {txn.pk}: gateway reports {amount} {currency}, expected {charge}")
+        return paid
+
+    @staticmethod
+    def fail(txn):
+        with tenant_atomic(txn.user_id):
+            Transaction.objects.filter(pk=txn.pk, status='pending').update(status='failed')
+        invalidate_billing(txn.user_id)
+
 
 # ─────────────────────────────────────────────
 #  Seed Demo Data View (Dev only)
@@ -496,32 +727,11 @@ class SeedDemoView(View):
             CreditPackage.objects.get_or_create(name=p['name'], defaults=p)
 
         if request.user.is_authenticated:
-            user = request.user
-            channels = ['whatsapp', 'sms', 'email']
-            statuses = ['delivered', 'delivered', 'delivered', 'failed', 'pending', 'verified']
-            countries = ['Nigeria', 'Kenya', 'Ghana', 'South Africa', 'Rwanda']
-            for i in range(30):
-                OTPLog.objects.create(
-                    user=user,
-                    identifier=f'+2348{random.randint(10000000, 99999999)}',
-                    channel=random.choice(channels),
-                    country_name=random.choice(countries),
-                    status=random.choice(statuses),
-                    latency_ms=random.randint(150, 1200),
-                    cost_credits=random.uniform(0.004, 0.008),
-                    sent_at=timezone.now() - timedelta(minutes=random.randint(0, 1440)),
-                )
+            from .datagen import bulk_load, generate_otp_logs
+            bulk_load(OTPLog, generate_otp_logs(random.Random(), [request.user.pk], 30, days=1))
 
         return HttpResponse('Demo data seeded! <a href="/">Go home</a>')
 
 
-# Helpers
-def get_client_ip(request):
-    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-    if x_forwarded_for:
-        return x_forwarded_for.split(',')[0].strip()
-    return request.META.get('REMOTE_ADDR')
-
-
 # Import models.Q for aggregation
 from django.db import models
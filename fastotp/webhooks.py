@@ -0,0 +1,558 @@
+"""
+FastOTP Outbound Webhooks
+=========================
+Customers register endpoints on the developer page and receive signed events
+when one of their OTPs changes status (``otp.sent``, ``otp.failed``,
+``otp.verified``, ``otp.expired``).
+
+Events go through a transactional outbox. ``enqueue_otp_events`` writes
+``WebhookEvent`` rows in the same transaction as the status change, so an
+event exists exactly when the change committed. The dispatcher then:
+
+* claims due events with a lease (``WEBHOOK_LEASE``) so concurrent
+  dispatchers skip them,
+* groups them per endpoint into batches of up to ``WEBHOOK_BATCH_SIZE`` (one
+  POST carries a whole burst),
+* sends the batches concurrently over one pooled ``httpx.AsyncClient``, at
+  most ``WEBHOOK_ENDPOINT_CONCURRENCY`` requests in flight per endpoint,
+* retries failures with exponential backoff and jitter, and gives up after
+  ``WEBHOOK_MAX_ATTEMPTS``.
+
+Delivery is at-least-once: receivers should de-duplicate on the event ``id``.
+Each request carries ``FastOTP-Signature: t=<unix>,v1=<hex>``, an HMAC-SHA256
+of ``"<t>.<body>"`` under the endpoint's secret; see ``verify_signature``.
+
+Endpoint URLs are customer input, so ``check_webhook_url`` resolves the host
+and refuses private, loopback, link-local (cloud metadata) and other
+non-public addresses when an endpoint is registered. DNS can change after
+that, so the dispatcher's connections go through ``PublicAddressBackend``:
+every new connection resolves the host once, checks those addresses and
+connects to the one it checked, keeping the URL's hostname for the Host
+header and TLS SNI. Environment proxies are not used. ``WEBHOOK_ALLOW_PRIVATE``
+(default ``DEBUG``) lifts all of this for local receivers.
+
+pip install httpx
+"""
+import asyncio
+import hashlib
+import hmac
+import ipaddress
+import json
+import logging
+import random
+import secrets
+import socket
+import threading
+import time
+from dataclasses import asdict, dataclass
+from datetime import timedelta
+from urllib.parse import urlsplit
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F
+from django.http import Http404, HttpResponseForbidden, JsonResponse
+from django.utils import timezone
+
+from .cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_DISPATCH_ASYNC = getattr(settings, 'WEBHOOK_DISPATCH_ASYNC', True)
+WEBHOOK_BATCH_SIZE = getattr(settings, 'WEBHOOK_BATCH_SIZE', 100)
+WEBHOOK_BATCH_WINDOW = getattr(settings, 'WEBHOOK_BATCH_WINDOW', 0.5)
+WEBHOOK_ENDPOINT_CONCURRENCY = getattr(settings, 'WEBHOOK_ENDPOINT_CONCURRENCY', 2)
+WEBHOOK_MAX_CONNECTIONS = getattr(settings, 'WEBHOOK_MAX_CONNECTIONS', 50)
+WEBHOOK_TIMEOUT = getattr(settings, 'WEBHOOK_TIMEOUT', 10)
+WEBHOOK_MAX_ATTEMPTS = getattr(settings, 'WEBHOOK_MAX_ATTEMPTS', 8)
+WEBHOOK_RETRY_BASE = getattr(settings, 'WEBHOOK_RETRY_BASE', 10)
+WEBHOOK_RETRY_MAX = getattr(settings, 'WEBHOOK_RETRY_MAX', 3600)
+WEBHOOK_LEASE = getattr(settings, 'WEBHOOK_LEASE', 60)
+WEBHOOK_POLL_INTERVAL = getattr(settings, 'WEBHOOK_POLL_INTERVAL', 5)
+WEBHOOK_SIGNATURE_TOLERANCE = 300
+WEBHOOK_ALLOW_PRIVATE = getattr(settings, 'WEBHOOK_ALLOW_PRIVATE', settings.DEBUG)
+CRON_SECRET = getattr(settings, 'CRON_SECRET', '')
+
+SIGNATURE_HEADER = 'FastOTP-Signature'
+OTP_EVENT_FIELDS = ('id', 'user_id', 'api_key_id', 'identifier', 'channel', 'status',
+                    'country_code', 'latency_ms')
+
+
+def generate_webhook_secret() -> str:
+    return f"whsec_{secrets.token_urlsafe(24)}"
+
+
+def sign_payload(secret: str, body: bytes, timestamp: int = None) -> str:
+    """``FastOTP-Signature`` header value for ``body``."""
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    digest = hmac.new(secret.encode(), f"{timestamp}.".encode() + body, hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={digest}"
+
+
+def verify_signature(secret: str, header: str, body: bytes,
+                     tolerance: float = WEBHOOK_SIGNATURE_TOLERANCE) -> bool:
+    """Receiver-side check of a ``FastOTP-Signature`` header (also rejects stale timestamps)."""
+    try:
+        parts = dict(item.split('=', 1) for item in header.split(','))
+        timestamp = int(parts['t'])
+    except (KeyError, ValueError):
+        return False
+    if abs(time.time() - timestamp) > tolerance:
+        return False
+    expected = sign_payload(secret, body, timestamp).split('v1=', 1)[1]
+    return hmac.compare_digest(expected, parts.get('v1', ''))
+
+
+# ─────────────────────────────────────────────
+#  Outbox
+# ─────────────────────────────────────────────
+
+_endpoint_cache = TTLCache(maxsize=10_000, ttl=60)
+
+
+# ─────────────────────────────────────────────
+#  Endpoint URL Checks
+# ─────────────────────────────────────────────
+
+BLOCKED_HOSTNAMES = frozenset({'localhost', 'metadata', 'metadata.google.internal'})
+
+
+class UnsafeWebhookURL(ValueError):
+    """The endpoint URL points at a non-public address."""
+
+
+def _check_hostname(host: str) -> str:
+    host = host.rstrip('.').lower()
+    if not host:
+        raise UnsafeWebhookURL('URL has no host')
+    if host in BLOCKED_HOSTNAMES or host.endswith('.localhost'):
+        raise UnsafeWebhookURL(f'{host} is not a public host')
+    return host
+
+
+def _split_host(url: str) -> tuple:
+    parts = urlsplit(url)
+    host = _check_hostname(parts.hostname or '')
+    try:
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+    except ValueError:
+        raise UnsafeWebhookURL('URL has an invalid port')
+    return host, port
+
+
+def _check_addresses(host: str, infos) -> None:
+    """Raise unless every address ``host`` resolved to is globally routable."""
+    if not infos:
+        raise UnsafeWebhookURL(f'{host} does not resolve')
+    for *_, sockaddr in infos:
+        address = ipaddress.ip_address(sockaddr[0].split('%', 1)[0])
+        if address.version == 6 and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        if not address.is_global or address.is_multicast:
+            raise UnsafeWebhookURL(f'{host} resolves to non-public address {address}')
+
+
+def check_webhook_url(url: str) -> None:
+    """Resolve the URL's host and raise ``UnsafeWebhookURL`` if any address is not public."""
+    if WEBHOOK_ALLOW_PRIVATE:
+        return
+    host, port = _split_host(url)
+    try:
+        infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except (socket.gaierror, UnicodeError):
+        raise UnsafeWebhookURL(f'{host} does not resolve')
+    _check_addresses(host, infos)
+
+
+class PublicAddressBackend:
+    """
+    httpcore network backend that connects only to public addresses.
+
+    The host is resolved once per connection and the connection goes to the
+    address that was checked, so a DNS answer that changes between the check
+    and the connect (rebinding) cannot reach an internal service.
+    """
+
+    def __init__(self, backend):
+        self._backend = backend
+
+    async def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        host = _check_hostname(host)
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        except (socket.gaierror, UnicodeError):
+            raise UnsafeWebhookURL(f'{host} does not resolve')
+        _check_addresses(host, infos)
+        return await self._backend.connect_tcp(infos[0][4][0], port, timeout=timeout,
+                                               local_address=local_address, socket_options=socket_options)
+
+    async def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        raise UnsafeWebhookURL('Unix sockets are not allowed')
+
+    async def sleep(self, seconds):
+        await self._backend.sleep(seconds)
+
+
+def active_endpoint_ids(user_id) -> tuple:
+    """The user's active endpoint ids, cached briefly (most users have none)."""
+    ids = _endpoint_cache.get(user_id)
+    if ids is None:
+        from .models import WebhookEndpoint
+        ids = tuple(WebhookEndpoint.objects.filter(user_id=user_id, is_active=True)
+                    .values_list('id', flat=True))
+        _endpoint_cache.set(user_id, ids)
+    return ids
+
+
+def forget_endpoints(user_id):
+    """Call after adding/removing an endpoint; other workers follow within the cache TTL."""
+    _endpoint_cache.pop(user_id)
+
+
+def otp_event_data(row: dict) -> dict:
+    return {
+        'otp_id': str(row['id']),
+        'identifier': row['identifier'],
+        'channel': row['channel'],
+        'status': row['status'],
+        'country_code': row['country_code'],
+        'latency_ms': row['latency_ms'],
+        'api_key_id': str(row['api_key_id']) if row['api_key_id'] else None,
+    }
+
+
+def enqueue_otp_events(rows) -> int:
+    """
+    Write outbox events for OTPLog rows (dicts with ``OTP_EVENT_FIELDS``, the
+    new status already applied). Call inside the transaction that changed
+    them; dispatch is scheduled for after commit.
+    """
+    from .models import WebhookEvent
+    events = []
+    for row in rows:
+        endpoint_ids = active_endpoint_ids(row['user_id'])
+        if endpoint_ids:
+            data = otp_event_data(row)
+            events.extend(WebhookEvent(endpoint_id=endpoint_id, event_type=f"otp.{row['status']}", payload=data)
+                          for endpoint_id in endpoint_ids)
+    if events:
+        WebhookEvent.objects.bulk_create(events)
+        transaction.on_commit(schedule_dispatch)
+    return len(events)
+
+
+def enqueue_test_event(endpoint) -> None:
+    from .models import WebhookEvent
+    with transaction.atomic():
+        WebhookEvent.objects.create(endpoint=endpoint, event_type='ping',
+                                    payload={'message': 'FastOTP webhook test'})
+        transaction.on_commit(schedule_dispatch)
+
+
+# ─────────────────────────────────────────────
+#  Dispatcher
+# ─────────────────────────────────────────────
+
+def retry_delay(attempts: int) -> float:
+    """Seconds before retry number ``attempts``: exponential, capped, ±20% jitter."""
+    return min(WEBHOOK_RETRY_MAX, WEBHOOK_RETRY_BASE * 2 ** (attempts - 1)) * random.uniform(0.8, 1.2)
+
+
+@dataclass
+class DispatchResult:
+    claimed: int = 0
+    requests: int = 0
+    delivered: int = 0
+    retrying: int = 0
+    failed: int = 0
+
+    def __iadd__(self, other: 'DispatchResult'):
+        for field in ('claimed', 'requests', 'delivered', 'retrying', 'failed'):
+            setattr(self, field, getattr(self, field) + getattr(other, field))
+        return self
+
+
+class WebhookDispatcher:
+    """
+    Database work runs on the calling thread; only the HTTP fan-out runs on
+    the dispatcher's own event loop, which keeps its connection pool between runs.
+
+    Usage:
+        result = webhook_dispatcher.dispatch_due()
+    """
+
+    def __init__(self, batch_size: int = WEBHOOK_BATCH_SIZE, concurrency: int = WEBHOOK_ENDPOINT_CONCURRENCY,
+                 timeout: float = WEBHOOK_TIMEOUT, max_batches: int = 50):
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.max_batches = max_batches
+        self._loop = None
+        self._client = None
+        self._lock = threading.Lock()
+
+    def claim_due(self) -> list:
+        """Lease due events and return ``[(endpoint, [events])]`` batches."""
+        from .models import WebhookEvent
+        now = timezone.now()
+        with transaction.atomic():
+            events = list(WebhookEvent.objects.select_for_update(skip_locked=True, of=('self',))
+                          .filter(status='pending', next_attempt_at__lte=now)
+                          .select_related('endpoint').order_by('next_attempt_at')
+                          [:self.batch_size * self.max_batches])
+            if events:
+                WebhookEvent.objects.filter(pk__in=[e.pk for e in events]).update(
+                    next_attempt_at=now + timedelta(seconds=WEBHOOK_LEASE), attempts=F('attempts') + 1)
+        by_endpoint = {}
+        for event in events:
+            event.attempts += 1
+            by_endpoint.setdefault(event.endpoint_id, []).append(event)
+        return [(batch[0].endpoint, batch[i:i + self.batch_size])
+                for batch in by_endpoint.values() for i in range(0, len(batch), self.batch_size)]
+
+    @staticmethod
+    def encode_batch(events) -> bytes:
+        return json.dumps({'events': [
+            {'id': str(e.id), 'type': e.event_type, 'created_at': e.created_at.isoformat(), 'data': e.payload}
+            for e in events
+        ]}, separators=(',', ':')).encode()
+
+    def _get_client(self):
+        if self._client is None:
+            import httpx
+            limits = httpx.Limits(max_connections=WEBHOOK_MAX_CONNECTIONS,
+                                  max_keepalive_connections=WEBHOOK_MAX_CONNECTIONS)
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=limits,
+                transport=None if WEBHOOK_ALLOW_PRIVATE else self._public_transport(limits),
+                trust_env=WEBHOOK_ALLOW_PRIVATE,
+                headers={'Content-Type': 'application/json', 'User-Agent': 'FastOTP-Webhooks/1.0'},
+            )
+        return self._client
+
+    @staticmethod
+    def _public_transport(limits):
+        """``AsyncHTTPTransport`` whose pool connects through ``PublicAddressBackend``."""
+        import httpcore
+        import httpx
+        transport = httpx.AsyncHTTPTransport(limits=limits, trust_env=False)
+        transport._pool = httpcore.AsyncConnectionPool(
+            ssl_context=httpx.create_ssl_context(trust_env=False),
+            max_connections=limits.max_connections,
+            max_keepalive_connections=limits.max_keepalive_connections,
+            keepalive_expiry=limits.keepalive_expiry,
+            network_backend=PublicAddressBackend(httpcore.AnyIOBackend()),
+        )
+        return transport
+
+    async def _send_all(self, batches) -> list:
+        import httpx
+        client = self._get_client()
+        limits = {endpoint.pk: asyncio.Semaphore(self.concurrency) for endpoint, _ in batches}
+
+        async def send(endpoint, events):
+            body = self.encode_batch(events)
+            async with limits[endpoint.pk]:
+                try:
+                    response = await client.post(endpoint.url, content=body,
+                                                 headers={SIGNATURE_HEADER: sign_payload(endpoint.secret, body)})
+                except UnsafeWebhookURL as e:
+                    return events, f'Blocked: {e}'[:200]
+                except httpx.HTTPError as e:
+                    return events, f'{e.__class__.__name__}: {e}'[:200]
+            return events, '' if 200 <= response.status_code < 300 else f'HTTP {response.status_code}'
+
+        return await asyncio.gather(*(send(endpoint, events) for endpoint, events in batches))
+
+    def record(self, outcomes) -> DispatchResult:
+        """Mark delivered events and reschedule or fail the rest, in set-based updates."""
+        from .models import WebhookEvent
+        now = timezone.now()
+        result = DispatchResult()
+        delivered, retry, failed = [], {}, {}
+        for events, error in outcomes:
+            result.requests += 1
+            for event in events:
+                if not error:
+                    delivered.append(event.pk)
+                elif event.attempts >= WEBHOOK_MAX_ATTEMPTS:
+                    failed.setdefault(error, []).append(event.pk)
+                else:
+                    retry.setdefault((event.attempts, error), []).append(event.pk)
+        with transaction.atomic():
+            if delivered:
+                WebhookEvent.objects.filter(pk__in=delivered).update(status='delivered', delivered_at=now,
+                                                                     last_error='')
+            for (attempts, error), pks in retry.items():
+                WebhookEvent.objects.filter(pk__in=pks).update(
+                    next_attempt_at=now + timedelta(seconds=retry_delay(attempts)), last_error=error)
+            for error, pks in failed.items():
+                WebhookEvent.objects.filter(pk__in=pks).update(status='failed', last_error=error)
+        result.delivered = len(delivered)
+        result.retrying = sum(map(len, retry.values()))
+        result.failed = sum(map(len, failed.values()))
+        return result
+
+    def dispatch_due(self) -> DispatchResult:
+        """Claim, send and record one round of due events."""
+        with self._lock:
+            batches = self.claim_due()
+            if not batches:
+                return DispatchResult()
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+            outcomes = self._loop.run_until_complete(self._send_all(batches))
+            result = self.record(outcomes)
+            result.claimed = sum(len(events) for _, events in batches)
+            return result
+
+    def drain(self) -> DispatchResult:
+        """Dispatch rounds until nothing is due."""
+        total = DispatchResult()
+        while True:
+            result = self.dispatch_due()
+            if not result.claimed:
+                return total
+            total += result
+
+    def close(self):
+        with self._lock:
+            if self._client is not None:
+                self._loop.run_until_complete(self._client.aclose())
+                self._client = None
+            if self._loop is not None:
+                self._loop.close()
+                self._loop = None
+
+
+webhook_dispatcher = WebhookDispatcher()
+
+
+# ─────────────────────────────────────────────
+#  Scheduling
+# ─────────────────────────────────────────────
+
+_wakeup = threading.Event()
+_thread = None
+_thread_lock = threading.Lock()
+
+
+def _dispatch_forever():
+    while True:
+        _wakeup.wait(WEBHOOK_POLL_INTERVAL)
+        _wakeup.clear()
+        time.sleep(WEBHOOK_BATCH_WINDOW)  # let a burst land so it goes out as one batch
+        try:
+            webhook_dispatcher.drain()
+        except Exception:
+            logger.exception("Webhook dispatch failed")
+        finally:
+            connections.close_all()  # this thread's connections only
+
+
+def schedule_dispatch():
+    """
+    Wake this process's dispatcher thread (started on first use; it also
+    polls every ``WEBHOOK_POLL_INTERVAL`` seconds for retries). With
+    ``WEBHOOK_DISPATCH_ASYNC = False`` this does nothing: a request never
+    waits on customer endpoints, and the outbox is drained by
+    ``dispatch_webhooks --once`` or the ``/api/cron/webhooks`` endpoint.
+    """
+    global _thread
+    if not WEBHOOK_DISPATCH_ASYNC:
+        return
+    if _thread is None:
+        with _thread_lock:
+            if _thread is None:
+                _thread = threading.Thread(target=_dispatch_forever, name='fastotp-webhooks', daemon=True)
+                _thread.start()
+    _wakeup.set()
+
+
+def cron_dispatch_view(request):
+    """
+    One dispatch round for a scheduler (Vercel Cron sends
+    ``Authorization: Bearer <CRON_SECRET>``); 404 with no secret configured.
+    """
+    if not CRON_SECRET:
+        raise Http404
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {CRON_SECRET}'):
+        return HttpResponseForbidden('Forbidden')
+    return JsonResponse(asdict(webhook_dispatcher.dispatch_due()))
+
+
+# ─────────────────────────────────────────────
+#  Local Receiver (development / benchmarks)
+# ─────────────────────────────────────────────
+
+class LocalReceiver:
+    """
+    Minimal HTTP receiver that verifies signatures and records event batches.
+
+    Usage:
+        with LocalReceiver(secret) as receiver:
+            endpoint.url = receiver.url
+            ...
+            receiver.events
+    """
+
+    def __init__(self, secret: str = '', port: int = 0, fail_rate: float = 0.0, on_batch=None):
+        self.secret = secret
+        self.port = port
+        self.fail_rate = fail_rate
+        self.on_batch = on_batch
+        self.events = []
+        self.requests = 0
+        self.rejected = 0
+        self._server = None
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self._server.server_address[1]}/webhooks'
+
+    def _handler(self):
+        from http.server import BaseHTTPRequestHandler
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive, so the dispatcher's pool is exercised
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                receiver.requests += 1
+                status = 200
+                if receiver.secret and not verify_signature(receiver.secret,
+                                                            self.headers.get(SIGNATURE_HEADER, ''), body):
+                    receiver.rejected += 1
+                    status = 401
+                elif random.random() < receiver.fail_rate:
+                    status = 503
+                else:
+                    batch = json.loads(body)['events']
+                    receiver.events.extend(batch)
+                    if receiver.on_batch:
+                        receiver.on_batch(batch)
+                self.send_response(status)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> 'LocalReceiver':
+        from http.server import ThreadingHTTPServer
+        self._server = ThreadingHTTPServer(('127.0.0.1', self.port), self._handler())
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,37 @@
+/** Source of truth for the compiled stylesheet (static/css/app.css).
+ *  Keep in sync with the CDN fallback config in templates/fastotp/base.html. */
+module.exports = {
+  content: [
+    './templates/**/*.html',
+    './fastotp/**/*.py',  // views return small HTML fragments with utility classes
+  ],
+  theme: {
+    extend: {
+      colors: {
+        emerald: { 50:'#ecfdf5',100:'#d1fae5',200:'#a7f3d0',300:'#6ee7b7',400:'#34d399',500:'#10b981',600:'#059669',700:'#047857',800:'#065f46',900:'#064e3b',950:'#022c22' },
+        lime: { 300:'#bef264',400:'#a3e635',500:'#84cc16' },
+      },
+      fontFamily: {
+        display: ['"Syne"', 'sans-serif'],
+        body: ['"DM Sans"', 'sans-serif'],
+        mono: ['"JetBrains Mono"', 'monospace'],
+      },
+      animation: {
+        'pulse-slow': 'pulse 3s cubic-bezier(0.4, 0, 0.6, 1) infinite',
+        'shimmer': 'shimmer 2s linear infinite',
+        'float': 'float 6s ease-in-out infinite',
+        'ping-slow': 'ping 2s cubic-bezier(0,0,.2,1) infinite',
+      },
+      keyframes: {
+        shimmer: { '0%': { backgroundPosition: '-200% 0' }, '100%': { backgroundPosition: '200% 0' } },
+        float: { '0%,100%': { transform: 'translateY(0)' }, '50%': { transform: 'translateY(-10px)' } },
+      },
+      backdropBlur: { xs: '2px' },
+      boxShadow: {
+        'glass': '0 8px 32px rgba(0,0,0,0.08), inset 0 1px 0 rgba(255,255,255,0.6)',
+        'glow': '0 0 30px rgba(5,150,105,0.3)',
+        'glow-lime': '0 0 20px rgba(190,242,100,0.4)',
+      },
+    },
+  },
+};
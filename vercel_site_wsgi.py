@@ -0,0 +1,10 @@
+"""
+WSGI config for the FastOTP site (pages, dashboard, billing, admin) on Vercel.
+"""
+import os
+
+from django.core.wsgi import get_wsgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+application = get_wsgi_application()
@@ -1,10 +1,13 @@
 """
-WSGI config for FastOTP project on Vercel.
+WSGI config for the FastOTP API lambda on Vercel.
+
+Serves the OTP API, polling endpoints and /metrics with the slim
+``config.settings_api`` profile; ``vercel_site_wsgi`` serves everything else.
 """
 import os
 
 from django.core.wsgi import get_wsgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings_api')
 
 application = get_wsgi_application()